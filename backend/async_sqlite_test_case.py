@@ -0,0 +1,60 @@
+"""
+Shared fixture for tests that need the database.
+
+`AsyncSQLiteTestCase` gives every test a throwaway SQLite file behind an aiosqlite
+engine (`self.engine`, sessions from `self.Session`) with the tables the test class
+declares, and runs `seed()` before each test. Tests are `async def` and run on the
+case's own event loop.
+
+    class TestSomething(AsyncSQLiteTestCase):
+        tables = [User, ChatMessage]
+
+        async def seed(self):
+            async with self.Session() as db:
+                ...
+"""
+import os
+import sys
+import tempfile
+import unittest
+from typing import Optional, List
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from models import Base, AsyncSessionLocal, async_engine
+
+
+def sqlite_tables() -> List:
+    """Every table except google_tokens, whose Postgres ARRAY column SQLite cannot hold."""
+    return [t for t in Base.metadata.sorted_tables if t.name != "google_tokens"]
+
+
+class AsyncSQLiteTestCase(unittest.IsolatedAsyncioTestCase):
+    # Models (or Table objects) to create; None creates every table SQLite can hold
+    tables: Optional[List] = None
+    # Point models.AsyncSessionLocal at the test database, for code that opens its own sessions
+    bind_session_factory = False
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/test.db")
+        self.Session = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        tables = sqlite_tables() if self.tables is None else [getattr(t, "__table__", t) for t in self.tables]
+        async with self.engine.begin() as conn:
+            await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=tables))
+        if self.bind_session_factory:
+            AsyncSessionLocal.configure(bind=self.engine)
+        await self.seed()
+
+    async def seed(self):
+        """Rows every test of the class starts with."""
+
+    async def asyncTearDown(self):
+        if self.bind_session_factory:
+            AsyncSessionLocal.configure(bind=async_engine)
+        await self.engine.dispose()
+        self.tmp.cleanup()
@@ -0,0 +1,104 @@
+"""
+Insert/read latency of chat_messages before and after monthly partitioning.
+
+Builds two synthetic tables with the chat_messages shape and indexes (Postgres only):
+  bench_chat_flat  - a plain table (current layout)
+  bench_chat_part  - range-partitioned by month on created_at (new layout)
+seeds both with ROWS messages spread over MONTHS months, then times single-row
+inserts and recent-session history reads on each.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python benchmark/bench_chat_partitioning.py --rows 50000000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from models import async_engine
+from services.chat_archive import _month_start, _add_months
+
+COLUMNS = """
+    id bigserial, session_id varchar(255) NOT NULL, user_id integer, role varchar(50) NOT NULL,
+    content text, tool_name varchar(255), citations json, created_at timestamptz NOT NULL DEFAULT now()
+"""
+
+SEED_SQL = """
+INSERT INTO {table} (session_id, user_id, role, content, created_at)
+SELECT 'bench-' || (g / 20), 1 + g % 1000, CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+       'synthetic message ' || g, now() - ((:rows - g) * :span / :rows) * interval '1 second'
+FROM generate_series(1, :rows) AS g
+"""
+
+
+async def build(conn, rows: int, months: int):
+    span = months * 30 * 24 * 3600
+    await conn.execute(text("DROP TABLE IF EXISTS bench_chat_flat, bench_chat_part CASCADE"))
+    await conn.execute(text(f"CREATE TABLE bench_chat_flat ({COLUMNS}, PRIMARY KEY (id))"))
+    await conn.execute(text(f"CREATE TABLE bench_chat_part ({COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"))
+    month = _month_start(datetime.now(timezone.utc))
+    first = _add_months(month, -months - 1)
+    while first <= _add_months(month, 1):
+        upper = _add_months(first, 1)
+        await conn.execute(text(
+            f"CREATE TABLE bench_chat_part_y{first.year}m{first.month:02d} PARTITION OF bench_chat_part "
+            f"FOR VALUES FROM ('{first.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        first = upper
+    for table in ("bench_chat_flat", "bench_chat_part"):
+        print(f"Seeding {rows} rows into {table}...")
+        await conn.execute(text(SEED_SQL.format(table=table)), {"rows": rows, "span": span})
+        await conn.execute(text(f"CREATE INDEX ON {table} (session_id)"))
+        await conn.execute(text(f"CREATE INDEX ON {table} (user_id, created_at)"))
+        await conn.execute(text(f"ANALYZE {table}"))
+
+
+def report(label: str, timings):
+    timings.sort()
+    print(f"  {label:<8} p50 {statistics.median(timings):7.3f} ms   p95 {timings[int(len(timings) * 0.95) - 1]:7.3f} ms")
+
+
+async def measure(table: str, rows: int, samples: int):
+    inserts, reads = [], []
+    recent_sessions = [f"bench-{(rows - i * 37) // 20}" for i in range(samples)]
+    async with async_engine.connect() as conn:
+        for i in range(samples):
+            start = time.perf_counter()
+            await conn.execute(text(f"INSERT INTO {table} (session_id, user_id, role, content) VALUES (:s, 1, 'user', 'benchmark insert')"), {"s": recent_sessions[i]})
+            await conn.commit()
+            inserts.append((time.perf_counter() - start) * 1000)
+        for session_id in recent_sessions:
+            start = time.perf_counter()
+            # Recent-session reads carry a created_at lower bound so the planner can prune partitions
+            await conn.execute(text(
+                f"SELECT * FROM {table} WHERE session_id = :s AND created_at >= now() - interval '31 days' ORDER BY created_at"
+            ), {"s": session_id})
+            reads.append((time.perf_counter() - start) * 1000)
+    print(table)
+    report("insert", inserts)
+    report("read", reads)
+
+
+async def run(rows: int, months: int, samples: int, skip_build: bool):
+    if not skip_build:
+        async with async_engine.begin() as conn:
+            await build(conn, rows, months)
+    for table in ("bench_chat_flat", "bench_chat_part"):
+        await measure(table, rows, samples)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--skip-build", action="store_true", help="reuse tables from a previous run")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.months, args.samples, args.skip_build))
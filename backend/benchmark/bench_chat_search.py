@@ -0,0 +1,86 @@
+"""
+Latency benchmark for /chat/search on a large synthetic chat_messages table.
+
+Creates USERS benchmark users, seeds ROWS synthetic messages spread across them
+with generate_series (Postgres only), makes sure the GIN index exists, then times
+search_chat_messages for a handful of queries and checks the p95 against the 50 ms
+budget.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python benchmark/bench_chat_search.py --rows 10000000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from models import async_engine, AsyncSessionLocal, init_db
+from services.chat_search import search_chat_messages
+
+WORDS = ["indemnity", "clause", "liability", "calendar", "meeting", "invoice", "spreadsheet", "budget",
+         "contract", "termination", "warranty", "payment", "schedule", "report", "summary", "drive"]
+
+# chat_messages.user_id references users.id, so the owners have to exist first
+USERS_SQL = """
+INSERT INTO users (username, password)
+SELECT 'bench-user-' || g, 'bench' FROM generate_series(1, :users) AS g
+ON CONFLICT (username) DO NOTHING
+"""
+
+SEED_SQL = """
+INSERT INTO chat_messages (session_id, user_id, role, content, created_at)
+SELECT 'bench-' || (g % :sessions),
+       (:user_ids)[1 + g % :users],
+       CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+       (:words)[1 + (g * 7) % 16] || ' ' || (:words)[1 + (g * 13) % 16] || ' ' ||
+       (:words)[1 + (g * 17) % 16] || ' message number ' || g,
+       now() - (g || ' seconds')::interval
+FROM generate_series(1, :rows) AS g
+"""
+
+QUERIES = ["indemnity clause", "budget report", "termination warranty", "calendar", "payment schedule"]
+
+
+async def run(rows: int, users: int, repeats: int):
+    await init_db()
+    async with async_engine.begin() as conn:
+        await conn.execute(text(USERS_SQL), {"users": users})
+        user_ids = (await conn.execute(
+            text("SELECT id FROM users WHERE username LIKE 'bench-user-%' ORDER BY id LIMIT :users"), {"users": users})).scalars().all()
+        existing = (await conn.execute(text("SELECT count(*) FROM chat_messages WHERE session_id LIKE 'bench-%'"))).scalar()
+        if existing < rows:
+            print(f"Seeding {rows - existing} rows...")
+            # Spread rows across users so the user filter is realistic
+            await conn.execute(text(SEED_SQL), {"rows": rows - existing, "sessions": max(rows // 100, 1), "words": WORDS,
+                                                "user_ids": list(user_ids), "users": len(user_ids)})
+        await conn.execute(text("ANALYZE chat_messages"))
+
+    timings = []
+    async with AsyncSessionLocal() as db:
+        for query in QUERIES:
+            for i in range(repeats):
+                start = time.perf_counter()
+                await search_chat_messages(db, user_ids[i % len(user_ids)], query, page=1 + (i % 3))
+                timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"rows:  {rows}  users: {users}  queries: {len(timings)}")
+    print(f"p50:   {statistics.median(timings):.1f} ms")
+    print(f"p95:   {p95:.1f} ms  ({'OK' if p95 < 50 else 'OVER'} 50 ms budget)")
+    print(f"max:   {timings[-1]:.1f} ms")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.users, args.repeats))
@@ -0,0 +1,94 @@
+"""
+Local Drive file ranking on a synthetic listing.
+
+Builds FILES synthetic Drive records (random multi-word names, mixed extensions and
+MIME types, modified times spread over two years), then times `rank_files` for a set
+of queries and reports p50/p95 per call, per-file cost, and how often the ranking was
+close enough to need the LLM tie-break.
+
+Usage (from backend/):
+    python benchmark/bench_file_matcher.py --files 10000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.file_matcher import rank_files, _name_features
+
+WORDS = ("budget", "report", "invoice", "meeting", "notes", "roadmap", "resume", "contract", "draft", "final",
+         "quarterly", "sales", "marketing", "plan", "summary", "design", "review", "team", "project", "client",
+         "q1", "q2", "q3", "q4", "2023", "2024", "2025", "hiring", "onboarding", "expenses")
+TYPES = (
+    ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ("", "application/vnd.google-apps.spreadsheet"),
+    ("pdf", "application/pdf"),
+    ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ("", "application/vnd.google-apps.document"),
+    ("pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation"),
+    ("png", "image/png"),
+    ("mp4", "video/mp4"),
+)
+QUERIES = (
+    ("budget 2024", "find my budget 2024 spreadsheet"),
+    ("meeting notes", "summarize the team meeting notes"),
+    ("resume", "read my resume pdf"),
+    ("sales report q3", "email the q3 sales report to finance"),
+    ("onboarding plan", "open the onboarding plan document"),
+    ("", "show the roadmap presentation"),
+)
+
+
+def synthetic_listing(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    files = []
+    for i in range(count):
+        name = " ".join(rng.sample(WORDS, rng.randint(1, 4))).title()
+        ext, mime = rng.choice(TYPES)
+        files.append({
+            "id": f"file-{i}",
+            "name": f"{name}.{ext}" if ext else name,
+            "mimeType": mime,
+            "modifiedTime": (now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))).isoformat().replace("+00:00", "Z"),
+        })
+    return files
+
+
+def run(count: int, rounds: int):
+    files = synthetic_listing(count)
+    cold_start = time.perf_counter()
+    rank_files(QUERIES[0][0], files, QUERIES[0][1])
+    cold = (time.perf_counter() - cold_start) * 1000
+    print(f"{count} files; first call (name features not cached yet): {cold:.1f} ms")
+
+    timings, ambiguous = [], 0
+    for _ in range(rounds):
+        for query, goal in QUERIES:
+            start = time.perf_counter()
+            result = rank_files(query, files, goal)
+            timings.append((time.perf_counter() - start) * 1000)
+            ambiguous += bool(result.get("ambiguous"))
+    timings.sort()
+    p50, p95 = statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+    print(f"rank_files  p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   ({p50 * 1000 / count:.2f} us/file)")
+    print(f"LLM tie-break needed in {ambiguous}/{len(timings)} rankings")
+    print(f"name feature cache: {_name_features.cache_info()}")
+    for query, goal in QUERIES:
+        result = rank_files(query, files, goal)
+        top = result["matches"][0] if result["matches"] else None
+        print(f"  {query or goal!r:<28} best={result.get('best_match_id', '-'):<11} ambiguous={result['ambiguous']!s:<5} "
+              f"top={top['name'] if top else '-'} ({top['relevance_score'] if top else 0})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    run(args.files, args.rounds)
@@ -0,0 +1,87 @@
+"""
+Time to first visible content of the final structured response.
+
+Replays a recorded FORMAT_SCHEMA answer (fixtures/final_response.json) as a token
+stream at a fixed rate through `stream_final_response` and reports when the first
+`structured_item` reached the websocket, compared with the whole response, which is
+when the old non-streaming call showed anything at all.
+
+With --live it asks gpt-4o for a final response to a short synthetic history instead.
+
+Usage (from backend/):
+    python benchmark/bench_final_response.py --tokens-per-sec 60
+    OPENAI_API_KEY=... python benchmark/bench_final_response.py --live --repeats 3
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import statistics
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controller.workflow_execution_controller import stream_final_response
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "final_response.json")
+HISTORY = [
+    {"role": "user", "content": "summarize Budget 2024 and email it to alex@example.com, then tell me when I'm free this week"},
+    {"role": "system", "content": "Output from tool 'read_spreadsheet': {\"status\": \"success\", \"values\": [[\"Dept\", \"Total\"], [\"Engineering\", \"412000\"]]}"},
+    {"role": "system", "content": "Output from tool 'send_email': {\"status\": \"success\", \"message_id\": \"18c2\"}"},
+    {"role": "system", "content": "Generate the final response using the specified structured format."},
+]
+
+
+class Socket:
+    def __init__(self):
+        self.events = []
+
+    async def send_text(self, text):
+        self.events.append(json.loads(text))
+
+
+class ReplayCompletions:
+    """Streams a recorded answer in ~4 character tokens at `tokens_per_sec`."""
+
+    def __init__(self, text: str, tokens_per_sec: float):
+        self.text = text
+        self.delay = 1 / tokens_per_sec
+
+    async def create(self, **kwargs):
+        return self._stream()
+
+    async def _stream(self):
+        for i in range(0, len(self.text), 4):
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.text[i:i + 4]))])
+
+
+async def measure(client_openai, repeats: int):
+    first, total, items = [], [], 0
+    for _ in range(repeats):
+        socket = Socket()
+        _, timing = await stream_final_response(socket, client_openai, HISTORY)
+        first.append(timing["first_content_ms"])
+        total.append(timing["total_ms"])
+        items = sum(e["type"] == "structured_item" for e in socket.events)
+    print(f"structured_item events per response: {items}")
+    print(f"first content     p50 {statistics.median(first):8.0f} ms")
+    print(f"complete response p50 {statistics.median(total):8.0f} ms   (non-streaming: nothing visible until here)")
+    print(f"time to first content reduced by {100 * (1 - statistics.median(first) / statistics.median(total)):.0f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true", help="stream from the OpenAI API instead of the recorded answer")
+    parser.add_argument("--tokens-per-sec", type=float, default=60)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    if args.live:
+        from function import function_client_read_openai
+        client = function_client_read_openai(os.environ["OPENAI_API_KEY"])
+    else:
+        with open(FIXTURE_PATH) as f:
+            recorded = json.dumps(json.load(f))
+        client = SimpleNamespace(chat=SimpleNamespace(completions=ReplayCompletions(recorded, args.tokens_per_sec)))
+    asyncio.run(measure(client, args.repeats))
@@ -0,0 +1,77 @@
+"""
+Concurrency benchmark for the chat history endpoints.
+
+Fires N simultaneous GET /chat/history/{session_id} requests at the app in-process
+(httpx ASGITransport) and reports throughput and latency percentiles.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... config_key_jwt=secret python benchmark/bench_history_concurrency.py --concurrency 200
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from main import app
+from function import function_token_encode
+from models import async_engine, AsyncSessionLocal, ChatMessage, init_db
+
+
+async def seed_session(user_id: int, message_count: int) -> str:
+    session_id = f"bench-{uuid.uuid4()}"
+    async with AsyncSessionLocal() as db:
+        for i in range(message_count):
+            db.add(ChatMessage(session_id=session_id, user_id=user_id, role="user" if i % 2 == 0 else "assistant", content=f"benchmark message {i}"))
+        await db.commit()
+    return session_id
+
+
+async def run(concurrency: int, rounds: int, user_id: int, message_count: int):
+    await init_db()
+    app.state.config_key_root = os.environ.get("config_key_root")
+    app.state.config_key_jwt = os.environ.get("config_key_jwt", "bench-secret")
+    token = await function_token_encode(app.state.config_key_jwt, 3600, {"id": user_id, "username": "bench"}, ["id", "username"])
+    session_id = await seed_session(user_id, message_count)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+
+    async def one(client):
+        start = time.perf_counter()
+        response = await client.get(f"/chat/history/{session_id}", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await one(client)  # warm the pool
+        latencies.clear()
+        wall_start = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(*(one(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - wall_start
+
+    total = concurrency * rounds
+    latencies.sort()
+    print(f"requests:     {total} ({concurrency} concurrent x {rounds} rounds, {message_count} msgs/session)")
+    print(f"throughput:   {total / wall:.1f} req/s")
+    print(f"latency p50:  {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"latency p95:  {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"latency max:  {latencies[-1] * 1000:.1f} ms")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.rounds, args.user_id, args.messages))
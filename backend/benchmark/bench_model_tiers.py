@@ -0,0 +1,132 @@
+"""
+Latency and cost of model routing tiers, replayed over recorded workflows.
+
+Every recorded workflow in fixtures/workflows/ (or --fixtures) is replayed through
+`workflow_handler` once per tier: "gpt-4o" runs every stage on gpt-4o, "routed" uses
+model_routing.json, and --tier name=path.json adds any other routing file. The recorded
+answers are served unchanged; what changes with the tier is the model each stage asks
+for, so each model call takes the modeled time of that model (`ttft_ms` +
+completion tokens / `tokens_per_sec` from the `models` section) and is priced from the
+recorded token usage. Tool calls keep their recorded latency.
+
+Replaying cannot tell whether a smaller model would have produced valid JSON: with
+--invalid-json-rate r, every call on a stage with `escalate_to` adds r times the
+escalation call to the expected latency and cost. The escalations that really happen
+are counted per stage at /admin/model-routing/stats.
+
+Usage (from backend/):
+    python benchmark/bench_model_tiers.py
+    python benchmark/bench_model_tiers.py --invalid-json-rate 0.05 --tier cheap=/tmp/all_mini.json
+"""
+import os
+import sys
+import copy
+import glob
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_workflow_replay import FIXTURE_DIR, prepare_database, percentile
+
+
+def single_model_tier(config: dict, model: str) -> dict:
+    tier = copy.deepcopy(config)
+    for route in tier["stages"].values():
+        route["model"] = model
+        route.pop("escalate_to", None)
+    return tier
+
+
+def completion_tokens(entry: dict) -> int:
+    usage = entry.get("usage") or {}
+    # Older recordings of streamed calls have no usage: about 4 characters per token
+    return usage.get("completion_tokens") or len(entry.get("content") or "") // 4
+
+
+async def run_tier(paths, router, tool_scale: float):
+    from services.workflow_replay import WorkflowReplay
+    from services.plan_cache import plan_cache
+    from controller.workflow_execution_controller import workflow_handler
+
+    def modeled_ms(model: str, tokens: int) -> float:
+        profile = router.models.get(model) or {}
+        return profile.get("ttft_ms", 0) + tokens * 1000 / max(profile.get("tokens_per_sec", 1), 1)
+
+    workflow_ms, llm_ms, cost, served = [], [], [], []
+    for path in paths:
+        plan_cache.clear()
+        replay = WorkflowReplay.load(path, latency_scale=tool_scale,
+                                     llm_latency_fn=lambda entry, request: modeled_ms(request.get("model"), completion_tokens(entry)))
+        start = time.perf_counter()
+        events = await replay.run(workflow_handler)
+        workflow_ms.append((time.perf_counter() - start) * 1000)
+        llm_ms.append(sum(sum(v) for stage, v in replay.timings.items() if stage != "execute"))
+        cost.append(sum(router.cost_usd(s["model"], (s["usage"] or {}).get("prompt_tokens", 0), completion_tokens(s)) for s in replay.served))
+        served.extend(replay.served)
+        if not any(e.get("type") == "workflow_complete" and e.get("status") == "success" for e in events):
+            print(f"  warning: {os.path.basename(path)} did not complete successfully under this tier")
+    return workflow_ms, llm_ms, cost, served
+
+
+async def run(paths, tiers: dict, tool_scale: float, invalid_json_rate: float):
+    from models import async_engine
+    from services.model_routing import model_router
+    # Importing the controller loads model_routing.json into the router; tiers are loaded after it
+    import controller.workflow_execution_controller  # noqa: F401
+
+    await prepare_database()
+    rows = []
+    for name, config in tiers.items():
+        model_router.load(config)
+        workflow_ms, llm_ms, cost, served = await run_tier(paths, model_router, tool_scale)
+        # Expected extra escalation call per call on a stage that can escalate
+        extra_ms = extra_cost = 0.0
+        for s in served:
+            route = model_router.get(s["stage"])
+            if route and route.escalate_to and s["model"] == route.model:
+                profile = model_router.models[route.escalate_to]
+                extra_ms += invalid_json_rate * (profile["ttft_ms"] + completion_tokens(s) * 1000 / profile["tokens_per_sec"])
+                extra_cost += invalid_json_rate * model_router.cost_usd(route.escalate_to, (s["usage"] or {}).get("prompt_tokens", 0), completion_tokens(s))
+        runs = len(paths)
+        models = ", ".join(f"{stage}={route.model}" for stage, route in model_router.routes.items())
+        rows.append((name, statistics.median(workflow_ms), percentile(workflow_ms, 0.95),
+                     sum(llm_ms) / runs + extra_ms / runs, 1000 * (sum(cost) + extra_cost) / runs, models))
+    await async_engine.dispose()
+
+    print(f"{len(paths)} recorded workflows, invalid JSON rate {invalid_json_rate:.0%} on stages that escalate\n")
+    print(f"{'tier':<10}{'workflow p50':>14}{'p95':>8}{'model ms/run':>14}{'USD/1k runs':>13}")
+    for name, p50, p95, model_ms, cost_1k, _ in rows:
+        print(f"{name:<10}{p50:>11.0f} ms{p95:>8.0f}{model_ms:>14.0f}{cost_1k:>13.2f}")
+    print()
+    for name, *_, models in rows:
+        print(f"{name:<10}{models}")
+    baseline = rows[0]
+    for name, p50, _, model_ms, cost_1k, _ in rows[1:]:
+        print(f"\n{name} vs {baseline[0]}: model time {100 * (1 - model_ms / baseline[3]):+.0f}% faster, "
+              f"cost {100 * (1 - cost_1k / baseline[4]):+.0f}% lower")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="directory of recorded runs")
+    parser.add_argument("--tier", action="append", default=[], metavar="NAME=PATH", help="extra routing file to compare")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.02)
+    parser.add_argument("--tool-latency-scale", type=float, default=1.0)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "tiers.db"))
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from services.model_routing import load_model_routing
+    routed = load_model_routing()
+    tiers = {"gpt-4o": single_model_tier(routed, "gpt-4o"), "routed": routed}
+    for spec in args.tier:
+        name, _, path = spec.partition("=")
+        tiers[name] = load_model_routing(path)
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.json")))
+    if not paths:
+        sys.exit(f"no recorded workflows in {args.fixtures}")
+    asyncio.run(run(paths, tiers, args.tool_latency_scale, args.invalid_json_rate))
@@ -0,0 +1,63 @@
+"""
+Time-to-first-tool for the two planner modes on recorded queries.
+
+For each query in fixtures/workflow_queries.json this runs what workflow_handler does
+before the first tool executes (planning + parameter resolution of step 1), once with
+the two-call planner (extract_variables -> plan_workflow) and once with the combined
+single-call planner (extract_and_plan), against the live OpenAI API.
+
+Usage (from backend/):
+    OPENAI_API_KEY=... python benchmark/bench_planner_modes.py
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from function import function_client_read_openai
+from controller.workflow_execution_controller import (
+    tool_catalog, extract_variables, plan_workflow, extract_and_plan, resolve_step_parameters
+)
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "workflow_queries.json")
+
+
+async def time_to_first_tool(client_openai, query: str, mode: str) -> float:
+    start = time.perf_counter()
+    if mode == "two_call":
+        extracted = await extract_variables(client_openai, query)
+        plan = await plan_workflow(client_openai, query, tool_catalog, extracted)
+    else:
+        extracted, plan = await extract_and_plan(client_openai, query, tool_catalog)
+    if plan:
+        await resolve_step_parameters(client_openai, plan[0].get("tool_id"), query, [], extracted, plan[0], tool_catalog)
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(repeats: int):
+    client_openai = function_client_read_openai(os.environ["OPENAI_API_KEY"])
+    with open(FIXTURE_PATH) as f:
+        queries = json.load(f)
+    results = {"two_call": [], "combined": []}
+    for query in queries:
+        for _ in range(repeats):
+            # Alternate modes so both see the same API conditions
+            for mode in results:
+                results[mode].append(await time_to_first_tool(client_openai, query, mode))
+    for mode, timings in results.items():
+        timings.sort()
+        print(f"{mode:<9} n={len(timings):<3} p50 {statistics.median(timings):7.0f} ms   p95 {timings[int(len(timings) * 0.95) - 1]:7.0f} ms")
+    saved = statistics.median(results["two_call"]) - statistics.median(results["combined"])
+    print(f"median time-to-first-tool saved by combined mode: {saved:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.repeats))
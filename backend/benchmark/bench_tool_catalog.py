@@ -0,0 +1,126 @@
+"""
+Planner prompt size with the compiled, relevance-filtered tool catalog.
+
+For each query in fixtures/workflow_queries.json this compares the 'Available Tools'
+block of the planner prompt in three forms:
+
+- pretty:   all tools, json.dumps(indent=2), as plan_workflow used to send them
+- compact:  all tools, precompiled compact fragments
+- filtered: the top-k tools the lexical prefilter keeps for the query
+
+and reports tokens per prompt, the cost of `select`, and the recall of the tools the
+query actually needs (EXPECTED). Tokens are counted with tiktoken when it is installed,
+otherwise estimated at 4 characters per token.
+
+With --live it also times extract_and_plan with the full and the filtered catalog
+against the OpenAI API.
+
+Usage (from backend/):
+    python benchmark/bench_tool_catalog.py
+    OPENAI_API_KEY=... python benchmark/bench_tool_catalog.py --live --repeats 3
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controller.workflow_execution_controller import TOOLS_REGISTRY, extract_and_plan
+from services.plan_templating import TOOL_OUTPUT_FIELDS
+from services.tool_catalog import ToolCatalog
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "workflow_queries.json")
+
+# Tools a correct plan for each fixture query uses
+EXPECTED = {
+    "check my calendar for the next 3 days": ["check_calendar_availability"],
+    "what's on my calendar tomorrow": ["check_calendar_availability"],
+    "read my last 5 emails": ["read_emails"],
+    "find emails from billing@acme.com about the invoice": ["read_emails"],
+    "schedule a meeting called Design Review tomorrow from 10:00 to 11:00 with priya@example.com": ["schedule_calendar_event"],
+    "email alex@example.com the summary of the Q3 report": ["list_drive_files", "read_drive_file_content", "send_email"],
+    "list my drive files named Budget": ["list_drive_files"],
+    "find the file OmPlacementResume and read its content": ["list_drive_files", "read_drive_file_content"],
+    "read the spreadsheet Sales 2025 and summarize the totals": ["list_drive_files", "read_spreadsheet"],
+    "create a spreadsheet called Team Roster": ["create_spreadsheet"],
+    "upload a note called standup.txt with content 'shipped the export endpoint'": ["upload_to_drive"],
+    "delete the calendar event for the dentist appointment": ["delete_calendar_event"],
+    "find the contract pdf in my drive and email its contents to legal@example.com": ["list_drive_files", "read_drive_file_content", "send_email"],
+    "clear range A1:D20 in the Inventory spreadsheet": ["list_drive_files", "clear_spreadsheet_values"],
+}
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.encoding_for_model("gpt-4o")
+
+    def count_tokens(text: str) -> int:
+        return len(_ENCODING.encode(text))
+    TOKENIZER = "tiktoken"
+except ImportError:
+    def count_tokens(text: str) -> int:
+        return (len(text) + 3) // 4
+    TOKENIZER = "~4 chars/token"
+
+
+def prompt_sizes(queries):
+    full = ToolCatalog(TOOLS_REGISTRY, TOOL_OUTPUT_FIELDS, prefilter=False)
+    filtered = ToolCatalog(TOOLS_REGISTRY, TOOL_OUTPUT_FIELDS, prefilter=True)
+    pretty = count_tokens(json.dumps(list(full.info.values()), indent=2))
+    compact = count_tokens(full.full_prompt)
+
+    sizes, select_us, found, needed = [], [], 0, 0
+    for query in queries:
+        start = time.perf_counter()
+        selected = filtered.select(query)
+        select_us.append((time.perf_counter() - start) * 1e6)
+        sizes.append(count_tokens(filtered.prompt(selected)))
+        expected = EXPECTED.get(query, [])
+        found += sum(t in selected for t in expected)
+        needed += len(expected)
+        missing = [t for t in expected if t not in selected]
+        print(f"{len(selected):>2} tools {sizes[-1]:>5} tok  {query[:70]}" + (f"   MISSING {missing}" if missing else ""))
+
+    filtered_avg = statistics.mean(sizes)
+    print(f"\ntokens ({TOKENIZER}) in the 'Available Tools' block, {len(full.by_id)} tools in tools.json")
+    print(f"pretty   {pretty:>6}")
+    print(f"compact  {compact:>6}   {100 * (1 - compact / pretty):5.1f}% smaller than pretty")
+    print(f"filtered {filtered_avg:>6.0f}   {100 * (1 - filtered_avg / pretty):5.1f}% smaller than pretty (avg over {len(sizes)} queries)")
+    print(f"select() p50 {statistics.median(select_us):.0f} us, max {max(select_us):.0f} us")
+    print(f"recall of expected tools: {found}/{needed}")
+
+
+async def planner_latency(queries, repeats: int):
+    from function import function_client_read_openai
+    client_openai = function_client_read_openai(os.environ["OPENAI_API_KEY"])
+    catalogs = {
+        "full": ToolCatalog(TOOLS_REGISTRY, TOOL_OUTPUT_FIELDS, prefilter=False),
+        "filtered": ToolCatalog(TOOLS_REGISTRY, TOOL_OUTPUT_FIELDS, prefilter=True),
+    }
+    results = {name: [] for name in catalogs}
+    for query in queries:
+        for _ in range(repeats):
+            # Alternate catalogs so both see the same API conditions
+            for name, catalog in catalogs.items():
+                start = time.perf_counter()
+                await extract_and_plan(client_openai, query, catalog)
+                results[name].append((time.perf_counter() - start) * 1000)
+    print()
+    for name, timings in results.items():
+        timings.sort()
+        print(f"{name:<8} n={len(timings):<3} p50 {statistics.median(timings):7.0f} ms   p95 {timings[int(len(timings) * 0.95) - 1]:7.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true", help="also time extract_and_plan against the OpenAI API")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+    with open(FIXTURE_PATH) as f:
+        queries = json.load(f)
+    prompt_sizes(queries)
+    if args.live:
+        asyncio.run(planner_latency(queries, args.repeats))
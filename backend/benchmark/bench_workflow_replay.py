@@ -0,0 +1,113 @@
+"""
+End-to-end workflow latency from recorded runs, without OpenAI or Google.
+
+Every fixture in fixtures/workflows/ (or --fixtures) is a run recorded with
+WORKFLOW_RECORD_DIR set (see services/workflow_replay.py). Each one is replayed through
+`workflow_handler` with a stand-in websocket: model and tool calls are answered from the
+recording after their recorded latency * --latency-scale, or a fixed --llm-latency-ms /
+--tool-latency-ms, while everything else (planning logic, templating, verification
+rules, state and message persistence) runs for real. Reports p50/p95 per stage
+(extract, plan, resolve, execute, verify, file_match, final) and per workflow.
+
+The bundled corpus was recorded from scripted model and tool responses with typical
+gpt-4o and Google API latencies; record real runs to measure a real workload.
+
+State and messages go to a throwaway SQLite database unless --database-url is given.
+
+Usage (from backend/):
+    python benchmark/bench_workflow_replay.py --repeats 3
+    python benchmark/bench_workflow_replay.py --llm-latency-ms 800 --tool-latency-ms 250
+    WORKFLOW_RECORD_DIR=/tmp/runs uvicorn main:app   # then: --fixtures /tmp/runs
+"""
+import os
+import sys
+import glob
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "workflows")
+STAGES = ("extract", "plan", "resolve", "execute", "verify", "file_match", "final")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+async def prepare_database():
+    from models import async_engine, Base, init_db
+    if async_engine.url.get_backend_name() != "sqlite":
+        await init_db()
+        return
+    async with async_engine.begin() as conn:
+        # google_tokens uses a Postgres ARRAY column; replays never read tokens
+        await conn.run_sync(lambda sc: Base.metadata.create_all(sc, tables=[t for t in Base.metadata.sorted_tables if t.name != "google_tokens"]))
+
+
+async def run(paths, repeats: int, replay_kwargs: dict):
+    from models import async_engine
+    from services.workflow_replay import WorkflowReplay
+    from services.plan_cache import plan_cache
+    from controller.workflow_execution_controller import workflow_handler
+
+    await prepare_database()
+    stage_ms = {stage: [] for stage in STAGES}
+    workflow_ms, outcomes = [], {}
+    fallbacks = misses = 0
+    for path in paths:
+        name = os.path.basename(path)
+        for _ in range(repeats):
+            # A repeat served from the plan cache takes a path the recording has no responses for
+            plan_cache.clear()
+            replay = WorkflowReplay.load(path, **replay_kwargs)
+            start = time.perf_counter()
+            events = await replay.run(workflow_handler)
+            workflow_ms.append((time.perf_counter() - start) * 1000)
+            for stage, values in replay.timings.items():
+                stage_ms.setdefault(stage, []).extend(values)
+            statuses = [e.get("status") for e in events if e.get("type") == "workflow_complete"]
+            outcomes.setdefault(name, set()).add("/".join(s or "?" for s in statuses) or "no workflow_complete")
+            stats = replay.stats()
+            fallbacks += stats["prompt_fallbacks"] + stats["tool_fallbacks"]
+            misses += stats["tool_misses"] + stats["unused_llm"]
+    await async_engine.dispose()
+
+    runs = len(paths) * repeats
+    print(f"{len(paths)} recorded workflows x {repeats} = {runs} runs\n")
+    print(f"{'stage':<12}{'calls/run':>10}{'p50 ms':>10}{'p95 ms':>10}{'ms/run':>10}")
+    for stage, values in stage_ms.items():
+        if values:
+            print(f"{stage:<12}{len(values) / runs:>10.1f}{statistics.median(values):>10.0f}"
+                  f"{percentile(values, 0.95):>10.0f}{sum(values) / runs:>10.0f}")
+    print(f"{'workflow':<12}{'':>10}{statistics.median(workflow_ms):>10.0f}{percentile(workflow_ms, 0.95):>10.0f}")
+    print()
+    for name, seen in sorted(outcomes.items()):
+        print(f"{name:<40} {', '.join(sorted(seen))}")
+    if fallbacks or misses:
+        print(f"\n{fallbacks} calls replayed out of recording order, {misses} missing or unused recorded calls "
+              f"(the workflow no longer behaves as when it was recorded)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="directory of recorded runs")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for recorded latencies")
+    parser.add_argument("--llm-latency-ms", type=float, help="fixed latency for every model call")
+    parser.add_argument("--tool-latency-ms", type=float, help="fixed latency for every tool call")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "replay.db"))
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.json")))
+    if not paths:
+        sys.exit(f"no recorded workflows in {args.fixtures}")
+    asyncio.run(run(paths, args.repeats, {
+        "latency_scale": args.latency_scale,
+        "llm_latency_ms": args.llm_latency_ms,
+        "tool_latency_ms": args.tool_latency_ms,
+    }))
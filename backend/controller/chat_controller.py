@@ -1,4 +1,8 @@
 from package import *
+from services.session_cache import session_cache, message_to_cache_entry
+from services.chat_archive import unpack_messages
+import zlib
+from datetime import datetime
 
 
 def prepare_context_and_metadata(pdf_bytes):
@@ -29,7 +33,7 @@ async def dynamic_pdf_stream_db(
     source_map, 
     pdf_filename
 ):
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     try:
         full_text = ""
         # 1. UI Initial Step
@@ -77,7 +81,8 @@ async def dynamic_pdf_stream_db(
             citations=dynamic_citations if dynamic_citations else None
         )
         db.add(assistant_msg)
-        db.commit()
+        await db.commit()
+        await session_cache.append(session_id, message_to_cache_entry(assistant_msg))
 
         yield f"data: {json.dumps({'type': 'done', 'session_id': session_id})}\n\n"
 
@@ -85,4 +90,74 @@ async def dynamic_pdf_stream_db(
         print(f"[ERROR] PDF Stream Error: {e}")
         yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = [c for c in ChatMessage.__table__.columns]
+
+def _export_line(row, archived=False):
+    record = {"type": "message", **{k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()}}
+    if archived:
+        record["archived"] = True
+    return json.dumps(record, default=str) + "\n"
+
+async def export_history_ndjson(user_id, after_id=None, compress=False, after_session=None):
+    """
+    Stream every message of a user as NDJSON with flat memory use.
+
+    Archived (cold) sessions are decompressed one at a time and emitted first on a
+    fresh export, in session id order. Live messages then follow in ascending id order
+    from a server-side cursor, `EXPORT_BATCH_SIZE` rows at a time. The trailer line says
+    where to resume after a broken download: `after_session` (the last archived session
+    sent) while in the archive phase, `last_id` (the last live message sent, 0 before
+    the first) after it; passing `after_id` resumes the live phase and skips the
+    archive phase. Sessions rehydrated while the export runs are not sent twice.
+    """
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    encode = (lambda text: gzip.compress(text.encode("utf-8"))) if gzip else (lambda text: text.encode("utf-8"))
+    count = 0
+    last_id = after_id
+    in_archive_phase, archive_cursor = after_id is None, after_session
+    # session_id -> highest message id sent from its archive; rehydration keeps the original ids
+    archived_upto = {}
+    async with AsyncSessionLocal() as db:
+        try:
+            if in_archive_phase:
+                query = select(ChatSessionArchive.session_id).filter(ChatSessionArchive.user_id == user_id)
+                if after_session is not None:
+                    query = query.filter(ChatSessionArchive.session_id > after_session)
+                archived_ids = (await db.execute(query.order_by(ChatSessionArchive.session_id))).scalars().all()
+                for archived_id in archived_ids:
+                    archive = await db.get(ChatSessionArchive, archived_id)
+                    if archive is None:
+                        continue  # rehydrated since the listing, its rows are exported by the live phase
+                    rows = unpack_messages(archive.payload)
+                    db.expunge(archive)
+                    yield encode("".join(_export_line({c.name: r.get(c.name) for c in EXPORT_COLUMNS}, archived=True) for r in rows))
+                    count += len(rows)
+                    archived_upto[archived_id] = max((r["id"] for r in rows), default=0)
+                    archive_cursor = archived_id
+                # Every archive is out: from here on the live cursor alone resumes the export
+                in_archive_phase, last_id = False, 0
+
+            query = select(*EXPORT_COLUMNS).filter(ChatMessage.user_id == user_id)
+            if after_id is not None:
+                query = query.filter(ChatMessage.id > after_id)
+            result = await db.stream(query.order_by(ChatMessage.id.asc()).execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for batch in result.mappings().partitions():
+                rows = [row for row in batch if row["id"] > archived_upto.get(row["session_id"], 0)]
+                if rows:
+                    yield encode("".join(_export_line(row) for row in rows))
+                    count += len(rows)
+                last_id = batch[-1]["id"]
+
+            yield encode(json.dumps({"type": "end", "count": count, "last_id": last_id}) + "\n")
+        except Exception as e:
+            print(f"[ERROR] History export failed for user {user_id}: {e}")
+            error = {"type": "error", "message": str(e), "last_id": last_id}
+            if in_archive_phase:
+                error["after_session"] = archive_cursor
+            yield encode(json.dumps(error) + "\n")
+    if gzip:
+        yield gzip.flush()
@@ -3,10 +3,27 @@ import json
 import time
 import asyncio
 import traceback
-from typing import Optional, Dict, Any, List
-from sqlalchemy.orm import Session
-from models import SessionLocal, ChatMessage
-from services import google_services
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from models import AsyncSessionLocal, ChatMessage
+from services.session_cache import session_cache, message_to_cache_entry
+from services.chat_archive import rehydrate_session
+from services.plan_cache import plan_cache, instantiate_template
+from services.step_verifier import verify_by_rules, WORKFLOW_RULE_VERIFIER
+from services.plan_templating import resolve_arguments, apply_updated_variables, TOOL_OUTPUT_FIELDS, CONTEXT_ALIASES
+from services.file_matcher import rank_files
+from services.workflow_store import workflow_store, WorkflowStateConflict
+from services.workflow_log import workflow_log, apply_file_selection
+from services.message_buffer import MessageWriteBuffer
+from services.tool_registry import tool_registry
+from services.tool_catalog import tool_catalog, ToolCatalog
+from services.step_prefetch import StepPrefetcher
+from services.plan_optimizer import optimize_plan, describe_rewrite, WORKFLOW_PLAN_OPTIMIZER_ENABLED
+from services.json_stream import IncrementalJSONParser, schema_problems
+from services.workflow_replay import WorkflowRecorder, WORKFLOW_RECORD_DIR, active_recorder, active_replay
+from services.workflow_tracing import WorkflowTrace, active_trace, start_span, traced, traced_stream
+from services.model_routing import model_router, load_model_routing
+from services.intent_classifier import intent_router
 from fastapi import WebSocketDisconnect
 
 # --- CONSTANTS ---
@@ -41,44 +58,87 @@ def load_tools_registry() -> List[Dict[str, Any]]:
     return []
 
 TOOLS_REGISTRY = load_tools_registry()
+# Handlers and execution policies are validated here, so a broken tools.json fails at startup
+tool_registry.load(TOOLS_REGISTRY)
+# Prompt fragments, id index and relevance index for the planner
+tool_catalog.load(TOOLS_REGISTRY, TOOL_OUTPUT_FIELDS)
+# Plan templates may keep the schema's enum values literal
+plan_cache.bind_registry(tool_registry)
+# Model, max_tokens and timeout of every LLM stage; a broken model_routing.json fails at startup
+model_router.load(load_model_routing())
+# Local classifier that sends confident single-read requests past the planner
+intent_router.load()
 
-# Local memory cache for workflow state
-local_workflow_cache = {}
+# Planner mode: "combined" extracts variables and plans in one structured-output call,
+# "two_call" keeps the original extract_variables -> plan_workflow sequence
+WORKFLOW_PLANNER_MODE = os.environ.get("WORKFLOW_PLANNER_MODE", "combined")
 
 class WorkflowState:
     """Manages workflow state for a session with Database and Local Cache"""
     
-    def __init__(self, session_id: str, db: Session, user_id: int):
+    def __init__(self, session_id: str, db: AsyncSession, user_id: int):
         self.session_id = session_id
         self.db = db
         self.user_id = user_id
+        # Plan steps run concurrently but share this AsyncSession, which allows one operation at a time
+        self._db_lock = asyncio.Lock()
+        # Concurrent steps save the same state object; serialize them so they don't conflict with each other
+        self._save_lock = asyncio.Lock()
+        # LLM-ready chat history, loaded on first use and then appended by save_message
+        self._transcript: Optional[List[Dict]] = None
+        # Messages are committed in batches, in sessions of their own on the same engine
+        self._writer = MessageWriteBuffer(
+            session_id,
+            async_sessionmaker(bind=db.bind, class_=AsyncSession, autoflush=False, expire_on_commit=False),
+            on_flushed=self._cache_flushed,
+        )
+        # Read-only steps run speculatively while the workflow waits on the user (kept across messages)
+        self.prefetch = StepPrefetcher(self._run_tool)
     
     async def load(self) -> Dict[str, Any]:
-        """Load workflow state from Local Cache"""
-        if self.session_id in local_workflow_cache:
-            return local_workflow_cache[self.session_id]
-            
-        return {
+        """Load workflow state from the workflow state store"""
+        state = await workflow_store.load(self.session_id)
+        if state is not None:
+            return state
+        
+        default_state = {
             "workflow_id": None,
             "status": "active",
             "history": [],
             "previous_response_id": None,
             "pending_tool": None,  # { name, arguments, hitl_type }
             "current_step": 0,
+            "completed_steps": [],  # step numbers finished so far (DAG executor)
             "user_goal": None,
             "execution_context": {},  # Context passed between steps
             "plan": None
         }
+        # Nothing in the store (worker restart, eviction): rebuild the run from the event log
+        logged = await workflow_log.rebuild(self.session_id)
+        if logged is not None:
+            print(f"[WORKFLOW LOG] Resumed session {self.session_id} at step {logged.get('current_step')} (pending: {(logged.get('pending_tool') or {}).get('name')})")
+            default_state.update(logged)
+        return default_state
     
+    async def record(self, event_type: str, state: Dict[str, Any], **payload):
+        """Append a workflow event (state is the state after the event, used for periodic snapshots)"""
+        async with traced("db", "event_log.append", event=event_type):
+            await workflow_log.append(self.session_id, event_type, payload, state)
+
     async def save(self, state: Dict[str, Any]):
-        """Save workflow state to Local Cache"""
+        """Save workflow state to the workflow state store (compare-and-set on its version)"""
         if len(state.get("history", [])) > 20:
             state["history"] = state["history"][-20:]
         
-        local_workflow_cache[self.session_id] = state
+        async with self._save_lock, traced("db", "state_store.save"):
+            await workflow_store.save(self.session_id, state)
 
-    async def save_message(self, role: str, content: str = None, tool_name: str = None, hitl_type: str = None, hitl_schema: Dict = None, workflow_state: Dict = None):
-        """Persist message to database and update cache"""
+    async def save_message(self, role: str, content: str = None, tool_name: str = None, hitl_type: str = None, hitl_schema: Dict = None, workflow_state: Dict = None, durable: bool = False):
+        """
+        Buffer the message for a batched commit and add it to the transcript.
+        HITL prompts and `durable` messages are committed before this returns, so they
+        are in the database before the client sees the corresponding event.
+        """
         msg = ChatMessage(
             session_id=self.session_id,
             user_id=self.user_id,
@@ -88,25 +148,70 @@ class WorkflowState:
             hitl_type=hitl_type,
             hitl_schema=hitl_schema
         )
-        self.db.add(msg)
-        self.db.commit()
+        self._writer.add(msg)
+        if self._transcript is not None:
+            self._transcript.append(transcript_entry(message_to_cache_entry(msg)))
+        if hitl_type or durable:
+            await self.flush_messages()
         
         if workflow_state:
             await self.save(workflow_state)
 
     async def get_full_history(self) -> List[Dict]:
-        """Retrieve chat history for the current session from database"""
-        messages = self.db.query(ChatMessage).filter(ChatMessage.session_id == self.session_id).order_by(ChatMessage.created_at.asc()).all()
-        history = []
-        for m in messages:
-            if m.role == "tool":
-                # OpenAI gpt-4o requires tool role messages to follow assistant tool_calls.
-                # Since we execute manually, we'll map these to 'system' role for context.
-                msg = {"role": "system", "content": f"Output from tool '{m.tool_name}': {m.content}"}
-            else:
-                msg = {"role": m.role, "content": m.content}
-            history.append(msg)
-        return history
+        """
+        Chat history for the current session (its last `session_cache.max_messages` messages).
+        Loaded once (hot-session cache, database on a miss), then kept current by save_message,
+        so repeated calls during a workflow cost nothing.
+        The returned list is the live transcript: callers must not modify it.
+        """
+        if self._transcript is None:
+            # No flush may land between the read and taking the still-buffered messages
+            async with self._writer.hold() as unflushed, self._db_lock:
+                if self._transcript is None:
+                    window = session_cache.max_messages
+                    messages = await session_cache.get(self.session_id, tail=window)
+                    if messages is None:
+                        await rehydrate_session(self.db, self.session_id, user_id=self.user_id)
+                        rows = (await self.db.execute(select(ChatMessage).filter(ChatMessage.session_id == self.session_id)
+                                                      .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(window + 1))).scalars().all()
+                        messages = [message_to_cache_entry(m) for m in reversed(rows[:window])]
+                        await session_cache.put(self.session_id, messages, complete=len(rows) <= window)
+                    self._transcript = [transcript_entry(m) for m in messages]
+                    self._transcript.extend(transcript_entry(message_to_cache_entry(m)) for m in unflushed)
+        return self._transcript
+
+    async def _cache_flushed(self, messages: List[ChatMessage]):
+        # Cache entries carry database ids, so the hot-session cache is updated after the commit
+        for msg in messages:
+            await session_cache.append(self.session_id, message_to_cache_entry(msg))
+
+    async def flush_messages(self):
+        """Commit buffered messages now."""
+        async with traced("db", "messages.flush") as span:
+            written = await self._writer.flush()
+            if span is not None:
+                span.attributes["messages"] = written
+
+    def step_boundary(self):
+        """Start a background flush of the messages buffered by the step that just finished."""
+        self._writer.schedule_flush()
+
+    async def close(self):
+        """Write remaining buffered messages (end of the request)."""
+        async with traced("db", "messages.flush", final=True):
+            await self._writer.close()
+
+    async def _run_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        async with AsyncSessionLocal() as tool_db:
+            return await execute_google_tool(tool_db, self.user_id, tool_name, arguments)
+
+def transcript_entry(m: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat message (cache entry) as an LLM history message."""
+    if m["role"] == "tool":
+        # OpenAI gpt-4o requires tool role messages to follow assistant tool_calls.
+        # Since we execute manually, we'll map these to 'system' role for context.
+        return {"role": "system", "content": f"Output from tool '{m['tool_name']}': {m['content']}"}
+    return {"role": m["role"], "content": m["content"]}
 
 # --- STRUCTURED OUTPUT SCHEMA ---
 FORMAT_SCHEMA = {
@@ -205,6 +310,65 @@ FORMAT_SCHEMA = {
     }
 }
 
+async def _llm_request(client_openai, stage: str, request: Dict[str, Any]):
+    """One model request: answered by the active replay or the API, recorded and traced."""
+    replay = active_replay.get()
+    span = start_span("llm", stage, model=request.get("model"), stream=bool(request.get("stream")))
+    start = time.perf_counter()
+    try:
+        if replay is not None:
+            response = await replay.llm(stage, request)
+        else:
+            response = await client_openai.chat.completions.create(**request)
+    except Exception as e:
+        if span is not None:
+            span.end(error=str(e))
+        raise
+    recorder = active_recorder.get()
+    if recorder is not None:
+        response = recorder.llm(stage, request, response, start)
+    if span is not None:
+        if request.get("stream"):
+            return traced_stream(span, response)
+        usage = getattr(response, "usage", None)
+        span.end(prompt_tokens=getattr(usage, "prompt_tokens", None), completion_tokens=getattr(usage, "completion_tokens", None))
+    return response
+
+async def _counted_stream(stage: str, model: str, stream):
+    usage = None
+    async for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        yield chunk
+    model_router.record(stage, model, usage)
+
+def _parses_as_json(response) -> bool:
+    try:
+        json.loads(response.choices[0].message.content)
+        return True
+    except (ValueError, TypeError, AttributeError, IndexError):
+        return False
+
+async def llm_call(client_openai, stage: str, **request):
+    """
+    Every model call of the workflow goes through here, labelled with its stage (extract, plan,
+    verify, file_match, resolve, final) so runs can be recorded, replayed offline and traced.
+    The stage's model, max_tokens and timeout come from model_routing.json; a JSON answer
+    that does not parse is asked again once from the stage's escalation model.
+    """
+    route = model_router.get(stage)
+    if route is not None:
+        request = {**request, **route.options()}
+    response = await _llm_request(client_openai, stage, request)
+    if request.get("stream"):
+        return _counted_stream(stage, request.get("model"), response)
+    model_router.record(stage, request.get("model"), getattr(response, "usage", None))
+    if route is not None and route.escalate_to and request.get("response_format") and not _parses_as_json(response):
+        print(f"[MODEL ROUTING] {stage}: {route.model} returned invalid JSON, asking {route.escalate_to}")
+        request = {**request, **route.options(escalated=True)}
+        response = await _llm_request(client_openai, stage, request)
+        model_router.record(stage, request["model"], getattr(response, "usage", None), escalated=True)
+    return response
+
 async def extract_variables(client_openai, user_message: str) -> Dict[str, Any]:
     """Pre-extract potential tool parameters from the user message with improved mapping."""
     prompt = f"""
@@ -231,8 +395,7 @@ async def extract_variables(client_openai, user_message: str) -> Dict[str, Any]:
     
     Only include fields that have actual values extracted. Use null for fields without values.
     """
-    response = await client_openai.chat.completions.create(
-        model="gpt-4o",
+    response = await llm_call(client_openai, "extract",
         messages=[{"role": "system", "content": "You are a helpful data extractor. Extract parameters accurately."},
                   {"role": "user", "content": prompt}],
         response_format={"type": "json_object"}
@@ -241,22 +404,13 @@ async def extract_variables(client_openai, user_message: str) -> Dict[str, Any]:
     # Remove null values
     return {k: v for k, v in extracted.items() if v is not None and v != ""}
 
-async def plan_workflow(client_openai, user_message: str, tools_registry: List[Dict], extracted_vars: Dict[str, Any] = None) -> List[Dict]:
+async def plan_workflow(client_openai, user_message: str, catalog: ToolCatalog, extracted_vars: Dict[str, Any] = None) -> List[Dict]:
     """Decide the order of tools and extract initial variables with proper execution sequence."""
-    tools_info = []
-    for tool in tools_registry:
-        tools_info.append({
-            "tool_id": tool["tool_id"],
-            "description": tool["tool_description"],
-            "required_params": tool["must_required_params"],
-            "optional_params": tool.get("optional_params", []),
-            "when_to_use": tool.get("exact_precise_tool_use", "")
-        })
-    
+
     prompt = f"""
     Analyze the user query and available tools to create an execution plan.
     User Query: "{user_message}"
-    Available Tools: {json.dumps(tools_info, indent=2)}
+    Available Tools: {catalog.prompt_for(user_message)}
     Extracted Variables: {json.dumps(extracted_vars or {}, indent=2)}
     
     IMPORTANT: You MUST ONLY use the tools provided in the 'Available Tools' list. Do not imagine or hallucinate tools that are not listed.
@@ -267,6 +421,8 @@ async def plan_workflow(client_openai, user_message: str, tools_registry: List[D
     2. Maps extracted variables to the correct tool parameters
     3. Identifies which parameters need to be collected from the user
     4. Specifies how results from one step feed into the next
+    5. Refers to earlier step outputs with explicit references in the variables, written as
+       {{{{steps.<step number>.<field path from that tool's "returns">}}}}, e.g. {{{{steps.1.files[0].id}}}}
     
     Return a JSON object with a "plan" array:
     {{
@@ -274,7 +430,7 @@ async def plan_workflow(client_openai, user_message: str, tools_registry: List[D
         {{
           "step": 1,
           "tool_id": "tool_name",
-          "variables": {{ "param1": "value_from_extracted_or_previous_step" }},
+          "variables": {{ "param1": "extracted value or {{{{steps.N.field}}}} reference" }},
           "missing_variables": ["param2"],
           "description": "What this step accomplishes",
           "depends_on_step": null,
@@ -284,8 +440,7 @@ async def plan_workflow(client_openai, user_message: str, tools_registry: List[D
       "summary": "Brief overview of the entire workflow"
     }}
     """
-    response = await client_openai.chat.completions.create(
-        model="gpt-4o",
+    response = await llm_call(client_openai, "plan",
         messages=[
             {"role": "system", "content": "You are a professional workflow architect. You create structured, efficient plans for complex tasks."},
             {"role": "user", "content": prompt}
@@ -295,6 +450,97 @@ async def plan_workflow(client_openai, user_message: str, tools_registry: List[D
     plan_data = json.loads(response.choices[0].message.content)
     return plan_data.get("plan", plan_data.get("calls", []))
 
+# --- COMBINED PLANNER SCHEMA ---
+# Free-form maps (variables) are encoded as name/value pairs so the schema stays strict
+_NAME_VALUE_PAIRS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {"name": {"type": "string"}, "value": {"type": "string"}},
+        "required": ["name", "value"]
+    }
+}
+
+COMBINED_PLAN_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "workflow_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "extracted_variables": _NAME_VALUE_PAIRS,
+                "plan": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "step": {"type": "integer"},
+                            "tool_id": {"type": "string"},
+                            "variables": _NAME_VALUE_PAIRS,
+                            "missing_variables": {"type": "array", "items": {"type": "string"}},
+                            "description": {"type": "string"},
+                            "depends_on_step": {"type": ["integer", "null"]},
+                            "output_used_by": {"type": "array", "items": {"type": "integer"}}
+                        },
+                        "required": ["step", "tool_id", "variables", "missing_variables", "description", "depends_on_step", "output_used_by"]
+                    }
+                },
+                "summary": {"type": "string"}
+            },
+            "required": ["extracted_variables", "plan", "summary"]
+        }
+    }
+}
+
+def _pairs_to_dict(pairs: List[Dict]) -> Dict[str, Any]:
+    """Name/value pairs to a dict: pairs without a name or a value are dropped, the first pair of a name wins."""
+    variables = {}
+    for pair in pairs or []:
+        name = (pair.get("name") or "").strip()
+        if name and name not in variables and pair.get("value") not in (None, "", "null"):
+            variables[name] = pair["value"]
+    return variables
+
+async def extract_and_plan(client_openai, user_message: str, catalog: ToolCatalog) -> Tuple[Dict[str, Any], List[Dict]]:
+    """Extract tool variables and build the execution plan in a single structured-output call."""
+    prompt = f"""
+    Analyze the user query and available tools (Google Calendar, Gmail, Google Drive, Sheets) to create an execution plan.
+    User Query: "{user_message}"
+    Available Tools: {catalog.prompt_for(user_message)}
+    
+    First, extract the entities in the query that tools can use (email addresses, event titles, ISO datetimes
+    such as 2024-01-26T10:00:00, number of days, file names, spreadsheet names, subjects, bodies, search queries).
+    Name each extracted variable after the exact tool parameter it maps to (to_email, subject, body, title,
+    start_time, end_time, days, filename, content, attendee_email, description, query). Only include values
+    actually present in the query.
+    
+    Then create a step-by-step plan that:
+    1. ONLY uses tools from 'Available Tools' (never invent tools; explain limitations in the summary)
+    2. Orders tools in the correct sequence (dependencies first)
+    3. Maps the extracted variables to each step's parameters ("variables")
+    4. Lists parameters that still need to be collected from the user ("missing_variables")
+    5. Specifies how results feed later steps ("depends_on_step", "output_used_by")
+    6. Writes values taken from an earlier step's output as explicit references
+       {{{{steps.<step number>.<field path from that tool's "returns">}}}}, e.g. {{{{steps.1.files[0].id}}}}
+    """
+    response = await llm_call(client_openai, "plan",
+        messages=[
+            {"role": "system", "content": "You are a professional workflow architect. You extract parameters accurately and create structured, efficient plans for complex tasks."},
+            {"role": "user", "content": prompt}
+        ],
+        response_format=COMBINED_PLAN_SCHEMA
+    )
+    plan_data = json.loads(response.choices[0].message.content)
+    extracted = _pairs_to_dict(plan_data.get("extracted_variables"))
+    plan = plan_data.get("plan", [])
+    for step in plan:
+        step["variables"] = _pairs_to_dict(step.get("variables"))
+    return extracted, plan
+
 async def verify_step_result(client_openai, tool_name: str, tool_args: Dict, tool_result: Dict, 
                               user_goal: str, remaining_plan: List[Dict], execution_context: Dict) -> Dict[str, Any]:
     """LLM verification of tool execution result with context for next step."""
@@ -320,8 +566,7 @@ async def verify_step_result(client_openai, tool_name: str, tool_args: Dict, too
     }}
     """
     try:
-        response = await client_openai.chat.completions.create(
-            model="gpt-4o",
+        response = await llm_call(client_openai, "verify",
             messages=[
                 {"role": "system", "content": "You are an AI validation agent. Your job is to verify tool outputs and ensure the workflow stays on track."},
                 {"role": "user", "content": prompt}
@@ -340,6 +585,27 @@ async def verify_step_result(client_openai, tool_name: str, tool_args: Dict, too
             "reason": str(e)
         }
 
+async def verify_step(client_openai, state: Dict[str, Any], step: Dict, tool_args: Dict, tool_result: Dict) -> Dict[str, Any]:
+    """Rule-based verification first; the LLM verifier only sees errored or ambiguous results."""
+    stats = state.setdefault("verification_stats", {"rules": 0, "llm": 0})
+    remaining_plan = remaining_steps(state, exclude=step.get("step"))
+    verification = None
+    if WORKFLOW_RULE_VERIFIER:
+        verification = verify_by_rules(step.get("tool_id"), tool_result, remaining_plan, step.get("step"), step.get("output_used_by"))
+    if verification is not None:
+        stats["rules"] += 1
+        return verification
+    stats["llm"] += 1
+    return await verify_step_result(
+        client_openai, 
+        step.get("tool_id"), 
+        tool_args, 
+        tool_result,
+        state.get("user_goal", ""),
+        remaining_plan,
+        state.get("execution_context", {})
+    )
+
 async def find_similar_files(client_openai, search_query: str, available_files: List[Dict], user_goal: str = "") -> Dict[str, Any]:
     """Use LLM to find files similar to the user's search query from available files with strict validation."""
     if not available_files:
@@ -395,8 +661,7 @@ async def find_similar_files(client_openai, search_query: str, available_files:
     """
     
     try:
-        response = await client_openai.chat.completions.create(
-            model="gpt-4o",
+        response = await llm_call(client_openai, "file_match",
             messages=[
                 {"role": "system", "content": "You are a professional file retrieval and validation assistant. You are strict and do not return irrelevant results."},
                 {"role": "user", "content": prompt}
@@ -408,13 +673,37 @@ async def find_similar_files(client_openai, search_query: str, available_files:
         print(f"[SIMILARITY SEARCH ERROR] {e}")
         return {"matches": [], "message": f"Search failed: {str(e)}"}
 
+def resolve_step_locally(step: Dict, state: Dict[str, Any], tool_def: Dict) -> Optional[Dict[str, Any]]:
+    """
+    Fill a step's arguments from its {{steps.N...}} references, stored step outputs and
+    the execution context. Returns None when something needs the LLM resolver: an
+    unresolvable reference, a prose placeholder, or a required parameter nobody supplied.
+    """
+    context = state.get("execution_context", {})
+    arguments, unresolved = resolve_arguments(step.get("variables"), {"steps": state.get("step_outputs", {}), "context": context})
+    if unresolved:
+        return None
+    missing = []
+    for param in tool_def.get("must_required_params", []):
+        if arguments.get(param) not in (None, ""):
+            continue
+        value = next((context[k] for k in CONTEXT_ALIASES.get(param, [param]) if context.get(k) not in (None, "")), None)
+        if value is not None:
+            arguments[param] = value
+        elif param in (step.get("missing_variables") or []):
+            # The planner already knew this has to come from the user: HITL form
+            missing.append(param)
+        else:
+            return None
+    return {"arguments": arguments, "missing_params": missing}
+
 async def resolve_step_parameters(client_openai, tool_name: str, user_goal: str, history: List[Dict], 
-                                 context: Dict, step_def: Dict, tools_registry: List[Dict]) -> Dict[str, Any]:
+                                 context: Dict, step_def: Dict, catalog: ToolCatalog) -> Dict[str, Any]:
     """
     Use LLM to resolve the most accurate parameters for the NEXT tool call
     based on the entire execution history and context.
     """
-    tool_def = next((t for t in tools_registry if t["tool_id"] == tool_name), None)
+    tool_def = catalog.get(tool_name)
     
     prompt = f"""
     The user wants to: "{user_goal}"
@@ -446,8 +735,7 @@ async def resolve_step_parameters(client_openai, tool_name: str, user_goal: str,
     """
     
     try:
-        response = await client_openai.chat.completions.create(
-            model="gpt-4o",
+        response = await llm_call(client_openai, "resolve",
             messages=[
                 {"role": "system", "content": "You are a precise parameters resolution engine. You extract values from history to satisfy tool requirements."},
                 {"role": "user", "content": prompt}
@@ -473,33 +761,30 @@ def get_hitl_selection_schema(title: str, message: str, options: List[Dict], con
         "none_label": "None of these files"
     }
 
-async def execute_google_tool(db: Session, user_id: int, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-    """Execute tools using google_services"""
-    try:
-        if tool_name == "check_calendar_availability": return await google_services.check_calendar_availability(db, user_id, arguments)
-        elif tool_name == "schedule_calendar_event": return await google_services.schedule_calendar_event(db, user_id, arguments)
-        elif tool_name == "update_calendar_event": return await google_services.update_calendar_event(db, user_id, arguments)
-        elif tool_name == "delete_calendar_event": return await google_services.delete_calendar_event(db, user_id, arguments)
-        elif tool_name == "send_email": return await google_services.send_email(db, user_id, arguments)
-        elif tool_name == "read_emails": return await google_services.read_emails(db, user_id, arguments)
-        elif tool_name == "delete_email": return await google_services.delete_email(db, user_id, arguments)
-        elif tool_name == "update_email_labels": return await google_services.update_email_labels(db, user_id, arguments)
-        elif tool_name == "list_drive_files": return await google_services.list_drive_files(db, user_id, arguments)
-        elif tool_name == "upload_to_drive": return await google_services.upload_to_drive(db, user_id, arguments)
-        elif tool_name == "update_drive_file": return await google_services.update_drive_file(db, user_id, arguments)
-        elif tool_name == "delete_drive_file": return await google_services.delete_drive_file(db, user_id, arguments)
-        elif tool_name == "read_drive_file_content": return await google_services.read_drive_file_content(db, user_id, arguments)
-        elif tool_name == "create_spreadsheet": return await google_services.create_spreadsheet(db, user_id, arguments)
-        elif tool_name == "read_spreadsheet": return await google_services.read_spreadsheet(db, user_id, arguments)
-        elif tool_name == "update_spreadsheet_values": return await google_services.update_spreadsheet_values(db, user_id, arguments)
-        elif tool_name == "clear_spreadsheet_values": return await google_services.clear_spreadsheet_values(db, user_id, arguments)
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
-    return {"status": "error", "message": f"Tool '{tool_name}' not implemented"}
+async def execute_google_tool(db: AsyncSession, user_id: int, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Execute a tool through the registry (timeout, concurrency limit, retries and metrics per tool)"""
+    async with traced("google", tool_name) as span:
+        replay = active_replay.get()
+        if replay is not None:
+            result = await replay.tool(tool_name, arguments)
+        else:
+            start = time.perf_counter()
+            result = await tool_registry.execute(db, user_id, tool_name, arguments)
+            recorder = active_recorder.get()
+            if recorder is not None:
+                recorder.tool(tool_name, arguments, result, start)
+        if span is not None and isinstance(result, dict):
+            span.attributes["status"] = result.get("status")
+            if result.get("status") == "error":
+                span.error = str(result.get("message"))[:200]
+    return result
 
-def get_hitl_form_schema(tool_id: str, missing_params: List[str]) -> Dict[str, Any]:
-    """Generate form schema with tool metadata for missing parameters."""
-    tool_def = next((t for t in TOOLS_REGISTRY if t["tool_id"] == tool_id), None)
+def get_hitl_form_schema(tool_id: str, missing_params: List[str], errors: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Generate form schema with tool metadata for missing parameters (and ones that failed validation)."""
+    tool_def = tool_catalog.get(tool_id)
+    spec = tool_registry.get(tool_id)
+    optional = set(tool_def.get("optional_params", [])) if tool_def else set()
+    errors = errors or {}
     
     fields = []
     for param in missing_params:
@@ -514,13 +799,19 @@ def get_hitl_form_schema(tool_id: str, missing_params: List[str]) -> Dict[str, A
         elif "days" in param.lower() or "size" in param.lower() or "results" in param.lower():
             field_type = "number"
         
-        fields.append({
+        field = {
             "name": param,
             "label": param.replace("_", " ").title(),
             "type": field_type,
-            "required": True,
+            "required": param not in optional,
             "placeholder": f"Enter {param.replace('_', ' ')}"
-        })
+        }
+        # The arguments_schema knows better: enums become selects, formats pick the input, bounds and patterns validate
+        if spec is not None and spec.validator is not None:
+            field.update(spec.validator.field_hints(param))
+        if param in errors:
+            field["error"] = errors[param]
+        fields.append(field)
     
     return {
         "title": f"Missing Information for {tool_id.replace('_', ' ').title()}",
@@ -534,12 +825,480 @@ def get_hitl_form_schema(tool_id: str, missing_params: List[str]) -> Dict[str, A
         "fields": fields
     }
 
+# --- PLAN EXECUTION (DAG) ---
+# Actions that need an explicit user confirmation before they run (`execution.confirm` in tools.json)
+CONFIRMATION_TOOLS = tool_registry.confirmation_tools()
+# Tools without side effects; they may run concurrently and ahead of later steps (`execution.read_only`)
+READ_ONLY_TOOLS = tool_registry.read_only_tools()
+# Upper bound of plan steps running at the same time within one session
+WORKFLOW_MAX_PARALLEL_STEPS = int(os.environ.get("WORKFLOW_MAX_PARALLEL_STEPS", 3))
+
+def normalize_plan_steps(plan: List[Dict]) -> List[Dict]:
+    """Give every step a unique integer `step` number (plan order) so the DAG can reference it."""
+    numbers = [s.get("step") for s in plan]
+    if any(not isinstance(n, int) for n in numbers) or len(set(numbers)) != len(numbers):
+        for i, step in enumerate(plan, start=1):
+            step["step"] = i
+    return plan
+
+def plan_dependencies(plan: List[Dict]) -> Dict[int, set]:
+    """Step number -> step numbers it waits for, from both `depends_on_step` and `output_used_by`."""
+    deps = {s["step"]: set() for s in plan}
+    for s in plan:
+        depends_on = s.get("depends_on_step")
+        for d in depends_on if isinstance(depends_on, list) else [depends_on]:
+            if d in deps and d != s["step"]:
+                deps[s["step"]].add(d)
+        for consumer in s.get("output_used_by") or []:
+            if consumer in deps and consumer != s["step"]:
+                deps[consumer].add(s["step"])
+    return deps
+
+def remaining_steps(state: Dict[str, Any], exclude: int = None) -> List[Dict]:
+    completed = set(state.get("completed_steps", []))
+    return [s for s in state.get("plan") or [] if s.get("step") not in completed and s.get("step") != exclude]
+
+def mark_step_done(state: Dict[str, Any], step_no: Optional[int]):
+    """Record a finished (or cancelled) step; `current_step` keeps counting finished steps."""
+    completed = state.setdefault("completed_steps", [])
+    if step_no is None:
+        # Pending tools saved before steps were numbered: fall back to plan order
+        step_no = next((s.get("step") for s in remaining_steps(state)), None)
+    if step_no is not None and step_no not in completed:
+        completed.append(step_no)
+    state["current_step"] = len(completed)
+
+def plan_finished(state: Dict[str, Any]) -> bool:
+    return not state.get("plan") or not remaining_steps(state)
+
+def ready_steps(plan: List[Dict], deps: Dict[int, set], completed: set, running: set) -> List[Dict]:
+    """
+    Steps whose dependencies are done. Mutating steps additionally act as barriers in
+    plan order: they wait for every earlier step, and later steps wait for them.
+    """
+    ready = []
+    for i, step in enumerate(plan):
+        n = step["step"]
+        if n in completed or n in running or not deps[n] <= completed:
+            continue
+        earlier = plan[:i]
+        if any(s["step"] not in completed and s.get("tool_id") not in READ_ONLY_TOOLS for s in earlier):
+            continue
+        if step.get("tool_id") not in READ_ONLY_TOOLS and (running or any(s["step"] not in completed for s in earlier)):
+            continue
+        ready.append(step)
+    return ready
+
+def prefetchable_steps(state: Dict[str, Any]) -> List[Dict]:
+    """
+    Read-only steps that can run while the workflow waits on the user: their dependencies
+    are done, and no unfinished write before them in plan order (the pending step included)
+    touches the resource they read.
+    """
+    plan = state.get("plan") or []
+    deps = plan_dependencies(plan)
+    completed = set(state.get("completed_steps", []))
+    pending_step = (state.get("pending_tool") or {}).get("step")
+    # Listings kept from a deferred step already have their result
+    listed = state.get("deferred_listings") or {}
+    steps = []
+    for i, step in enumerate(plan):
+        n = step["step"]
+        if n in completed or n == pending_step or str(n) in listed or step.get("tool_id") not in READ_ONLY_TOOLS or not deps[n] <= completed:
+            continue
+        writes = [s for s in plan[:i] if s["step"] not in completed and s.get("tool_id") not in READ_ONLY_TOOLS]
+        if any(tool_registry.may_interfere(s.get("tool_id"), step.get("tool_id")) for s in writes):
+            continue
+        steps.append(step)
+    return steps
+
+def check_arguments(tool_name: str, arguments: Dict[str, Any], missing: List[str]) -> Tuple[Dict[str, Any], List[str], Dict[str, str]]:
+    """
+    Validate and coerce resolved arguments against the tool's arguments_schema.
+    Returns (arguments, missing, errors): invalid required values are dropped and their
+    parameters join `missing`, so the HITL form asks for them again with `errors` shown
+    next to them. Invalid optional values are dropped and the call runs without them.
+    """
+    checked, invalid = tool_registry.validate(tool_name, arguments)
+    spec = tool_registry.get(tool_name)
+    required = set(spec.validator.required) if spec and spec.validator else set()
+    missing = list(missing)
+    errors, dropped = {}, {}
+    for param, problem in invalid.items():
+        checked.pop(param, None)
+        if param not in required:
+            dropped[param] = problem
+            continue
+        if arguments.get(param) not in (None, ""):
+            errors[param] = f"{problem} (got {json.dumps(arguments[param], default=str)})"
+        if param not in missing:
+            missing.append(param)
+    if dropped:
+        print(f"[ARGUMENTS] {tool_name}: dropped invalid optional arguments {dropped}")
+    if errors:
+        print(f"[ARGUMENTS] {tool_name}: {errors}")
+    return checked, missing, errors
+
+def start_prefetch(state_m: "WorkflowState", state: Dict[str, Any]):
+    """Start the tool calls of prefetchable steps whose arguments resolve without the LLM."""
+    for step in prefetchable_steps(state):
+        tool_def = tool_catalog.get(step.get("tool_id"))
+        resolution = resolve_step_locally(step, state, tool_def) if tool_def else None
+        if resolution is None or resolution["missing_params"]:
+            continue
+        # Coerced exactly as run_plan_step will, so the claim finds the call; invalid steps wait for the form
+        arguments, invalid = tool_registry.validate(step["tool_id"], resolution["arguments"], record=False)
+        if invalid:
+            continue
+        if state_m.prefetch.start(step["step"], step["tool_id"], arguments):
+            print(f"[PREFETCH] Step {step['step']} ({step['tool_id']}) started while waiting on the user")
+
+async def send_step_status(websocket, step: Dict, status: str, **extra):
+    await safe_send(websocket, {"type": "step_status", "step": step.get("step"), "tool_name": step.get("tool_id"), "status": status, **extra})
+
+async def run_plan_step(websocket, client_openai, state_m: "WorkflowState", state: Dict[str, Any], step: Dict) -> Tuple[str, Optional[str]]:
+    """
+    Resolve, confirm, execute and verify one plan step.
+    Returns (outcome, detail) with outcome in done | skipped | paused | deferred | error | stop.
+    A step that needs user input while another step already waits on the user is
+    `deferred`: it stays unfinished and runs again once the workflow resumes. A Drive
+    listing is deferred before it runs, or, when the prompt opened while it ran, kept
+    in state["deferred_listings"] so the resumed step goes straight to its selection.
+    """
+    tool_name = step.get("tool_id")
+    step_no = step["step"]
+
+    tool_def = tool_catalog.get(tool_name)
+    if not tool_def: 
+        return "skipped", None
+
+    # PARAMETER RESOLUTION: explicit references first, LLM only when they cannot be resolved
+    stats = state.setdefault("resolution_stats", {"templated": 0, "llm": 0})
+    resolution = resolve_step_locally(step, state, tool_def)
+    if resolution is not None:
+        stats["templated"] += 1
+    else:
+        stats["llm"] += 1
+        # Fetch full history to inform the LLM
+        history = await state_m.get_full_history()
+        resolution = await resolve_step_parameters(
+            client_openai, 
+            tool_name, 
+            state.get("user_goal", ""), 
+            history, 
+            state.get("execution_context", {}), 
+            step, 
+            tool_catalog
+        )
+    
+    merged_args = resolution.get("arguments", {})
+    missing = resolution.get("missing_params", [])
+    # Schema check before anything reaches the Google APIs: values are coerced, invalid ones go to the form
+    merged_args, missing, errors = check_arguments(tool_name, merged_args, missing)
+    
+    # Check for missing required params
+    if missing:
+        if state.get("pending_tool"):
+            return "deferred", None
+        state["pending_tool"] = {"name": tool_name, "arguments": merged_args, "hitl_type": "form", "step": step_no}
+        await state_m.record("hitl_requested", state, step=step_no, tool=tool_name, pending_tool=state["pending_tool"], execution_context=state["execution_context"])
+        schema = get_hitl_form_schema(tool_name, missing, errors)
+        # HITL prompts are committed before the client sees them
+        await state_m.save_message("assistant", f"Need parameters for {tool_name}", hitl_type="form", hitl_schema=schema, workflow_state=state)
+        await send_step_status(websocket, step, "waiting_input")
+        await safe_send(websocket, {"type": "hitl_form", "schema": schema})
+        return "paused", None
+    
+    # Update context with resolved arguments
+    state["execution_context"].update(merged_args)
+
+    # Check for HITL confirmation (sensitive actions)
+    if tool_name in CONFIRMATION_TOOLS:
+        if state.get("pending_tool"):
+            return "deferred", None
+        state["pending_tool"] = {"name": tool_name, "arguments": merged_args, "hitl_type": "confirmation", "step": step_no}
+        await state_m.record("hitl_requested", state, step=step_no, tool=tool_name, pending_tool=state["pending_tool"], execution_context=state["execution_context"])
+        await state_m.save_message("assistant", f"Confirmation needed for {tool_name}", hitl_type="confirmation", workflow_state=state)
+        await send_step_status(websocket, step, "waiting_input")
+        await safe_send(websocket, {
+            "type": "hitl_confirmation", 
+            "title": "Confirm Action", 
+            "message": f"Proceed with {tool_name.replace('_', ' ').title()}?", 
+            "details": merged_args
+        })
+        return "paused", None
+
+    # A listing deferred at its selection prompt comes back with its result and ranking
+    listing = (state.get("deferred_listings") or {}).pop(str(step_no), None)
+    if tool_name == "list_drive_files" and listing is None and state.get("pending_tool"):
+        # The listing may end in a selection prompt while another one is open: wait before calling Drive
+        return "deferred", None
+
+    if listing is not None:
+        result = listing["result"]
+    else:
+        # Execute tool
+        # SEPARATION OF CONCERNS: Send status as distinct event
+        await safe_send(websocket, {"type": "status", "message": "executing_tool", "tool_name": tool_name})
+        await send_step_status(websocket, step, "running")
+        await state_m.record("step_started", state, step=step_no, tool=tool_name, arguments=merged_args)
+        prefetched = await state_m.prefetch.claim(step_no, tool_name, merged_args)
+        if prefetched is not None:
+            # Already fetched while the workflow waited on the user, with the same arguments
+            result, saved_ms = prefetched
+            prefetch = state.setdefault("prefetch_stats", {"used": 0, "ms_saved": 0})
+            prefetch["used"] += 1
+            prefetch["ms_saved"] = round(prefetch["ms_saved"] + saved_ms, 1)
+            print(f"[PREFETCH] Step {step_no} ({tool_name}) used the speculative result, {saved_ms:.0f} ms saved")
+        else:
+            # Concurrent steps must not share one AsyncSession
+            async with AsyncSessionLocal() as step_db:
+                result = await execute_google_tool(step_db, state_m.user_id, tool_name, merged_args)
+    print(f"[LOGGER] TOOL EXECUTION ({tool_name}): {result}")
+    state.setdefault("step_outputs", {})[str(step_no)] = result
+    
+    # SPECIAL CASE: list_drive_files handles doc discovery
+    if tool_name == "list_drive_files":
+        files = result.get("files", [])
+        search_query = merged_args.get("filename") or merged_args.get("query") or ""
+        
+        # We ALWAYS run similarity search if we found 1 or more files
+        # to ensure consistent HITL experience or confident auto-picking.
+        if len(files) >= 1 :
+            print(f"[LOGGER] Drive results count: {len(files)} for query '{search_query}'. Running similarity search...")
+            
+            # Local ranking; the LLM only breaks ties between the top candidates
+            if listing is not None:
+                similarity_results = listing["ranking"]
+            else:
+                similarity_results = rank_files(search_query, files, user_goal=state.get("user_goal", ""))
+            if listing is None and similarity_results.get("ambiguous"):
+                candidate_ids = set(similarity_results["candidates"])
+                candidates = [f for f in files if f.get("id") in candidate_ids]
+                print(f"[LOGGER] Local file ranking ambiguous, asking the LLM to rank {len(candidates)} candidates")
+                similarity_results = await find_similar_files(client_openai, search_query, candidates, user_goal=state.get("user_goal", ""))
+            best_match_id = similarity_results.get("best_match_id")
+            matches = similarity_results.get("matches", [])
+            
+            if best_match_id:
+                # Auto-pick the best match
+                best_match = next((m for m in matches if m["id"] == best_match_id), None)
+                print(f"[LOGGER] LLM auto-picked best match: {best_match.get('name') if best_match else best_match_id}")
+                
+                # Update result to simulate a single successful find
+                if best_match:
+                    result["files"] = [best_match]
+                    selected_name = best_match.get("name", "selected file")
+                else:
+                    selected_name = "selected file"
+                
+                # SEPARATE MESSAGE for selection notification
+                await safe_send(websocket, {
+                    "role": "assistant", 
+                    "content": f"Found and selected: {selected_name}",
+                    "type": "content"
+                })
+                await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
+            elif matches:
+                # Decision needed
+                if state.get("pending_tool"):
+                    # Listed while another prompt opened: keep the result so the resumed step asks right away
+                    state.setdefault("deferred_listings", {})[str(step_no)] = {"result": result, "ranking": similarity_results}
+                    return "deferred", None
+                state["pending_tool"] = {"name": tool_name, "arguments": merged_args, "hitl_type": "selection", "step": step_no}
+                await state_m.record("hitl_requested", state, step=step_no, tool=tool_name, pending_tool=state["pending_tool"], execution_context=state["execution_context"])
+                options = []
+                is_sheet = any("spreadsheet" in m.get("mimeType", "").lower() for m in matches)
+                
+                for m in matches:
+                    label = f"[{m.get('relevance_label', 'Match')}]"
+                    options.append({
+                        "id": m["id"], 
+                        "name": f"{label} {m['name']}", 
+                        "description": m["reason"]
+                    })
+                
+                title = "Spreadsheet Selection" if is_sheet else "File Selection"
+                msg = f"I found several { 'spreadsheets' if is_sheet else 'files' } matching '{search_query}'. Which one should I use?"
+                
+                schema = get_hitl_selection_schema(title=title, message=msg, options=options)
+                await state_m.save_message("assistant", f"Selection needed for {search_query}", hitl_type="selection", hitl_schema=schema, workflow_state=state)
+                await send_step_status(websocket, step, "waiting_input")
+                await safe_send(websocket, {"type": "hitl_selection", "schema": schema})
+                return "paused", None
+            else:
+                # No good matches found by LLM filter
+                await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
+        else:
+            # 0 files found or error
+            await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
+    else:
+        await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
+    
+    # CHECK FOR TOOL ERROR - break stream immediately
+    if result.get("status") == "error" or result.get("error"):
+        error_msg = result.get("message") or result.get("error") or "Tool execution failed"
+        print(f"[TOOL ERROR] {tool_name}: {error_msg}")
+        await state_m.record("step_failed", state, step=step_no, tool=tool_name, arguments=merged_args, output=result, error=error_msg)
+        await send_step_status(websocket, step, "failed")
+        await safe_send(websocket, {
+            "type": "error", 
+            "message": f"Tool '{tool_name}' failed: {error_msg}",
+            "tool_name": tool_name,
+            "recoverable": True
+        })
+        return "error", error_msg
+    
+    # Verification for each step (rules first, LLM for ambiguous results)
+    verification = await verify_step(client_openai, state, step, merged_args, result)
+    print(f"[LOGGER] VERIFICATION ({tool_name}): {verification}")
+    
+    # Update execution context
+    if verification.get("context_for_next_step"):
+        state["execution_context"].update(verification["context_for_next_step"])
+    apply_updated_variables(remaining_steps(state, exclude=step_no), step, verification.get("updated_variables"))
+    
+    # SPECIAL CASE: If tool result indicates a PDF was read, trigger the UI viewer
+    if tool_name == "read_drive_file_content" and result.get("is_pdf"):
+        file_id = result.get("file_id")
+        # Send view_pdf event
+        await safe_send(websocket, {
+            "type": "view_pdf",
+            "file_id": file_id,
+            "file_name": result.get("name"),
+            "proxy_url": f"/api/drive/view/{file_id}"
+        })
+
+    mark_step_done(state, step_no)
+    await state_m.record("step_completed", state, step=step_no, tool=tool_name, arguments=merged_args, output=result,
+                         execution_context=state["execution_context"], updated_variables=verification.get("updated_variables") or {})
+    await send_step_status(websocket, step, "completed")
+    await state_m.save_message("tool", content=json.dumps(result), tool_name=tool_name, workflow_state=state)
+    
+    # Check if verification says to stop
+    if not verification.get("should_continue", True):
+        await safe_send(websocket, {"role": "assistant", "content": verification.get("error_recovery", "Workflow stopped."), "type": "content"})
+        await safe_send(websocket, {"type": "workflow_complete", "status": "stopped", "session_id": state_m.session_id})
+        await safe_send(websocket, {"type": "done", "session_id": state_m.session_id})
+        return "stop", None
+    return "done", None
+
+async def execute_plan(websocket, client_openai, state_m: "WorkflowState", state: Dict[str, Any]) -> str:
+    """
+    Run the remaining plan as a dependency DAG: every step whose dependencies are done
+    starts right away (up to WORKFLOW_MAX_PARALLEL_STEPS at once). A HITL pause, a tool
+    error or a verifier stop lets the in-flight steps finish but starts no new ones;
+    the finished set lives in state["completed_steps"] so a HITL response resumes here.
+    Returns completed | paused | stopped | error.
+    """
+    plan = state["plan"]
+    deps = plan_dependencies(plan)
+    completed = set(state.setdefault("completed_steps", []))
+    running: Dict[asyncio.Task, Dict] = {}
+    halted = stopped = False
+    failure = None
+    try:
+        while True:
+            halted = halted or bool(state.get("pending_tool"))
+            if not halted:
+                for step in ready_steps(plan, deps, completed, {s["step"] for s in running.values()}):
+                    if len(running) >= WORKFLOW_MAX_PARALLEL_STEPS:
+                        break
+                    if step.get("tool_id") not in READ_ONLY_TOOLS and running:
+                        break
+                    running[asyncio.create_task(run_plan_step(websocket, client_openai, state_m, state, step))] = step
+                    if step.get("tool_id") not in READ_ONLY_TOOLS:
+                        break
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                step = running.pop(task)
+                outcome, detail = task.result()
+                if outcome == "skipped":
+                    mark_step_done(state, step["step"])
+                    await state_m.record("step_skipped", state, step=step["step"], tool=step.get("tool_id"))
+                    await send_step_status(websocket, step, "skipped")
+                elif outcome == "paused":
+                    halted = True
+                elif outcome == "stop":
+                    halted = stopped = True
+                elif outcome == "error":
+                    halted = True
+                    failure = failure or detail
+                completed = set(state.get("completed_steps", []))
+            if not running:
+                # Step boundary (nothing in flight): commit the finished steps' messages in the background
+                state_m.step_boundary()
+    finally:
+        for task in running:
+            task.cancel()
+
+    if failure is not None:
+        # Clear state and stop workflow
+        state["plan"] = None
+        state["pending_tool"] = None
+        state["execution_context"] = {}
+        state["step_outputs"] = {}
+        await state_m.save_message("assistant", f"Error: {failure}", workflow_state=state, durable=True)
+        await safe_send(websocket, {"type": "workflow_complete", "status": "error", "session_id": state_m.session_id})
+        state_m.prefetch.discard()
+        return "error"
+    await state_m.save(state)
+    if stopped:
+        state_m.prefetch.discard()
+        return "stopped"
+    if state.get("pending_tool"):
+        start_prefetch(state_m, state)
+        return "paused"
+    state_m.prefetch.discard()
+    return "completed"
+
+# Sections of the final response sent item by item while it streams
+STREAMED_SECTIONS = ("paragraphs", "pqa", "accordion", "pop_up")
+
+async def stream_final_response(websocket, client_openai, messages: List[Dict]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Stream the FORMAT_SCHEMA answer: each paragraphs/pqa/accordion/pop_up item goes out as a
+    `structured_item` event as soon as it closes, other sections (end_toggle) when complete.
+    Returns the validated object and the time to the first item / to the whole response.
+    """
+    start = time.perf_counter()
+    first_content_ms = None
+    parser = IncrementalJSONParser(item_sections=STREAMED_SECTIONS)
+    stream = await llm_call(client_openai, "final",
+        messages=messages,
+        response_format=FORMAT_SCHEMA,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None
+        if not delta:
+            continue
+        for section, index, item in parser.feed(delta):
+            if first_content_ms is None:
+                first_content_ms = round((time.perf_counter() - start) * 1000, 1)
+            await safe_send(websocket, {"type": "structured_item", "section": section, "index": index, "item": item})
+    structured_data = parser.result()
+    problems = schema_problems(structured_data, FORMAT_SCHEMA["json_schema"]["schema"])
+    if problems:
+        # The schema is not strict; the client renders whatever sections are usable
+        print(f"[LOGGER] FINAL RESPONSE does not match FORMAT_SCHEMA: {problems[:5]}")
+    return structured_data, {"first_content_ms": first_content_ms, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+
 async def workflow_handler(websocket: WebSocket, client_openai):
     """Main WebSocket workflow handler with heartbeat, HITL, and LLM verification."""
     session_id = "unknown"
     db = None
     heartbeat_task = None
     last_pong_time = time.time()
+    # Kept across the messages of one session so its transcript is loaded once per connection
+    state_m = None
+    # Record the connection to a replay fixture (WORKFLOW_RECORD_DIR), unless it is itself a replay
+    recorder = WorkflowRecorder() if WORKFLOW_RECORD_DIR and active_replay.get() is None else None
+    recorder_token = active_recorder.set(recorder)
+    timing_events = False
     
     async def send_heartbeat():
         """Send periodic heartbeat pings to keep connection alive."""
@@ -560,7 +1319,7 @@ async def workflow_handler(websocket: WebSocket, client_openai):
     
     try:
         await websocket.accept()
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         user_id = 1  # Default for now
         
         # Start heartbeat task
@@ -570,6 +1329,8 @@ async def workflow_handler(websocket: WebSocket, client_openai):
             data = await websocket.receive_text()
             try:
                 message_data = json.loads(data)
+                if recorder is not None:
+                    recorder.incoming(message_data)
                 
                 # Handle heartbeat pong
                 if message_data.get("type") == "pong":
@@ -584,15 +1345,24 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                 user_message = message_data.get("message")
                 session_id = message_data.get("session_id", "default")
                 hitl_response = message_data.get("hitl_response")
+                # Continue an unfinished plan, e.g. after reconnecting to another worker
+                resume = bool(message_data.get("resume"))
+                # Clients opt in to per-span `timing` events for the rest of the connection
+                timing_events = timing_events or bool(message_data.get("timing"))
             except Exception as e:
                 print(f"[WS ERROR] Failed to parse message: {e}")
                 continue
 
+            trace = WorkflowTrace(session_id, send=(lambda event: safe_send(websocket, event)) if timing_events else None)
+            trace_token = active_trace.set(trace)
             try:
                 if user_message:
                     print(f"[LOGGER] USER MESSAGE ({session_id}): {user_message}")
 
-                state_m = WorkflowState(session_id, db, user_id)
+                if state_m is None or state_m.session_id != session_id:
+                    if state_m is not None:
+                        state_m.prefetch.discard()
+                    state_m = WorkflowState(session_id, db, user_id)
                 state = await state_m.load()
                 
                 # --- AUTO-RESET STATE FOR NEW MESSAGES ---
@@ -612,12 +1382,18 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                         state["plan"] = None
                         state["pending_tool"] = None
                         state["current_step"] = 0
+                        state["completed_steps"] = []
+                        state["step_outputs"] = {}
                         state["execution_context"] = {}
+                        state_m.prefetch.discard()
+                        await state_m.record("workflow_reset", state)
                 
                 # --- HANDLE HITL RESPONSE ---
                 if hitl_response and state.get("pending_tool"):
                     print(f"[LOGGER] HITL RESPONSE ({session_id}): {hitl_response}")
                     pending = state["pending_tool"]
+                    missing = []
+                    errors = {}
                     
                     if pending["hitl_type"] == "form":
                         pending["arguments"].update(hitl_response)
@@ -626,40 +1402,32 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                         if not selected_item:
                             await safe_send(websocket, {"type": "content", "chunk": "No selection made. Action cancelled."})
                             state["pending_tool"] = None
-                            state["current_step"] += 1
+                            mark_step_done(state, pending.get("step"))
+                            await state_m.record("hitl_answered", state, step=pending.get("step"), tool=pending["name"], outcome="cancelled")
                             await state_m.save_message("assistant", "Action cancelled.", workflow_state=state)
                             # REMOVED premature 'done' signal
                             continue
                         
-                        # Update variables for future steps with the selected ID
-                        selected_id = selected_item.get("id")
                         selected_name = selected_item.get("name")
-                        
-                        # Add to execution context
-                        state["execution_context"]["selected_file_id"] = selected_id
-                        state["execution_context"]["selected_file_name"] = selected_name
-                        
-                        # Specifically update file_id for next steps if they need it
-                        for future_step in state.get("plan", [])[state["current_step"] + 1:]:
-                            if "file_id" in future_step.get("variables", {}):
-                                future_step["variables"]["file_id"] = selected_id
-                            if "missing_variables" in future_step and "file_id" in future_step["missing_variables"]:
-                                future_step["missing_variables"].remove("file_id")
-                                future_step["variables"]["file_id"] = selected_id
+                        # Selected file goes to the execution context, the step outputs and the file_id of later steps
+                        apply_file_selection(state, pending.get("step"), selected_item)
 
                         await safe_send(websocket, {"type": "content", "chunk": f"Selected file: {selected_name}"})
                         state["pending_tool"] = None
-                        state["current_step"] += 1
+                        mark_step_done(state, pending.get("step"))
+                        await state_m.record("hitl_answered", state, step=pending.get("step"), tool=pending["name"], outcome="selected", response=selected_item)
                         await state_m.save_message("assistant", f"User selected file: {selected_name}", workflow_state=state)
                         # Workflow continues in the next loop iteration
                     elif pending["hitl_type"] == "confirmation":
                         if hitl_response.get("approved") is False:
                             await safe_send(websocket, {"type": "content", "chunk": "Action cancelled."})
                             state["pending_tool"] = None
-                            state["current_step"] += 1  # Advance to next step even if cancelled
+                            mark_step_done(state, pending.get("step"))  # Advance to next step even if cancelled
+                            await state_m.record("hitl_answered", state, step=pending.get("step"), tool=pending["name"], outcome="cancelled")
                             await state_m.save_message("assistant", "Action cancelled.", workflow_state=state)
                             # REMOVED premature 'done' signal
                             continue
+                        await state_m.record("hitl_answered", state, step=pending.get("step"), tool=pending["name"], outcome="approved")
                     
                     if pending["hitl_type"] == "form":
                         # Save user's input to history so LLM can see it in the next resolution pass
@@ -668,28 +1436,35 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                         
                         # Use the new resolution loop
                         pending["arguments"].update(hitl_response)
-                        missing = [] # Will be checked by second pass resolution
+                        # Form answers are strings: coerce them, and ask again for any that are still invalid
+                        pending["arguments"], missing, errors = check_arguments(pending["name"], pending["arguments"], [])
+                        await state_m.record("hitl_answered", state, step=pending.get("step"), tool=pending["name"], outcome="provided", response=hitl_response)
                     
                     # Special check: If this was a selection, we've already updated the context and future steps.
                     # We should NOT re-execute the search tool (e.g. list_drive_files), 
-                    # but we MUST let the code fall through to the 'while state.get("plan")' loop below
-                    # so that it picks up the NEXT step in the plan.
+                    # but we MUST let the code fall through to execute_plan below
+                    # so that it picks up the remaining steps of the plan.
                     if pending.get("hitl_type") == "selection":
                         print(f"[LOGGER] Selection handled for {pending['name']}, proceeding to next step.")
                         state["pending_tool"] = None
-                        # Note: current_step was already incremented in the selection branch above
+                        # Note: the step was already marked done in the selection branch above
                     
                     elif not missing:
                         # Execute the tool
+                        pending_step = {"step": pending.get("step"), "tool_id": pending["name"]}
                         await safe_send(websocket, {"type": "status", "message": "executing_tool", "tool_name": pending["name"]})
+                        await send_step_status(websocket, pending_step, "running")
+                        await state_m.record("step_started", state, step=pending.get("step"), tool=pending["name"], arguments=pending["arguments"])
                         result = await execute_google_tool(db, user_id, pending["name"], pending["arguments"])
                         print(f"[LOGGER] TOOL EXECUTION ({pending['name']}): {result}")
+                        state.setdefault("step_outputs", {})[str(pending.get("step"))] = result
                         await safe_send(websocket, {"type": "tool_result", "tool_name": pending["name"], "result": result})
                         
                         # CHECK FOR TOOL ERROR - break stream immediately
                         if result.get("status") == "error" or result.get("error"):
                             error_msg = result.get("message") or result.get("error") or "Tool execution failed"
                             print(f"[TOOL ERROR] {pending['name']}: {error_msg}")
+                            await send_step_status(websocket, pending_step, "failed")
                             await safe_send(websocket, {
                                 "type": "error", 
                                 "message": f"Tool '{pending['name']}' failed: {error_msg}",
@@ -700,32 +1475,27 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                             state["pending_tool"] = None
                             state["plan"] = None
                             state["execution_context"] = {}
-                            await state_m.save_message("assistant", f"Error: {error_msg}", workflow_state=state)
+                            state["step_outputs"] = {}
+                            await state_m.record("step_failed", state, step=pending.get("step"), tool=pending["name"], arguments=pending["arguments"], output=result, error=error_msg)
+                            await state_m.save_message("assistant", f"Error: {error_msg}", workflow_state=state, durable=True)
                             await safe_send(websocket, {"type": "workflow_complete", "status": "error", "session_id": session_id})
                             continue
                         
-                        # LLM Verification for successful execution
-                        remaining_plan = state.get("plan", [])[state["current_step"] + 1:] if state.get("plan") else []
-                        verification = await verify_step_result(
-                            client_openai, 
-                            pending["name"], 
-                            pending["arguments"], 
-                            result,
-                            state.get("user_goal", ""),
-                            remaining_plan,
-                            state.get("execution_context", {})
-                        )
+                        # Verification for successful execution (rules first, LLM for ambiguous results)
+                        pending_def = next((s for s in state.get("plan") or [] if s.get("step") == pending.get("step")), pending_step)
+                        verification = await verify_step(client_openai, state, pending_def, pending["arguments"], result)
                         print(f"[LOGGER] VERIFICATION ({pending['name']}): {verification}")
                         
                         # Update execution context with verified results
                         if verification.get("context_for_next_step"):
                             state["execution_context"].update(verification["context_for_next_step"])
-                        if verification.get("updated_variables"):
-                            for future_step in state.get("plan", [])[state["current_step"] + 1:]:
-                                future_step["variables"].update(verification["updated_variables"])
+                        apply_updated_variables(remaining_steps(state, exclude=pending.get("step")), pending_def, verification.get("updated_variables"))
                         
                         state["pending_tool"] = None
-                        state["current_step"] += 1
+                        mark_step_done(state, pending.get("step"))
+                        await state_m.record("step_completed", state, step=pending.get("step"), tool=pending["name"], arguments=pending["arguments"], output=result,
+                                             execution_context=state["execution_context"], updated_variables=verification.get("updated_variables") or {})
+                        await send_step_status(websocket, pending_step, "completed")
                         await state_m.save_message("tool", content=json.dumps(result), tool_name=pending["name"], workflow_state=state)
                         
                         # Check if verification says to stop
@@ -736,9 +1506,9 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                             await safe_send(websocket, {"type": "done", "session_id": session_id})
                             continue
                     else:
-                        schema = get_hitl_form_schema(pending["name"], missing)
-                        await safe_send(websocket, {"type": "hitl_form", "schema": schema})
+                        schema = get_hitl_form_schema(pending["name"], missing, errors)
                         await state_m.save_message("assistant", "Missing parameters for tool.", hitl_type="form", hitl_schema=schema, workflow_state=state)
+                        await safe_send(websocket, {"type": "hitl_form", "schema": schema})
                         continue
 
                 # --- SAVE USER MESSAGE if present ---
@@ -748,26 +1518,51 @@ async def workflow_handler(websocket: WebSocket, client_openai):
 
                 # --- INITIAL PLANNER CALL ---
                 if user_message and not state.get("plan"):
-                    try:
-                        await safe_send(websocket, {"type": "status", "message": "thinking"})
-                        extracted = await extract_variables(client_openai, user_message)
-                        print(f"[LOGGER] EXTRACTED VARIABLES ({session_id}): {json.dumps(extracted, indent=2)}")
-                    except Exception as extract_error:
-                        print(f"[ERROR] Variable extraction failed: {extract_error}")
-                        await websocket.send_text(json.dumps({
-                            "type": "error",
-                            "message": f"Failed to analyze your request: {str(extract_error)}",
-                            "stage": "variable_extraction",
-                            "recoverable": True
-                        }))
-                        await websocket.send_text(json.dumps({"type": "workflow_complete", "status": "error", "session_id": session_id}))
-                        continue
+                    extracted = {}
+                    await safe_send(websocket, {"type": "status", "message": "thinking"})
+                    # Confident single-read requests skip the planner: one step, arguments extracted locally
+                    intent = intent_router.route(user_message, tool_registry, tool_catalog)
+                    # Recurring intents reuse a cached plan template, only the variables are extracted again
+                    # (a round trip saved in two_call mode; in combined mode the extraction replaces the one call)
+                    round_trips_saved = 1 if WORKFLOW_PLANNER_MODE == "two_call" else 0
+                    plan_template = plan_cache.get(user_message, round_trips_saved) if intent is None else None
+                    # A routed intent already carries its arguments: no extraction call
+                    if intent is None and (plan_template is not None or WORKFLOW_PLANNER_MODE == "two_call"):
+                        try:
+                            extracted = await extract_variables(client_openai, user_message)
+                            print(f"[LOGGER] EXTRACTED VARIABLES ({session_id}): {json.dumps(extracted, indent=2)}")
+                        except Exception as extract_error:
+                            print(f"[ERROR] Variable extraction failed: {extract_error}")
+                            await websocket.send_text(json.dumps({
+                                "type": "error",
+                                "message": f"Failed to analyze your request: {str(extract_error)}",
+                                "stage": "variable_extraction",
+                                "recoverable": True
+                            }))
+                            await websocket.send_text(json.dumps({"type": "workflow_complete", "status": "error", "session_id": session_id}))
+                            continue
                     
                     try:
                         await safe_send(websocket, {"type": "status", "message": "choosing_tools"})
-                        plan = await plan_workflow(client_openai, user_message, TOOLS_REGISTRY, extracted)
-                        
-                        print(f"[LOGGER] OPENAI PLANNER ({session_id}): {json.dumps(plan, indent=2)}")
+                        if intent is not None:
+                            extracted = dict(intent["arguments"])
+                            plan = [{
+                                "step": 1, "tool_id": intent["tool_id"], "variables": dict(intent["arguments"]), "missing_variables": [],
+                                "description": f"{intent['tool_id'].replace('_', ' ')} (intent classifier)", "depends_on_step": None, "output_used_by": []
+                            }]
+                            print(f"[INTENT] ({session_id}) {intent['tool_id']} at {intent['confidence']:.2f} without the planner: {json.dumps(intent['arguments'])}")
+                        elif plan_template is not None:
+                            plan = instantiate_template(plan_template, extracted)
+                            print(f"[LOGGER] PLAN CACHE HIT ({session_id}): {json.dumps(plan, indent=2)}")
+                        else:
+                            if WORKFLOW_PLANNER_MODE == "two_call":
+                                plan = await plan_workflow(client_openai, user_message, tool_catalog, extracted)
+                            else:
+                                # Single round trip: entities and step plan from one structured-output call
+                                extracted, plan = await extract_and_plan(client_openai, user_message, tool_catalog)
+                                print(f"[LOGGER] EXTRACTED VARIABLES ({session_id}): {json.dumps(extracted, indent=2)}")
+                            print(f"[LOGGER] OPENAI PLANNER ({session_id}): {json.dumps(plan, indent=2)}")
+                            plan_cache.put(user_message, plan, extracted)
                         
                         # Check if plan is empty or invalid
                         if not plan or len(plan) == 0:
@@ -780,233 +1575,93 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                             await websocket.send_text(json.dumps({"type": "workflow_complete", "status": "error", "session_id": session_id}))
                             continue
                         
+                        plan = normalize_plan_steps(plan)
+                        optimizations = []
+                        if WORKFLOW_PLAN_OPTIMIZER_ENABLED:
+                            planned = len(plan)
+                            plan, optimizations = optimize_plan(plan, tool_registry, tool_catalog)
+                            for rewrite in optimizations:
+                                print(f"[PLAN OPTIMIZER] ({session_id}) {describe_rewrite(rewrite)}")
+                            if optimizations:
+                                print(f"[PLAN OPTIMIZER] ({session_id}) {planned} -> {len(plan)} steps")
+                        
                         # Send plan preview to user
                         await safe_send(websocket, {
                             "type": "plan_preview",
                             "plan": plan,
-                            "extracted_variables": extracted
+                            "extracted_variables": extracted,
+                            "optimizations": optimizations
                         })
                         
                         state["plan"] = plan
                         state["current_step"] = 0
+                        state["completed_steps"] = []
+                        state["verification_stats"] = {"rules": 0, "llm": 0}
+                        state["resolution_stats"] = {"templated": 0, "llm": 0}
+                        state["prefetch_stats"] = {"used": 0, "ms_saved": 0}
+                        state["step_outputs"] = {}
+                        state["deferred_listings"] = {}
                         state["execution_context"] = extracted.copy()  # Initialize with extracted vars
+                        await state_m.record("plan_created", state, user_goal=user_message, plan=plan, execution_context=state["execution_context"], optimizations=optimizations, intent=intent)
                     except Exception as plan_error:
                         print(f"[ERROR] Planning failed: {plan_error}")
                         await websocket.send_text(json.dumps({
                             "type": "error",
                             "message": f"Failed to create execution plan: {str(plan_error)}",
                             "stage": "planning",
-                            "extracted_variables": extracted if 'extracted' in dir() else {},
+                            "extracted_variables": extracted,
                             "recoverable": True
                         }))
                         await websocket.send_text(json.dumps({"type": "workflow_complete", "status": "error", "session_id": session_id}))
                         continue
                 
                 # --- EXECUTE PLAN ---
-                while state.get("plan") and state["current_step"] < len(state["plan"]):
-                    step = state["plan"][state["current_step"]]
-                    tool_name = step.get("tool_id")
-                    
-                    # DYNAMIC PARAMETER RESOLUTION
-                    # Fetch full history to inform the LLM
-                    history = await state_m.get_full_history()
-                    resolution = await resolve_step_parameters(
-                        client_openai, 
-                        tool_name, 
-                        state.get("user_goal", ""), 
-                        history, 
-                        state.get("execution_context", {}), 
-                        step, 
-                        TOOLS_REGISTRY
-                    )
-                    
-                    merged_args = resolution.get("arguments", {})
-                    missing = resolution.get("missing_params", [])
-                    
-                    tool_def = next((t for t in TOOLS_REGISTRY if t["tool_id"] == tool_name), None)
-                    if not tool_def: 
-                        state["current_step"] += 1
-                        continue
-                    
-                    # Check for missing required params
-                    if missing:
-                        state["pending_tool"] = {"name": tool_name, "arguments": merged_args, "hitl_type": "form"}
-                        schema = get_hitl_form_schema(tool_name, missing)
-                        await safe_send(websocket, {"type": "hitl_form", "schema": schema})
-                        await state_m.save_message("assistant", f"Need parameters for {tool_name}", hitl_type="form", hitl_schema=schema, workflow_state=state)
-                        break 
-                    
-                    # Update context with resolved arguments
-                    state["execution_context"].update(merged_args)
-
-                    # Check for HITL confirmation (sensitive actions)
-                    if tool_name in ["send_email", "schedule_calendar_event", "delete_calendar_event", "delete_drive_file", "delete_email"]:
-                        state["pending_tool"] = {"name": tool_name, "arguments": merged_args, "hitl_type": "confirmation"}
-                        await safe_send(websocket, {
-                            "type": "hitl_confirmation", 
-                            "title": "Confirm Action", 
-                            "message": f"Proceed with {tool_name.replace('_', ' ').title()}?", 
-                            "details": merged_args
-                        })
-                        await state_m.save_message("assistant", f"Confirmation needed for {tool_name}", hitl_type="confirmation", workflow_state=state)
-                        break
-
-                    # Execute tool
-                    # SEPARATION OF CONCERNS: Send status as distinct event
-                    await safe_send(websocket, {"type": "status", "message": "executing_tool", "tool_name": tool_name})
-                    result = await execute_google_tool(db, user_id, tool_name, merged_args)
-                    print(f"[LOGGER] TOOL EXECUTION ({tool_name}): {result}")
-                    
-                    # SPECIAL CASE: list_drive_files handles doc discovery
-                    if tool_name == "list_drive_files":
-                        files = result.get("files", [])
-                        search_query = merged_args.get("filename") or merged_args.get("query") or ""
-                        
-                        # We ALWAYS run similarity search if we found 1 or more files
-                        # to ensure consistent HITL experience or confident auto-picking.
-                        if len(files) >= 1 :
-                            print(f"[LOGGER] Drive results count: {len(files)} for query '{search_query}'. Running similarity search...")
-                            
-                            similarity_results = await find_similar_files(client_openai, search_query, files, user_goal=state.get("user_goal", ""))
-                            best_match_id = similarity_results.get("best_match_id")
-                            matches = similarity_results.get("matches", [])
-                            
-                            if best_match_id:
-                                # Auto-pick the best match
-                                best_match = next((m for m in matches if m["id"] == best_match_id), None)
-                                print(f"[LOGGER] LLM auto-picked best match: {best_match.get('name') if best_match else best_match_id}")
-                                
-                                # Update result to simulate a single successful find
-                                if best_match:
-                                    result["files"] = [best_match]
-                                    selected_name = best_match.get("name", "selected file")
-                                else:
-                                    selected_name = "selected file"
-                                
-                                # SEPARATE MESSAGE for selection notification
-                                await safe_send(websocket, {
-                                    "role": "assistant", 
-                                    "content": f"Found and selected: {selected_name}",
-                                    "type": "content"
-                                })
-                                await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
-                            elif matches:
-                                # Decision needed
-                                state["pending_tool"] = {"name": tool_name, "arguments": merged_args, "hitl_type": "selection"}
-                                options = []
-                                is_sheet = any("spreadsheet" in m.get("mimeType", "").lower() for m in matches)
-                                
-                                for m in matches:
-                                    label = f"[{m.get('relevance_label', 'Match')}]"
-                                    options.append({
-                                        "id": m["id"], 
-                                        "name": f"{label} {m['name']}", 
-                                        "description": m["reason"]
-                                    })
-                                
-                                title = "Spreadsheet Selection" if is_sheet else "File Selection"
-                                msg = f"I found several { 'spreadsheets' if is_sheet else 'files' } matching '{search_query}'. Which one should I use?"
-                                
-                                schema = get_hitl_selection_schema(title=title, message=msg, options=options)
-                                await safe_send(websocket, {"type": "hitl_selection", "schema": schema})
-                                await state_m.save_message("assistant", f"Selection needed for {search_query}", hitl_type="selection", hitl_schema=schema, workflow_state=state)
-                                break 
-                            else:
-                                # No good matches found by LLM filter
-                                await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
-                        else:
-                            # 0 files found or error
-                            await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
-                    else:
-                        await safe_send(websocket, {"type": "tool_result", "tool_name": tool_name, "result": result})
-                    
-                    # CHECK FOR TOOL ERROR - break stream immediately
-                    if result.get("status") == "error" or result.get("error"):
-                        error_msg = result.get("message") or result.get("error") or "Tool execution failed"
-                        print(f"[TOOL ERROR] {tool_name}: {error_msg}")
-                        await safe_send(websocket, {
-                            "type": "error", 
-                            "message": f"Tool '{tool_name}' failed: {error_msg}",
-                            "tool_name": tool_name,
-                            "recoverable": True
-                        })
-                        # Clear state and stop workflow
-                        state["plan"] = None
-                        state["execution_context"] = {}
-                        await state_m.save_message("assistant", f"Error: {error_msg}", workflow_state=state)
-                        await safe_send(websocket, {"type": "workflow_complete", "status": "error", "session_id": session_id})
-                        break
-                    
-                    # LLM Verification for each step
-                    remaining_plan = state["plan"][state["current_step"] + 1:]
-                    verification = await verify_step_result(
-                        client_openai, 
-                        tool_name, 
-                        merged_args, 
-                        result,
-                        state.get("user_goal", ""),
-                        remaining_plan,
-                        state.get("execution_context", {})
-                    )
-                    print(f"[LOGGER] VERIFICATION ({tool_name}): {verification}")
-                    
-                    # Update execution context
-                    if verification.get("context_for_next_step"):
-                        state["execution_context"].update(verification["context_for_next_step"])
-                    if verification.get("updated_variables"):
-                        for future_step in state["plan"][state["current_step"] + 1:]:
-                            future_step["variables"].update(verification["updated_variables"])
-                    
-                    # SPECIAL CASE: If tool result indicates a PDF was read, trigger the UI viewer
-                    if tool_name == "read_drive_file_content" and result.get("is_pdf"):
-                        file_id = result.get("file_id")
-                        # Send view_pdf event
-                        await safe_send(websocket, {
-                            "type": "view_pdf",
-                            "file_id": file_id,
-                            "file_name": result.get("name"),
-                            "proxy_url": f"/api/drive/view/{file_id}"
-                        })
-
-                    state["current_step"] += 1
-                    await state_m.save_message("tool", content=json.dumps(result), tool_name=tool_name, workflow_state=state)
-                    
-                    # Check if verification says to stop
-                    if not verification.get("should_continue", True):
-                        await safe_send(websocket, {"role": "assistant", "content": verification.get("error_recovery", "Workflow stopped."), "type": "content"})
-                        await safe_send(websocket, {"type": "workflow_complete", "status": "stopped", "session_id": session_id})
-                        await safe_send(websocket, {"type": "done", "session_id": session_id})
-                        break
+                plan_outcome = None
+                if state.get("plan") and not state.get("pending_tool"):
+                    plan_outcome = await execute_plan(websocket, client_openai, state_m, state)
 
                 # --- FINAL STRUCTURED RESPONSE ---
-                if (user_message or hitl_response) and state.get("pending_tool") is None:
+                if (user_message or hitl_response or resume) and state.get("pending_tool") is None and plan_outcome != "stopped":
                     # Only generate final response if no pending HITL
-                    plan_complete = not state.get("plan") or state["current_step"] >= len(state.get("plan", []))
+                    plan_complete = plan_finished(state)
                     
                     if plan_complete or not state.get("plan"):
                         try:
+                            verification_stats = state.pop("verification_stats", None)
+                            resolution_stats = state.pop("resolution_stats", None)
+                            prefetch_stats = state.pop("prefetch_stats", None) or {"used": 0, "ms_saved": 0}
+                            if verification_stats:
+                                print(f"[LOGGER] VERIFIER ({session_id}): {verification_stats['rules']} rule-based, {verification_stats['llm']} LLM (LLM calls avoided: {verification_stats['rules']})")
+                            if resolution_stats:
+                                print(f"[LOGGER] RESOLVER ({session_id}): {resolution_stats['templated']} templated, {resolution_stats['llm']} LLM (LLM calls avoided: {resolution_stats['templated']})")
+                            if prefetch_stats["used"]:
+                                print(f"[LOGGER] PREFETCH ({session_id}): {prefetch_stats['used']} steps served from speculative results, {prefetch_stats['ms_saved']} ms saved after HITL responses")
                             history = await state_m.get_full_history()
-                            history.append({"role": "system", "content": "Generate the final response using the specified structured format."})
-                            response = await client_openai.chat.completions.create(
-                                model="gpt-4o",
-                                messages=history[-15:],
-                                response_format=FORMAT_SCHEMA
-                            )
-                            structured_data = json.loads(response.choices[0].message.content)
+                            history = history[-14:] + [{"role": "system", "content": "Generate the final response using the specified structured format."}]
+                            structured_data, timing = await stream_final_response(websocket, client_openai, history[-15:])
                             print(f"[LOGGER] OPENAI ASSISTANT ({session_id}): {json.dumps(structured_data, indent=2)}")
+                            print(f"[LOGGER] FINAL RESPONSE ({session_id}): first item after {timing['first_content_ms']} ms, complete after {timing['total_ms']} ms")
                             # REMOVED finished: True from content chunk
                             await safe_send(websocket, {"type": "content", "chunk": json.dumps(structured_data)})
                             
                             state["plan"] = None 
                             state["execution_context"] = {}
-                            await state_m.save_message("assistant", json.dumps(structured_data), workflow_state=state)
+                            state["step_outputs"] = {}
+                            await state_m.record("workflow_finished", state, status="success")
+                            await state_m.save_message("assistant", json.dumps(structured_data), workflow_state=state, durable=True)
                             
                             # Send clear completion signal
                             await safe_send(websocket, {
                                 "type": "workflow_complete", 
                                 "status": "success",
                                 "session_id": session_id,
-                                "message": "Workflow completed successfully"
+                                "message": "Workflow completed successfully",
+                                "llm_verifications_avoided": (verification_stats or {}).get("rules", 0),
+                                "llm_resolutions_avoided": (resolution_stats or {}).get("templated", 0),
+                                "prefetched_steps": prefetch_stats["used"],
+                                "prefetch_ms_saved": prefetch_stats["ms_saved"],
+                                "first_content_ms": timing["first_content_ms"],
+                                "final_response_ms": timing["total_ms"]
                             })
                             await safe_send(websocket, {"type": "done", "session_id": session_id})
                         except json.JSONDecodeError as json_err:
@@ -1028,6 +1683,17 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                             })
                             await safe_send(websocket, {"type": "workflow_complete", "status": "error", "session_id": session_id})
 
+            except WorkflowStateConflict:
+                print(f"[WS ERROR] Workflow state changed concurrently (Session: {session_id})")
+                await safe_send(websocket, {
+                    "type": "error",
+                    "message": "This conversation was updated from another connection. Please resend your message.",
+                    "stage": "state",
+                    "session_id": session_id,
+                    "recoverable": True
+                })
+                await safe_send(websocket, {"type": "workflow_complete", "status": "error", "session_id": session_id})
+
             except Exception as e:
                 error_details = str(e)
                 print(f"[WS ERROR] Processing error (Session: {session_id}): {e}")
@@ -1042,19 +1708,38 @@ async def workflow_handler(websocket: WebSocket, client_openai):
                 })
                 await safe_send(websocket, {"type": "workflow_complete", "status": "error", "session_id": session_id})
 
+            finally:
+                if state_m is not None:
+                    try:
+                        await state_m.close()
+                    except Exception as e:
+                        print(f"[MESSAGE BUFFER] Final flush failed (Session: {session_id}): {e}")
+                await trace.finish(hitl_response=bool(hitl_response))
+                active_trace.reset(trace_token)
+
     except (WebSocketDisconnect, RuntimeError) as e:
         print(f"WS Disconnected (Session: {session_id}): {type(e).__name__}")
     except Exception as e:
         print(f"WS Error (Session: {session_id}): {e}")
         traceback.print_exc()
     finally:
+        if state_m is not None:
+            state_m.prefetch.discard()
         if heartbeat_task:
             heartbeat_task.cancel()
             try:
                 await heartbeat_task
             except asyncio.CancelledError:
                 pass
-        if db: db.close()
+        if db: await db.close()
+        active_recorder.reset(recorder_token)
+        if recorder is not None:
+            try:
+                path = recorder.save(WORKFLOW_RECORD_DIR)
+                if path:
+                    print(f"[RECORDER] Workflow run saved to {path}")
+            except OSError as e:
+                print(f"[RECORDER] Could not save recording (Session: {session_id}): {e}")
 
 async def stream_openai_response_async(client_openai, messages, tools=None):
     kwargs = {"model": "gpt-4o", "messages": messages, "stream": True}
@@ -90,10 +90,28 @@ def function_client_read_openai(config_openai_key):
 
 
 #client
-from databases import Database
-async def function_client_read_postgres(config_postgres_url,config_postgres_min_connection=5,config_postgres_max_connection=20):
-   client_postgres=Database(config_postgres_url,min_size=config_postgres_min_connection,max_size=config_postgres_max_connection)
-   await client_postgres.connect()
+from sqlalchemy import text
+class PostgresClient:
+    """Raw SQL client (fetch_all/execute with :named values) backed by the shared async engine pool."""
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def fetch_all(self, query, values=None):
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(query), values or {})
+            return result.mappings().all() if result.returns_rows else []
+
+    async def execute(self, query, values=None):
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query), values or {})
+
+    async def close(self):
+        await self.engine.dispose()
+
+async def function_client_read_postgres(async_engine):
+   client_postgres=PostgresClient(async_engine)
+   async with async_engine.connect():
+      pass
    return client_postgres
 
 async def function_object_create_postgres_asyncpg(client_postgres_asyncpg,table,object_dict):
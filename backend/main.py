@@ -1,5 +1,9 @@
 from package import *
 from function import *
+from models import async_engine
+from services.session_cache import session_cache
+from services.workflow_store import workflow_store
+from services.chat_archive import CHAT_ARCHIVE_ENABLED, run_archival_loop
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,15 +16,23 @@ config_key_root = os.environ.get("config_key_root")
 config_openai_key = os.environ.get("OPENAI_API_KEY")
 config_key_jwt = os.environ.get("config_key_jwt")
 config_token_expire_sec = int(os.environ.get("config_token_expire_sec",259200))
+config_redis_url = os.environ.get("config_redis_url")
+# Usernames allowed to read the /admin endpoints
+config_admin_username_list = [u.strip() for u in os.environ.get("config_admin_username_list", "").split(",") if u.strip()]
 
 from contextlib import asynccontextmanager
 import traceback
 @asynccontextmanager
 async def lifespan(app:FastAPI):
     try:
-        client_postgres=await function_client_read_postgres(config_postgres_url) if config_postgres_url else None
+        client_postgres=await function_client_read_postgres(async_engine) if config_postgres_url else None
         # client_gemini = function_client_read_gemini(config_gemini_key) if config_gemini_key else None
         client_openai = function_client_read_openai(config_openai_key) if config_openai_key else None
+        client_redis = await function_client_read_redis(config_redis_url) if config_redis_url else None
+        if client_redis:
+            session_cache.attach_redis(client_redis)
+            workflow_store.attach_redis(client_redis)
+        task_chat_archive = asyncio.create_task(run_archival_loop(async_engine)) if client_postgres and CHAT_ARCHIVE_ENABLED else None
         
         app.state.client_postgres = client_postgres
         # app.state.client_gemini = client_gemini
@@ -30,15 +42,19 @@ async def lifespan(app:FastAPI):
         app.state.config_token_expire_sec = config_token_expire_sec
         
         print("Database connection established successfully!")
-        function_add_app_state({**globals(),**locals()}, app, ("config_","client_","cache_"))
+        function_add_app_state({**globals(),**locals()}, app, ("config_","client_","cache_","task_"))
         yield
     except Exception as e:
         print(f"Failed to establish database connection: {str(e)}")
         print(traceback.format_exc())
     finally:
+        if getattr(app.state, 'task_chat_archive', None):
+            app.state.task_chat_archive.cancel()
         if hasattr(app.state, 'client_postgres') and app.state.client_postgres:
             await app.state.client_postgres.close()
             print("Database connection closed.")
+        if getattr(app.state, 'client_redis', None):
+            await app.state.client_redis.aclose()
 
 
 #app
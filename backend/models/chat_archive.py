@@ -0,0 +1,27 @@
+"""
+Chat Session Archive Model
+Stores cold chat sessions as a single compressed blob (zstd JSON) outside chat_messages
+"""
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, ForeignKey, func
+from models import Base
+
+
+class ChatSessionArchive(Base):
+    __tablename__ = "chat_session_archives"
+
+    session_id = Column(String(255), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    # Listing metadata so archived sessions still show up in /chat/history without rehydrating
+    title = Column(String(255), nullable=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    first_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+
+    # zstd-compressed JSON array of full chat_messages rows
+    codec = Column(String(20), nullable=False, default="zstd-json")
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ChatSessionArchive(session='{self.session_id}', messages={self.message_count})>"
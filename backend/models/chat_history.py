@@ -2,13 +2,20 @@
 Chat History Model
 Stores chat messages with support for HITL (Human-in-the-Loop) data
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index, DDL, event, func, text
 from sqlalchemy.orm import relationship
 from models import Base
 
+# Expression indexed for full-text search; queries must use exactly this expression to hit the GIN index
+CONTENT_TSVECTOR_SQL = "to_tsvector('english', coalesce(content, ''))"
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_user_created", "user_id", "created_at"),
+        Index("ix_chat_messages_content_fts", text(CONTENT_TSVECTOR_SQL), postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(255), nullable=False, index=True)
@@ -53,3 +60,17 @@ class ChatMessage(Base):
             "citations": self.citations,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+
+
+# SQLite fallback (local tests): external-content FTS5 table kept in sync by triggers
+for _statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5(content, content='chat_messages', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS chat_messages_fts_ai AFTER INSERT ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_messages_fts_ad AFTER DELETE ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_messages_fts_au AFTER UPDATE ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO chat_messages_fts(rowid, content) VALUES (new.id, new.content); END",
+):
+    event.listen(ChatMessage.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
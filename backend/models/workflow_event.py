@@ -0,0 +1,44 @@
+"""
+Workflow Event Log Models
+Append-only log of workflow execution events, plus the latest state snapshot per session
+"""
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint, func
+from models import Base
+
+
+class WorkflowEvent(Base):
+    __tablename__ = "workflow_events"
+    __table_args__ = (
+        # Also serializes concurrent appends from different workers
+        UniqueConstraint("session_id", "seq", name="uq_workflow_events_session_seq"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(255), nullable=False, index=True)
+    seq = Column(Integer, nullable=False)  # 1, 2, 3... per session
+    event_type = Column(String(50), nullable=False)  # 'plan_created', 'step_completed', 'hitl_requested'...
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<WorkflowEvent(session='{self.session_id}', seq={self.seq}, type='{self.event_type}')>"
+
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "event_type": self.event_type,
+            "payload": self.payload,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class WorkflowSnapshot(Base):
+    __tablename__ = "workflow_snapshots"
+
+    session_id = Column(String(255), primary_key=True)
+    seq = Column(Integer, nullable=False)  # last event folded into `state`
+    state = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<WorkflowSnapshot(session='{self.session_id}', seq={self.seq})>"
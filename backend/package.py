@@ -9,8 +9,8 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 import json
 from dotenv import load_dotenv
 import httpx
-from models import SessionLocal, ChatMessage
-from sqlalchemy import func, text
+from models import AsyncSessionLocal, ChatMessage, ChatSessionArchive
+from sqlalchemy import func, text, select
 
 
 from pydantic import BaseModel
@@ -34,3 +34,14 @@ import re
 
 # Create router instance
 router = APIRouter()
+
+from fastapi import Depends, HTTPException
+
+async def require_admin(request: Request):
+    """Dependency of the /admin endpoints: an authenticated user listed in config_admin_username_list."""
+    user = request.state.user
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if user.get("username") not in (getattr(request.app.state, "config_admin_username_list", None) or []):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
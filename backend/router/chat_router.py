@@ -2,6 +2,9 @@ from package import *
 from controller.chat_controller import *
 from fastapi import responses
 from sqlalchemy import func, text
+from services.chat_search import search_chat_messages
+from services.session_cache import session_cache, message_to_cache_entry
+from services.chat_archive import rehydrate_session
 
 
 @router.get("/chat/history")
@@ -11,14 +14,13 @@ async def get_chat_history(request: Request):
     if user is None:
         return responses.JSONResponse(status_code=401, content={"status": 0, "message": "Authentication required"})
     
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         # Get unique session IDs and their latest message for title/timestamp
-        sessions_query = db.query(
+        sessions_query = (await db.execute(select(
             ChatMessage.session_id,
             func.max(ChatMessage.created_at).label("updatedAt"),
             func.min(ChatMessage.content).label("title") # Simple title strategy: first message
-        ).filter(ChatMessage.user_id == user["id"]).group_by(ChatMessage.session_id).order_by(text("updatedAt DESC")).all()
+        ).filter(ChatMessage.user_id == user["id"]).group_by(ChatMessage.session_id).order_by(func.max(ChatMessage.created_at).desc()))).all()
         
         sessions = []
         for s in sessions_query:
@@ -28,9 +30,19 @@ async def get_chat_history(request: Request):
                 "updatedAt": s.updatedAt.isoformat()
             })
         
+        # Archived (cold) sessions are listed from their archive metadata and rehydrated when opened
+        archived = (await db.execute(select(ChatSessionArchive).filter(ChatSessionArchive.user_id == user["id"]))).scalars().all()
+        live_ids = {s["id"] for s in sessions}
+        for a in archived:
+            if a.session_id not in live_ids:
+                sessions.append({
+                    "id": a.session_id,
+                    "title": a.title[:50] + "..." if a.title else "New Chat",
+                    "updatedAt": a.last_message_at.isoformat() if a.last_message_at else None
+                })
+        sessions.sort(key=lambda s: s["updatedAt"] or "", reverse=True)
+        
         return {"status": 1, "sessions": sessions}
-    finally:
-        db.close()
 
 @router.get("/chat/history/{session_id}")
 async def get_session_history(session_id: str, request: Request):
@@ -39,16 +51,41 @@ async def get_session_history(session_id: str, request: Request):
     if user is None:
         return responses.JSONResponse(status_code=401, content={"status": 0, "message": "Authentication required"})
     
-    db = SessionLocal()
-    try:
-        messages = db.query(ChatMessage).filter(
+    async with AsyncSessionLocal() as db:
+        await rehydrate_session(db, session_id, user_id=user["id"])
+        messages = (await db.execute(select(ChatMessage).filter(
             ChatMessage.session_id == session_id,
             ChatMessage.user_id == user["id"]
-        ).order_by(ChatMessage.created_at.asc()).all()
+        ).order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()))).scalars().all()
         
         return {"status": 1, "messages": [m.to_dict() for m in messages]}
-    finally:
-        db.close()
+
+@router.get("/chat/search")
+async def search_chat_history(request: Request, q: str, page: int = 1, page_size: int = 20):
+    """Full-text search across all of the user's sessions, ranked and highlighted."""
+    user = request.state.user
+    if user is None:
+        return responses.JSONResponse(status_code=401, content={"status": 0, "message": "Authentication required"})
+    if not q.strip():
+        return responses.JSONResponse(status_code=400, content={"status": 0, "message": "Search query is required"})
+    
+    async with AsyncSessionLocal() as db:
+        result = await search_chat_messages(db, user["id"], q, page=page, page_size=page_size)
+        return {"status": 1, **result}
+
+@router.get("/chat/export")
+async def export_chat_history(request: Request, gzip: bool = False, after_id: int = None, after_session: str = None):
+    """Stream the user's entire history as NDJSON (optionally gzip), resumable from a message id or archived session."""
+    user = request.state.user
+    if user is None:
+        return responses.JSONResponse(status_code=401, content={"status": 0, "message": "Authentication required"})
+    
+    filename = "chat_history.ndjson.gz" if gzip else "chat_history.ndjson"
+    return StreamingResponse(
+        export_history_ndjson(user["id"], after_id=after_id, compress=gzip, after_session=after_session),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
+    )
 
 @router.post("/chat/pdf/stream")
 async def chat_endpoint(
@@ -64,20 +101,26 @@ async def chat_endpoint(
     if user_id is None:
         return responses.JSONResponse(status_code=401, content={"status": 0, "message": "Authentication required"})
     
-    db = SessionLocal()
     history = []
     source_map = {}
     pdf_filename = "Document"
 
-    try:
-        # 1. Load existing history from DB
-        existing_msgs = db.query(ChatMessage).filter(
-            ChatMessage.session_id == active_session_id
-        ).order_by(ChatMessage.created_at.asc()).all()
+    async with AsyncSessionLocal() as db:
+        # 1. Load existing history (hot-session cache first, DB only on a miss)
+        window = session_cache.max_messages
+        existing_msgs = await session_cache.get(active_session_id, tail=window)
+        if existing_msgs is None:
+            await rehydrate_session(db, active_session_id, user_id=user_id)
+            # Only the history window is read; one extra row tells whether the session is longer
+            rows = (await db.execute(select(ChatMessage).filter(
+                ChatMessage.session_id == active_session_id
+            ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(window + 1))).scalars().all()
+            existing_msgs = [message_to_cache_entry(m) for m in reversed(rows[:window])]
+            await session_cache.put(active_session_id, existing_msgs, complete=len(rows) <= window)
         
         for m in existing_msgs:
-            history.append({"role": m.role, "content": m.content})
-            if m.citations and not source_map: # Use citations from first assistant message with citations
+            history.append({"role": m["role"], "content": m["content"]})
+            if m["citations"] and not source_map: # Use citations from first assistant message with citations
                 # This is a bit simplistic, but we primarily need citations for the CURRENT pdf
                 pass
 
@@ -102,7 +145,8 @@ async def chat_endpoint(
             content=message
         )
         db.add(user_msg)
-        db.commit()
+        await db.commit()
+        await session_cache.append(active_session_id, message_to_cache_entry(user_msg))
 
         # 4. Stream the Response
         return StreamingResponse(
@@ -116,5 +160,8 @@ async def chat_endpoint(
             ),
             media_type="text/event-stream"
         )
-    finally:
-        db.close()
\ No newline at end of file
+
+@router.get("/admin/chat-cache/stats", dependencies=[Depends(require_admin)])
+async def get_chat_cache_stats(request: Request):
+    """Hit ratio, eviction counts and memory use of the hot-session message cache."""
+    return {"status": 1, "cache": session_cache.stats()}
@@ -1,17 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from models import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import get_async_db
 from services import google_services
 import io
 
 router = APIRouter(prefix="/api/drive", tags=["drive"])
 
 @router.get("/view/{file_id}")
-async def view_drive_file(file_id: str, db: Session = Depends(get_db)):
+async def view_drive_file(file_id: str, db: AsyncSession = Depends(get_async_db)):
     """Proxy endpoint to stream a PDF file from Google Drive to the frontend."""
     user_id = 1  # Default for now
-    service = google_services.get_service(db, user_id, 'drive', 'v3')
+    service = await google_services.get_service(db, user_id, 'drive', 'v3')
     if not service:
         raise HTTPException(status_code=400, detail="Google Drive not connected")
     
@@ -1,5 +1,17 @@
 from package import *
 from controller.workflow_execution_controller import workflow_handler
+from services.plan_cache import plan_cache
+from services.workflow_store import workflow_store
+from services.workflow_log import workflow_log
+from services.message_buffer import flush_stats
+from services.tool_registry import tool_registry
+from services.tool_catalog import tool_catalog
+from services.step_prefetch import prefetch_stats
+from services.plan_optimizer import plan_optimizer_stats
+from services.intent_classifier import intent_router
+from services.workflow_tracing import span_metrics, trace_exporter
+from services.model_routing import model_router
+from fastapi.responses import PlainTextResponse
 
 
 @router.websocket("/ws/workflow")
@@ -10,3 +22,63 @@ async def workflow_websocket_endpoint(websocket: WebSocket):
     # Custom tools can be passed here if needed
     # For now, using default tools defined in the controller
     await workflow_handler(websocket, client_openai)
+
+
+@router.get("/admin/plan-cache/stats", dependencies=[Depends(require_admin)])
+async def get_plan_cache_stats(request: Request):
+    """Hit rate, model round trips saved and evictions of the workflow plan cache."""
+    return {"status": 1, "cache": plan_cache.stats()}
+
+
+@router.get("/admin/workflow-state/stats", dependencies=[Depends(require_admin)])
+async def get_workflow_state_stats(request: Request):
+    """Loads, saves, version conflicts and evictions of the workflow state store, plus event log counters."""
+    return {"status": 1, "store": workflow_store.stats(), "log": workflow_log.stats()}
+
+
+@router.get("/admin/message-writes/stats", dependencies=[Depends(require_admin)])
+async def get_message_write_stats(request: Request):
+    """Batched chat message persistence: flush latency and batch sizes."""
+    return {"status": 1, "writes": flush_stats.stats()}
+
+
+@router.get("/admin/tools/stats", dependencies=[Depends(require_admin)])
+async def get_tool_stats(request: Request):
+    """Per-tool execution policy, call/error/timeout/retry counts and latency histogram, plus planner catalog sizes."""
+    return {"status": 1, "tools": tool_registry.stats(), "catalog": tool_catalog.stats()}
+
+
+@router.get("/admin/prefetch/stats", dependencies=[Depends(require_admin)])
+async def get_prefetch_stats(request: Request):
+    """Speculative read-only steps run during HITL waits: used, discarded and time saved after the response."""
+    return {"status": 1, "prefetch": prefetch_stats.stats()}
+
+
+@router.get("/admin/plan-optimizer/stats", dependencies=[Depends(require_admin)])
+async def get_plan_optimizer_stats(request: Request):
+    """Plan rewrites before execution: duplicate reads removed, writes merged, reads hoisted, steps eliminated."""
+    return {"status": 1, "optimizer": plan_optimizer_stats.stats()}
+
+
+@router.get("/admin/intent/stats", dependencies=[Depends(require_admin)])
+async def get_intent_stats(request: Request):
+    """Requests the local intent classifier sent past the planner, and why the others went to it."""
+    return {"status": 1, "intent": intent_router.stats()}
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus histograms of workflow spans: model calls (and TTFT, tokens), Google calls and database writes."""
+    return PlainTextResponse(span_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/admin/tracing/stats", dependencies=[Depends(require_admin)])
+async def get_tracing_stats(request: Request):
+    """OTLP trace export: spans exported, dropped and failed, and where they go."""
+    return {"status": 1, "tracing": trace_exporter.stats()}
+
+
+@router.get("/admin/model-routing/stats", dependencies=[Depends(require_admin)])
+async def get_model_routing_stats(request: Request):
+    """Model of every workflow stage, with calls, JSON escalations, tokens and cost so far."""
+    return {"status": 1, "routing": model_router.stats()}
@@ -0,0 +1,239 @@
+"""
+Monthly partitioning of chat_messages and cold-session archival.
+
+- `migrate_to_partitioned` converts an existing chat_messages table into a table
+  range-partitioned by month on created_at (Postgres only, idempotent).
+- `ensure_monthly_partitions` keeps partitions created ahead of time.
+- `archive_idle_sessions` moves sessions idle for N days into chat_session_archives
+  as a single zstd-compressed JSON blob and deletes their rows.
+- `rehydrate_session` restores an archived session on demand; history readers call it
+  on every cache miss so archival stays invisible to clients.
+
+Run the job manually with:
+    python -m services.chat_archive --idle-days 30
+"""
+import os
+import json
+import asyncio
+import argparse
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional
+
+import zstandard
+from sqlalchemy import select, delete, insert, text, DateTime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import AsyncSessionLocal, ChatMessage, ChatSessionArchive
+from services.session_cache import session_cache
+
+CHAT_ARCHIVE_ENABLED = os.environ.get("CHAT_ARCHIVE_ENABLED", "false").lower() == "true"
+CHAT_ARCHIVE_IDLE_DAYS = int(os.environ.get("CHAT_ARCHIVE_IDLE_DAYS", 30))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.environ.get("CHAT_ARCHIVE_BATCH_SIZE", 200))
+CHAT_ARCHIVE_INTERVAL_SEC = int(os.environ.get("CHAT_ARCHIVE_INTERVAL_SEC", 3600))
+CHAT_PARTITION_MONTHS_AHEAD = int(os.environ.get("CHAT_PARTITION_MONTHS_AHEAD", 2))
+ZSTD_LEVEL = 10
+
+ARCHIVE_COLUMNS = [c.name for c in ChatMessage.__table__.columns]
+DATETIME_COLUMNS = {c.name for c in ChatMessage.__table__.columns if isinstance(c.type, DateTime)}
+
+
+# --- partitioning (Postgres) ---
+
+def _month_start(d: datetime) -> datetime:
+    return d.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _add_months(d: datetime, months: int) -> datetime:
+    month = d.month - 1 + months
+    return d.replace(year=d.year + month // 12, month=month % 12 + 1)
+
+def partition_name(month: datetime) -> str:
+    return f"chat_messages_y{month.year}m{month.month:02d}"
+
+
+async def is_partitioned(conn) -> bool:
+    return bool((await conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'chat_messages')"
+    ))).scalar())
+
+
+async def ensure_monthly_partitions(conn, start: datetime = None, months_ahead: int = CHAT_PARTITION_MONTHS_AHEAD):
+    """Create one partition per month from `start` (default: this month) through `months_ahead` months."""
+    now = datetime.now(timezone.utc)
+    month = _month_start(start or now)
+    last = _add_months(_month_start(now), months_ahead)
+    while month <= last:
+        upper = _add_months(month, 1)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF chat_messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        month = upper
+
+
+async def migrate_to_partitioned(conn):
+    """
+    One-time conversion of chat_messages into a monthly range-partitioned table.
+    The primary key becomes (id, created_at) because Postgres requires the partition
+    key in every unique constraint; ids keep coming from the same sequence.
+    """
+    if await is_partitioned(conn):
+        return False
+    oldest = (await conn.execute(text("SELECT min(created_at) FROM chat_messages"))).scalar()
+    for statement in (
+        "ALTER TABLE chat_messages RENAME TO chat_messages_unpartitioned",
+        "ALTER INDEX IF EXISTS ix_chat_messages_session_id RENAME TO ix_chat_messages_unpartitioned_session_id",
+        "ALTER INDEX IF EXISTS ix_chat_messages_user_created RENAME TO ix_chat_messages_unpartitioned_user_created",
+        "ALTER INDEX IF EXISTS ix_chat_messages_content_fts RENAME TO ix_chat_messages_unpartitioned_content_fts",
+        "ALTER INDEX IF EXISTS ix_chat_messages_id RENAME TO ix_chat_messages_unpartitioned_id",
+        "CREATE TABLE chat_messages (LIKE chat_messages_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)",
+        "UPDATE chat_messages_unpartitioned SET created_at = now() WHERE created_at IS NULL",
+        "ALTER TABLE chat_messages ALTER COLUMN created_at SET NOT NULL",
+        "ALTER TABLE chat_messages ADD PRIMARY KEY (id, created_at)",
+        "ALTER TABLE chat_messages ADD FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE",
+        "ALTER SEQUENCE IF EXISTS chat_messages_id_seq OWNED BY chat_messages.id",
+        "CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT",
+    ):
+        await conn.execute(text(statement))
+    # Partitions must exist before the copy, rows landing in DEFAULT would block creating them later
+    await ensure_monthly_partitions(conn, start=oldest)
+    for statement in (
+        "INSERT INTO chat_messages SELECT * FROM chat_messages_unpartitioned",
+        "CREATE INDEX ix_chat_messages_id ON chat_messages (id)",
+        "CREATE INDEX ix_chat_messages_session_id ON chat_messages (session_id)",
+        "CREATE INDEX ix_chat_messages_user_created ON chat_messages (user_id, created_at)",
+        "CREATE INDEX ix_chat_messages_content_fts ON chat_messages USING gin (to_tsvector('english', coalesce(content, '')))",
+        "DROP TABLE chat_messages_unpartitioned",
+    ):
+        await conn.execute(text(statement))
+    print(f"[CHAT ARCHIVE] chat_messages converted to monthly partitions (oldest row: {oldest})")
+    return True
+
+
+# --- archive blobs ---
+
+def pack_messages(rows: List[Dict[str, Any]]) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(json.dumps(rows, default=str).encode("utf-8"))
+
+def unpack_messages(blob: bytes) -> List[Dict[str, Any]]:
+    rows = json.loads(zstandard.ZstdDecompressor().decompress(blob))
+    for row in rows:
+        for col in DATETIME_COLUMNS:
+            if row.get(col):
+                row[col] = datetime.fromisoformat(row[col])
+    return rows
+
+
+async def archive_session(db: AsyncSession, session_id: str) -> int:
+    """Move every row of a session into one compressed archive blob. Returns the number of archived messages."""
+    messages = (await db.execute(
+        select(ChatMessage).where(ChatMessage.session_id == session_id).order_by(ChatMessage.id.asc())
+    )).scalars().all()
+    if not messages:
+        return 0
+    rows = [{col: getattr(m, col) for col in ARCHIVE_COLUMNS} for m in messages]
+    first_user = next((m.content for m in messages if m.role == "user" and m.content), None)
+    archive = await db.get(ChatSessionArchive, session_id)
+    if archive is not None:
+        # Rows written while the session sat in the archive: merge them into the existing blob
+        rows = unpack_messages(archive.payload) + rows
+        await db.delete(archive)
+        await db.flush()
+    db.add(ChatSessionArchive(
+        session_id=session_id,
+        user_id=messages[0].user_id,
+        title=(first_user or "")[:255] or None,
+        message_count=len(rows),
+        first_message_at=rows[0]["created_at"],
+        last_message_at=messages[-1].created_at,
+        payload=pack_messages(rows),
+    ))
+    await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+    await db.commit()
+    await session_cache.invalidate(session_id)
+    return len(messages)
+
+
+async def rehydrate_session(db: AsyncSession, session_id: str, user_id: Optional[int] = None) -> int:
+    """
+    Restore an archived session into chat_messages (original ids and timestamps). No-op if
+    not archived, or when `user_id` is given and the archive belongs to another user.
+    """
+    archive = await db.get(ChatSessionArchive, session_id)
+    if archive is None or (user_id is not None and archive.user_id != user_id):
+        return 0
+    rows = unpack_messages(archive.payload)
+    try:
+        await db.execute(insert(ChatMessage), rows)
+        await db.delete(archive)
+        await db.commit()
+    except IntegrityError:
+        # Another request rehydrated the same session concurrently
+        await db.rollback()
+        return 0
+    await session_cache.invalidate(session_id)
+    print(f"[CHAT ARCHIVE] Rehydrated session {session_id} ({len(rows)} messages)")
+    return len(rows)
+
+
+async def find_idle_sessions(db: AsyncSession, idle_days: int, limit: int) -> List[str]:
+    """Sessions whose newest message is older than the cutoff; only old partitions are scanned."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=idle_days)
+    recent = aliased(ChatMessage)
+    has_recent = select(recent.id).where(recent.session_id == ChatMessage.session_id, recent.created_at >= cutoff).exists()
+    result = await db.execute(
+        select(ChatMessage.session_id).where(ChatMessage.created_at < cutoff, ~has_recent).distinct().limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def archive_idle_sessions(idle_days: int = CHAT_ARCHIVE_IDLE_DAYS, batch_size: int = CHAT_ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+    """Archive every session idle for `idle_days`, `batch_size` sessions per round."""
+    sessions = messages = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            batch = await find_idle_sessions(db, idle_days, batch_size)
+            if not batch:
+                break
+            for session_id in batch:
+                messages += await archive_session(db, session_id)
+                sessions += 1
+            if len(batch) < batch_size:
+                break
+    print(f"[CHAT ARCHIVE] Archived {sessions} sessions ({messages} messages) idle for {idle_days}+ days")
+    return {"sessions": sessions, "messages": messages}
+
+
+async def run_archival_loop(engine, interval: int = CHAT_ARCHIVE_INTERVAL_SEC):
+    """Background job: keep partitions ahead of time and archive idle sessions periodically."""
+    while True:
+        try:
+            if engine.dialect.name == "postgresql":
+                async with engine.begin() as conn:
+                    if await is_partitioned(conn):
+                        await ensure_monthly_partitions(conn)
+            await archive_idle_sessions()
+        except Exception as e:
+            print(f"[CHAT ARCHIVE] Archival run failed: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from models import async_engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--idle-days", type=int, default=CHAT_ARCHIVE_IDLE_DAYS)
+    parser.add_argument("--batch-size", type=int, default=CHAT_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--partition", action="store_true", help="convert chat_messages to monthly partitions first")
+    args = parser.parse_args()
+
+    async def main():
+        if args.partition:
+            async with async_engine.begin() as conn:
+                await migrate_to_partitioned(conn)
+        await archive_idle_sessions(args.idle_days, args.batch_size)
+        await async_engine.dispose()
+
+    asyncio.run(main())
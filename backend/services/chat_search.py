@@ -0,0 +1,93 @@
+"""
+Full-text search over a user's chat history.
+
+Postgres uses the GIN expression index on chat_messages.content (see models/chat_history.py)
+with websearch_to_tsquery, ts_rank_cd ranking and ts_headline highlighting.
+SQLite (local tests) falls back to the chat_messages_fts FTS5 table with bm25 + snippet.
+"""
+from typing import Dict, Any, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.chat_history import CONTENT_TSVECTOR_SQL
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+MAX_PAGE_SIZE = 50
+
+# ts_headline is expensive, so it only runs on the rows of the requested page
+POSTGRES_SEARCH_SQL = f"""
+WITH hits AS (
+    SELECT id, session_id, role, content, created_at,
+           ts_rank_cd({CONTENT_TSVECTOR_SQL}, q) AS rank
+    FROM chat_messages, websearch_to_tsquery('english', :query) AS q
+    WHERE user_id = :user_id AND {CONTENT_TSVECTOR_SQL} @@ q
+    ORDER BY rank DESC, id DESC
+    LIMIT :limit OFFSET :offset
+)
+SELECT id, session_id, role, created_at, rank,
+       ts_headline('english', coalesce(content, ''), websearch_to_tsquery('english', :query),
+                   'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=20, MinWords=5') AS headline
+FROM hits
+ORDER BY rank DESC, id DESC
+"""
+
+SQLITE_SEARCH_SQL = f"""
+SELECT m.id, m.session_id, m.role, m.created_at,
+       -bm25(chat_messages_fts) AS rank,
+       snippet(chat_messages_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '...', 24) AS headline
+FROM chat_messages_fts
+JOIN chat_messages m ON m.id = chat_messages_fts.rowid
+WHERE chat_messages_fts MATCH :query AND m.user_id = :user_id
+ORDER BY rank DESC, m.id DESC
+LIMIT :limit OFFSET :offset
+"""
+
+
+def to_fts5_query(query: str) -> str:
+    """Quote every term so user input is never parsed as FTS5 syntax (AND/OR/NEAR, column filters)."""
+    terms = [t.replace('"', '""') for t in query.split() if t.strip('"')]
+    return " ".join(f'"{t}"' for t in terms)
+
+
+async def search_chat_messages(db: AsyncSession, user_id: int, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+    """
+    Rank the user's messages against a free-text query.
+
+    Returns one page of hits plus `has_more`; no total count is computed so deep
+    result sets never force a full scan of the matching rows.
+    """
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    dialect = db.bind.dialect.name
+
+    if dialect == "sqlite":
+        sql, bound_query = SQLITE_SEARCH_SQL, to_fts5_query(query)
+    else:
+        sql, bound_query = POSTGRES_SEARCH_SQL, query
+
+    if not bound_query.strip():
+        return {"results": [], "page": page, "page_size": page_size, "has_more": False}
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.execute(text(sql), {
+        "query": bound_query,
+        "user_id": user_id,
+        "limit": page_size + 1,
+        "offset": (page - 1) * page_size,
+    })).mappings().all()
+
+    results: List[Dict[str, Any]] = []
+    for row in rows[:page_size]:
+        created_at = row["created_at"]
+        results.append({
+            "id": row["id"],
+            "session_id": row["session_id"],
+            "role": row["role"],
+            "headline": row["headline"],
+            "rank": float(row["rank"] or 0),
+            "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+        })
+
+    return {"results": results, "page": page, "page_size": page_size, "has_more": len(rows) > page_size}
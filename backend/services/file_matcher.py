@@ -0,0 +1,199 @@
+"""
+Local ranking of Drive listings against the user's search.
+
+`rank_files` scores every file by name similarity (character trigrams plus fuzzy
+token-set overlap), compatibility of its type with what the query/goal asks for
+(spreadsheet, pdf, document...) and recency, and returns the same
+`matches`/`best_match_id` structure as the LLM validator in `find_similar_files`.
+`ambiguous` is set when the top candidates score too close to call; only then does
+the caller hand those candidates (`candidates`: ids within the margin of the best
+score) to the LLM.
+"""
+import os
+import re
+import math
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, FrozenSet, Tuple
+
+# Top-two score gap below which the LLM breaks the tie
+FILE_MATCH_LLM_MARGIN = float(os.environ.get("FILE_MATCH_LLM_MARGIN", 0.08))
+HIGH_SCORE = 0.75
+MEDIUM_SCORE = 0.45
+MAX_MATCHES = 10
+
+NAME_WEIGHT, TYPE_WEIGHT, RECENCY_WEIGHT = 0.75, 0.15, 0.10
+RECENCY_HALF_LIFE_DAYS = 60
+
+_STOPWORDS = {
+    "a", "an", "the", "my", "me", "i", "of", "for", "to", "in", "on", "and", "or", "with", "from", "about",
+    "find", "open", "read", "show", "get", "fetch", "search", "look", "named", "called", "please", "file", "files",
+    "content", "contents", "drive", "google", "this", "that", "it", "what", "is", "at", "summarize",
+}
+KIND_KEYWORDS = {
+    "spreadsheet": {"spreadsheet", "spreadsheets", "sheet", "sheets", "excel", "xlsx", "xls", "csv"},
+    "pdf": {"pdf", "pdfs"},
+    "document": {"doc", "docs", "document", "documents", "docx", "word", "txt"},
+    "presentation": {"slides", "slide", "presentation", "deck", "ppt", "pptx"},
+    "image": {"image", "images", "photo", "photos", "picture", "png", "jpg", "jpeg"},
+    "video": {"video", "videos", "mp4", "movie", "recording"},
+    "folder": {"folder", "folders", "directory"},
+}
+_EXTENSION_KINDS = {
+    "xlsx": "spreadsheet", "xls": "spreadsheet", "csv": "spreadsheet", "pdf": "pdf",
+    "doc": "document", "docx": "document", "txt": "document", "md": "document",
+    "ppt": "presentation", "pptx": "presentation", "png": "image", "jpg": "image", "jpeg": "image", "gif": "image",
+    "mp4": "video", "mov": "video",
+}
+_GENERIC_NAMES = {"untitled", "copy", "new", "document", "spreadsheet", "untitled document", "untitled spreadsheet"}
+
+
+def _split_words(text: str) -> List[str]:
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+@lru_cache(maxsize=65536)
+def _trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def file_kind(mime_type: str, name: str) -> str:
+    mime = (mime_type or "").lower()
+    for needle, kind in (("folder", "folder"), ("spreadsheet", "spreadsheet"), ("excel", "spreadsheet"), ("csv", "spreadsheet"),
+                         ("pdf", "pdf"), ("presentation", "presentation"), ("powerpoint", "presentation"),
+                         ("document", "document"), ("msword", "document"), ("text/", "document"),
+                         ("image/", "image"), ("video/", "video")):
+        if needle in mime:
+            return kind
+    ext = name.rsplit(".", 1)[-1].lower() if "." in (name or "") else ""
+    return _EXTENSION_KINDS.get(ext, "other")
+
+
+@lru_cache(maxsize=65536)
+def _name_features(name: str) -> Tuple[str, FrozenSet[str], FrozenSet[str]]:
+    """Normalized stem, token set and trigram set of a file name (cached across listings)."""
+    stem = re.sub(r"\.[A-Za-z0-9]{1,5}$", "", name or "")
+    words = _split_words(stem)
+    normalized = " ".join(words)
+    return normalized, frozenset(words), _trigrams(normalized)
+
+
+def _token_score(query_tokens: List[str], name_tokens: FrozenSet[str]) -> float:
+    """Fuzzy token-set coverage: each query token takes its best exact, prefix or trigram match."""
+    if not query_tokens or not name_tokens:
+        return 0.0
+    total = 0.0
+    for token in query_tokens:
+        if token in name_tokens:
+            total += 1.0
+            continue
+        best = 0.0
+        token_grams = _trigrams(token)
+        for candidate in name_tokens:
+            if len(token) >= 3 and (candidate.startswith(token) or token.startswith(candidate) and len(candidate) >= 3):
+                best = max(best, 0.9)
+            else:
+                grams = _trigrams(candidate)
+                best = max(best, len(token_grams & grams) / len(token_grams | grams))
+        total += best if best >= 0.4 else 0.0
+    return total / len(query_tokens)
+
+
+@lru_cache(maxsize=65536)
+def _timestamp(modified: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _recency_score(modified: str, now: float) -> float:
+    ts = _timestamp(modified) if modified else None
+    if ts is None:
+        return 0.5
+    return math.exp(-max(now - ts, 0) / 86400 * math.log(2) / RECENCY_HALF_LIFE_DAYS)
+
+
+def query_terms(search_query: str, user_goal: str = "") -> Tuple[List[str], set]:
+    """Name tokens to match and the file kinds the user asked for (kind words are not name tokens)."""
+    words = [w for w in _split_words(search_query) if w not in _STOPWORDS]
+    goal_words = [w for w in _split_words(user_goal) if w not in _STOPWORDS]
+    kinds = {kind for kind, keywords in KIND_KEYWORDS.items() if keywords & set(words + goal_words)}
+    name_tokens = [w for w in words if not any(w in kw for kw in KIND_KEYWORDS.values())]
+    if not name_tokens:
+        # No explicit search term: fall back to the content words of the goal
+        name_tokens = [w for w in (words or goal_words) if not any(w in kw for kw in KIND_KEYWORDS.values())]
+    return name_tokens, kinds
+
+
+def score_file(name_tokens: List[str], query_normalized: str, query_grams: FrozenSet[str], kinds: set,
+               f: Dict[str, Any], now: float) -> Tuple[float, float, str, bool]:
+    """(score, name similarity, kind, exact name match) for one file."""
+    normalized, tokens, grams = _name_features(f.get("name") or "")
+    exact = bool(query_normalized) and normalized == query_normalized
+    shared = len(query_grams & grams)
+    trigram = shared / (len(query_grams) + len(grams) - shared) if query_grams and grams else 0.0
+    if exact:
+        name_sim = 1.0
+    elif shared == 0:
+        # No character trigram in common: no token can match either
+        name_sim = 0.0
+    else:
+        name_sim = 0.7 * _token_score(name_tokens, tokens) + 0.3 * trigram
+    kind = file_kind(f.get("mimeType"), f.get("name") or "")
+    type_score = 0.5 if not kinds else (1.0 if kind in kinds else 0.0)
+    score = NAME_WEIGHT * name_sim + TYPE_WEIGHT * type_score + RECENCY_WEIGHT * _recency_score(f.get("modifiedTime"), now)
+    if kinds and kind not in kinds:
+        # e.g. an mp4 when the user asked for a document
+        score *= 0.4
+    if normalized in _GENERIC_NAMES:
+        score *= 0.5
+    return round(score, 4), name_sim, kind, exact
+
+
+def rank_files(search_query: str, files: List[Dict], user_goal: str = "", margin: float = FILE_MATCH_LLM_MARGIN) -> Dict[str, Any]:
+    """Rank a Drive listing locally. Same shape as `find_similar_files`, plus `ambiguous`."""
+    if not files:
+        return {"matches": [], "message": "No files available in Drive", "ambiguous": False}
+    name_tokens, kinds = query_terms(search_query, user_goal)
+    query_normalized = " ".join(name_tokens)
+    query_grams = _trigrams(query_normalized) if query_normalized else frozenset()
+    now = datetime.now(timezone.utc).timestamp()
+
+    scored = []
+    for f in files:
+        score, name_sim, kind, exact = score_file(name_tokens, query_normalized, query_grams, kinds, f, now)
+        if score >= MEDIUM_SCORE:
+            scored.append((score, name_sim, kind, exact, f))
+    scored.sort(key=lambda s: -s[0])
+    scored = scored[:MAX_MATCHES]
+
+    matches = []
+    for score, name_sim, kind, exact, f in scored:
+        matches.append({
+            "id": f.get("id"),
+            "name": f.get("name"),
+            "mimeType": f.get("mimeType", "unknown"),
+            "relevance_score": score,
+            "relevance_label": "High" if score >= HIGH_SCORE else "Medium",
+            "reason": f"{'Exact name match' if exact else f'Name similarity {name_sim:.2f}'}, {kind}"
+                      + (" as requested" if kind in kinds else ""),
+        })
+
+    result = {"matches": matches, "message": f"{len(matches)} relevant of {len(files)} files", "ambiguous": False}
+    if not matches:
+        return result
+    exact_matches = [s for s in scored if s[3]]
+    top, second = scored[0][0], scored[1][0] if len(scored) > 1 else 0.0
+    if len(exact_matches) == 1 and (not kinds or exact_matches[0][2] in kinds):
+        result["best_match_id"] = exact_matches[0][4].get("id")
+    elif top >= HIGH_SCORE and (len(scored) == 1 or (second < HIGH_SCORE and top - second >= 0.25)):
+        # One strong candidate, everything else far behind
+        result["best_match_id"] = scored[0][4].get("id")
+    elif len(scored) > 1 and top - second < margin and not exact_matches:
+        # Too close to call locally
+        result["ambiguous"] = True
+        result["candidates"] = [s[4].get("id") for s in scored if top - s[0] < margin]
+    return result
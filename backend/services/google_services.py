@@ -5,7 +5,9 @@ import traceback
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 
-from sqlalchemy.orm import Session
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
@@ -17,11 +19,11 @@ from models.google_token import GoogleToken
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET")
 
-def get_google_credentials(db: Session, user_id: int) -> Optional[Credentials]:
+async def get_google_credentials(db: AsyncSession, user_id: int) -> Optional[Credentials]:
     """
     Retrieves and refreshes Google OAuth credentials for a user.
     """
-    token_record = db.query(GoogleToken).filter(GoogleToken.user_id == user_id).first()
+    token_record = (await db.execute(select(GoogleToken).filter(GoogleToken.user_id == user_id))).scalars().first()
     if not token_record:
         print(f"[GOOGLE SERVICE] No tokens found for user {user_id}")
         return None
@@ -37,11 +39,12 @@ def get_google_credentials(db: Session, user_id: int) -> Optional[Credentials]:
 
     if creds.expired and creds.refresh_token:
         try:
-            creds.refresh(Request())
+            # Token refresh is a blocking HTTP call, keep it off the event loop
+            await asyncio.to_thread(creds.refresh, Request())
             # Update database with new access token
             token_record.access_token = creds.token
             token_record.expires_at = datetime.now(timezone.utc) + timedelta(seconds=3600) # Default expiry
-            db.commit()
+            await db.commit()
             print(f"[GOOGLE SERVICE] Refreshed tokens for user {user_id}")
         except RefreshError as e:
             print(f"[GOOGLE SERVICE] Failed to refresh tokens for user {user_id}: {e}")
@@ -49,25 +52,29 @@ def get_google_credentials(db: Session, user_id: int) -> Optional[Credentials]:
 
     return creds
 
-def get_service(db: Session, user_id: int, service_name: str, version: str) -> Optional[Resource]:
+async def _execute(request):
+    """Run a googleapiclient request in a worker thread; `.execute()` is blocking I/O."""
+    return await asyncio.to_thread(request.execute)
+
+async def get_service(db: AsyncSession, user_id: int, service_name: str, version: str) -> Optional[Resource]:
     """Generic function to get a Google API service."""
-    creds = get_google_credentials(db, user_id)
+    creds = await get_google_credentials(db, user_id)
     if not creds:
         return None
     return build(service_name, version, credentials=creds)
 
 # --- CALENDAR TOOLS ---
 
-async def check_calendar_availability(db: Session, user_id: int, parameters: dict) -> dict:
+async def check_calendar_availability(db: AsyncSession, user_id: int, parameters: dict) -> dict:
     days = int(parameters.get("days", 7))
-    service = get_service(db, user_id, 'calendar', 'v3')
+    service = await get_service(db, user_id, 'calendar', 'v3')
     if not service: return {"error": "Google Calendar not connected"}
     now = datetime.now(timezone.utc)
-    result = service.freebusy().query(body={"timeMin": now.isoformat(), "timeMax": (now + timedelta(days=days)).isoformat(), "items": [{"id": "primary"}]}).execute()
+    result = await _execute(service.freebusy().query(body={"timeMin": now.isoformat(), "timeMax": (now + timedelta(days=days)).isoformat(), "items": [{"id": "primary"}]}))
     return {"status": "success", "busy": result.get('calendars', {}).get('primary', {}).get('busy', [])}
 
-async def schedule_calendar_event(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'calendar', 'v3')
+async def schedule_calendar_event(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'calendar', 'v3')
     if not service: return {"error": "Google Calendar not connected"}
     event = {
         'summary': parameters.get('title', 'Meeting'),
@@ -76,30 +83,30 @@ async def schedule_calendar_event(db: Session, user_id: int, parameters: dict) -
         'end': {'dateTime': parameters.get('end_time'), 'timeZone': 'UTC'},
         'attendees': [{'email': parameters.get('attendee_email')}] if parameters.get('attendee_email') else []
     }
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
+    created_event = await _execute(service.events().insert(calendarId='primary', body=event))
     return {"status": "success", "event_id": created_event.get('id'), "link": created_event.get('htmlLink')}
 
-async def update_calendar_event(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'calendar', 'v3')
+async def update_calendar_event(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'calendar', 'v3')
     if not service: return {"error": "Google Calendar not connected"}
     event_id = parameters.get("event_id")
-    event = service.events().get(calendarId='primary', eventId=event_id).execute()
+    event = await _execute(service.events().get(calendarId='primary', eventId=event_id))
     if parameters.get('title'): event['summary'] = parameters.get('title')
     if parameters.get('start_time'): event['start'] = {'dateTime': parameters.get('start_time'), 'timeZone': 'UTC'}
     if parameters.get('end_time'): event['end'] = {'dateTime': parameters.get('end_time'), 'timeZone': 'UTC'}
-    updated_event = service.events().update(calendarId='primary', eventId=event_id, body=event).execute()
+    updated_event = await _execute(service.events().update(calendarId='primary', eventId=event_id, body=event))
     return {"status": "success", "event_id": updated_event.get('id')}
 
-async def delete_calendar_event(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'calendar', 'v3')
+async def delete_calendar_event(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'calendar', 'v3')
     if not service: return {"error": "Google Calendar not connected"}
-    service.events().delete(calendarId='primary', eventId=parameters.get("event_id")).execute()
+    await _execute(service.events().delete(calendarId='primary', eventId=parameters.get("event_id")))
     return {"status": "success", "message": "Event deleted"}
 
 # --- GMAIL TOOLS ---
 
-async def send_email(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'gmail', 'v1')
+async def send_email(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'gmail', 'v1')
     if not service: return {"error": "Gmail not connected"}
     
     from email.mime.text import MIMEText
@@ -118,40 +125,40 @@ async def send_email(db: Session, user_id: int, parameters: dict) -> dict:
     message['subject'] = parameters.get("subject", "")
     
     raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    sent_message = service.users().messages().send(userId='me', body={'raw': raw}).execute()
+    sent_message = await _execute(service.users().messages().send(userId='me', body={'raw': raw}))
     return {"status": "success", "message_id": sent_message.get('id'), "recipients": to_email}
 
-async def read_emails(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'gmail', 'v1')
+async def read_emails(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'gmail', 'v1')
     if not service: return {"error": "Gmail not connected"}
-    results = service.users().messages().list(userId='me', q=parameters.get("query", ""), maxResults=parameters.get("max_results", 10)).execute()
+    results = await _execute(service.users().messages().list(userId='me', q=parameters.get("query", ""), maxResults=parameters.get("max_results", 10)))
     emails = []
     for msg in results.get('messages', []):
-        m = service.users().messages().get(userId='me', id=msg['id'], format='metadata').execute()
+        m = await _execute(service.users().messages().get(userId='me', id=msg['id'], format='metadata'))
         headers = {h['name']: h['value'] for h in m.get('payload', {}).get('headers', [])}
         emails.append({"id": msg['id'], "subject": headers.get('Subject'), "from": headers.get('From'), "snippet": m.get('snippet')})
     return {"status": "success", "emails": emails}
 
-async def delete_email(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'gmail', 'v1')
+async def delete_email(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'gmail', 'v1')
     if not service: return {"error": "Gmail not connected"}
-    service.users().messages().trash(userId='me', id=parameters.get("message_id")).execute()
+    await _execute(service.users().messages().trash(userId='me', id=parameters.get("message_id")))
     return {"status": "success", "message": "Email moved to trash"}
 
-async def update_email_labels(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'gmail', 'v1')
+async def update_email_labels(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'gmail', 'v1')
     if not service: return {"error": "Gmail not connected"}
     body = {
         "addLabelIds": parameters.get("add_labels", []),
         "removeLabelIds": parameters.get("remove_labels", [])
     }
-    service.users().messages().modify(userId='me', id=parameters.get("message_id"), body=body).execute()
+    await _execute(service.users().messages().modify(userId='me', id=parameters.get("message_id"), body=body))
     return {"status": "success"}
 
 # --- DRIVE TOOLS ---
 
-async def list_drive_files(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'drive', 'v3')
+async def list_drive_files(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
     
     query_parts = []
@@ -188,48 +195,48 @@ async def list_drive_files(db: Session, user_id: int, parameters: dict) -> dict:
     
     print(f"[GOOGLE DRIVE] Listing files with query: {final_query}")
     
-    results = service.files().list(
+    results = await _execute(service.files().list(
         pageSize=parameters.get("page_size", 10), 
         q=final_query,
-        fields="nextPageToken, files(id, name, mimeType, webViewLink)"
-    ).execute()
+        fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime)"
+    ))
     return {"status": "success", "files": results.get('files', [])}
 
-async def upload_to_drive(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'drive', 'v3')
+async def upload_to_drive(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
     from googleapiclient.http import MediaByteArrayUpload
     media = MediaByteArrayUpload(parameters.get('content', '').encode(), mime_type='text/plain')
-    file = service.files().create(body={'name': parameters.get('filename')}, media_body=media).execute()
+    file = await _execute(service.files().create(body={'name': parameters.get('filename')}, media_body=media))
     return {"status": "success", "file_id": file.get('id')}
 
-async def update_drive_file(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'drive', 'v3')
+async def update_drive_file(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
-    updated = service.files().update(fileId=parameters.get("file_id"), body={'name': parameters.get('filename')}).execute()
+    updated = await _execute(service.files().update(fileId=parameters.get("file_id"), body={'name': parameters.get('filename')}))
     return {"status": "success", "file_id": updated.get('id')}
 
-async def delete_drive_file(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'drive', 'v3')
+async def delete_drive_file(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
-    service.files().delete(fileId=parameters.get("file_id")).execute()
+    await _execute(service.files().delete(fileId=parameters.get("file_id")))
     return {"status": "success", "message": "File deleted"}
 
-async def read_drive_file_content(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'drive', 'v3')
+async def read_drive_file_content(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
     file_id = parameters.get("file_id")
     try:
-        file_metadata = service.files().get(fileId=file_id, fields="name, mimeType").execute()
+        file_metadata = await _execute(service.files().get(fileId=file_id, fields="name, mimeType"))
         mime_type = file_metadata.get("mimeType")
         
         if mime_type == "application/vnd.google-apps.document":
             # Google Doc - export to text
-            content = service.files().export(fileId=file_id, mimeType='text/plain').execute()
+            content = await _execute(service.files().export(fileId=file_id, mimeType='text/plain'))
             return {"status": "success", "content": content.decode('utf-8'), "name": file_metadata.get("name")}
         elif mime_type.startswith("text/"):
             # Text file
-            content = service.files().get_media(fileId=file_id).execute()
+            content = await _execute(service.files().get_media(fileId=file_id))
             return {"status": "success", "content": content.decode('utf-8'), "name": file_metadata.get("name")}
         elif mime_type == "application/pdf":
             # PDF - Use OCR via temporary Google Doc conversion
@@ -239,9 +246,9 @@ async def read_drive_file_content(db: Session, user_id: int, parameters: dict) -
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-async def read_drive_pdf_content(db: Session, user_id: int, file_id: str, file_name: str) -> dict:
+async def read_drive_pdf_content(db: AsyncSession, user_id: int, file_id: str, file_name: str) -> dict:
     """Extract text from PDF using Google Drive OCR (Convert to Doc)"""
-    service = get_service(db, user_id, 'drive', 'v3')
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
     
     try:
@@ -250,21 +257,21 @@ async def read_drive_pdf_content(db: Session, user_id: int, file_id: str, file_n
             'name': f"TEMP_OCR_{file_name}",
             'mimeType': 'application/vnd.google-apps.document'
         }
-        temp_doc = service.files().copy(
+        temp_doc = await _execute(service.files().copy(
             fileId=file_id,
             body=doc_metadata,
             fields='id'
-        ).execute()
+        ))
         temp_doc_id = temp_doc.get('id')
         
         # 2. Export the temp doc as plain text
-        content = service.files().export(
+        content = await _execute(service.files().export(
             fileId=temp_doc_id,
             mimeType='text/plain'
-        ).execute()
+        ))
         
         # 3. Delete the temporary doc
-        service.files().delete(fileId=temp_doc_id).execute()
+        await _execute(service.files().delete(fileId=temp_doc_id))
         
         return {
             "status": "success", 
@@ -276,28 +283,28 @@ async def read_drive_pdf_content(db: Session, user_id: int, file_id: str, file_n
     except Exception as e:
         return {"status": "error", "message": f"PDF OCR failed: {str(e)}"}
 
-async def get_drive_file_link(db: Session, user_id: int, file_id: str) -> dict:
+async def get_drive_file_link(db: AsyncSession, user_id: int, file_id: str) -> dict:
     """Get a webViewLink for the file or prepare content for proxy"""
-    service = get_service(db, user_id, 'drive', 'v3')
+    service = await get_service(db, user_id, 'drive', 'v3')
     if not service: return {"error": "Google Drive not connected"}
     try:
-        file = service.files().get(fileId=file_id, fields='webViewLink, webContentLink').execute()
+        file = await _execute(service.files().get(fileId=file_id, fields='webViewLink, webContentLink'))
         return {"status": "success", "link": file.get('webViewLink')}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 # --- SHEETS TOOLS ---
 
-async def create_spreadsheet(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'sheets', 'v4')
+async def create_spreadsheet(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'sheets', 'v4')
     if not service: return {"error": "Google Sheets not connected"}
     spreadsheet = {'properties': {'title': parameters.get('title', 'New Sheet')}}
-    result = service.spreadsheets().create(body=spreadsheet, fields='spreadsheetId').execute()
+    result = await _execute(service.spreadsheets().create(body=spreadsheet, fields='spreadsheetId'))
     return {"status": "success", "spreadsheet_id": result.get('spreadsheetId')}
 
-async def read_spreadsheet(db: Session, user_id: int, parameters: dict) -> dict:
+async def read_spreadsheet(db: AsyncSession, user_id: int, parameters: dict) -> dict:
     try:
-        service = get_service(db, user_id, 'sheets', 'v4')
+        service = await get_service(db, user_id, 'sheets', 'v4')
         if not service: return {"error": "Google Sheets not connected"}
         
         spreadsheet_id = parameters.get("spreadsheet_id")
@@ -306,13 +313,13 @@ async def read_spreadsheet(db: Session, user_id: int, parameters: dict) -> dict:
         # If range is specified, try reading it directly
         if user_range:
             try:
-                result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=user_range).execute()
+                result = await _execute(service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=user_range))
                 return {"status": "success", "values": result.get('values', [])}
             except Exception as e:
                 print(f"[RECOVERABLE ERROR] Failed to read specific range '{user_range}': {e}. Falling back to first sheet.")
         
         # Fallback or Default: Fetch spreadsheet metadata to find the first sheet name
-        spread_meta = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+        spread_meta = await _execute(service.spreadsheets().get(spreadsheetId=spreadsheet_id))
         sheets = spread_meta.get('sheets', [])
         if not sheets:
             return {"error": "No sheets found in spreadsheet"}
@@ -321,22 +328,22 @@ async def read_spreadsheet(db: Session, user_id: int, parameters: dict) -> dict:
         print(f"[LOGGER] Defaulting to first sheet: {first_sheet_name}")
         
         # Read the entire first sheet
-        result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=f"'{first_sheet_name}'!A:Z").execute()
+        result = await _execute(service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=f"'{first_sheet_name}'!A:Z"))
         return {"status": "success", "values": result.get('values', []), "range_used": first_sheet_name}
         
     except Exception as e:
         print(f"[ERROR] read_spreadsheet: {e}")
         return {"status": "error", "message": str(e)}
 
-async def update_spreadsheet_values(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'sheets', 'v4')
+async def update_spreadsheet_values(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'sheets', 'v4')
     if not service: return {"error": "Google Sheets not connected"}
     body = {'values': parameters.get("values", [])}
-    service.spreadsheets().values().update(spreadsheetId=parameters.get("spreadsheet_id"), range=parameters.get("range"), valueInputOption="RAW", body=body).execute()
+    await _execute(service.spreadsheets().values().update(spreadsheetId=parameters.get("spreadsheet_id"), range=parameters.get("range"), valueInputOption="RAW", body=body))
     return {"status": "success"}
 
-async def clear_spreadsheet_values(db: Session, user_id: int, parameters: dict) -> dict:
-    service = get_service(db, user_id, 'sheets', 'v4')
+async def clear_spreadsheet_values(db: AsyncSession, user_id: int, parameters: dict) -> dict:
+    service = await get_service(db, user_id, 'sheets', 'v4')
     if not service: return {"error": "Google Sheets not connected"}
-    service.spreadsheets().values().clear(spreadsheetId=parameters.get("spreadsheet_id"), range=parameters.get("range")).execute()
+    await _execute(service.spreadsheets().values().clear(spreadsheetId=parameters.get("spreadsheet_id"), range=parameters.get("range")))
     return {"status": "success"}
@@ -0,0 +1,405 @@
+"""
+Local intent classifier that lets one-shot requests skip the LLM planner.
+
+Most workflow traffic is a single read ("what's on my calendar tomorrow", "read my
+last 5 emails"), yet each request paid for the extract, plan, resolve and verify calls.
+`IntentClassifier` is a multinomial logistic regression over hashed features of the
+query's intent signature (the same masking the plan cache uses: emails, dates, numbers
+and quoted strings become placeholders): word unigrams and bigrams plus character
+trigrams, hashed into INTENT_HASH_BUCKETS buckets with crc32 so a model trained in one
+process scores the same in another. Labels are tool ids for single-tool requests and
+PLANNER_LABEL for everything else.
+
+`IntentRouter.route` turns a confident prediction into a one-step plan when the tool
+is read-only, needs no confirmation and `extract_arguments` (regexes, plus dateparser
+when it is installed) fills every required parameter. Anything else returns None and
+the request goes through the planner as before. Routing outcomes are counted in
+`IntentRouter.stats`.
+
+Train from the seed examples in intent_training.json plus the queries of successful
+runs in the workflow event log (one-step plans give their tool, longer plans the
+planner label):
+    python -m services.intent_classifier --from-log --out intent_model.json
+"""
+import os
+import re
+import json
+import math
+import time
+import zlib
+import random
+import asyncio
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from services.plan_cache import intent_signature
+
+try:
+    from dateparser.search import search_dates
+except ImportError:
+    search_dates = None
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+WORKFLOW_INTENT_ENABLED = os.environ.get("WORKFLOW_INTENT_ENABLED", "true").lower() == "true"
+WORKFLOW_INTENT_MODEL = os.environ.get("WORKFLOW_INTENT_MODEL", os.path.join(_BACKEND_DIR, "intent_model.json"))
+WORKFLOW_INTENT_MIN_CONFIDENCE = float(os.environ.get("WORKFLOW_INTENT_MIN_CONFIDENCE", 0.85))
+INTENT_TRAINING_PATH = os.path.join(_BACKEND_DIR, "intent_training.json")
+INTENT_HASH_BUCKETS = 1 << 18
+PLANNER_LABEL = "__planner__"
+MODEL_VERSION = 1
+
+
+def intent_features(query: str) -> List[int]:
+    """Hashed feature buckets of a query (duplicates kept: they count as term frequency)."""
+    words = intent_signature(query).split()
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"^{w}$"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return [zlib.crc32(g.encode()) % INTENT_HASH_BUCKETS for g in grams]
+
+
+def _softmax(scores: List[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed n-gram features, stored sparsely."""
+
+    def __init__(self, labels: List[str], weights: Dict[int, List[float]], bias: List[float]):
+        self.labels = labels
+        self.weights = weights
+        self.bias = bias
+
+    def probabilities(self, query: str) -> Dict[str, float]:
+        scores = list(self.bias)
+        features = intent_features(query)
+        scale = 1 / math.sqrt(len(features)) if features else 0.0
+        for bucket in features:
+            row = self.weights.get(bucket)
+            if row:
+                for k, w in enumerate(row):
+                    scores[k] += w * scale
+        return dict(zip(self.labels, _softmax(scores)))
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        probabilities = self.probabilities(query)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], epochs: int = 40, learning_rate: float = 0.5,
+              l2: float = 1e-4, seed: int = 0) -> "IntentClassifier":
+        """Fit on (query, label) pairs with plain SGD on the cross-entropy loss."""
+        labels = sorted({label for _, label in examples})
+        index = {label: k for k, label in enumerate(labels)}
+        data = []
+        for query, label in examples:
+            features = intent_features(query)
+            if features:
+                data.append((features, 1 / math.sqrt(len(features)), index[label]))
+        model = cls(labels, {}, [0.0] * len(labels))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch * 0.1)
+            for features, scale, target in data:
+                scores = list(model.bias)
+                for bucket in features:
+                    row = model.weights.get(bucket)
+                    if row:
+                        for k, w in enumerate(row):
+                            scores[k] += w * scale
+                probabilities = _softmax(scores)
+                for k, p in enumerate(probabilities):
+                    gradient = p - (1.0 if k == target else 0.0)
+                    model.bias[k] -= rate * gradient
+                    for bucket in features:
+                        row = model.weights.setdefault(bucket, [0.0] * len(labels))
+                        row[k] -= rate * (gradient * scale + l2 * row[k])
+        return model
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": MODEL_VERSION, "buckets": INTENT_HASH_BUCKETS, "labels": self.labels,
+            "bias": [round(b, 5) for b in self.bias],
+            "weights": {str(bucket): [round(w, 5) for w in row] for bucket, row in sorted(self.weights.items())
+                        if any(abs(w) >= 1e-4 for w in row)},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IntentClassifier":
+        if data.get("version") != MODEL_VERSION or data.get("buckets") != INTENT_HASH_BUCKETS:
+            raise ValueError(f"intent model version {data.get('version')} / {data.get('buckets')} buckets is not supported")
+        return cls(data["labels"], {int(bucket): row for bucket, row in data["weights"].items()}, data["bias"])
+
+    @classmethod
+    def load(cls, path: str = WORKFLOW_INTENT_MODEL) -> "IntentClassifier":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+
+# --- ARGUMENT EXTRACTION ---
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+                 "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30, "a": 1, "a couple of": 2, "a few": 3}
+_NUMBER = r"(\d+|" + "|".join(sorted(map(re.escape, _NUMBER_WORDS), key=len, reverse=True)) + r")"
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+_QUOTED = re.compile(r"\"([^\"]+)\"|'([^']{2,})'")
+_FILENAME = re.compile(r"\b[\w-]+\.(?:pdf|docx?|xlsx?|csv|pptx?|txt|md|json|png|jpe?g)\b", re.I)
+_MIME_TYPES = [
+    (re.compile(r"\bpdfs?\b", re.I), "application/pdf"),
+    (re.compile(r"\b(?:spreadsheets?|sheets)\b", re.I), "application/vnd.google-apps.spreadsheet"),
+    (re.compile(r"\b(?:google )?(?:docs|documents)\b", re.I), "application/vnd.google-apps.document"),
+    (re.compile(r"\bfolders?\b", re.I), "application/vnd.google-apps.folder"),
+]
+_DRIVE_NAME = re.compile(r"\b(?:named|called|titled|with (?:the )?name)\s+(.+?)(?:\s+(?:in|on|from)\s+(?:my\s+)?(?:google\s+)?drive\b|[?.!]|$)", re.I)
+_EMAIL_TOPIC = re.compile(r"\b(?:about|regarding|mentioning|with subject)\s+(?:the\s+|my\s+|an?\s+)?(.+?)(?:\s+from\b|[?.!]|$)", re.I)
+# Default for parameters a one-shot request usually leaves implicit
+DEFAULT_ARGUMENTS = {"check_calendar_availability": {"days": 7}}
+
+
+def _number(text: str) -> int:
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text.lower()]
+
+
+def calendar_days(query: str, today: Optional[date] = None) -> Optional[int]:
+    """Days from now that cover the period the query asks about (the tool looks `days` ahead)."""
+    today = today or date.today()
+    text = query.lower()
+    match = re.search(rf"\b(?:next|coming|following)\s+{_NUMBER}\s+days?\b|\b{_NUMBER}\s+days?\b", text)
+    if match:
+        return max(1, _number(match.group(1) or match.group(2)))
+    match = re.search(rf"\b(?:next|coming)\s+{_NUMBER}\s+weeks?\b|\b{_NUMBER}\s+weeks?\b", text)
+    if match:
+        return 7 * _number(match.group(1) or match.group(2))
+    if re.search(r"\b(?:today|tonight|this (?:morning|afternoon|evening))\b", text):
+        return 1
+    if re.search(r"\bday after tomorrow\b", text):
+        return 3
+    if re.search(r"\btomorrow\b", text):
+        return 2
+    if re.search(r"\b(?:this|the) weekend\b", text):
+        return (5 - today.weekday()) % 7 + 2
+    if re.search(r"\b(?:this|rest of the) week\b", text):
+        return 7 - today.weekday()
+    if re.search(r"\bnext week\b", text):
+        return 14 - today.weekday()
+    if re.search(r"\b(?:this|the) month\b", text):
+        return ((today.replace(day=28) + timedelta(days=4)).replace(day=1) - today).days
+    if re.search(r"\bnext month\b", text):
+        return 31 + ((today.replace(day=28) + timedelta(days=4)).replace(day=1) - today).days
+    match = re.search(r"\b(?:on |next |this )?(" + "|".join(_WEEKDAYS) + r")\b", text)
+    if match:
+        ahead = (_WEEKDAYS.index(match.group(1)) - today.weekday()) % 7 or 7
+        return ahead + 1
+    if search_dates is not None:
+        found = search_dates(query, settings={"PREFER_DATES_FROM": "future", "RELATIVE_BASE": datetime.combine(today, datetime.min.time())})
+        for _, when in found or []:
+            ahead = (when.date() - today).days
+            if ahead >= 0:
+                return ahead + 1
+    return None
+
+
+def _read_emails_arguments(query: str) -> Dict[str, Any]:
+    arguments, terms = {}, []
+    match = re.search(rf"\b{_NUMBER}\s+(?:\w+\s+)?(?:e-?mails?|messages?|mails)\b", query, re.I)
+    if match:
+        arguments["max_results"] = _number(match.group(1))
+    sender = re.search(rf"\bfrom\s+({_EMAIL})", query, re.I)
+    if sender:
+        terms.append(f"from:{sender.group(1)}")
+    if re.search(r"\bunread\b", query, re.I):
+        terms.append("is:unread")
+    if re.search(r"\bstarred\b", query, re.I):
+        terms.append("is:starred")
+    topic = _EMAIL_TOPIC.search(query)
+    if topic:
+        terms.append(topic.group(1).strip())
+    if terms:
+        arguments["query"] = " ".join(terms)
+    return arguments
+
+
+def _list_drive_files_arguments(query: str) -> Dict[str, Any]:
+    arguments = {}
+    quoted = _QUOTED.search(query)
+    filename = _FILENAME.search(query)
+    named = _DRIVE_NAME.search(query)
+    if quoted:
+        arguments["filename"] = quoted.group(1) or quoted.group(2)
+    elif filename:
+        arguments["filename"] = filename.group(0)
+    elif named:
+        arguments["filename"] = named.group(1).strip()
+    if "filename" not in arguments or not filename:
+        mime_type = next((mime for pattern, mime in _MIME_TYPES if pattern.search(query)), None)
+        if mime_type:
+            arguments["mime_type"] = mime_type
+    return arguments
+
+
+def extract_arguments(tool_id: str, query: str, today: Optional[date] = None) -> Dict[str, Any]:
+    """Arguments of a single-tool request from the query text alone (no LLM)."""
+    if tool_id == "check_calendar_availability":
+        days = calendar_days(query, today)
+        arguments = {"days": days} if days else {}
+    elif tool_id == "read_emails":
+        arguments = _read_emails_arguments(query)
+    elif tool_id == "list_drive_files":
+        arguments = _list_drive_files_arguments(query)
+    else:
+        arguments = {}
+    return {**DEFAULT_ARGUMENTS.get(tool_id, {}), **arguments}
+
+
+# --- ROUTING ---
+class IntentRouter:
+    def __init__(self, min_confidence: float = WORKFLOW_INTENT_MIN_CONFIDENCE, enabled: bool = WORKFLOW_INTENT_ENABLED):
+        self.classifier: Optional[IntentClassifier] = None
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self.counters = {"queries": 0, "routed": 0, "planner_label": 0, "low_confidence": 0, "not_read_only": 0,
+                         "missing_arguments": 0, "no_model": 0, "classify_ms": 0.0}
+
+    def load(self, path: str = WORKFLOW_INTENT_MODEL) -> "IntentRouter":
+        """Load the trained model; without one every request goes to the planner."""
+        try:
+            self.classifier = IntentClassifier.load(path)
+        except FileNotFoundError:
+            print(f"[INTENT] No intent model at {path}; every request goes to the planner")
+            self.classifier = None
+        return self
+
+    def route(self, query: str, registry, catalog) -> Optional[Dict[str, Any]]:
+        """{"tool_id", "arguments", "confidence"} for a confident single read, else None (use the planner)."""
+        if not self.enabled or not query:
+            return None
+        self.counters["queries"] += 1
+        if self.classifier is None:
+            self.counters["no_model"] += 1
+            return None
+        start = time.perf_counter()
+        label, confidence = self.classifier.predict(query)
+        self.counters["classify_ms"] += (time.perf_counter() - start) * 1000
+        if label == PLANNER_LABEL:
+            self.counters["planner_label"] += 1
+            return None
+        if confidence < self.min_confidence:
+            self.counters["low_confidence"] += 1
+            return None
+        spec, tool_def = registry.get(label), catalog.get(label)
+        if spec is None or tool_def is None or not spec.read_only or spec.confirm:
+            # A misread write would have side effects; those always go through the planner
+            self.counters["not_read_only"] += 1
+            return None
+        arguments = extract_arguments(label, query)
+        if any(arguments.get(p) in (None, "") for p in tool_def.get("must_required_params", [])):
+            self.counters["missing_arguments"] += 1
+            return None
+        self.counters["routed"] += 1
+        return {"tool_id": label, "arguments": arguments, "confidence": round(confidence, 4)}
+
+    def stats(self) -> Dict[str, Any]:
+        queries = self.counters["queries"]
+        classified = queries - self.counters["no_model"]
+        return {
+            **{k: v for k, v in self.counters.items() if k != "classify_ms"},
+            "routed_ratio": round(self.counters["routed"] / queries, 4) if queries else 0.0,
+            "avg_classify_ms": round(self.counters["classify_ms"] / classified, 3) if classified else None,
+            "min_confidence": self.min_confidence,
+            "labels": self.classifier.labels if self.classifier else [],
+            "enabled": self.enabled,
+        }
+
+
+# Process-wide router; its model is loaded by the workflow controller at import time
+intent_router = IntentRouter()
+
+
+# --- TRAINING ---
+def load_seed_examples(path: str = INTENT_TRAINING_PATH) -> List[Tuple[str, str]]:
+    with open(path) as f:
+        return [(e["query"], e["label"]) for e in json.load(f)]
+
+
+async def logged_examples() -> List[Tuple[str, str]]:
+    """(user goal, label) of every planned run in the workflow event log that finished successfully."""
+    from sqlalchemy import select
+    from models import AsyncSessionLocal, WorkflowEvent
+
+    examples, runs = [], {}
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(select(WorkflowEvent.session_id, WorkflowEvent.event_type, WorkflowEvent.payload)
+                                 .where(WorkflowEvent.event_type.in_(("plan_created", "workflow_finished")))
+                                 .order_by(WorkflowEvent.session_id, WorkflowEvent.seq))
+        async for session_id, event_type, payload in result:
+            if event_type == "plan_created":
+                runs[session_id] = payload
+                continue
+            run = runs.pop(session_id, None)
+            # Runs the classifier itself routed would only teach it its own answers
+            if run and payload.get("status") == "success" and run.get("user_goal") and not run.get("intent"):
+                tools = [s.get("tool_id") for s in run.get("plan") or []]
+                examples.append((run["user_goal"], tools[0] if len(tools) == 1 else PLANNER_LABEL))
+    return examples
+
+
+def evaluate(model: IntentClassifier, examples: List[Tuple[str, str]], min_confidence: float) -> Dict[str, Any]:
+    correct = routed = routed_wrong = 0
+    for query, label in examples:
+        predicted, confidence = model.predict(query)
+        correct += predicted == label
+        if predicted != PLANNER_LABEL and confidence >= min_confidence:
+            routed += 1
+            routed_wrong += predicted != label
+    n = len(examples) or 1
+    return {"accuracy": correct / n, "routed": routed / n, "routed_wrong": routed_wrong}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local intent classifier")
+    parser.add_argument("--seed", default=INTENT_TRAINING_PATH, help="labelled seed examples (JSON list of {query, label})")
+    parser.add_argument("--from-log", action="store_true", help="add the queries of successful runs in workflow_events")
+    parser.add_argument("--out", default=WORKFLOW_INTENT_MODEL)
+    parser.add_argument("--epochs", type=int, default=40)
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction held out to report accuracy before the final fit")
+    parser.add_argument("--min-confidence", type=float, default=WORKFLOW_INTENT_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    examples = load_seed_examples(args.seed) if args.seed else []
+    if args.from_log:
+        from models import async_engine
+
+        async def read_log():
+            try:
+                return await logged_examples()
+            finally:
+                await async_engine.dispose()
+        logged = asyncio.run(read_log())
+        print(f"{len(logged)} examples from the workflow event log")
+        examples += logged
+    if not examples:
+        raise SystemExit("no training examples")
+
+    shuffled = list(examples)
+    random.Random(0).shuffle(shuffled)
+    cut = int(len(shuffled) * (1 - args.holdout))
+    if args.holdout and 0 < cut < len(shuffled):
+        held_out = evaluate(IntentClassifier.train(shuffled[:cut], epochs=args.epochs), shuffled[cut:], args.min_confidence)
+        print(f"held out {len(shuffled) - cut}: accuracy {held_out['accuracy']:.1%}, confident single-tool predictions "
+              f"{held_out['routed']:.1%} ({held_out['routed_wrong']} of them wrong)")
+    model = IntentClassifier.train(examples, epochs=args.epochs)
+    model.save(args.out)
+    counts = {label: sum(1 for _, l in examples if l == label) for label in model.labels}
+    print(f"trained on {len(examples)} examples {counts}; {len(model.to_dict()['weights'])} weight rows -> {args.out}")
@@ -0,0 +1,149 @@
+"""
+Incremental parsing of a streamed JSON object.
+
+`IncrementalJSONParser` is fed the text deltas of a streamed structured-output response
+and reports values as soon as they are complete, without re-parsing the text seen so
+far: every element of the top-level arrays named in `item_sections` is reported when
+it closes, as (section, index, value), and every other top-level value when it
+closes, as (key, None, value). `result()` parses the whole text at the end.
+
+`schema_problems` checks a parsed value against the subset of JSON Schema the
+structured-output schemas use (type, properties, required, additionalProperties, items).
+"""
+import json
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+_WHITESPACE = " \t\r\n"
+_JSON_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "index", "start", "expect_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind          # "{" or "["
+        self.key = None           # object: key of the value being read
+        self.index = -1           # array: index of the element being read
+        self.start = None         # offset where the current child value starts
+        self.expect_key = kind == "{"
+
+
+class IncrementalJSONParser:
+    def __init__(self, item_sections: Iterable[str] = ()):
+        self.item_sections = set(item_sections)
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = self._escape = self._is_key = False
+        self._string_start = None
+        self._primitive_start = None
+        self.finished = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[int], Any]]:
+        """Consume the next text delta; returns the values completed by it."""
+        self.text += chunk
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_end(i + 1, events)
+                continue
+            if c in _WHITESPACE:
+                continue
+            if c in ",]}" and self._primitive_start is not None:
+                self._value_end(self._primitive_start, i, events)
+                self._primitive_start = None
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                frame = self._stack[-1] if self._stack else None
+                self._is_key = frame is not None and frame.kind == "{" and frame.expect_key
+                if not self._is_key:
+                    self._value_start(i)
+            elif c in "{[":
+                self._value_start(i)
+                self._stack.append(_Frame(c))
+            elif c in "}]":
+                frame = self._stack.pop()
+                self._value_end(self._parent_start(frame), i + 1, events)
+            elif c == ":":
+                self._stack[-1].expect_key = False
+            elif c == ",":
+                frame = self._stack[-1]
+                frame.expect_key = frame.kind == "{"
+            elif self._primitive_start is None:
+                self._primitive_start = i
+                self._value_start(i)
+        self._pos = len(text)
+        return events
+
+    def result(self) -> Any:
+        """The complete object (raises json.JSONDecodeError if the text is not valid JSON)."""
+        return json.loads(self.text)
+
+    def _parent_start(self, frame: _Frame) -> int:
+        # A closed container started where its parent recorded the child's start (0 for the root)
+        return self._stack[-1].start if self._stack else self.text.find(frame.kind)
+
+    def _value_start(self, i: int):
+        if self._stack:
+            frame = self._stack[-1]
+            frame.start = i
+            if frame.kind == "[":
+                frame.index += 1
+
+    def _string_end(self, end: int, events: list):
+        if self._is_key:
+            self._stack[-1].key = json.loads(self.text[self._string_start:end])
+            self._is_key = False
+        else:
+            self._value_end(self._string_start, end, events)
+
+    def _value_end(self, start: int, end: int, events: list):
+        depth = len(self._stack)
+        if depth == 0:
+            self.finished = True
+            return
+        root = self._stack[0]
+        if root.kind != "{":
+            return
+        if depth == 1:
+            if root.key not in self.item_sections:
+                events.append((root.key, None, json.loads(self.text[start:end])))
+        elif depth == 2 and root.key in self.item_sections and self._stack[1].kind == "[":
+            events.append((root.key, self._stack[1].index, json.loads(self.text[start:end])))
+
+
+def schema_problems(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """Where `value` breaks `schema`; an empty list means it is valid."""
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(isinstance(value, _JSON_TYPES[t]) and not (t in ("integer", "number") and isinstance(value, bool))
+                   for t in types):
+            return [f"{path}: expected {'/'.join(types)}, got {type(value).__name__}"]
+    problems = []
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                problems.append(f"{path}: missing '{key}'")
+        for key, item in value.items():
+            if key in properties:
+                problems.extend(schema_problems(item, properties[key], f"{path}.{key}"))
+            elif schema.get("additionalProperties") is False:
+                problems.append(f"{path}: unexpected '{key}'")
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            problems.extend(schema_problems(item, schema["items"], f"{path}[{i}]"))
+    return problems
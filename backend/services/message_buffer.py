@@ -0,0 +1,152 @@
+"""
+Batched persistence of workflow chat messages.
+
+`MessageWriteBuffer` collects the ChatMessage rows of one session and commits them
+together, in order, in a session of its own (so a flush never competes with the
+caller's AsyncSession):
+
+- on a timer, MESSAGE_FLUSH_INTERVAL_MS after the first buffered message,
+- right away once MESSAGE_FLUSH_MAX_BATCH messages are waiting,
+- in the background when the caller marks a step boundary (`schedule_flush`),
+- synchronously through `flush()` when the caller needs durability, e.g. before a
+  HITL prompt goes out or before the final `workflow_complete`.
+
+A failed flush puts the batch back at the head of the buffer for the next attempt.
+Flush latency and batch sizes are aggregated process-wide in `flush_stats`.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import List, Optional, Callable, Awaitable, Dict, Any
+
+from models import ChatMessage
+
+MESSAGE_FLUSH_INTERVAL_MS = int(os.environ.get("MESSAGE_FLUSH_INTERVAL_MS", 250))
+MESSAGE_FLUSH_MAX_BATCH = int(os.environ.get("MESSAGE_FLUSH_MAX_BATCH", 32))
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class FlushStats:
+    """Flush latency and batch-size distribution over the last `window` flushes, plus totals."""
+
+    def __init__(self, window: int = 1024):
+        self.latencies_ms = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.counters = {"flushes": 0, "messages": 0, "errors": 0, "max_batch": 0}
+
+    def record(self, batch_size: int, latency_ms: float):
+        self.latencies_ms.append(latency_ms)
+        self.batch_sizes.append(batch_size)
+        self.counters["flushes"] += 1
+        self.counters["messages"] += batch_size
+        self.counters["max_batch"] = max(self.counters["max_batch"], batch_size)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 2) if latencies else None
+
+        histogram = {f"<={b}": 0 for b in BATCH_SIZE_BUCKETS}
+        histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = 0
+        for size in self.batch_sizes:
+            bucket = next((f"<={b}" for b in BATCH_SIZE_BUCKETS if size <= b), f">{BATCH_SIZE_BUCKETS[-1]}")
+            histogram[bucket] += 1
+        flushes = self.counters["flushes"]
+        return {
+            **self.counters,
+            "avg_batch": round(self.counters["messages"] / flushes, 2) if flushes else None,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": round(latencies[-1], 2) if latencies else None,
+            "batch_size_histogram": histogram,
+        }
+
+
+# Process-wide flush metrics (all sessions)
+flush_stats = FlushStats()
+
+
+class MessageWriteBuffer:
+    """Per-session write buffer for ChatMessage rows."""
+
+    def __init__(self, session_id: str, session_factory, on_flushed: Callable[[List[ChatMessage]], Awaitable[None]] = None,
+                 interval_ms: int = MESSAGE_FLUSH_INTERVAL_MS, max_batch: int = MESSAGE_FLUSH_MAX_BATCH):
+        self.session_id = session_id
+        self.session_factory = session_factory
+        self.on_flushed = on_flushed
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[ChatMessage] = []
+        # One flush at a time so batches commit in the order they were buffered
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._background: set = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, message: ChatMessage):
+        self._pending.append(message)
+        if len(self._pending) >= self.max_batch:
+            self.schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after(self.interval))
+
+    def schedule_flush(self):
+        """Flush in the background (step boundary); returns immediately."""
+        if self._pending:
+            task = asyncio.create_task(self._flush_quietly())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        # From here on the timer is flushing and must not be cancelled by flush()
+        self._timer = None
+        await self._flush_quietly()
+
+    async def _flush_quietly(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"[MESSAGE BUFFER] Background flush failed (Session: {self.session_id}): {e}")
+
+    async def flush(self) -> int:
+        """Commit everything buffered so far; returns the number of messages written. Raises on failure."""
+        async with self._lock:
+            if self._timer is not None:
+                # A pending timer is still sleeping (it clears itself before flushing): this flush covers it
+                self._timer.cancel()
+                self._timer = None
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            try:
+                async with self.session_factory() as db:
+                    db.add_all(batch)
+                    await db.commit()
+            except Exception:
+                self._pending[:0] = batch
+                flush_stats.counters["errors"] += 1
+                raise
+            flush_stats.record(len(batch), (time.perf_counter() - start) * 1000)
+            if self.on_flushed:
+                await self.on_flushed(batch)
+            return len(batch)
+
+    @asynccontextmanager
+    async def hold(self):
+        """Keep flushes out while the caller reads the database; yields the messages not committed yet."""
+        async with self._lock:
+            yield list(self._pending)
+
+    async def close(self):
+        """Write whatever is left (end of the request)."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self.flush()
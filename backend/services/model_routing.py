@@ -0,0 +1,138 @@
+"""
+Model routing for the workflow's LLM stages.
+
+model_routing.json assigns every stage of `llm_call` a model and its limits:
+
+    "stages": {
+      "verify": {
+        "model": "gpt-4o-mini",
+        "max_tokens": 800,       # completion budget of one call
+        "timeout_sec": 20,       # per request, passed to the OpenAI client
+        "escalate_to": "gpt-4o"  # retried once on this model when the JSON answer does not parse
+      }
+    }
+
+Stages: extract (extract_variables), plan (plan_workflow / extract_and_plan), verify
+(verify_step_result), file_match (find_similar_files), resolve (resolve_step_parameters)
+and final (the structured answer). The `models` section holds per-model prices used for
+the cost counters, plus rough latency figures (time to first token, output tokens/s)
+used by benchmark/bench_model_tiers.py to model other tiers from recorded runs.
+
+`ModelRouter.load` validates the whole file up front and raises one `ModelRoutingError`
+listing every problem, like the tool registry does for tools.json.
+"""
+import os
+import json
+from typing import Optional, Dict, Any, List
+
+MODEL_ROUTING_PATH = os.environ.get("WORKFLOW_MODEL_ROUTING", os.path.join(os.path.dirname(os.path.dirname(__file__)), "model_routing.json"))
+ROUTED_STAGES = ("extract", "plan", "verify", "file_match", "resolve", "final")
+MODEL_DEFAULTS = {"input_usd_per_1m": 0.0, "output_usd_per_1m": 0.0, "ttft_ms": 500, "tokens_per_sec": 80}
+
+
+class ModelRoutingError(ValueError):
+    """model_routing.json failed validation; `problems` lists every issue found."""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("Invalid model routing:\n  - " + "\n  - ".join(problems))
+
+
+def load_model_routing(path: str = MODEL_ROUTING_PATH) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+class StageRoute:
+    """Model, limits and escalation model of one stage."""
+
+    def __init__(self, stage: str, model: str, max_tokens: int, timeout_sec: float, escalate_to: Optional[str] = None):
+        self.stage = stage
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout_sec = timeout_sec
+        self.escalate_to = escalate_to
+
+    def options(self, escalated: bool = False) -> Dict[str, Any]:
+        """Request options for a call on the stage model (or its escalation model)."""
+        return {"model": self.escalate_to if escalated else self.model, "max_tokens": self.max_tokens, "timeout": self.timeout_sec}
+
+
+class ModelRouter:
+    def __init__(self):
+        self.routes: Dict[str, StageRoute] = {}
+        self.models: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, config: Dict[str, Any]) -> "ModelRouter":
+        """Validate a routing config and replace the current routes (counters are kept)."""
+        problems, routes = [], {}
+        models = config.get("models") or {}
+        stages = config.get("stages") or {}
+        for model, profile in models.items():
+            for key, value in (profile or {}).items():
+                if key not in MODEL_DEFAULTS:
+                    problems.append(f"model '{model}': unknown key '{key}'")
+                elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                    problems.append(f"model '{model}': {key} must be a non-negative number")
+        for stage in set(ROUTED_STAGES) - set(stages):
+            problems.append(f"stage '{stage}': missing")
+        for stage, route in stages.items():
+            where = f"stage '{stage}'"
+            if stage not in ROUTED_STAGES:
+                problems.append(f"{where}: unknown stage (expected one of {', '.join(ROUTED_STAGES)})")
+                continue
+            unknown = set(route) - {"model", "max_tokens", "timeout_sec", "escalate_to"}
+            if unknown:
+                problems.append(f"{where}: unknown keys {sorted(unknown)}")
+            if not isinstance(route.get("model"), str) or not route.get("model"):
+                problems.append(f"{where}: missing model")
+            if isinstance(route.get("max_tokens"), bool) or not isinstance(route.get("max_tokens"), int) or route["max_tokens"] < 1:
+                problems.append(f"{where}: max_tokens must be an integer >= 1")
+            if isinstance(route.get("timeout_sec"), bool) or not isinstance(route.get("timeout_sec"), (int, float)) or route["timeout_sec"] <= 0:
+                problems.append(f"{where}: timeout_sec must be a positive number")
+            escalate_to = route.get("escalate_to")
+            if escalate_to is not None and (not isinstance(escalate_to, str) or escalate_to == route.get("model")):
+                problems.append(f"{where}: escalate_to must name a different model")
+            for model in (route.get("model"), escalate_to):
+                if isinstance(model, str) and model and model not in models:
+                    problems.append(f"{where}: model '{model}' has no entry in models")
+            routes[stage] = StageRoute(stage, route.get("model"), route.get("max_tokens"), route.get("timeout_sec"), escalate_to)
+
+        if problems:
+            raise ModelRoutingError(problems)
+        self.routes = routes
+        self.models = {model: {**MODEL_DEFAULTS, **(profile or {})} for model, profile in models.items()}
+        return self
+
+    def get(self, stage: str) -> Optional[StageRoute]:
+        return self.routes.get(stage)
+
+    def cost_usd(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        profile = self.models.get(model, MODEL_DEFAULTS)
+        return ((prompt_tokens or 0) * profile["input_usd_per_1m"] + (completion_tokens or 0) * profile["output_usd_per_1m"]) / 1e6
+
+    def record(self, stage: str, model: str, usage, escalated: bool = False):
+        """Count one call of `stage` on `model` with the usage the API reported (None for streams without usage)."""
+        counters = self.counters.setdefault(stage, {"calls": 0, "escalations": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "models": {}})
+        counters["calls"] += 1
+        counters["escalations"] += int(escalated)
+        counters["models"][model] = counters["models"].get(model, 0) + 1
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        counters["prompt_tokens"] += prompt_tokens
+        counters["completion_tokens"] += completion_tokens
+        counters["cost_usd"] += self.cost_usd(model, prompt_tokens, completion_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            stage: {
+                "model": route.model, "escalate_to": route.escalate_to, "max_tokens": route.max_tokens, "timeout_sec": route.timeout_sec,
+                **{k: round(v, 6) if k == "cost_usd" else v for k, v in self.counters.get(stage, {}).items()},
+            }
+            for stage, route in self.routes.items()
+        }
+
+
+# Process-wide router; loaded from model_routing.json by the workflow controller at import time
+model_router = ModelRouter()
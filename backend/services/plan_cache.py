@@ -0,0 +1,218 @@
+"""
+Plan cache keyed by normalized intent signatures.
+
+Recurring requests ("check my calendar for the next 3 days", "email X the summary")
+produce the same plan shape with different values. The user query is reduced to an
+intent signature by masking emails, filenames, dates and numbers; the planner's output
+is stored as a template where every value that came from the extracted variables is
+replaced by a `{{vars.<name>}}` placeholder. A later query with the same signature
+re-instantiates the template with its own freshly extracted variables instead of
+calling the planner again.
+
+Only constants may stay literal in a template: enum values of the tool's
+arguments_schema, booleans, `{{steps.N...}}` references and phrases made of the
+signature's own words. Anything else the planner derived ("tomorrow at 10am" ->
+an ISO start_time, a resolved file id) cannot be traced to an extracted variable,
+so the plan is not cached.
+
+Entries are evicted LRU-first and after a TTL. Templates are bound to the tool
+registry the controller loaded at startup (`bind_registry`); tools.json is only
+read then, so changing it needs a restart, which also starts with an empty cache.
+"""
+import os
+import re
+import copy
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+PLAN_CACHE_ENABLED = os.environ.get("PLAN_CACHE_ENABLED", "true").lower() == "true"
+PLAN_CACHE_MAX_ENTRIES = int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", 512))
+PLAN_CACHE_TTL_SEC = int(os.environ.get("PLAN_CACHE_TTL_SEC", 3600))
+
+_MONTHS = r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+_WEEKDAYS = r"mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:rs(?:day)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?"
+
+# Order matters: emails and filenames contain dots and digits that later patterns would split
+_MASKS = [
+    ("<email>", re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")),
+    ("<file>", re.compile(r"\b[\w-]+\.(?:pdf|docx?|xlsx?|csv|pptx?|txt|md|json|png|jpe?g|gif|mp4|zip)\b", re.I)),
+    ("<date>", re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[t ]\d{1,2}:\d{2}(?::\d{2})?)?\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b", re.I)),
+    ("<date>", re.compile(rf"\b(?:\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:{_MONTHS})|(?:{_MONTHS})\s+\d{{1,2}}(?:st|nd|rd|th)?)\b(?:,?\s+\d{{4}})?", re.I)),
+    ("<date>", re.compile(rf"\b(?:today|tomorrow|tonight|yesterday|(?:next|this|last)\s+(?:week|month|{_WEEKDAYS})|{_WEEKDAYS})\b", re.I)),
+    ("<time>", re.compile(r"\b\d{1,2}(?::\d{2})?\s*(?:am|pm)\b|\b\d{1,2}:\d{2}\b", re.I)),
+    ("<num>", re.compile(r"\b\d+(?:\.\d+)?\b")),
+]
+_QUOTED = re.compile(r"\"[^\"]+\"|'[^']{2,}'")
+_PLACEHOLDER = re.compile(r"^\{\{vars\.(\w+)\}\}$")
+_STEP_REFERENCE = re.compile(r"^\{\{steps\.\d+[^{}]*\}\}$")
+
+
+def intent_signature(query: str) -> str:
+    """Lowercased query with emails, filenames, dates/times, numbers and quoted strings masked."""
+    text = _QUOTED.sub(" <text> ", query or "")
+    for token, pattern in _MASKS:
+        text = pattern.sub(f" {token} ", text)
+    text = re.sub(r"[^\w<>\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def _mentions(text: str, value: str) -> bool:
+    return bool(value) and re.search(rf"(?<!\w){re.escape(value)}(?!\w)", text, re.I) is not None
+
+
+def _constant(value: Any, signature: str, allowed: List[Any]) -> bool:
+    """
+    True when a literal is the same for every query with this signature: a schema enum
+    value, a boolean, a reference to an earlier step's output, or a phrase whose words
+    all survive in the signature ("summary", "inbox"). Containers are constant when
+    all of their items are.
+    """
+    if value is None or isinstance(value, bool) or value in allowed:
+        return True
+    if isinstance(value, dict):
+        return all(_constant(v, signature, allowed) for v in value.values())
+    if isinstance(value, list):
+        return all(_constant(v, signature, allowed) for v in value)
+    if isinstance(value, str) and _STEP_REFERENCE.match(value):
+        return True
+    words = " ".join(re.sub(r"[^\w\s]", " ", str(value).lower()).split())
+    return bool(words) and _mentions(signature, words)
+
+
+def make_template(query: str, plan: List[Dict], extracted: Dict[str, Any],
+                  constants: Dict[str, Dict[str, List[Any]]] = None) -> Optional[List[Dict]]:
+    """
+    Turn a concrete plan into a template, or return None when it cannot be reused:
+    a step value that is neither one of the extracted variables nor a constant
+    (see `_constant`; `constants` maps tool_id -> parameter -> enum values) was
+    derived from this query and would leak its data into the next one.
+    """
+    signature = intent_signature(query)
+    constants = constants or {}
+    by_value = {str(v): k for k, v in extracted.items() if str(v).strip()}
+    template = copy.deepcopy(plan)
+    for step in template:
+        allowed = constants.get(step.get("tool_id")) or {}
+        for param, value in list((step.get("variables") or {}).items()):
+            name = by_value.get(str(value)) if value is not None else None
+            if name is not None:
+                step["variables"][param] = f"{{{{vars.{name}}}}}"
+            elif not _constant(value, signature, allowed.get(param) or []):
+                return None
+        description = step.get("description") or ""
+        for value, name in sorted(by_value.items(), key=lambda kv: -len(kv[0])):
+            description = re.sub(rf"(?<!\w){re.escape(value)}(?!\w)", f"{{{{vars.{name}}}}}", description)
+        step["description"] = description
+    return template
+
+
+def instantiate_template(template: List[Dict], extracted: Dict[str, Any]) -> List[Dict]:
+    """Fill a plan template with fresh variables; placeholders without a value become missing_variables."""
+    plan = copy.deepcopy(template)
+    for step in plan:
+        variables = step.get("variables") or {}
+        missing = step.setdefault("missing_variables", [])
+        for param, value in list(variables.items()):
+            match = _PLACEHOLDER.match(value) if isinstance(value, str) else None
+            if not match:
+                continue
+            if match.group(1) in extracted:
+                variables[param] = extracted[match.group(1)]
+            else:
+                del variables[param]
+                if param not in missing:
+                    missing.append(param)
+        description = step.get("description") or ""
+        for name in re.findall(r"\{\{vars\.(\w+)\}\}", description):
+            description = description.replace(f"{{{{vars.{name}}}}}", str(extracted.get(name, name)))
+        step["description"] = description
+    return plan
+
+
+class PlanCache:
+    """LRU + TTL map of intent signature -> plan template."""
+
+    def __init__(self, max_entries: int = PLAN_CACHE_MAX_ENTRIES, ttl: int = PLAN_CACHE_TTL_SEC,
+                 enabled: bool = PLAN_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.constants: Dict[str, Dict[str, List[Any]]] = {}
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats_counters = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0,
+                               "evictions_lru": 0, "evictions_ttl": 0, "invalidations": 0, "round_trips_saved": 0}
+
+    def bind_registry(self, registry) -> "PlanCache":
+        """
+        Take the enum constants of every tool's arguments_schema from the loaded
+        ToolRegistry and drop the templates planned against the previous one.
+        """
+        constants = {}
+        for tool_id, spec in registry.tools.items():
+            properties = (spec.validator.schema.get("properties") or {}) if spec.validator else {}
+            enums = {param: list(schema["enum"]) for param, schema in properties.items() if "enum" in schema}
+            if enums:
+                constants[tool_id] = enums
+        if self._entries:
+            self.stats_counters["invalidations"] += 1
+        self._entries.clear()
+        self.constants = constants
+        return self
+
+    def get(self, query: str, round_trips_saved: int = 1) -> Optional[List[Dict]]:
+        """
+        Plan template cached for the query's intent signature, or None on a miss.
+        Callers fill it with `instantiate_template` and their freshly extracted variables.
+        A hit still costs that extraction call, so `round_trips_saved` is what the caller's
+        miss path spends beyond it: 1 for extract + plan, 0 for one combined call.
+        """
+        if not self.enabled:
+            return None
+        key = intent_signature(query)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            self.stats_counters["evictions_ttl"] += 1
+            entry = None
+        if entry is None:
+            self.stats_counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats_counters["hits"] += 1
+        self.stats_counters["round_trips_saved"] += round_trips_saved
+        return entry[0]
+
+    def put(self, query: str, plan: List[Dict], extracted: Dict[str, Any]) -> bool:
+        """Store the template for a freshly planned query. Returns False when the plan is not reusable."""
+        if not self.enabled or not plan:
+            return False
+        template = make_template(query, plan, extracted, self.constants)
+        if template is None:
+            self.stats_counters["uncacheable"] += 1
+            return False
+        key = intent_signature(query)
+        self._entries.pop(key, None)
+        self._entries[key] = (template, time.monotonic() + self.ttl)
+        self.stats_counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats_counters["evictions_lru"] += 1
+        return True
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_rate": round(self.stats_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "enabled": self.enabled,
+        }
+
+
+# Process-wide plan cache; the controller binds it to the tool registry it loads
+plan_cache = PlanCache()
@@ -0,0 +1,278 @@
+"""
+Static rewrites of a workflow plan before it runs.
+
+Planner output is often redundant: `list_drive_files` twice for the same query, or a
+`read_spreadsheet` right after the `create_spreadsheet` that produced the sheet.
+`optimize_plan` rewrites the normalized plan with the execution policy from tools.json:
+
+- deduplicate: a read-only step with the same tool and variables as an earlier one,
+  with no write to its resource in between, is dropped and its references
+  (`{{steps.N...}}`, `depends_on_step`, `output_used_by`) point to the earlier step;
+- merge: two calls of a tool with a `merge_key` on the same target become one call
+  (later scalar arguments win, list arguments are combined) when nothing between them
+  touches the resource or uses the earlier result;
+- drop: a read-only step nobody consumes that only reads back what an earlier write
+  of this plan produced is removed (other unconsumed reads are the answer itself);
+- hoist: a read-only step moves ahead of earlier writes it does not depend on and that
+  cannot change what it reads, so it runs alongside the reads before them instead of
+  waiting behind the write barrier (and, for confirmations, behind the user).
+
+Only steps whose required parameters are all written out in `variables` are hoisted or
+hoisted over: the others may take values from the execution context, which every
+step updates as it runs. Step numbers are kept, so references stay valid. Every
+rewrite is returned for logging; `plan_optimizer_stats` counts them process-wide,
+with the steps eliminated.
+"""
+import os
+import re
+import copy
+import json
+from typing import Dict, Any, List, Tuple, Optional
+
+WORKFLOW_PLAN_OPTIMIZER_ENABLED = os.environ.get("WORKFLOW_PLAN_OPTIMIZER_ENABLED", "true").lower() == "true"
+
+_STEP_REFERENCE = re.compile(r"(\{\{\s*steps\.)(\d+)(?=[.\[\s}])")
+
+
+class PlanOptimizerStats:
+    def __init__(self):
+        self.counters = {"plans": 0, "plans_rewritten": 0, "steps_planned": 0, "steps_eliminated": 0,
+                         "deduplicate": 0, "merge": 0, "drop": 0, "hoist": 0}
+
+    def record(self, steps_before: int, steps_after: int, rewrites: List[Dict[str, Any]]):
+        self.counters["plans"] += 1
+        self.counters["plans_rewritten"] += int(bool(rewrites))
+        self.counters["steps_planned"] += steps_before
+        self.counters["steps_eliminated"] += steps_before - steps_after
+        for rewrite in rewrites:
+            self.counters[rewrite["rewrite"]] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        planned = self.counters["steps_planned"]
+        return {
+            **self.counters,
+            "eliminated_ratio": round(self.counters["steps_eliminated"] / planned, 4) if planned else 0.0,
+            "enabled": WORKFLOW_PLAN_OPTIMIZER_ENABLED,
+        }
+
+
+# Process-wide optimizer metrics (all sessions)
+plan_optimizer_stats = PlanOptimizerStats()
+
+
+def step_references(value: Any) -> set:
+    """Step numbers referenced as {{steps.N...}} anywhere inside a variables value."""
+    if isinstance(value, str):
+        return {int(m.group(2)) for m in _STEP_REFERENCE.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(step_references(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(step_references(v) for v in value)) if value else set()
+    return set()
+
+
+def _replace_references(value: Any, old: int, new: int) -> Any:
+    if isinstance(value, str):
+        return _STEP_REFERENCE.sub(lambda m: m.group(1) + (str(new) if int(m.group(2)) == old else m.group(2)), value)
+    if isinstance(value, dict):
+        return {k: _replace_references(v, old, new) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_references(v, old, new) for v in value]
+    return value
+
+
+def _depends_on(step: Dict) -> set:
+    depends_on = step.get("depends_on_step")
+    return {d for d in (depends_on if isinstance(depends_on, list) else [depends_on]) if isinstance(d, int)}
+
+
+def _set_depends_on(step: Dict, numbers: set):
+    numbers = sorted(numbers - {step["step"]})
+    step["depends_on_step"] = numbers[0] if len(numbers) == 1 else (numbers or None)
+
+
+def _direct_dependencies(plan: List[Dict], step: Dict) -> set:
+    """Steps this one needs: references, `depends_on_step`, and producers listing it in `output_used_by`."""
+    n = step["step"]
+    deps = step_references(step.get("variables")) | _depends_on(step)
+    deps |= {s["step"] for s in plan if n in (s.get("output_used_by") or [])}
+    return deps - {n}
+
+
+def _consumed(plan: List[Dict], step: Dict) -> bool:
+    n = step["step"]
+    return bool(step.get("output_used_by")) or any(n in _direct_dependencies(plan, s) for s in plan if s is not step)
+
+
+def _redirect(plan: List[Dict], old: int, new: int):
+    """Point every use of step `old` (now gone) at step `new`."""
+    for step in plan:
+        step["variables"] = _replace_references(step.get("variables"), old, new)
+        depends_on = _depends_on(step)
+        if old in depends_on:
+            _set_depends_on(step, (depends_on - {old}) | {new})
+        used_by = step.get("output_used_by") or []
+        if old in used_by:
+            step["output_used_by"] = [c for c in dict.fromkeys(new if c == old else c for c in used_by) if c != step["step"]]
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class _Optimizer:
+    def __init__(self, plan: List[Dict], registry, catalog):
+        self.plan = plan
+        self.registry = registry
+        self.catalog = catalog
+        self.rewrites: List[Dict[str, Any]] = []
+
+    def read_only(self, step: Dict) -> bool:
+        spec = self.registry.get(step.get("tool_id"))
+        return spec is not None and spec.read_only
+
+    def explicit(self, step: Dict) -> bool:
+        """All required parameters are in `variables`, so the step does not read the execution context."""
+        tool_def = self.catalog.get(step.get("tool_id"))
+        if tool_def is None or step.get("missing_variables"):
+            return False
+        variables = step.get("variables") or {}
+        return all(variables.get(p) not in (None, "") for p in tool_def.get("must_required_params", []))
+
+    def remove(self, step: Dict, into: Optional[int] = None):
+        self.plan.remove(step)
+        if into is not None:
+            target = next(s for s in self.plan if s["step"] == into)
+            target["output_used_by"] = [c for c in dict.fromkeys((target.get("output_used_by") or []) + (step.get("output_used_by") or [])) if c != into]
+            _redirect(self.plan, step["step"], into)
+        else:
+            for other in self.plan:
+                if step["step"] in (other.get("output_used_by") or []):
+                    other["output_used_by"] = [c for c in other["output_used_by"] if c != step["step"]]
+
+    def log(self, rewrite: str, step: Dict, **detail):
+        self.rewrites.append({"rewrite": rewrite, "step": step["step"], "tool_id": step.get("tool_id"), **detail})
+
+    def deduplicate(self) -> bool:
+        for i, step in enumerate(self.plan):
+            if not self.read_only(step):
+                continue
+            key = _canonical(step.get("variables") or {})
+            for j in range(i - 1, -1, -1):
+                earlier = self.plan[j]
+                if not self.read_only(earlier) and self.registry.may_interfere(earlier.get("tool_id"), step.get("tool_id")):
+                    break
+                if earlier.get("tool_id") == step.get("tool_id") and _canonical(earlier.get("variables") or {}) == key:
+                    self.remove(step, into=earlier["step"])
+                    self.log("deduplicate", step, into=earlier["step"])
+                    return True
+        return False
+
+    def merged_variables(self, first: Dict, second: Dict) -> Optional[Dict[str, Any]]:
+        merged = dict(first.get("variables") or {})
+        for param, value in (second.get("variables") or {}).items():
+            if isinstance(value, list) and isinstance(merged.get(param), list):
+                merged[param] = list(dict.fromkeys(merged[param] + value))
+            else:
+                merged[param] = value
+        # add_labels and remove_labels naming the same label: the order of the two calls mattered
+        seen = {}
+        for param, value in merged.items():
+            if isinstance(value, list) and all(isinstance(v, str) for v in value):
+                for item in value:
+                    if seen.setdefault(item, param) != param:
+                        return None
+        return merged
+
+    def merge(self) -> bool:
+        for i, step in enumerate(self.plan):
+            spec = self.registry.get(step.get("tool_id"))
+            if spec is None or not spec.merge_key:
+                continue
+            target = [(step.get("variables") or {}).get(k) for k in spec.merge_key]
+            if any(v in (None, "") for v in target):
+                continue
+            for j in range(i - 1, -1, -1):
+                earlier = self.plan[j]
+                if earlier.get("tool_id") == step.get("tool_id") and [(earlier.get("variables") or {}).get(k) for k in spec.merge_key] == target:
+                    between = self.plan[j + 1:i]
+                    if any(earlier["step"] in _direct_dependencies(self.plan, s) for s in between):
+                        break
+                    variables = self.merged_variables(earlier, step)
+                    if variables is None:
+                        break
+                    step["variables"] = variables
+                    step["missing_variables"] = [p for p in dict.fromkeys((earlier.get("missing_variables") or []) + (step.get("missing_variables") or []))
+                                                 if variables.get(p) in (None, "")]
+                    step["description"] = "; ".join(d for d in (earlier.get("description"), step.get("description")) if d)
+                    _set_depends_on(step, _depends_on(step) | _depends_on(earlier))
+                    self.remove(earlier, into=step["step"])
+                    self.log("merge", earlier, into=step["step"])
+                    return True
+                if self.registry.may_interfere(step.get("tool_id"), earlier.get("tool_id")):
+                    break
+        return False
+
+    def drop(self) -> bool:
+        for step in self.plan:
+            if not self.read_only(step) or _consumed(self.plan, step):
+                continue
+            sources = [s for s in self.plan if s["step"] in step_references(step.get("variables"))]
+            writes = [s["step"] for s in sources if not self.read_only(s)]
+            if writes:
+                self.remove(step)
+                self.log("drop", step, reads_back=writes)
+                return True
+        return False
+
+    def crossable(self, step: Dict, earlier: Dict) -> bool:
+        if earlier["step"] in _direct_dependencies(self.plan, step):
+            return False
+        if self.read_only(earlier):
+            return True
+        return self.explicit(earlier) and not self.registry.may_interfere(earlier.get("tool_id"), step.get("tool_id"))
+
+    def hoist(self):
+        for step in list(self.plan):
+            if not self.read_only(step) or not self.explicit(step):
+                continue
+            i = self.plan.index(step)
+            target = i
+            for j in range(i - 1, -1, -1):
+                if not self.crossable(step, self.plan[j]):
+                    break
+                if not self.read_only(self.plan[j]):
+                    target = j
+            if target < i:
+                before = self.plan[target]["step"]
+                self.plan.insert(target, self.plan.pop(i))
+                self.log("hoist", step, before=before)
+
+    def run(self) -> List[Dict[str, Any]]:
+        while self.deduplicate() or self.merge() or self.drop():
+            pass
+        self.hoist()
+        return self.rewrites
+
+
+def optimize_plan(plan: List[Dict], registry, catalog) -> Tuple[List[Dict], List[Dict[str, Any]]]:
+    """
+    Rewritten copy of a normalized plan (steps numbered) and the rewrites applied, each
+    {"rewrite": deduplicate | merge | drop | hoist, "step": n, "tool_id": ..., details}.
+    `registry` supplies read_only, resource and merge_key; `catalog` the required parameters.
+    """
+    optimized = copy.deepcopy(plan)
+    rewrites = _Optimizer(optimized, registry, catalog).run()
+    plan_optimizer_stats.record(len(plan), len(optimized), rewrites)
+    return optimized, rewrites
+
+
+def describe_rewrite(rewrite: Dict[str, Any]) -> str:
+    step = f"step {rewrite['step']} ({rewrite['tool_id']})"
+    if rewrite["rewrite"] == "deduplicate":
+        return f"{step} repeats step {rewrite['into']}: removed"
+    if rewrite["rewrite"] == "merge":
+        return f"{step} merged into step {rewrite['into']}"
+    if rewrite["rewrite"] == "drop":
+        return f"{step} only reads back step(s) {', '.join(map(str, rewrite['reads_back']))} and nothing uses it: removed"
+    return f"{step} moved ahead of step {rewrite['before']}"
@@ -0,0 +1,156 @@
+"""
+Deterministic parameter resolution for workflow plans.
+
+The planner writes explicit references to earlier step outputs, e.g.
+`{{steps.1.files[0].id}}`, instead of prose placeholders like `file_id_from_step_1`.
+`resolve_arguments` fills them from the stored step outputs with a typed lookup (a value
+that is exactly one reference keeps the referenced type; references inside longer
+strings are substituted as text). Unresolvable references and legacy prose placeholders
+are reported so the caller can fall back to the LLM resolver.
+"""
+import re
+import json
+from typing import Dict, Any, List, Tuple
+
+_REFERENCE = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+_PATH_TOKEN = re.compile(r"\.?([A-Za-z_0-9][\w-]*)|\[(-?\d+)\]")
+# Prose placeholders older plans (and the planner on a bad day) use instead of references
+LEGACY_PLACEHOLDER = re.compile(r"_from_step_?\d*|from_(?:the_)?previous|previous_step|value_from_|<[a-z_ ]+>", re.I)
+
+# Output fields of each tool's result, shown to the planner so it can write references
+TOOL_OUTPUT_FIELDS: Dict[str, str] = {
+    "check_calendar_availability": "busy[].start, busy[].end",
+    "schedule_calendar_event": "event_id, link",
+    "update_calendar_event": "event_id",
+    "send_email": "message_id, recipients",
+    "read_emails": "emails[].id, emails[].subject, emails[].from, emails[].snippet",
+    "list_drive_files": "files[].id, files[].name, files[].mimeType",
+    "upload_to_drive": "file_id",
+    "update_drive_file": "file_id",
+    "read_drive_file_content": "content, name, file_id",
+    "create_spreadsheet": "spreadsheet_id",
+    "read_spreadsheet": "values, range_used",
+}
+
+# Context keys that can stand in for a required parameter nobody referenced explicitly
+CONTEXT_ALIASES: Dict[str, List[str]] = {
+    "file_id": ["file_id", "selected_file_id"],
+    "spreadsheet_id": ["spreadsheet_id", "selected_file_id"],
+    "event_id": ["event_id"],
+    "message_id": ["message_id"],
+}
+
+
+class UnresolvedReference(KeyError):
+    pass
+
+
+def _parse_path(path: str) -> List[Any]:
+    tokens, pos = [], 0
+    while pos < len(path):
+        match = _PATH_TOKEN.match(path, pos)
+        if not match or match.end() == pos:
+            raise UnresolvedReference(path)
+        tokens.append(int(match.group(2)) if match.group(2) is not None else match.group(1))
+        pos = match.end()
+    return tokens
+
+
+def lookup(path: str, scope: Dict[str, Any]) -> Any:
+    """
+    Resolve `steps.<n>.<field>[<i>]...` against scope["steps"] (step number -> result)
+    or `vars.<name>` / `context.<name>` against scope["context"].
+    """
+    tokens = _parse_path(path)
+    if len(tokens) < 2:
+        raise UnresolvedReference(path)
+    root = tokens.pop(0)
+    if root == "steps":
+        value = scope.get("steps", {}).get(str(tokens.pop(0)))
+    elif root in ("vars", "context"):
+        value = scope.get("context", {}).get(tokens.pop(0))
+    else:
+        raise UnresolvedReference(path)
+    for token in tokens:
+        try:
+            if isinstance(token, int):
+                value = value[token]
+            elif isinstance(value, dict):
+                value = value[token]
+            elif isinstance(value, list) and token.isdigit():
+                value = value[int(token)]
+            else:
+                raise UnresolvedReference(path)
+        except (KeyError, IndexError, TypeError):
+            raise UnresolvedReference(path)
+    if value is None:
+        raise UnresolvedReference(path)
+    return value
+
+
+def resolve_value(value: Any, scope: Dict[str, Any]) -> Any:
+    """Substitute every reference inside a value; raises UnresolvedReference on the first miss."""
+    if isinstance(value, str):
+        whole = _REFERENCE.fullmatch(value.strip())
+        if whole:
+            return lookup(whole.group(1), scope)
+        def substitute(match):
+            found = lookup(match.group(1), scope)
+            return found if isinstance(found, str) else json.dumps(found)
+        return _REFERENCE.sub(substitute, value)
+    if isinstance(value, dict):
+        return {k: resolve_value(v, scope) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_value(v, scope) for v in value]
+    return value
+
+
+def resolve_arguments(variables: Dict[str, Any], scope: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Resolved arguments plus the parameters that still need the LLM (unresolved or prose placeholders)."""
+    arguments, unresolved = {}, []
+    for param, value in (variables or {}).items():
+        try:
+            resolved = resolve_value(value, scope)
+        except UnresolvedReference:
+            unresolved.append(param)
+            continue
+        if isinstance(resolved, str) and LEGACY_PLACEHOLDER.search(resolved):
+            unresolved.append(param)
+            continue
+        arguments[param] = resolved
+    return arguments, unresolved
+
+
+def depends_on(step: Dict[str, Any], producer_no: Any, output_used_by: List[int] = None) -> bool:
+    """Whether `step` uses the output of step `producer_no` (depends_on_step, output_used_by or a reference)."""
+    if producer_no is None:
+        return False
+    depends = step.get("depends_on_step")
+    if depends == producer_no or (isinstance(depends, list) and producer_no in depends):
+        return True
+    if step.get("step") in (output_used_by or []):
+        return True
+    prefix = re.compile(rf"steps\.{producer_no}(?![\w])")
+    return any(prefix.match(m.group(1)) for m in _REFERENCE.finditer(json.dumps(step.get("variables") or {})))
+
+
+def fillable(value: Any) -> bool:
+    """A parameter value a verifier may fill in: absent, empty or a legacy prose placeholder (never a reference)."""
+    if value in (None, ""):
+        return True
+    return isinstance(value, str) and not _REFERENCE.search(value) and bool(LEGACY_PLACEHOLDER.search(value))
+
+
+def apply_updated_variables(steps: List[Dict[str, Any]], producer: Dict[str, Any], updated: Dict[str, Any]):
+    """
+    Hand a verifier's `updated_variables` to the later steps that depend on `producer`.
+    Only parameters that are absent, null or prose placeholders are filled: a value the
+    planner wrote (a {{steps.N...}} reference in particular) wins over a context guess.
+    """
+    for step in steps:
+        if not updated or not depends_on(step, producer.get("step"), producer.get("output_used_by")):
+            continue
+        variables = step.setdefault("variables", {})
+        for key, value in updated.items():
+            if fillable(variables.get(key)):
+                variables[key] = value
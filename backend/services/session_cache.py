@@ -0,0 +1,228 @@
+"""
+Hot-session message cache.
+
+Keeps the recent messages of active chat sessions in an in-process LRU (bounded by
+total bytes, per-session message count and per-session TTL) with an optional Redis
+tier shared between workers. Writers call `append` right after the DB commit
+(write-through), readers call `get` and only fall back to Postgres on a miss.
+
+History readers ask for the last `max_messages` messages (`tail`), so sessions longer
+than the cap are served from their cached tail like any other session.
+"""
+import os
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+CHAT_CACHE_MAX_BYTES = int(os.environ.get("CHAT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CHAT_CACHE_TTL_SEC = int(os.environ.get("CHAT_CACHE_TTL_SEC", 900))
+CHAT_CACHE_MAX_MESSAGES = int(os.environ.get("CHAT_CACHE_MAX_MESSAGES", 200))
+CHAT_CACHE_REDIS_PREFIX = "chat_cache:"
+
+
+def message_to_cache_entry(m) -> Dict[str, Any]:
+    """Compact, JSON-safe view of a ChatMessage row: only what history readers need."""
+    return {
+        "id": m.id,
+        "role": m.role,
+        "content": m.content,
+        "tool_name": m.tool_name,
+        "citations": m.citations,
+    }
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return len(json.dumps(entry, default=str))
+
+
+class _Session:
+    __slots__ = ("messages", "sizes", "bytes", "complete", "expires_at")
+
+    def __init__(self, messages: List[Dict], complete: bool, expires_at: float):
+        self.messages = messages
+        self.sizes = [_entry_size(m) for m in messages]
+        self.bytes = sum(self.sizes)
+        self.complete = complete
+        self.expires_at = expires_at
+
+
+class SessionMessageCache:
+    """LRU of per-session message tails with write-through appends and hit/eviction counters."""
+
+    def __init__(self, max_bytes: int = CHAT_CACHE_MAX_BYTES, ttl: int = CHAT_CACHE_TTL_SEC,
+                 max_messages: int = CHAT_CACHE_MAX_MESSAGES, redis_client=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.redis = redis_client
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self.stats_counters = {"hits": 0, "misses": 0, "redis_hits": 0, "evictions_lru": 0, "evictions_ttl": 0, "redis_errors": 0}
+
+    def attach_redis(self, redis_client):
+        self.redis = redis_client
+
+    # --- local tier ---
+
+    def _drop(self, session_id: str, reason: str = None):
+        entry = self._sessions.pop(session_id, None)
+        if entry:
+            self._bytes -= entry.bytes
+            if reason:
+                self.stats_counters[f"evictions_{reason}"] += 1
+
+    def _store(self, session_id: str, messages: List[Dict], complete: bool):
+        self._drop(session_id)
+        if len(messages) > self.max_messages:
+            messages, complete = messages[-self.max_messages:], False
+        entry = _Session(list(messages), complete, time.monotonic() + self.ttl)
+        self._sessions[session_id] = entry
+        self._bytes += entry.bytes
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._sessions:
+            oldest = next(iter(self._sessions))
+            self._drop(oldest, "lru")
+
+    def _local_get(self, session_id: str) -> Optional[_Session]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(session_id, "ttl")
+            return None
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    # --- public API ---
+
+    async def get(self, session_id: str, tail: int = None) -> Optional[List[Dict]]:
+        """
+        Return the cached messages for a session, or None on a miss.
+        Without `tail` a hit requires the full session to be cached; with `tail`
+        the last N messages are enough.
+
+        When the Redis tier is attached it is read first, because other workers may
+        have appended to the session; the local tier then only covers Redis outages.
+        """
+        entry = None
+        if self.redis is not None:
+            entry = await self._redis_get(session_id)
+        if entry is None:
+            entry = self._local_get(session_id)
+        if entry is not None and (entry.complete or (tail is not None and len(entry.messages) >= tail)):
+            self.stats_counters["hits"] += 1
+            return list(entry.messages[-tail:] if tail else entry.messages)
+        self.stats_counters["misses"] += 1
+        return None
+
+    async def put(self, session_id: str, messages: List[Dict], complete: bool = True):
+        """Populate the cache with history just read from the database (`complete=False` for only its tail)."""
+        self._store(session_id, messages, complete=complete)
+        if self.redis is not None:
+            await self._redis_put(session_id, self._sessions.get(session_id))
+
+    async def append(self, session_id: str, message: Dict):
+        """Write-through for a freshly committed message. Sessions that are not cached stay uncached."""
+        entry = self._local_get(session_id)
+        if entry is not None:
+            size = _entry_size(message)
+            entry.messages.append(message)
+            entry.sizes.append(size)
+            entry.bytes += size
+            self._bytes += size
+            entry.expires_at = time.monotonic() + self.ttl
+            while len(entry.messages) > self.max_messages:
+                entry.messages.pop(0)
+                self._bytes -= entry.sizes[0]
+                entry.bytes -= entry.sizes.pop(0)
+                entry.complete = False
+            self._evict()
+        if self.redis is not None:
+            await self._redis_append(session_id, message)
+
+    async def invalidate(self, session_id: str):
+        self._drop(session_id)
+        if self.redis is not None:
+            await self._redis_invalidate(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_ratio": round(self.stats_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "redis_enabled": self.redis is not None,
+        }
+
+    # --- redis tier: one list of messages per session plus a `complete` flag key ---
+
+    def _redis_error(self, op: str, e: Exception):
+        self.stats_counters["redis_errors"] += 1
+        print(f"[CHAT CACHE] Redis {op} failed, using local tier only: {e}")
+
+    async def _redis_get(self, session_id: str) -> Optional[_Session]:
+        key = CHAT_CACHE_REDIS_PREFIX + session_id
+        try:
+            pipe = self.redis.pipeline()
+            pipe.get(key + ":complete")
+            pipe.lrange(key, 0, -1)
+            complete, raw = await pipe.execute()
+        except Exception as e:
+            self._redis_error("get", e)
+            return None
+        if complete is None:
+            return None
+        self.stats_counters["redis_hits"] += 1
+        self._store(session_id, [json.loads(r) for r in raw], complete=complete == "1")
+        return self._sessions.get(session_id)
+
+    async def _redis_put(self, session_id: str, entry: Optional[_Session]):
+        if entry is None:
+            return
+        key = CHAT_CACHE_REDIS_PREFIX + session_id
+        try:
+            pipe = self.redis.pipeline()
+            pipe.delete(key)
+            if entry.messages:
+                pipe.rpush(key, *[json.dumps(m, default=str) for m in entry.messages])
+            pipe.set(key + ":complete", "1" if entry.complete else "0")
+            pipe.expire(key, self.ttl)
+            pipe.expire(key + ":complete", self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            self._redis_error("put", e)
+
+    async def _redis_append(self, session_id: str, message: Dict):
+        key = CHAT_CACHE_REDIS_PREFIX + session_id
+        try:
+            # Only sessions that are already cached get the append, uncached sessions stay uncached
+            if not await self.redis.exists(key + ":complete"):
+                return
+            pipe = self.redis.pipeline()
+            pipe.rpush(key, json.dumps(message, default=str))
+            pipe.expire(key, self.ttl)
+            pipe.expire(key + ":complete", self.ttl)
+            length = (await pipe.execute())[0]
+            if length > self.max_messages:
+                pipe = self.redis.pipeline()
+                pipe.ltrim(key, -self.max_messages, -1)
+                pipe.set(key + ":complete", "0", keepttl=True)
+                await pipe.execute()
+        except Exception as e:
+            self._redis_error("append", e)
+
+    async def _redis_invalidate(self, session_id: str):
+        key = CHAT_CACHE_REDIS_PREFIX + session_id
+        try:
+            await self.redis.delete(key, key + ":complete")
+        except Exception as e:
+            self._redis_error("invalidate", e)
+
+
+# Process-wide cache instance; the Redis tier is attached at startup when configured
+session_cache = SessionMessageCache()
@@ -0,0 +1,119 @@
+"""
+Speculative execution of read-only plan steps during HITL waits.
+
+When a workflow pauses on a form, confirmation or selection, later read-only steps
+that don't depend on the answer would otherwise sit idle until the user replies.
+`StepPrefetcher` runs their tool calls in the background with the arguments they
+resolve to right now and keeps the results in memory, keyed by step number.
+
+When the plan resumes, `claim` hands a result to the step only if the step resolves
+to exactly the same tool and arguments again; otherwise the answer changed the plan
+and the speculative result is discarded. Results older than WORKFLOW_PREFETCH_MAX_AGE_SEC
+and error results are discarded too, and the step runs normally.
+
+Time saved is the part of the speculative call that finished before the step asked
+for it; it is aggregated process-wide in `prefetch_stats`.
+"""
+import os
+import json
+import time
+import asyncio
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+
+WORKFLOW_PREFETCH_ENABLED = os.environ.get("WORKFLOW_PREFETCH_ENABLED", "true").lower() == "true"
+WORKFLOW_PREFETCH_MAX_STEPS = int(os.environ.get("WORKFLOW_PREFETCH_MAX_STEPS", 3))
+WORKFLOW_PREFETCH_MAX_AGE_SEC = int(os.environ.get("WORKFLOW_PREFETCH_MAX_AGE_SEC", 120))
+
+
+def call_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    return json.dumps([tool_name, arguments], sort_keys=True, default=str)
+
+
+class PrefetchStats:
+    def __init__(self):
+        self.counters = {"started": 0, "used": 0, "discarded_changed": 0, "discarded_stale": 0,
+                         "discarded_error": 0, "discarded_unused": 0, "ms_saved": 0.0}
+
+    def stats(self) -> Dict[str, Any]:
+        started, used = self.counters["started"], self.counters["used"]
+        return {
+            **self.counters,
+            "ms_saved": round(self.counters["ms_saved"], 2),
+            "hit_rate": round(used / started, 4) if started else 0.0,
+            "avg_ms_saved_per_hit": round(self.counters["ms_saved"] / used, 2) if used else None,
+            "enabled": WORKFLOW_PREFETCH_ENABLED,
+        }
+
+
+# Process-wide prefetch metrics (all sessions)
+prefetch_stats = PrefetchStats()
+
+
+class _Prefetch:
+    def __init__(self, tool_name: str, arguments: Dict[str, Any], task: asyncio.Task):
+        self.key = call_key(tool_name, arguments)
+        self.task = task
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        task.add_done_callback(self._done)
+
+    def _done(self, _task):
+        self.finished = time.perf_counter()
+
+
+class StepPrefetcher:
+    """Speculative tool results of one session, keyed by plan step number."""
+
+    def __init__(self, run_tool: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 max_steps: int = WORKFLOW_PREFETCH_MAX_STEPS, max_age_sec: float = WORKFLOW_PREFETCH_MAX_AGE_SEC,
+                 enabled: bool = WORKFLOW_PREFETCH_ENABLED):
+        self.run_tool = run_tool
+        self.max_steps = max_steps
+        self.max_age_sec = max_age_sec
+        self.enabled = enabled
+        self._entries: Dict[int, _Prefetch] = {}
+
+    def __contains__(self, step_no: int) -> bool:
+        return step_no in self._entries
+
+    def start(self, step_no: int, tool_name: str, arguments: Dict[str, Any]) -> bool:
+        """Run a step's tool call in the background; False if disabled, already running or at the limit."""
+        if not self.enabled or step_no in self._entries or len(self._entries) >= self.max_steps:
+            return False
+        self._entries[step_no] = _Prefetch(tool_name, arguments, asyncio.create_task(self.run_tool(tool_name, dict(arguments))))
+        prefetch_stats.counters["started"] += 1
+        return True
+
+    async def claim(self, step_no: int, tool_name: str, arguments: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """The speculative (result, ms saved) for this exact call, or None when the step has to run itself."""
+        entry = self._entries.pop(step_no, None)
+        if entry is None:
+            return None
+        claimed = time.perf_counter()
+        if entry.key != call_key(tool_name, arguments):
+            entry.task.cancel()
+            prefetch_stats.counters["discarded_changed"] += 1
+            return None
+        if entry.finished is not None and claimed - entry.finished > self.max_age_sec:
+            prefetch_stats.counters["discarded_stale"] += 1
+            return None
+        try:
+            result = await entry.task
+        except Exception as e:
+            print(f"[PREFETCH] Speculative {tool_name} (step {step_no}) failed: {e}")
+            result = None
+        if not isinstance(result, dict) or result.get("status") == "error" or result.get("error"):
+            # Errors may be transient; the step runs for real and reports its own outcome
+            prefetch_stats.counters["discarded_error"] += 1
+            return None
+        saved_ms = (min(claimed, entry.finished) - entry.started) * 1000
+        prefetch_stats.counters["used"] += 1
+        prefetch_stats.counters["ms_saved"] += saved_ms
+        return result, saved_ms
+
+    def discard(self):
+        """Drop every speculative result (new plan, finished workflow or closed connection)."""
+        for entry in self._entries.values():
+            entry.task.cancel()
+        prefetch_stats.counters["discarded_unused"] += len(self._entries)
+        self._entries.clear()
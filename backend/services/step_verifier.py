@@ -0,0 +1,107 @@
+"""
+Rule-based verification of workflow step results.
+
+Most tool results are unambiguous (`{"status": "success", "event_id": ...}`), so an LLM
+round trip to confirm them is wasted. `verify_by_rules` checks a result against the
+tool's expected shape, copies its known output fields into the execution context and
+decides whether to continue. It returns None when the result is errored or ambiguous
+(unexpected shape, or an empty read that later steps depend on); only then does the
+caller fall back to the LLM verifier.
+"""
+import os
+from typing import Optional, Dict, Any, List
+
+from services.plan_templating import depends_on, fillable
+
+WORKFLOW_RULE_VERIFIER = os.environ.get("WORKFLOW_RULE_VERIFIER", "true").lower() == "true"
+
+# tool_id -> expected result fields with their types, and result field -> execution_context key.
+# `collection` names the list a read returns; an empty one is only accepted when no later step uses it.
+RESULT_RULES: Dict[str, Dict[str, Any]] = {
+    "check_calendar_availability": {"fields": {"busy": list}, "context": {"busy": "busy_slots"}},
+    "schedule_calendar_event": {"fields": {"event_id": str}, "context": {"event_id": "event_id", "link": "event_link"}},
+    "update_calendar_event": {"fields": {"event_id": str}, "context": {"event_id": "event_id"}},
+    "delete_calendar_event": {"fields": {}, "context": {}},
+    "send_email": {"fields": {"message_id": str}, "context": {"message_id": "sent_message_id"}},
+    "read_emails": {"fields": {"emails": list}, "context": {}, "collection": "emails"},
+    "delete_email": {"fields": {}, "context": {}},
+    "update_email_labels": {"fields": {}, "context": {}},
+    "list_drive_files": {"fields": {"files": list}, "context": {}, "collection": "files"},
+    "upload_to_drive": {"fields": {"file_id": str}, "context": {"file_id": "file_id"}},
+    "update_drive_file": {"fields": {"file_id": str}, "context": {"file_id": "file_id"}},
+    "delete_drive_file": {"fields": {}, "context": {}},
+    "read_drive_file_content": {"fields": {"content": str}, "context": {"name": "file_name", "file_id": "file_id"}},
+    "create_spreadsheet": {"fields": {"spreadsheet_id": str}, "context": {"spreadsheet_id": "spreadsheet_id"}},
+    "read_spreadsheet": {"fields": {"values": list}, "context": {"range_used": "range_used"}, "collection": "values"},
+    "update_spreadsheet_values": {"fields": {}, "context": {}},
+    "clear_spreadsheet_values": {"fields": {}, "context": {}},
+}
+
+
+def _single_item_context(tool_name: str, items: List[Dict]) -> Dict[str, Any]:
+    """A read that returned exactly one item identifies what later steps act on."""
+    if len(items) != 1 or not isinstance(items[0], dict):
+        return {}
+    item = items[0]
+    if tool_name == "list_drive_files":
+        context = {"file_id": item.get("id"), "file_name": item.get("name")}
+        if "spreadsheet" in (item.get("mimeType") or ""):
+            context["spreadsheet_id"] = item.get("id")
+        return context
+    if tool_name == "read_emails":
+        return {"message_id": item.get("id")}
+    return {}
+
+
+def _has_dependents(step_no: Optional[int], remaining_plan: List[Dict]) -> bool:
+    return any(depends_on(step, step_no) for step in remaining_plan)
+
+
+def verify_by_rules(tool_name: str, tool_result: Any, remaining_plan: List[Dict], step_no: Optional[int] = None,
+                    output_used_by: List[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Verification result in the same shape as the LLM verifier, or None when the
+    result needs the LLM to interpret it.
+    """
+    rules = RESULT_RULES.get(tool_name)
+    if rules is None or not isinstance(tool_result, dict):
+        return None
+    if tool_result.get("error") or tool_result.get("status") != "success":
+        return None
+    for field, expected in rules["fields"].items():
+        if not isinstance(tool_result.get(field), expected):
+            return None
+
+    collection = rules.get("collection")
+    items = tool_result.get(collection) if collection else None
+    if collection and not items and (output_used_by or _has_dependents(step_no, remaining_plan)):
+        # Nothing found but later steps need it: whether to stop is a judgement call
+        return None
+
+    context = {key: tool_result[field] for field, key in rules["context"].items() if tool_result.get(field) is not None}
+    if collection:
+        context[f"{collection}_count"] = len(items)
+        context.update({k: v for k, v in _single_item_context(tool_name, items).items() if v is not None})
+
+    # Hand ids to later steps of this one that still wait for them (same contract as the LLM verifier)
+    updated_variables = {}
+    for step in remaining_plan:
+        if not depends_on(step, step_no, output_used_by):
+            continue
+        variables = step.get("variables") or {}
+        for key, value in context.items():
+            if key in (step.get("missing_variables") or []) or (key in variables and fillable(variables[key])):
+                updated_variables[key] = value
+
+    summary = f"{tool_name} succeeded"
+    if collection:
+        summary += f" ({len(items)} {collection})"
+    return {
+        "success": True,
+        "summary": summary,
+        "context_for_next_step": context,
+        "should_continue": True,
+        "updated_variables": updated_variables,
+        "reason": "Result matches the expected schema for this tool",
+        "verified_by": "rules",
+    }
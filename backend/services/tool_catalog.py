@@ -0,0 +1,196 @@
+"""
+Compiled tool catalog for planner prompts.
+
+tools.json is compiled once when it is loaded:
+
+- every tool's planner-facing view, which used to be rebuilt and pretty-printed for
+  every planner call, is serialized to one compact JSON fragment,
+- tools are indexed by id, so lookups no longer scan the list,
+- a small BM25 index over tool ids, descriptions, usage notes and parameter names
+  backs `select`, which keeps the top-k tools for a query.
+
+Before scoring, query words are expanded with a few domain synonyms ("meeting" ->
+calendar, "pdf" -> drive file...). Selected tools bring along the read-only tools that
+look up the ids they need, e.g. `delete_drive_file` brings `list_drive_files`. A
+query that matches nothing gets the full catalog, so the prefilter can shrink the
+prompt but cannot take away the tools a plan needs.
+"""
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import Optional, Dict, Any, List
+
+TOOL_CATALOG_PREFILTER = os.environ.get("TOOL_CATALOG_PREFILTER", "true").lower() == "true"
+TOOL_CATALOG_TOP_K = int(os.environ.get("TOOL_CATALOG_TOP_K", 6))
+# Tools scoring below this fraction of the best match are left out even when top-k has room
+TOOL_CATALOG_MIN_SCORE_RATIO = float(os.environ.get("TOOL_CATALOG_MIN_SCORE_RATIO", 0.3))
+
+BM25_K1, BM25_B = 1.2, 0.75
+# Tool id words say what the tool is; they count more than the prose around them
+TOOL_ID_WEIGHT = 3
+
+_STOPWORDS = {
+    "a", "an", "the", "my", "me", "i", "of", "for", "to", "in", "on", "and", "or", "with", "from", "about", "by",
+    "this", "that", "it", "its", "is", "are", "be", "at", "as", "use", "when", "user", "asks", "please", "can", "you",
+    "what", "which", "all", "any", "then", "one", "more", "new", "existing", "x", "next", "last", "id", "ids",
+}
+# Query word -> catalog words it stands for
+SYNONYMS = {
+    "meeting": "calendar event schedule", "meetings": "calendar event schedule", "appointment": "calendar event",
+    "call": "calendar event", "event": "calendar", "events": "calendar", "tomorrow": "calendar", "today": "calendar",
+    "week": "calendar", "free": "availability", "busy": "availability", "available": "availability",
+    "book": "schedule", "invite": "schedule attendee", "reschedule": "update calendar event", "move": "update",
+    "mail": "email", "inbox": "email read", "message": "email", "messages": "email", "reply": "send email",
+    "label": "labels", "archive": "labels", "star": "labels", "unread": "labels read",
+    "pdf": "drive file", "doc": "drive file", "document": "drive file", "report": "drive file", "contract": "drive file",
+    "resume": "drive file", "note": "drive file", "notes": "drive file", "folder": "drive", "txt": "drive file",
+    "summarize": "read content", "summary": "read content", "contents": "content", "open": "read",
+    "sheet": "spreadsheet", "sheets": "spreadsheet", "excel": "spreadsheet", "xlsx": "spreadsheet",
+    "range": "spreadsheet values", "cell": "spreadsheet values", "cells": "spreadsheet values",
+    "find": "list search", "search": "list", "show": "list read", "check": "availability",
+    "remove": "delete", "trash": "delete", "cancel": "delete", "erase": "clear", "rename": "update",
+    "edit": "update", "change": "update", "modify": "update", "write": "update", "save": "upload",
+    "make": "create", "add": "create", "put": "upload",
+}
+# An address in the query is somebody to send to or invite
+_EMAIL_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_ADDRESS_TERMS = "send email to_email attendee_email"
+# Parameter -> read-only tools that look it up; a selected tool that needs the id brings them along
+PARAM_PROVIDERS = {
+    "file_id": ["list_drive_files"],
+    "spreadsheet_id": ["list_drive_files"],
+    "message_id": ["read_emails"],
+}
+
+
+def _words(text: str) -> List[str]:
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(w) for w in _words(text) if w not in _STOPWORDS]
+
+
+def query_terms(query: str) -> List[str]:
+    """Query terms plus the catalog words their synonyms stand for."""
+    terms = _terms(_ADDRESS_TERMS) if _EMAIL_ADDRESS.search(query or "") else []
+    for word in _words(_EMAIL_ADDRESS.sub(" ", query or "")):
+        if word in SYNONYMS:
+            terms.extend(_terms(SYNONYMS[word]))
+        if word not in _STOPWORDS:
+            terms.append(_stem(word))
+    return terms
+
+
+class ToolCatalog:
+    """Tools of one tools.json, compiled for prompts, lookups and relevance selection."""
+
+    def __init__(self, definitions: List[Dict[str, Any]] = None, output_fields: Dict[str, str] = None,
+                 prefilter: bool = TOOL_CATALOG_PREFILTER, top_k: int = TOOL_CATALOG_TOP_K):
+        self.prefilter = prefilter
+        self.top_k = top_k
+        self.stats_counters = {"prompts": 0, "filtered": 0, "tools_offered": 0, "prompt_chars": 0, "prompt_chars_saved": 0}
+        self.load(definitions or [], output_fields or {})
+
+    def load(self, definitions: List[Dict[str, Any]], output_fields: Dict[str, str]) -> "ToolCatalog":
+        self.definitions = list(definitions)
+        self.by_id: Dict[str, Dict[str, Any]] = {t["tool_id"]: t for t in self.definitions}
+        self.info: Dict[str, Dict[str, Any]] = {}
+        self.fragments: Dict[str, str] = {}
+        self._term_freqs: Dict[str, Counter] = {}
+        for tool in self.definitions:
+            tool_id = tool["tool_id"]
+            self.info[tool_id] = {
+                "tool_id": tool_id,
+                "description": tool["tool_description"],
+                "required_params": tool["must_required_params"],
+                "optional_params": tool.get("optional_params", []),
+                "when_to_use": tool.get("exact_precise_tool_use", ""),
+                "returns": output_fields.get(tool_id, "status"),
+            }
+            self.fragments[tool_id] = json.dumps(self.info[tool_id], separators=(",", ":"))
+            params = " ".join(tool["must_required_params"] + tool.get("optional_params", []))
+            self._term_freqs[tool_id] = Counter(
+                _terms(tool_id.replace("_", " ")) * TOOL_ID_WEIGHT
+                + _terms(f"{tool['tool_description']} {tool.get('exact_precise_tool_use', '')} {params}")
+            )
+        lengths = [sum(tf.values()) for tf in self._term_freqs.values()]
+        self._avg_length = sum(lengths) / len(lengths) if lengths else 1.0
+        doc_freq = Counter(term for tf in self._term_freqs.values() for term in tf)
+        n = len(self.definitions)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+        self.full_prompt = self.prompt(list(self.by_id))
+        return self
+
+    def get(self, tool_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(tool_id)
+
+    def __contains__(self, tool_id: str) -> bool:
+        return tool_id in self.by_id
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """BM25 relevance of every tool to the (synonym-expanded) query."""
+        terms = Counter(query_terms(query))
+        scores = {}
+        for tool_id, tf in self._term_freqs.items():
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(tf.values()) / self._avg_length)
+            scores[tool_id] = sum(
+                self._idf[term] * tf[term] * (BM25_K1 + 1) / (tf[term] + length_norm) * count
+                for term, count in terms.items() if term in tf
+            )
+        return scores
+
+    def select(self, query: str) -> List[str]:
+        """Ids of the tools worth showing the planner for `query`, in catalog order."""
+        if not self.prefilter or len(self.by_id) <= self.top_k:
+            return list(self.by_id)
+        ranked = sorted(((score, tool_id) for tool_id, score in self.scores(query).items() if score > 0), reverse=True)
+        if not ranked:
+            return list(self.by_id)
+        floor = ranked[0][0] * TOOL_CATALOG_MIN_SCORE_RATIO
+        chosen = {tool_id for score, tool_id in ranked[:self.top_k] if score >= floor}
+        for tool_id in list(chosen):
+            for param in self.by_id[tool_id]["must_required_params"]:
+                chosen.update(p for p in PARAM_PROVIDERS.get(param, []) if p in self.by_id)
+        return [tool_id for tool_id in self.by_id if tool_id in chosen]
+
+    def prompt(self, tool_ids: List[str]) -> str:
+        """Compact JSON array of the given tools' planner views (fragments are precompiled)."""
+        return "[" + ",".join(self.fragments[t] for t in tool_ids if t in self.fragments) + "]"
+
+    def prompt_for(self, query: str) -> str:
+        """The 'Available Tools' block for a planner prompt about `query`."""
+        tool_ids = self.select(query)
+        text = self.full_prompt if len(tool_ids) == len(self.by_id) else self.prompt(tool_ids)
+        self.stats_counters["prompts"] += 1
+        self.stats_counters["filtered"] += len(tool_ids) < len(self.by_id)
+        self.stats_counters["tools_offered"] += len(tool_ids)
+        self.stats_counters["prompt_chars"] += len(text)
+        self.stats_counters["prompt_chars_saved"] += len(self.full_prompt) - len(text)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        prompts = self.stats_counters["prompts"]
+        return {
+            **self.stats_counters,
+            "tools": len(self.by_id),
+            "avg_tools_offered": round(self.stats_counters["tools_offered"] / prompts, 2) if prompts else None,
+            "full_prompt_chars": len(self.full_prompt),
+            "prefilter": self.prefilter,
+            "top_k": self.top_k,
+        }
+
+
+# Process-wide catalog; compiled from tools.json by the workflow controller at import time
+tool_catalog = ToolCatalog()
@@ -0,0 +1,276 @@
+"""
+Tool dispatch registry.
+
+Every entry of tools.json carries an `execution` block next to its prompt metadata:
+
+    "execution": {
+      "handler": "services.google_services:read_emails",
+      "read_only": true,         # no side effects: may run concurrently and be retried
+      "confirm": false,          # needs an explicit user confirmation before it runs
+      "timeout_sec": 20,
+      "retries": 2,              # extra attempts after a timeout/exception (read-only tools only)
+      "retry_backoff_sec": 0.5,  # doubled after every attempt
+      "max_concurrency": 4,      # invocations of this tool in flight across the process
+      "resource": "gmail"        # what the tool reads or changes; a write only affects reads of the same resource
+    }
+
+Writes whose later call supersedes an earlier one on the same target also name that
+target, e.g. `"merge_key": ["event_id"]` for update_calendar_event, so the plan
+optimizer can fold two such steps into one call.
+
+An optional `arguments_schema` (JSON Schema, see services/tool_schema.py) is compiled
+into a validator at load time; `validate` checks and coerces a call's arguments
+before it is dispatched.
+
+`ToolRegistry.load` resolves the handlers and validates every entry up front, raising
+one `ToolRegistryError` that lists all problems, so a broken tools.json stops the
+server at startup instead of failing the first request that needs the tool.
+`execute` dispatches a call under the tool's concurrency limit and timeout and records
+a latency histogram plus call/error/timeout/retry counts per tool.
+"""
+import time
+import asyncio
+import inspect
+import importlib
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from services.tool_schema import ArgumentValidator, SchemaError
+
+# Keys an `execution` block may leave out
+TOOL_EXECUTION_DEFAULTS = {
+    "read_only": False,
+    "confirm": False,
+    "timeout_sec": 30,
+    "retries": 0,
+    "retry_backoff_sec": 0.5,
+    "max_concurrency": 4,
+    "resource": None,
+    "merge_key": None,
+}
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class ToolRegistryError(ValueError):
+    """tools.json failed validation; `problems` lists every issue found."""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("Invalid tool registry:\n  - " + "\n  - ".join(problems))
+
+
+def resolve_handler(path: str) -> Callable:
+    """Import a `package.module:function` reference."""
+    module_name, _, attr = path.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"handler '{path}' must look like 'package.module:function'")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class ToolMetrics:
+    """Latency distribution (last `window` calls) and outcome counters of one tool."""
+
+    def __init__(self, window: int = 1024):
+        self.latencies_ms = deque(maxlen=window)
+        self.histogram = {b: 0 for b in LATENCY_BUCKETS_MS}
+        self.overflow = 0
+        self.counters = {"calls": 0, "errors": 0, "timeouts": 0, "retries": 0, "in_flight": 0,
+                         "arguments_coerced": 0, "arguments_rejected": 0}
+
+    def record(self, latency_ms: float, outcome: str):
+        self.latencies_ms.append(latency_ms)
+        bucket = next((b for b in LATENCY_BUCKETS_MS if latency_ms <= b), None)
+        if bucket is None:
+            self.overflow += 1
+        else:
+            self.histogram[bucket] += 1
+        self.counters["calls"] += 1
+        if outcome == "timeout":
+            self.counters["timeouts"] += 1
+        if outcome in ("error", "timeout"):
+            self.counters["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 2) if latencies else None
+
+        histogram = {f"<={b}ms": n for b, n in self.histogram.items()}
+        histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self.overflow
+        return {
+            **self.counters,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": round(latencies[-1], 2) if latencies else None,
+            "latency_histogram": histogram,
+        }
+
+
+class ToolSpec:
+    """One validated tool: its handler and execution policy."""
+
+    def __init__(self, tool_id: str, handler: Callable, read_only: bool, confirm: bool, timeout_sec: float,
+                 retries: int, retry_backoff_sec: float, max_concurrency: int, resource: Optional[str],
+                 merge_key: Optional[List[str]] = None, validator: Optional[ArgumentValidator] = None):
+        self.tool_id = tool_id
+        self.handler = handler
+        self.read_only = read_only
+        self.confirm = confirm
+        self.timeout_sec = timeout_sec
+        self.retries = retries
+        self.retry_backoff_sec = retry_backoff_sec
+        self.max_concurrency = max_concurrency
+        self.resource = resource
+        self.merge_key = merge_key
+        self.validator = validator
+        self.metrics = ToolMetrics()
+        # asyncio primitives belong to one event loop; rebuilt if the registry is used from another
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.max_concurrency), loop
+        return self._semaphore
+
+
+class ToolRegistry:
+    def __init__(self):
+        self.tools: Dict[str, ToolSpec] = {}
+
+    def load(self, definitions: List[Dict[str, Any]]) -> "ToolRegistry":
+        """Validate tool definitions (tools.json entries) and replace the registered tools."""
+        problems, tools = [], {}
+        for index, definition in enumerate(definitions):
+            tool_id = definition.get("tool_id")
+            where = f"tool '{tool_id}'" if tool_id else f"entry #{index}"
+            if not tool_id or not isinstance(tool_id, str):
+                problems.append(f"{where}: missing tool_id")
+                continue
+            if tool_id in tools:
+                problems.append(f"{where}: duplicate tool_id")
+                continue
+            execution = definition.get("execution")
+            if not isinstance(execution, dict) or not execution.get("handler"):
+                problems.append(f"{where}: missing execution.handler")
+                continue
+            unknown = set(execution) - set(TOOL_EXECUTION_DEFAULTS) - {"handler"}
+            if unknown:
+                problems.append(f"{where}: unknown execution keys {sorted(unknown)}")
+            policy = {**TOOL_EXECUTION_DEFAULTS, **{k: v for k, v in execution.items() if k in TOOL_EXECUTION_DEFAULTS}}
+
+            try:
+                handler = resolve_handler(execution["handler"])
+            except (ImportError, AttributeError, ValueError) as e:
+                problems.append(f"{where}: cannot resolve handler '{execution['handler']}': {e}")
+                continue
+            if not inspect.iscoroutinefunction(handler):
+                problems.append(f"{where}: handler '{execution['handler']}' is not an async function")
+                continue
+
+            for key in ("read_only", "confirm"):
+                if not isinstance(policy[key], bool):
+                    problems.append(f"{where}: {key} must be true or false")
+            for key in ("timeout_sec", "retry_backoff_sec"):
+                if isinstance(policy[key], bool) or not isinstance(policy[key], (int, float)) or policy[key] < 0 \
+                        or (key == "timeout_sec" and policy[key] == 0):
+                    problems.append(f"{where}: {key} must be a positive number")
+            for key, minimum in (("retries", 0), ("max_concurrency", 1)):
+                if isinstance(policy[key], bool) or not isinstance(policy[key], int) or policy[key] < minimum:
+                    problems.append(f"{where}: {key} must be an integer >= {minimum}")
+            if policy["resource"] is not None and not isinstance(policy["resource"], str):
+                problems.append(f"{where}: resource must be a string")
+            merge_key = policy["merge_key"]
+            if merge_key is not None:
+                if not isinstance(merge_key, list) or not merge_key or not all(isinstance(k, str) and k for k in merge_key):
+                    problems.append(f"{where}: merge_key must be a non-empty list of parameter names")
+                elif policy["read_only"] is True:
+                    problems.append(f"{where}: merge_key is only allowed for tools that write")
+            if policy["retries"] and policy["read_only"] is False:
+                # A timed-out send/delete may still have happened; retrying it could repeat the side effect
+                problems.append(f"{where}: retries are only allowed for read_only tools")
+            validator = None
+            if definition.get("arguments_schema") is not None:
+                try:
+                    validator = ArgumentValidator(definition["arguments_schema"])
+                except SchemaError as e:
+                    problems.append(f"{where}: arguments_schema {e}")
+                else:
+                    required = definition.get("must_required_params") or []
+                    if set(validator.required) != set(required):
+                        problems.append(f"{where}: arguments_schema requires {sorted(validator.required)} but must_required_params is {sorted(required)}")
+            tools[tool_id] = ToolSpec(tool_id, handler, **policy, validator=validator)
+
+        if problems:
+            raise ToolRegistryError(problems)
+        self.tools = tools
+        return self
+
+    def get(self, tool_id: str) -> Optional[ToolSpec]:
+        return self.tools.get(tool_id)
+
+    def read_only_tools(self) -> set:
+        return {t for t, spec in self.tools.items() if spec.read_only}
+
+    def confirmation_tools(self) -> set:
+        return {t for t, spec in self.tools.items() if spec.confirm}
+
+    def validate(self, tool_name: str, arguments: Dict[str, Any], record: bool = True) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Arguments coerced to the tool's schema and {parameter: problem}; unchanged when the tool has no schema."""
+        spec = self.tools.get(tool_name)
+        if spec is None or spec.validator is None:
+            return arguments, {}
+        coerced, invalid = spec.validator.validate(arguments)
+        if record and invalid:
+            spec.metrics.counters["arguments_rejected"] += 1
+        elif record and coerced != arguments:
+            spec.metrics.counters["arguments_coerced"] += 1
+        return coerced, invalid
+
+    def may_interfere(self, write_tool: str, read_tool: str) -> bool:
+        """Whether running `write_tool` could change what `read_tool` returns (unknown resources always may)."""
+        write, read = self.tools.get(write_tool), self.tools.get(read_tool)
+        if write is None or read is None or write.resource is None or read.resource is None:
+            return True
+        return write.resource == read.resource
+
+    async def execute(self, db, user_id: int, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a tool under its concurrency limit, timeout and retry policy; errors come back as a status dict."""
+        spec = self.tools.get(tool_name)
+        if spec is None:
+            return {"status": "error", "message": f"Tool '{tool_name}' not implemented"}
+
+        message = None
+        for attempt in range(spec.retries + 1):
+            if attempt:
+                spec.metrics.counters["retries"] += 1
+                await asyncio.sleep(spec.retry_backoff_sec * 2 ** (attempt - 1))
+            async with spec.semaphore():
+                spec.metrics.counters["in_flight"] += 1
+                start = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(spec.handler(db, user_id, arguments), spec.timeout_sec)
+                except asyncio.TimeoutError:
+                    outcome, message = "timeout", f"Tool '{tool_name}' timed out after {spec.timeout_sec}s"
+                except Exception as e:
+                    outcome, message = "error", str(e)
+                else:
+                    is_error = isinstance(result, dict) and result.get("status") == "error"
+                    spec.metrics.record((time.perf_counter() - start) * 1000, "error" if is_error else "ok")
+                    return result
+                finally:
+                    spec.metrics.counters["in_flight"] -= 1
+            spec.metrics.record((time.perf_counter() - start) * 1000, outcome)
+            print(f"[TOOL REGISTRY] {tool_name} attempt {attempt + 1}/{spec.retries + 1} failed ({outcome}): {message}")
+        return {"status": "error", "message": message}
+
+    def stats(self) -> Dict[str, Any]:
+        return {tool_id: {"read_only": spec.read_only, "timeout_sec": spec.timeout_sec,
+                          "max_concurrency": spec.max_concurrency, **spec.metrics.stats()}
+                for tool_id, spec in self.tools.items()}
+
+
+# Process-wide registry; loaded from tools.json by the workflow controller at import time
+tool_registry = ToolRegistry()
@@ -0,0 +1,284 @@
+"""
+Compiled JSON-Schema validation of tool arguments.
+
+Every tools.json entry may carry an `arguments_schema` (a JSON Schema for the arguments
+object). `compile_schema` turns it into a tree of small closures once, when the tool
+registry loads, so checking a call walks prepared validators instead of interpreting
+the schema again. Validation also coerces what the planner and the resolver commonly
+get slightly wrong:
+
+- "5" for an integer, 5 for a string, "true" for a boolean,
+- a comma-separated string (or a single value) for an array, a JSON string for an
+  array or object,
+- `date-time` / `date` values in any format `datetime.fromisoformat` or a few common
+  layouts understand (and anything dateparser parses, when it is installed),
+  normalized to ISO 8601.
+
+Supported keywords: type (one or a list), enum, format (date-time, date, email,
+a1-range), pattern, minimum, maximum, minLength, maxLength, items, minItems,
+properties, required, additionalProperties, plus title/description. Unknown keywords
+fail compilation, so a typo in tools.json stops the server at startup.
+"""
+import re
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import dateparser
+except ImportError:
+    dateparser = None
+
+# (coerced value, [(path, message)])
+Validator = Callable[[Any, str], Tuple[Any, List[Tuple[str, str]]]]
+
+SUPPORTED_KEYWORDS = {"type", "enum", "format", "pattern", "minimum", "maximum", "minLength", "maxLength", "items",
+                      "minItems", "properties", "required", "additionalProperties", "title", "description"}
+_TYPES = {"string", "integer", "number", "boolean", "array", "object", "null"}
+_DATETIME_LAYOUTS = ("%Y-%m-%d %I:%M %p", "%Y-%m-%d %I%p", "%Y-%m-%d %I:%M%p", "%B %d, %Y %H:%M", "%B %d %Y %H:%M",
+                     "%B %d, %Y %I:%M %p", "%B %d %Y %I:%M %p", "%B %d, %Y %I%p", "%b %d, %Y %H:%M", "%b %d %Y %I:%M %p",
+                     "%d %B %Y %H:%M", "%d %b %Y %H:%M")
+_DATE_LAYOUTS = ("%B %d, %Y", "%B %d %Y", "%b %d, %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y")
+_EMAIL = re.compile(r"^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$")
+# Sheet1, 'My Sheet'!A1:D20, Sheet1!A:Z, A1:B2, 2:5
+_A1_RANGE = re.compile(r"^(?:(?:'[^']+'|[^'!:]+)!)?(?:[A-Za-z]{1,3}\d*(?::[A-Za-z]{1,3}\d*)?|\d+:\d+)$|^(?:'[^']+'|[^'!:]+)$")
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def parse_datetime(value: str) -> Optional[datetime]:
+    text = value.strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for layout in _DATETIME_LAYOUTS + _DATE_LAYOUTS:
+        try:
+            return datetime.strptime(text, layout)
+        except ValueError:
+            continue
+    if dateparser is not None:
+        return dateparser.parse(text, settings={"PREFER_DATES_FROM": "future"})
+    return None
+
+
+def _format_datetime(value: str) -> Tuple[Any, Optional[str]]:
+    parsed = parse_datetime(value)
+    if parsed is None:
+        return value, "is not a date and time (expected e.g. 2026-03-02T10:00:00)"
+    return parsed.isoformat(timespec="seconds"), None
+
+
+def _format_date(value: str) -> Tuple[Any, Optional[str]]:
+    parsed = parse_datetime(value)
+    if parsed is None:
+        return value, "is not a date (expected e.g. 2026-03-02)"
+    return parsed.date().isoformat(), None
+
+
+def _format_email(value: str) -> Tuple[Any, Optional[str]]:
+    value = value.strip()
+    return value, None if _EMAIL.match(value) else "is not an email address"
+
+
+def _format_a1_range(value: str) -> Tuple[Any, Optional[str]]:
+    value = value.strip()
+    return value, None if _A1_RANGE.match(value) else "is not a sheet range (expected e.g. Sheet1!A1:D20)"
+
+
+FORMATS: Dict[str, Callable[[str], Tuple[Any, Optional[str]]]] = {
+    "date-time": _format_datetime, "date": _format_date, "email": _format_email, "a1-range": _format_a1_range,
+}
+
+
+def _coerce(value: Any, kind: str, item_kind: Optional[str]) -> Tuple[Any, bool]:
+    """Value converted to JSON type `kind` when that is unambiguous; (value, matched?)."""
+    if kind == "null":
+        return value, value is None
+    if kind == "boolean":
+        if isinstance(value, bool):
+            return value, True
+        if isinstance(value, str) and value.strip().lower() in ("true", "yes", "false", "no"):
+            return value.strip().lower() in ("true", "yes"), True
+        return value, False
+    if kind in ("integer", "number"):
+        if isinstance(value, bool):
+            return value, False
+        if isinstance(value, str):
+            try:
+                value = float(value.strip()) if kind == "number" or "." in value else int(value.strip())
+            except ValueError:
+                return value, False
+        if kind == "integer" and isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return value, isinstance(value, int) if kind == "integer" else isinstance(value, (int, float))
+    if kind == "string":
+        if isinstance(value, str):
+            return value, True
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value), True
+        return value, False
+    if kind == "array":
+        if isinstance(value, list):
+            return value, True
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith("["):
+                try:
+                    parsed = json.loads(text)
+                    if isinstance(parsed, list):
+                        return parsed, True
+                except ValueError:
+                    pass
+            if item_kind in (None, "string") and text:
+                return [part.strip() for part in re.split(r"[,;]", text) if part.strip()], True
+        if value is not None and not isinstance(value, dict):
+            return [value], True
+        return value, False
+    if kind == "object":
+        if isinstance(value, dict):
+            return value, True
+        if isinstance(value, str) and value.strip().startswith("{"):
+            try:
+                parsed = json.loads(value)
+                return parsed, isinstance(parsed, dict)
+            except ValueError:
+                pass
+        return value, False
+    return value, False
+
+
+def compile_schema(schema: Dict[str, Any], where: str = "$") -> Validator:
+    """Compile a schema into a validator; raises SchemaError for unsupported or malformed keywords."""
+    if not isinstance(schema, dict):
+        raise SchemaError(f"{where}: schema must be an object")
+    unknown = set(schema) - SUPPORTED_KEYWORDS
+    if unknown:
+        raise SchemaError(f"{where}: unsupported keywords {sorted(unknown)}")
+    kinds = schema.get("type")
+    kinds = [kinds] if isinstance(kinds, str) else list(kinds or [])
+    if any(k not in _TYPES for k in kinds):
+        raise SchemaError(f"{where}: unknown type {kinds}")
+    fmt = schema.get("format")
+    if fmt is not None and fmt not in FORMATS:
+        raise SchemaError(f"{where}: unknown format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    format_check = FORMATS.get(fmt)
+    try:
+        pattern = re.compile(schema["pattern"]) if "pattern" in schema else None
+    except (re.error, TypeError) as e:
+        raise SchemaError(f"{where}: invalid pattern: {e}")
+    enum = schema.get("enum")
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    min_length, max_length, min_items = schema.get("minLength"), schema.get("maxLength"), schema.get("minItems")
+    items = compile_schema(schema["items"], f"{where}[]") if "items" in schema else None
+    item_kind = schema["items"].get("type") if isinstance(schema.get("items"), dict) else None
+    properties = {name: compile_schema(sub, f"{where}.{name}") for name, sub in (schema.get("properties") or {}).items()}
+    required = list(schema.get("required") or [])
+    additional = schema.get("additionalProperties", True)
+    if additional is not True and additional is not False:
+        raise SchemaError(f"{where}: additionalProperties must be true or false")
+
+    def validate(value: Any, path: str) -> Tuple[Any, List[Tuple[str, str]]]:
+        if kinds:
+            for kind in kinds:
+                coerced, matched = _coerce(value, kind, item_kind)
+                if matched:
+                    value = coerced
+                    break
+            else:
+                return value, [(path, f"must be {' or '.join(kinds)}")]
+        problems = []
+        if isinstance(value, str):
+            if format_check is not None:
+                value, problem = format_check(value)
+                if problem:
+                    return value, [(path, problem)]
+            if pattern is not None and not pattern.search(value):
+                problems.append((path, f"does not match {pattern.pattern}"))
+            if min_length is not None and len(value) < min_length:
+                problems.append((path, f"must have at least {min_length} characters"))
+            if max_length is not None and len(value) > max_length:
+                problems.append((path, f"must have at most {max_length} characters"))
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if minimum is not None and value < minimum:
+                problems.append((path, f"must be >= {minimum}"))
+            if maximum is not None and value > maximum:
+                problems.append((path, f"must be <= {maximum}"))
+        if enum is not None and value not in enum:
+            problems.append((path, f"must be one of {', '.join(map(str, enum))}"))
+        if isinstance(value, list):
+            if min_items is not None and len(value) < min_items:
+                problems.append((path, f"must have at least {min_items} item(s)"))
+            if items is not None:
+                checked = []
+                for i, item in enumerate(value):
+                    item, item_problems = items(item, f"{path}[{i}]")
+                    checked.append(item)
+                    problems.extend(item_problems)
+                value = checked
+        if isinstance(value, dict):
+            checked = {}
+            for name in required:
+                if value.get(name) in (None, ""):
+                    problems.append((f"{path}.{name}" if path else name, "is required"))
+            for name, item in value.items():
+                key = f"{path}.{name}" if path else name
+                if name in properties:
+                    if item in (None, ""):
+                        continue  # left out (planners write null, forms send ""); required ones are reported above
+                    item, item_problems = properties[name](item, key)
+                    problems.extend(item_problems)
+                elif additional is False:
+                    problems.append((key, "is not a parameter of this tool"))
+                    continue
+                checked[name] = item
+            value = checked
+        return value, problems
+
+    return validate
+
+
+class ArgumentValidator:
+    """Compiled `arguments_schema` of one tool."""
+
+    def __init__(self, schema: Dict[str, Any]):
+        if schema.get("type", "object") != "object":
+            raise SchemaError("$: arguments_schema must describe an object")
+        self.schema = schema
+        self.required = list(schema.get("required") or [])
+        self._validate = compile_schema(schema)
+
+    def validate(self, arguments: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Coerced arguments and {parameter: problem} (empty when the call may run)."""
+        value, problems = self._validate(dict(arguments or {}), "")
+        invalid = {}
+        for path, message in problems:
+            param = re.split(r"[.\[]", path, maxsplit=1)[0]
+            invalid.setdefault(param, f"{path} {message}")
+        return value, invalid
+
+    def field_hints(self, param: str) -> Dict[str, Any]:
+        """Form field type, options and validation for a parameter, for the HITL form."""
+        schema = (self.schema.get("properties") or {}).get(param) or {}
+        hints: Dict[str, Any] = {}
+        kinds = schema.get("type")
+        kinds = [kinds] if isinstance(kinds, str) else list(kinds or [])
+        if "enum" in schema:
+            hints["type"] = "select"
+            hints["options"] = [{"value": str(v), "label": str(v)} for v in schema["enum"]]
+        elif schema.get("format") == "date-time":
+            hints["type"] = "datetime"
+        elif schema.get("format") == "date":
+            hints["type"] = "date"
+        elif schema.get("format") == "email" or (schema.get("items") or {}).get("format") == "email":
+            hints["type"] = "email" if "array" not in kinds else "text"
+        elif kinds and kinds[0] in ("integer", "number"):
+            hints["type"] = "number"
+        validation = {key: schema[keyword] for keyword, key in (("minimum", "min"), ("maximum", "max"), ("pattern", "pattern")) if keyword in schema}
+        if validation:
+            hints["validation"] = validation
+        if schema.get("description"):
+            hints["placeholder"] = schema["description"]
+        return hints
@@ -0,0 +1,286 @@
+"""
+Event-sourced workflow execution log.
+
+Every transition of a workflow run (plan created, step started/completed/failed,
+HITL requested/answered, workflow finished) is appended to `workflow_events` with a
+per-session sequence number. `apply_event` folds an event into the resumable part
+of the workflow state, so the state can be rebuilt on any worker from the log when
+the workflow state store has nothing for the session (restart, eviction, another
+worker without Redis).
+
+Appends of one session are serialized within the process; the unique (session_id, seq)
+key settles races between workers, and a locked or busy database (SQLite under
+concurrent writers) is retried with a short backoff instead of dropping the event.
+
+Every WORKFLOW_SNAPSHOT_EVERY events the current state is written to
+`workflow_snapshots`; a rebuild reads the snapshot and folds only the events after it.
+
+Replay a run for debugging (reads the log only, never calls Google or the LLM):
+    python -m services.workflow_log <session_id> [--verbose]
+"""
+import os
+import copy
+import json
+import asyncio
+import weakref
+import argparse
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import AsyncSessionLocal, WorkflowEvent, WorkflowSnapshot
+from services.plan_templating import apply_updated_variables
+
+WORKFLOW_EVENT_LOG_ENABLED = os.environ.get("WORKFLOW_EVENT_LOG_ENABLED", "true").lower() == "true"
+WORKFLOW_SNAPSHOT_EVERY = int(os.environ.get("WORKFLOW_SNAPSHOT_EVERY", 20))
+APPEND_RETRIES = 5
+APPEND_BACKOFF_SEC = 0.05
+# Driver messages of errors that go away once the other writer commits
+TRANSIENT_ERRORS = ("locked", "busy", "deadlock", "could not serialize")
+
+# The part of the workflow state that the log can rebuild
+RESUMABLE_KEYS = ("user_goal", "plan", "completed_steps", "current_step", "pending_tool", "execution_context", "step_outputs")
+
+
+def empty_state() -> Dict[str, Any]:
+    return {"user_goal": None, "plan": None, "completed_steps": [], "current_step": 0,
+            "pending_tool": None, "execution_context": {}, "step_outputs": {}}
+
+
+def snapshot_of(state: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-safe copy of the resumable keys."""
+    return json.loads(json.dumps({k: state.get(k) for k in RESUMABLE_KEYS}, default=str))
+
+
+def _mark_done(state: Dict[str, Any], step_no: Optional[int]):
+    completed = state.setdefault("completed_steps", [])
+    if step_no is not None and step_no not in completed:
+        completed.append(step_no)
+    state["current_step"] = len(completed)
+
+
+def _remaining(state: Dict[str, Any], exclude: int = None) -> List[Dict]:
+    completed = set(state.get("completed_steps") or [])
+    return [s for s in state.get("plan") or [] if s.get("step") not in completed and s.get("step") != exclude]
+
+
+def _clear_run(state: Dict[str, Any]):
+    state.update(plan=None, pending_tool=None, execution_context={}, step_outputs={})
+
+
+def apply_file_selection(state: Dict[str, Any], step_no: Optional[int], selected_item: Dict[str, Any]):
+    """A file picked in the selection prompt becomes the step's output and the `file_id` of later steps."""
+    selected_id = selected_item.get("id")
+    state["execution_context"]["selected_file_id"] = selected_id
+    state["execution_context"]["selected_file_name"] = selected_item.get("name")
+    # The selection is this step's output for {{steps.N.files[0].id}} references
+    state.setdefault("step_outputs", {})[str(step_no)] = {"status": "success", "files": [selected_item]}
+    for future_step in _remaining(state, exclude=step_no):
+        if "file_id" in future_step.get("variables", {}):
+            future_step["variables"]["file_id"] = selected_id
+        if "missing_variables" in future_step and "file_id" in future_step["missing_variables"]:
+            future_step["missing_variables"].remove("file_id")
+            future_step.setdefault("variables", {})["file_id"] = selected_id
+
+
+def apply_event(state: Dict[str, Any], event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold one event into `state` (in place) and return it."""
+    step_no = payload.get("step")
+    if event_type == "plan_created":
+        state.update(empty_state())
+        state.update(user_goal=payload.get("user_goal"), plan=copy.deepcopy(payload.get("plan")),
+                     execution_context=dict(payload.get("execution_context") or {}))
+    elif event_type == "hitl_requested":
+        state["pending_tool"] = copy.deepcopy(payload.get("pending_tool"))
+        if "execution_context" in payload:
+            state["execution_context"] = dict(payload["execution_context"])
+    elif event_type == "hitl_answered":
+        outcome = payload.get("outcome")
+        if outcome == "cancelled":
+            state["pending_tool"] = None
+            _mark_done(state, step_no)
+        elif outcome == "selected":
+            apply_file_selection(state, step_no, payload.get("response") or {})
+            state["pending_tool"] = None
+            _mark_done(state, step_no)
+        elif outcome == "provided" and state.get("pending_tool"):
+            state["pending_tool"].setdefault("arguments", {}).update(payload.get("response") or {})
+    elif event_type in ("step_completed", "step_skipped"):
+        if event_type == "step_completed":
+            state.setdefault("step_outputs", {})[str(step_no)] = payload.get("output")
+            if "execution_context" in payload:
+                state["execution_context"] = dict(payload["execution_context"])
+            producer = next((s for s in state.get("plan") or [] if s.get("step") == step_no), {"step": step_no})
+            apply_updated_variables(_remaining(state, exclude=step_no), producer, payload.get("updated_variables"))
+        if (state.get("pending_tool") or {}).get("step") == step_no:
+            state["pending_tool"] = None
+        _mark_done(state, step_no)
+    elif event_type in ("step_failed", "workflow_finished"):
+        _clear_run(state)
+    elif event_type == "workflow_reset":
+        _clear_run(state)
+        state.update(completed_steps=[], current_step=0)
+    # step_started only marks the timeline
+    return state
+
+
+def replay(events: List[Dict[str, Any]], start: Dict[str, Any] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Yield (event, state after the event) for each event, starting from `start` (a snapshot) or an empty state."""
+    state = copy.deepcopy(start) if start else empty_state()
+    for event in events:
+        apply_event(state, event["event_type"], event["payload"])
+        yield event, state
+
+
+class WorkflowEventLog:
+    """Appends workflow events and rebuilds state from the latest snapshot plus the events after it."""
+
+    def __init__(self, session_factory=None, snapshot_every: int = WORKFLOW_SNAPSHOT_EVERY, enabled: bool = WORKFLOW_EVENT_LOG_ENABLED):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.snapshot_every = snapshot_every
+        self.enabled = enabled
+        self.stats_counters = {"appends": 0, "append_conflicts": 0, "append_retries": 0, "append_errors": 0, "snapshots": 0,
+                               "rebuilds": 0, "events_folded": 0}
+        # session_id -> lock of the appends in flight; asyncio locks belong to one event loop
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._loop = None
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._locks, self._loop = weakref.WeakValueDictionary(), loop
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def append(self, session_id: str, event_type: str, payload: Dict[str, Any], state: Dict[str, Any] = None) -> Optional[int]:
+        """
+        Append one event; returns its sequence number (None when disabled or on failure,
+        the log never breaks the workflow). `state` is the state after the event and is
+        stored as the session snapshot every `snapshot_every` events.
+        """
+        if not self.enabled:
+            return None
+        payload = json.loads(json.dumps(payload, default=str))
+        try:
+            async with self._session_lock(session_id):
+                for attempt in range(APPEND_RETRIES):
+                    async with self.session_factory() as db:
+                        try:
+                            last = (await db.execute(
+                                select(func.coalesce(func.max(WorkflowEvent.seq), 0)).where(WorkflowEvent.session_id == session_id)
+                            )).scalar()
+                            seq = last + 1
+                            db.add(WorkflowEvent(session_id=session_id, seq=seq, event_type=event_type, payload=payload))
+                            snapshot = state is not None and seq % self.snapshot_every == 0
+                            if snapshot:
+                                await db.merge(WorkflowSnapshot(session_id=session_id, seq=seq, state=snapshot_of(state)))
+                            await db.commit()
+                        except IntegrityError:
+                            # Another worker took this sequence number
+                            await db.rollback()
+                            self.stats_counters["append_conflicts"] += 1
+                            continue
+                        except OperationalError as e:
+                            if not any(word in str(e).lower() for word in TRANSIENT_ERRORS) or attempt == APPEND_RETRIES - 1:
+                                raise
+                            await db.rollback()
+                            self.stats_counters["append_retries"] += 1
+                            await asyncio.sleep(APPEND_BACKOFF_SEC * 2 ** attempt)
+                            continue
+                    self.stats_counters["appends"] += 1
+                    self.stats_counters["snapshots"] += snapshot
+                    return seq
+                raise RuntimeError(f"no free sequence number after {APPEND_RETRIES} attempts")
+        except Exception as e:
+            self.stats_counters["append_errors"] += 1
+            print(f"[WORKFLOW LOG] Append of {event_type} failed (Session: {session_id}): {e}")
+            return None
+
+    async def read(self, session_id: str, use_snapshot: bool = True) -> Tuple[Optional[Dict[str, Any]], int, List[Dict[str, Any]]]:
+        """(snapshot state or None, snapshot seq, events after the snapshot in order)."""
+        async with self.session_factory() as db:
+            snapshot = await db.get(WorkflowSnapshot, session_id) if use_snapshot else None
+            after = snapshot.seq if snapshot else 0
+            rows = (await db.execute(
+                select(WorkflowEvent).where(WorkflowEvent.session_id == session_id, WorkflowEvent.seq > after).order_by(WorkflowEvent.seq)
+            )).scalars().all()
+        return (snapshot.state if snapshot else None), after, [r.to_dict() for r in rows]
+
+    async def rebuild(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Resumable state of the session from its log, or None when nothing was logged."""
+        if not self.enabled:
+            return None
+        try:
+            start, _, events = await self.read(session_id)
+        except Exception as e:
+            print(f"[WORKFLOW LOG] Rebuild failed (Session: {session_id}): {e}")
+            return None
+        if start is None and not events:
+            return None
+        state = start or empty_state()
+        for _, state in replay(events, start):
+            pass
+        self.stats_counters["rebuilds"] += 1
+        self.stats_counters["events_folded"] += len(events)
+        return state
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "enabled": self.enabled, "snapshot_every": self.snapshot_every}
+
+
+# Process-wide log used by the workflow controller
+workflow_log = WorkflowEventLog()
+
+
+def _summarize(event: Dict[str, Any], verbose: bool) -> str:
+    payload = event["payload"]
+    if verbose:
+        return json.dumps(payload, default=str)
+    parts = []
+    for key in ("step", "tool", "outcome", "status", "error"):
+        if payload.get(key) is not None:
+            parts.append(f"{key}={payload[key]}")
+    if "arguments" in payload:
+        parts.append(f"arguments={json.dumps(payload['arguments'], default=str)[:120]}")
+    if "output" in payload:
+        parts.append(f"output={json.dumps(payload['output'], default=str)[:120]}")
+    if event["event_type"] == "plan_created":
+        parts.append("plan=" + " -> ".join(str(s.get("tool_id")) for s in payload.get("plan") or []))
+    return " ".join(parts)
+
+
+async def print_replay(session_id: str, verbose: bool = False):
+    """Print the recorded run step by step and check the snapshot against a fold of the whole log."""
+    _, _, events = await workflow_log.read(session_id, use_snapshot=False)
+    if not events:
+        print(f"No workflow events for session {session_id}")
+        return
+    state = None
+    for event, state in replay(events):
+        print(f"#{event['seq']:<4} {event['created_at'] or '':<32} {event['event_type']:<18} {_summarize(event, verbose)}")
+        print(f"      -> step {state['current_step']} done={state['completed_steps']} "
+              f"pending={(state['pending_tool'] or {}).get('name')} plan={'yes' if state['plan'] else 'no'}")
+    print("\nRebuilt state:")
+    print(json.dumps(state, indent=2, default=str))
+    snapshot_state, snapshot_seq, _ = await workflow_log.read(session_id)
+    if snapshot_state is not None:
+        folded = snapshot_of(next(s for e, s in replay(events) if e["seq"] == snapshot_seq))
+        print(f"\nSnapshot at #{snapshot_seq}: {'matches the log' if folded == snapshot_state else 'DIFFERS from the log'}")
+
+
+if __name__ == "__main__":
+    from models import async_engine
+
+    parser = argparse.ArgumentParser(description="Replay a recorded workflow run from the event log")
+    parser.add_argument("session_id")
+    parser.add_argument("--verbose", action="store_true", help="print full event payloads")
+    args = parser.parse_args()
+
+    async def main():
+        await print_replay(args.session_id, args.verbose)
+        await async_engine.dispose()
+
+    asyncio.run(main())
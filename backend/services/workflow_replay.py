@@ -0,0 +1,283 @@
+"""
+Record and replay workflow runs.
+
+With WORKFLOW_RECORD_DIR set, every websocket connection of the workflow handler is
+written to `<dir>/<session>-<timestamp>.json` when it closes: the client messages, every
+model response (stage, model, content, token usage, latency, time to first token) and
+every Google tool result (arguments, result, latency). Tool calls are captured at the
+tool registry boundary, so a fixture holds exactly what the workflow saw.
+
+`WorkflowReplay` drives `workflow_handler` through such a file without OpenAI or Google:
+the controller's `llm_call` and `execute_google_tool` hand calls to the replay active in
+the current context, which answers from the recording after an artificial latency
+(recorded latency * `latency_scale`, a fixed `llm_latency_ms` / `tool_latency_ms`, or
+`llm_latency_fn` to model another model's speed) and times every call per stage for the
+benchmarks (benchmark/bench_workflow_replay.py, benchmark/bench_model_tiers.py).
+
+Model responses are matched by stage and prompt fingerprint, falling back to recording
+order within the stage when a prompt changed; tool results by tool and arguments,
+falling back to recording order per tool.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Callable
+from fastapi import WebSocketDisconnect
+
+# Directory for recorded runs; recording is off when unset
+WORKFLOW_RECORD_DIR = os.environ.get("WORKFLOW_RECORD_DIR", "")
+FIXTURE_VERSION = 1
+# Streamed responses are replayed in chunks of this many characters
+REPLAY_CHUNK_CHARS = 16
+# Client messages that only keep the connection alive
+_KEEPALIVE_TYPES = ("pong", "heartbeat")
+
+# Set by workflow_handler (recording) and WorkflowReplay.run (replay) for the current connection
+active_recorder: ContextVar[Optional["WorkflowRecorder"]] = ContextVar("active_recorder", default=None)
+active_replay: ContextVar[Optional["WorkflowReplay"]] = ContextVar("active_replay", default=None)
+
+
+class ReplayError(LookupError):
+    """The recording has no response left for a model call."""
+
+
+def prompt_fingerprint(request: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(request.get("messages"), sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _call_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    return tool_name + ":" + json.dumps(arguments, sort_keys=True, default=str)
+
+
+def _response_format_name(request: Dict[str, Any]) -> Optional[str]:
+    response_format = request.get("response_format") or {}
+    return response_format.get("json_schema", {}).get("name") or response_format.get("type")
+
+
+def _usage(usage) -> Optional[Dict[str, int]]:
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens} if usage else None
+
+
+def _usage_namespace(usage: Optional[Dict[str, int]]):
+    return SimpleNamespace(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens")) if usage else None
+
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class WorkflowRecorder:
+    """Collects one connection's client messages, model responses and tool results."""
+
+    def __init__(self):
+        self.session_id = None
+        self.messages: List[Dict[str, Any]] = []
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.tool_calls: List[Dict[str, Any]] = []
+
+    def incoming(self, message: Dict[str, Any]):
+        if message.get("type") in _KEEPALIVE_TYPES:
+            return
+        self.session_id = message.get("session_id", self.session_id)
+        self.messages.append(message)
+
+    def llm(self, stage: str, request: Dict[str, Any], response, start: float):
+        """Record a model response; a stream is passed through and recorded once consumed."""
+        entry = {
+            "stage": stage,
+            "model": request.get("model"),
+            "response_format": _response_format_name(request),
+            "fingerprint": prompt_fingerprint(request),
+            "stream": bool(request.get("stream")),
+        }
+        if entry["stream"]:
+            return self._tee(entry, response, start)
+        entry.update({
+            "content": response.choices[0].message.content,
+            "usage": _usage(getattr(response, "usage", None)),
+            "latency_ms": _ms(start),
+            "ttft_ms": None,
+        })
+        self.llm_calls.append(entry)
+        return response
+
+    async def _tee(self, entry: Dict[str, Any], stream, start: float):
+        parts, ttft_ms, usage = [], None, None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None
+            if delta:
+                if ttft_ms is None:
+                    ttft_ms = _ms(start)
+                parts.append(delta)
+            yield chunk
+        entry.update({"content": "".join(parts), "usage": _usage(usage), "latency_ms": _ms(start), "ttft_ms": ttft_ms})
+        self.llm_calls.append(entry)
+
+    def tool(self, tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any], start: float):
+        self.tool_calls.append({"tool": tool_name, "arguments": arguments, "result": result, "latency_ms": _ms(start)})
+
+    def to_fixture(self) -> Dict[str, Any]:
+        return {
+            "version": FIXTURE_VERSION,
+            "session_id": self.session_id,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "messages": self.messages,
+            "llm": self.llm_calls,
+            "tools": self.tool_calls,
+        }
+
+    def save(self, directory: str) -> Optional[str]:
+        """Write the fixture file; nothing is written for a connection that sent no messages."""
+        if not self.messages:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", self.session_id or "session")[:64]
+        path = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_fixture(), f, indent=1, default=str)
+        return path
+
+
+class ReplaySocket:
+    """Websocket stand-in: hands the recorded client messages to the handler one by one, then disconnects."""
+
+    def __init__(self, messages: List[Dict[str, Any]]):
+        self.pending = list(messages)
+        self.events: List[Dict[str, Any]] = []
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self) -> str:
+        # The handler only reads again once it finished with the previous message
+        if not self.pending:
+            raise WebSocketDisconnect()
+        return json.dumps(self.pending.pop(0))
+
+    async def send_text(self, text: str):
+        self.events.append(json.loads(text))
+
+
+class WorkflowReplay:
+    """Answers model and tool calls from one recorded run."""
+
+    def __init__(self, fixture: Dict[str, Any], latency_scale: float = 1.0,
+                 llm_latency_ms: Optional[float] = None, tool_latency_ms: Optional[float] = None,
+                 llm_latency_fn: Optional[Callable[[Dict[str, Any], Dict[str, Any]], float]] = None):
+        if fixture.get("version") != FIXTURE_VERSION:
+            raise ValueError(f"unsupported fixture version {fixture.get('version')}")
+        self.fixture = fixture
+        self.latency_scale = latency_scale
+        self.llm_latency_ms = llm_latency_ms
+        self.tool_latency_ms = tool_latency_ms
+        # (recorded entry, replayed request) -> latency in ms, e.g. to model another model's speed
+        self.llm_latency_fn = llm_latency_fn
+        self.llm_pending: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in fixture.get("llm", []):
+            self.llm_pending.setdefault(entry["stage"], []).append(entry)
+        self.tools_pending = list(fixture.get("tools", []))
+        # Wall time of every replayed call, per stage ("execute" for tools)
+        self.timings: Dict[str, List[float]] = {}
+        # Model the workflow asked for and the recorded usage of every replayed model call
+        self.served: List[Dict[str, Any]] = []
+        self.counters = {"llm_calls": 0, "tool_calls": 0, "prompt_fallbacks": 0, "tool_fallbacks": 0, "tool_misses": 0}
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "WorkflowReplay":
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def _latency_s(self, recorded_ms: Optional[float], fixed_ms: Optional[float]) -> float:
+        if fixed_ms is not None:
+            return fixed_ms / 1000
+        return (recorded_ms or 0) * self.latency_scale / 1000
+
+    def _record(self, stage: str, start: float):
+        self.timings.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+    async def llm(self, stage: str, request: Dict[str, Any]):
+        start = time.perf_counter()
+        self.counters["llm_calls"] += 1
+        pending = self.llm_pending.get(stage) or []
+        if not pending:
+            raise ReplayError(f"no recorded '{stage}' response left")
+        fingerprint = prompt_fingerprint(request)
+        entry = next((e for e in pending if e["fingerprint"] == fingerprint), None)
+        if entry is None:
+            self.counters["prompt_fallbacks"] += 1
+            entry = pending[0]
+        pending.remove(entry)
+        self.served.append({"stage": stage, "model": request.get("model"), "recorded_model": entry.get("model"), "usage": entry.get("usage")})
+
+        if self.llm_latency_fn is not None:
+            latency = self.llm_latency_fn(entry, request) / 1000
+        else:
+            latency = self._latency_s(entry.get("latency_ms"), self.llm_latency_ms)
+        if request.get("stream"):
+            return self._stream(stage, entry, latency, start)
+        await asyncio.sleep(latency)
+        self._record(stage, start)
+        return SimpleNamespace(
+            model=request.get("model"),
+            choices=[SimpleNamespace(message=SimpleNamespace(content=entry["content"]))],
+            usage=_usage_namespace(entry.get("usage")),
+        )
+
+    async def _stream(self, stage: str, entry: Dict[str, Any], latency: float, start: float):
+        content = entry["content"]
+        chunks = [content[i:i + REPLAY_CHUNK_CHARS] for i in range(0, len(content), REPLAY_CHUNK_CHARS)] or [""]
+        # Keep the recorded share of time to first token; the rest is spread over the chunks
+        share = (entry["ttft_ms"] / entry["latency_ms"]) if entry.get("ttft_ms") and entry.get("latency_ms") else 0.25
+        await asyncio.sleep(latency * share)
+        per_chunk = latency * (1 - share) / len(chunks)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(per_chunk)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk, tool_calls=None))], usage=None)
+        if entry.get("usage"):
+            # Like stream_options.include_usage: a last chunk with the usage and no choices
+            yield SimpleNamespace(choices=[], usage=_usage_namespace(entry["usage"]))
+        self._record(stage, start)
+
+    async def tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        self.counters["tool_calls"] += 1
+        key = _call_key(tool_name, arguments)
+        entry = next((e for e in self.tools_pending if _call_key(e["tool"], e["arguments"]) == key), None)
+        if entry is None:
+            entry = next((e for e in self.tools_pending if e["tool"] == tool_name), None)
+            self.counters["tool_fallbacks" if entry else "tool_misses"] += 1
+        if entry is None:
+            result, recorded_ms = {"status": "error", "message": f"No recorded result for tool '{tool_name}'"}, 0
+        else:
+            self.tools_pending.remove(entry)
+            result, recorded_ms = entry["result"], entry.get("latency_ms")
+        await asyncio.sleep(self._latency_s(recorded_ms, self.tool_latency_ms))
+        self._record("execute", start)
+        return result
+
+    async def run(self, handler, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Drive `handler` (workflow_handler) through the recorded client messages and return
+        the events it sent. Messages are moved to `session_id` (a fresh one by default) so
+        runs never share workflow state.
+        """
+        session_id = session_id or f"replay-{uuid.uuid4().hex[:12]}"
+        messages = [{**m, "session_id": session_id} if "session_id" in m else m for m in self.fixture.get("messages", [])]
+        socket = ReplaySocket(messages)
+        token = active_replay.set(self)
+        try:
+            await handler(socket, None)
+        finally:
+            active_replay.reset(token)
+        return socket.events
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "unused_llm": sum(len(v) for v in self.llm_pending.values()), "unused_tools": len(self.tools_pending)}
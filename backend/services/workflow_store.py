@@ -0,0 +1,228 @@
+"""
+Workflow state store.
+
+Holds the per-session workflow state (plan, pending HITL tool, execution context...)
+behind a small backend interface:
+
+- `LocalStateBackend`: in-process LRU bounded by serialized bytes, with a TTL per session.
+- `RedisStateBackend`: shared between uvicorn workers, so a HITL response can land on
+  any worker. States are stored as compact JSON (zlib + base64 above a size threshold).
+
+Every stored state carries a version. `put` is a compare-and-set against the version
+the caller loaded (optimistic concurrency), so two workers racing on the same session
+cannot silently overwrite each other: the loser gets `WorkflowStateConflict`.
+`WorkflowStateStore` reads and writes through Redis when attached and falls back to
+the local backend while Redis is unreachable.
+"""
+import os
+import json
+import time
+import zlib
+import base64
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+WORKFLOW_STATE_MAX_BYTES = int(os.environ.get("WORKFLOW_STATE_MAX_BYTES", 32 * 1024 * 1024))
+WORKFLOW_STATE_TTL_SEC = int(os.environ.get("WORKFLOW_STATE_TTL_SEC", 24 * 3600))
+WORKFLOW_STATE_COMPRESS_MIN = 2048
+WORKFLOW_STATE_REDIS_PREFIX = "workflow_state:"
+VERSION_KEY = "_version"
+
+
+class WorkflowStateConflict(Exception):
+    """The session state changed (another worker or request) since it was loaded."""
+
+
+def encode_state(version: int, state: Dict[str, Any]) -> str:
+    """`<version>|j|<json>` or, for large states, `<version>|z|<base64(zlib(json))>`."""
+    payload = json.dumps({k: v for k, v in state.items() if k != VERSION_KEY}, separators=(",", ":"), default=str)
+    if len(payload) >= WORKFLOW_STATE_COMPRESS_MIN:
+        return f"{version}|z|" + base64.b64encode(zlib.compress(payload.encode("utf-8"), 6)).decode("ascii")
+    return f"{version}|j|{payload}"
+
+
+def decode_state(raw: str) -> Tuple[Dict[str, Any], int]:
+    version, codec, payload = raw.split("|", 2)
+    if codec == "z":
+        payload = zlib.decompress(base64.b64decode(payload)).decode("utf-8")
+    state = json.loads(payload)
+    state[VERSION_KEY] = int(version)
+    return state, int(version)
+
+
+def _version_of(raw: Optional[str]) -> Optional[int]:
+    return int(raw.split("|", 1)[0]) if raw else None
+
+
+class StateBackend:
+    """Interface of a workflow state backend."""
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def put(self, session_id: str, state: Dict[str, Any], expected_version: Optional[int]) -> int:
+        """Store `state` if the stored version still equals `expected_version`; returns the new version."""
+        raise NotImplementedError
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError
+
+
+class LocalStateBackend(StateBackend):
+    """Per-process LRU of encoded states, bounded by total bytes, with a per-session TTL."""
+
+    def __init__(self, max_bytes: int = WORKFLOW_STATE_MAX_BYTES, ttl: int = WORKFLOW_STATE_TTL_SEC):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self.stats_counters = {"evictions_lru": 0, "evictions_ttl": 0, "conflicts": 0}
+
+    def _drop(self, session_id: str, reason: str = None):
+        entry = self._entries.pop(session_id, None)
+        if entry:
+            self._bytes -= len(entry[0])
+            if reason:
+                self.stats_counters[f"evictions_{reason}"] += 1
+
+    def _live(self, session_id: str) -> Optional[str]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self._drop(session_id, "ttl")
+            return None
+        self._entries.move_to_end(session_id)
+        return entry[0]
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._live(session_id)
+        return decode_state(raw)[0] if raw else None
+
+    async def put(self, session_id: str, state: Dict[str, Any], expected_version: Optional[int], check: bool = True) -> int:
+        current = _version_of(self._live(session_id))
+        if check and current is not None and current != expected_version:
+            self.stats_counters["conflicts"] += 1
+            raise WorkflowStateConflict(session_id)
+        version = (current or 0) + 1
+        raw = encode_state(version, state)
+        self._drop(session_id)
+        self._entries[session_id] = (raw, time.monotonic() + self.ttl)
+        self._bytes += len(raw)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)), "lru")
+        return version
+
+    async def delete(self, session_id: str):
+        self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "sessions": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class RedisStateBackend(StateBackend):
+    """One string key per session; compare-and-set through WATCH/MULTI."""
+
+    def __init__(self, redis_client, ttl: int = WORKFLOW_STATE_TTL_SEC):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.stats_counters = {"conflicts": 0}
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.redis.get(WORKFLOW_STATE_REDIS_PREFIX + session_id)
+        return decode_state(raw)[0] if raw else None
+
+    async def put(self, session_id: str, state: Dict[str, Any], expected_version: Optional[int]) -> int:
+        from redis.exceptions import WatchError
+
+        key = WORKFLOW_STATE_REDIS_PREFIX + session_id
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                current = _version_of(await pipe.get(key))
+                if current is not None and current != expected_version:
+                    raise WorkflowStateConflict(session_id)
+                version = (current or 0) + 1
+                pipe.multi()
+                pipe.set(key, encode_state(version, state), ex=self.ttl)
+                await pipe.execute()
+                return version
+        except (WatchError, WorkflowStateConflict):
+            self.stats_counters["conflicts"] += 1
+            raise WorkflowStateConflict(session_id)
+
+    async def delete(self, session_id: str):
+        await self.redis.delete(WORKFLOW_STATE_REDIS_PREFIX + session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.stats_counters)
+
+
+class WorkflowStateStore:
+    """Redis backend when attached (shared by all workers), local backend otherwise or while Redis is down."""
+
+    def __init__(self, local: LocalStateBackend = None, redis_client=None):
+        self.local = local or LocalStateBackend()
+        self.redis = RedisStateBackend(redis_client) if redis_client is not None else None
+        self.stats_counters = {"loads": 0, "misses": 0, "saves": 0, "redis_errors": 0}
+
+    def attach_redis(self, redis_client):
+        self.redis = RedisStateBackend(redis_client)
+
+    def _redis_error(self, op: str, e: Exception):
+        self.stats_counters["redis_errors"] += 1
+        print(f"[WORKFLOW STATE] Redis {op} failed, using local backend: {e}")
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Stored state (with its `_version`) or None when the session has no live state."""
+        self.stats_counters["loads"] += 1
+        state = None
+        if self.redis is not None:
+            try:
+                state = await self.redis.get(session_id)
+            except Exception as e:
+                self._redis_error("get", e)
+                state = await self.local.get(session_id)
+        else:
+            state = await self.local.get(session_id)
+        if state is None:
+            self.stats_counters["misses"] += 1
+        return state
+
+    async def save(self, session_id: str, state: Dict[str, Any]) -> int:
+        """Compare-and-set against state["_version"]; updates it in place. Raises WorkflowStateConflict."""
+        expected = state.get(VERSION_KEY)
+        version = None
+        if self.redis is not None:
+            try:
+                version = await self.redis.put(session_id, state, expected)
+            except WorkflowStateConflict:
+                raise
+            except Exception as e:
+                self._redis_error("put", e)
+                # Best effort while Redis is down: versions from Redis mean nothing to the local backend
+                version = await self.local.put(session_id, state, expected, check=False)
+        if version is None:
+            version = await self.local.put(session_id, state, expected)
+        state[VERSION_KEY] = version
+        self.stats_counters["saves"] += 1
+        return version
+
+    async def delete(self, session_id: str):
+        await self.local.delete(session_id)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(session_id)
+            except Exception as e:
+                self._redis_error("delete", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "local": self.local.stats(),
+            "redis": self.redis.stats() if self.redis is not None else None,
+        }
+
+
+# Process-wide store; the Redis backend is attached at startup when configured
+workflow_store = WorkflowStateStore()
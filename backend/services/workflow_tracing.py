@@ -0,0 +1,288 @@
+"""
+Spans for where workflow time goes.
+
+The workflow handler opens a `WorkflowTrace` per client message and makes it the
+`active_trace` of that context; the controller then records a span for every model call
+(stage, model, prompt/completion tokens, time to first token), every Google tool call and
+every database write (event log, state store, message batches). Code running without an
+active trace (tests, scripts) records nothing.
+
+Every finished span is
+  - sent to the client as a `timing` event when it asked for them (`"timing": true`),
+  - added to the Prometheus histograms of `span_metrics` (served at /metrics),
+  - queued for `trace_exporter`, which writes OTLP/JSON traces when the message is done:
+    one ExportTraceServiceRequest per line to WORKFLOW_TRACE_FILE and/or POSTed to an
+    OTLP/HTTP collector at WORKFLOW_TRACE_OTLP_URL (e.g. http://localhost:4318/v1/traces).
+"""
+import os
+import json
+import time
+import asyncio
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+import httpx
+
+WORKFLOW_TRACE_FILE = os.environ.get("WORKFLOW_TRACE_FILE", "")
+WORKFLOW_TRACE_OTLP_URL = os.environ.get("WORKFLOW_TRACE_OTLP_URL", "")
+WORKFLOW_TRACE_SERVICE_NAME = os.environ.get("WORKFLOW_TRACE_SERVICE_NAME", "pdf-analyzer-workflow")
+# Spans waiting for export are dropped beyond this (collector down for a long time)
+WORKFLOW_TRACE_MAX_PENDING = int(os.environ.get("WORKFLOW_TRACE_MAX_PENDING", 10000))
+
+SPAN_BUCKETS_SEC = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# OTLP SpanKind: CLIENT for model, Google and database calls, INTERNAL for the message itself
+_OTLP_CLIENT, _OTLP_INTERNAL = 3, 1
+
+active_trace: ContextVar[Optional["WorkflowTrace"]] = ContextVar("active_trace", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "kind", "name", "span_id", "parent_id", "attributes", "start_ns", "_start", "duration_ms", "error")
+
+    def __init__(self, trace: "WorkflowTrace", kind: str, name: str, attributes: Dict[str, Any], parent_id: Optional[str]):
+        self.trace = trace
+        self.kind = kind
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    @property
+    def ended(self) -> bool:
+        return self.duration_ms is not None
+
+    def end(self, error: str = None, **attributes):
+        """Finish the span (later calls are ignored); `error` marks it failed."""
+        if self.ended:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.error = error or self.error
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+        self.trace.span_ended(self)
+
+    def to_event(self) -> Dict[str, Any]:
+        return {"type": "timing", "span": self.kind, "name": self.name, "duration_ms": round(self.duration_ms, 1),
+                "attributes": self.attributes, **({"error": self.error} if self.error else {})}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": f"{self.kind}.{self.name}",
+            "kind": _OTLP_INTERNAL if self.kind == "workflow" else _OTLP_CLIENT,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + int(self.duration_ms * 1e6)),
+            "attributes": [_otlp_attribute(k, v) for k, v in {"span.kind": self.kind, **self.attributes}.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class WorkflowTrace:
+    """The spans of one handled client message, under a root `workflow.message` span."""
+
+    def __init__(self, session_id: str, send: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None):
+        self.session_id = session_id
+        self.trace_id = os.urandom(16).hex()
+        self.send = send
+        self.spans: List[Span] = []
+        self._sending: List[asyncio.Task] = []
+        self.root = Span(self, "workflow", "message", {"session.id": session_id}, None)
+
+    def span(self, kind: str, name: str, **attributes) -> Span:
+        return Span(self, kind, name, attributes, self.root.span_id)
+
+    def span_ended(self, span: Span):
+        self.spans.append(span)
+        span_metrics.observe(span)
+        trace_exporter.add(span)
+        if self.send is not None:
+            self._sending.append(asyncio.get_running_loop().create_task(self.send(span.to_event())))
+
+    async def finish(self, **attributes):
+        """End the root span, wait for the timing events and export the trace."""
+        self.root.end(spans=len(self.spans), **attributes)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+            self._sending.clear()
+        await trace_exporter.flush()
+
+
+def start_span(kind: str, name: str, **attributes) -> Optional[Span]:
+    """A started span in the active trace, or None when nothing is being traced."""
+    trace = active_trace.get()
+    return trace.span(kind, name, **attributes) if trace is not None else None
+
+
+class traced:
+    """`async with traced("db", "state_store.save"):` records a span around the block (errors included)."""
+
+    def __init__(self, kind: str, name: str, **attributes):
+        self.kind, self.name, self.attributes = kind, name, attributes
+        self.span = None
+
+    async def __aenter__(self) -> Optional[Span]:
+        self.span = start_span(self.kind, self.name, **self.attributes)
+        return self.span
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            self.span.end(error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+async def traced_stream(span: Span, stream):
+    """Pass a streamed completion through, ending `span` with TTFT and token usage when it is consumed."""
+    ttft_ms = usage = None
+    try:
+        async for chunk in stream:
+            if ttft_ms is None and chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                ttft_ms = round((time.perf_counter() - span._start) * 1000, 1)
+            # With stream_options.include_usage the last chunk carries the usage and no choices
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+    except Exception as e:
+        span.end(error=str(e), ttft_ms=ttft_ms)
+        raise
+    span.end(ttft_ms=ttft_ms, prompt_tokens=getattr(usage, "prompt_tokens", None),
+             completion_tokens=getattr(usage, "completion_tokens", None))
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(SPAN_BUCKETS_SEC)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(SPAN_BUCKETS_SEC):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return ",".join(f'{k}="{v}"' for k, v in escaped.items())
+
+
+class SpanMetrics:
+    """Prometheus histograms of span durations and model TTFT, plus model token counters."""
+
+    def __init__(self):
+        self.durations: Dict[tuple, _Histogram] = {}
+        self.ttft: Dict[tuple, _Histogram] = {}
+        self.tokens: Dict[tuple, int] = {}
+
+    def observe(self, span: Span):
+        key = (span.kind, span.name, "error" if span.error else "ok")
+        self.durations.setdefault(key, _Histogram()).observe(span.duration_ms / 1000)
+        if span.kind == "llm":
+            model = span.attributes.get("model", "")
+            if span.attributes.get("ttft_ms") is not None:
+                self.ttft.setdefault((span.name, model), _Histogram()).observe(span.attributes["ttft_ms"] / 1000)
+            for kind in ("prompt", "completion"):
+                tokens = span.attributes.get(f"{kind}_tokens")
+                if tokens:
+                    self.tokens[(span.name, model, kind)] = self.tokens.get((span.name, model, kind), 0) + tokens
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric, help_text, label_names, histograms in (
+            ("workflow_span_duration_seconds", "Duration of workflow spans (model calls, Google calls, database writes)",
+             ("kind", "name", "status"), self.durations),
+            ("workflow_llm_ttft_seconds", "Time to first token of streamed model calls", ("stage", "model"), self.ttft),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for key, histogram in sorted(histograms.items()):
+                labels = _labels(dict(zip(label_names, key)))
+                cumulative = 0
+                for bound, n in zip(SPAN_BUCKETS_SEC, histogram.buckets):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        lines += ["# HELP workflow_llm_tokens_total Model tokens used by workflow stage", "# TYPE workflow_llm_tokens_total counter"]
+        for (stage, model, kind), n in sorted(self.tokens.items()):
+            lines.append(f"workflow_llm_tokens_total{{{_labels({'stage': stage, 'model': model, 'type': kind})}}} {n}")
+        return "\n".join(lines) + "\n"
+
+
+class TraceExporter:
+    """Queues finished spans and writes them as OTLP/JSON to a file and/or an OTLP/HTTP collector."""
+
+    def __init__(self, path: str = WORKFLOW_TRACE_FILE, url: str = WORKFLOW_TRACE_OTLP_URL,
+                 service_name: str = WORKFLOW_TRACE_SERVICE_NAME, max_pending: int = WORKFLOW_TRACE_MAX_PENDING):
+        self.path = path
+        self.url = url
+        self.service_name = service_name
+        self.max_pending = max_pending
+        self.pending: List[Dict[str, Any]] = []
+        self.counters = {"exported": 0, "dropped": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.url)
+
+    def add(self, span: Span):
+        if not self.enabled:
+            return
+        if len(self.pending) >= self.max_pending:
+            self.counters["dropped"] += 1
+            return
+        self.pending.append(span.to_otlp())
+
+    def request_body(self, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "workflow_execution_controller"}, "spans": spans}],
+        }]}
+
+    async def flush(self):
+        if not self.pending:
+            return
+        spans, self.pending = self.pending, []
+        body = self.request_body(spans)
+        try:
+            if self.path:
+                await asyncio.to_thread(self._append, json.dumps(body))
+            if self.url:
+                async with httpx.AsyncClient(timeout=5) as client:
+                    response = await client.post(self.url, json=body)
+                    response.raise_for_status()
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"[TRACING] Export of {len(spans)} spans failed: {e}")
+            return
+        self.counters["exported"] += len(spans)
+
+    def _append(self, line: str):
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "pending": len(self.pending), "file": self.path or None, "collector": self.url or None}
+
+
+# Process-wide metrics and exporter shared by every connection
+span_metrics = SpanMetrics()
+trace_exporter = TraceExporter()
@@ -0,0 +1,58 @@
+import sys
+import os
+import asyncio
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from fastapi.testclient import TestClient
+from main import app
+from function import function_token_encode
+
+ADMIN_PATHS = [
+    "/admin/chat-cache/stats",
+    "/admin/plan-cache/stats",
+    "/admin/workflow-state/stats",
+    "/admin/message-writes/stats",
+    "/admin/tools/stats",
+    "/admin/prefetch/stats",
+    "/admin/plan-optimizer/stats",
+    "/admin/intent/stats",
+    "/admin/tracing/stats",
+    "/admin/model-routing/stats",
+]
+
+
+class TestAdminAccess(unittest.TestCase):
+    def setUp(self):
+        # No lifespan: the stats endpoints only need the auth settings on app.state
+        app.state.config_key_root = "root-key"
+        app.state.config_key_jwt = "jwt-key"
+        app.state.config_admin_username_list = ["ops"]
+        self.client = TestClient(app)
+
+    def token(self, username):
+        return asyncio.run(function_token_encode("jwt-key", 60, {"id": 1, "username": username}, ["id", "username"]))
+
+    def get(self, path, username=None):
+        headers = {"Authorization": f"Bearer {self.token(username)}"} if username else {}
+        return self.client.get(path, headers=headers)
+
+    def test_stats_need_an_admin(self):
+        for path in ADMIN_PATHS:
+            self.assertEqual(self.get(path).status_code, 400, path)  # the middleware rejects /admin without a token
+            self.assertEqual(self.get(path, "alice").status_code, 403, path)
+            response = self.get(path, "ops")
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response.json()["status"], 1)
+
+    def test_invalid_token_is_not_authenticated(self):
+        response = self.client.get(ADMIN_PATHS[0], headers={"Authorization": "Bearer not-a-jwt"})
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
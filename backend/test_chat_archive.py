@@ -0,0 +1,71 @@
+import sys
+import unittest
+import os
+from datetime import datetime, timedelta, timezone
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from sqlalchemy import select, func
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from models import User, ChatMessage, ChatSessionArchive
+from services.chat_archive import archive_session, rehydrate_session, find_idle_sessions, pack_messages, unpack_messages
+
+
+class TestChatArchive(AsyncSQLiteTestCase):
+    tables = [User, ChatMessage, ChatSessionArchive]
+
+    async def seed(self):
+        old = datetime.now(timezone.utc) - timedelta(days=60)
+        async with self.Session() as db:
+            db.add_all([
+                ChatMessage(session_id="cold", user_id=1, role="user", content="old question", created_at=old),
+                ChatMessage(session_id="cold", user_id=1, role="assistant", content="old answer", citations=[{"page": 1}], created_at=old + timedelta(minutes=1)),
+                ChatMessage(session_id="warm", user_id=1, role="user", content="old start", created_at=old),
+                ChatMessage(session_id="warm", user_id=1, role="user", content="recent follow-up"),
+            ])
+            await db.commit()
+
+    async def run_db(self, fn, *args):
+        async with self.Session() as db:
+            return await fn(db, *args)
+
+    async def test_only_idle_sessions_are_selected(self):
+        self.assertEqual(await self.run_db(find_idle_sessions, 30, 10), ["cold"])
+
+    async def test_archive_and_rehydrate_round_trip(self):
+        self.assertEqual(await self.run_db(archive_session, "cold"), 2)
+
+        async def count(db, session_id):
+            return (await db.execute(select(func.count()).where(ChatMessage.session_id == session_id))).scalar()
+        self.assertEqual(await self.run_db(count, "cold"), 0)
+
+        self.assertEqual(await self.run_db(rehydrate_session, "cold"), 2)
+        self.assertEqual(await self.run_db(rehydrate_session, "cold"), 0)
+
+        async def load(db):
+            return (await db.execute(select(ChatMessage).where(ChatMessage.session_id == "cold").order_by(ChatMessage.id))).scalars().all()
+        restored = await self.run_db(load)
+        self.assertEqual([m.content for m in restored], ["old question", "old answer"])
+        self.assertEqual(restored[1].citations, [{"page": 1}])
+
+    async def test_only_the_owner_rehydrates(self):
+        await self.run_db(archive_session, "cold")
+        self.assertEqual(await self.run_db(rehydrate_session, "cold", 2), 0)
+
+        async def archived(db):
+            return await db.get(ChatSessionArchive, "cold")
+        self.assertIsNotNone(await self.run_db(archived))
+        self.assertEqual(await self.run_db(rehydrate_session, "cold", 1), 2)
+
+    def test_blob_round_trip(self):
+        rows = [{"id": 1, "created_at": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc), "content": "x" * 1000}]
+        blob = pack_messages(rows)
+        self.assertLess(len(blob), 200)
+        self.assertEqual(unpack_messages(blob), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
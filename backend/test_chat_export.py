@@ -0,0 +1,112 @@
+import sys
+import json
+import gzip
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from models import User, ChatMessage, ChatSessionArchive
+from services.chat_archive import archive_session, rehydrate_session
+import controller.chat_controller as chat_controller
+from controller.chat_controller import export_history_ndjson
+
+
+class TestChatExport(AsyncSQLiteTestCase):
+    tables = [User, ChatMessage, ChatSessionArchive]
+    # The export opens its own sessions from the shared factory
+    bind_session_factory = True
+
+    unpack = staticmethod(chat_controller.unpack_messages)
+    export_line = staticmethod(chat_controller._export_line)
+
+    def tearDown(self):
+        chat_controller.unpack_messages = self.unpack
+        chat_controller._export_line = self.export_line
+
+    async def seed(self):
+        old = datetime.now(timezone.utc) - timedelta(days=60)
+        async with self.Session() as db:
+            db.add_all([
+                ChatMessage(session_id="a-cold", user_id=1, role="user", content="first archived", created_at=old),
+                ChatMessage(session_id="b-cold", user_id=1, role="user", content="second archived", created_at=old),
+                ChatMessage(session_id="live", user_id=1, role="user", content="live question"),
+                ChatMessage(session_id="live", user_id=1, role="assistant", content="live answer"),
+                ChatMessage(session_id="other", user_id=2, role="user", content="not mine"),
+            ])
+            await db.commit()
+            await archive_session(db, "a-cold")
+            await archive_session(db, "b-cold")
+
+    async def export(self, **kwargs):
+        return b"".join([chunk async for chunk in export_history_ndjson(1, **kwargs)])
+
+    def lines(self, data):
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    async def test_archives_first_then_live_messages(self):
+        lines = self.lines(await self.export())
+        self.assertEqual([(l.get("content"), l.get("archived", False)) for l in lines[:-1]],
+                         [("first archived", True), ("second archived", True), ("live question", False), ("live answer", False)])
+        self.assertEqual(lines[-1], {"type": "end", "count": 4, "last_id": lines[3]["id"]})
+
+    async def test_gzip_output_matches_plain(self):
+        self.assertEqual(gzip.decompress(await self.export(compress=True)), await self.export())
+
+    async def test_resume_after_message_id_skips_archives(self):
+        first_live = self.lines(await self.export())[2]["id"]
+        lines = self.lines(await self.export(after_id=first_live))
+        self.assertEqual([l.get("content") for l in lines], ["live answer", None])
+        self.assertEqual(lines[-1]["count"], 1)
+
+    async def test_error_in_archive_phase_reports_the_archive_cursor(self):
+        calls = []
+
+        def unpack(blob):
+            calls.append(blob)
+            if len(calls) == 2:
+                raise ValueError("corrupt archive")
+            return self.unpack(blob)
+        chat_controller.unpack_messages = unpack
+        lines = self.lines(await self.export())
+        self.assertEqual(lines[-1], {"type": "error", "message": "corrupt archive", "last_id": None, "after_session": "a-cold"})
+
+        chat_controller.unpack_messages = self.unpack
+        resumed = self.lines(await self.export(after_session="a-cold"))
+        self.assertEqual([l.get("content") for l in resumed[:-1]], ["second archived", "live question", "live answer"])
+
+    async def test_error_after_the_archive_phase_reports_a_live_cursor(self):
+        def line(row, archived=False):
+            if not archived:
+                raise ConnectionError("connection reset")
+            return self.export_line(row, archived=archived)
+        chat_controller._export_line = line
+        lines = self.lines(await self.export())
+        self.assertEqual([l.get("content") for l in lines[:-1]], ["first archived", "second archived"])
+        self.assertEqual(lines[-1], {"type": "error", "message": "connection reset", "last_id": 0})
+
+        chat_controller._export_line = self.export_line
+        resumed = self.lines(await self.export(after_id=0))
+        self.assertEqual([l.get("content") for l in resumed[:-1]], ["live question", "live answer"])
+
+    async def test_session_rehydrated_during_the_export_is_sent_once(self):
+        chunks = []
+        async for chunk in export_history_ndjson(1):
+            if not chunks:
+                # a-cold was sent from its archive; a reader opens it before the live phase
+                async with self.Session() as db:
+                    await rehydrate_session(db, "a-cold")
+            chunks.append(chunk)
+        lines = self.lines(b"".join(chunks))
+        contents = [l.get("content") for l in lines[:-1]]
+        self.assertEqual(contents, ["first archived", "second archived", "live question", "live answer"])
+        self.assertEqual(lines[-1]["count"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import sys
+import unittest
+import os
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from models import User, ChatMessage
+from services.chat_search import search_chat_messages, to_fts5_query
+
+
+class TestChatSearchSqlite(AsyncSQLiteTestCase):
+    """Exercises the SQLite FTS5 fallback used for local tests."""
+
+    tables = [User, ChatMessage]
+
+    async def seed(self):
+        async with self.Session() as db:
+            db.add_all([
+                ChatMessage(session_id="s1", user_id=1, role="assistant", content="The indemnity clause caps liability at the contract value."),
+                ChatMessage(session_id="s2", user_id=1, role="user", content="What does the indemnity clause say about indemnity for third parties?"),
+                ChatMessage(session_id="s3", user_id=1, role="user", content="Schedule a meeting tomorrow"),
+                ChatMessage(session_id="s4", user_id=2, role="user", content="Another user's indemnity question"),
+            ])
+            await db.commit()
+
+    async def search(self, *args, **kwargs):
+        async with self.Session() as db:
+            return await search_chat_messages(db, *args, **kwargs)
+
+    async def test_ranks_and_highlights_only_own_messages(self):
+        res = await self.search(1, "indemnity clause")
+        self.assertEqual({r["session_id"] for r in res["results"]}, {"s1", "s2"})
+        self.assertEqual(res["results"][0]["session_id"], "s2")  # two mentions rank higher
+        self.assertIn("<mark>indemnity</mark>", res["results"][0]["headline"])
+        self.assertFalse(res["has_more"])
+
+    async def test_pagination(self):
+        first = await self.search(1, "indemnity", page=1, page_size=1)
+        second = await self.search(1, "indemnity", page=2, page_size=1)
+        self.assertTrue(first["has_more"])
+        self.assertFalse(second["has_more"])
+        self.assertNotEqual(first["results"][0]["id"], second["results"][0]["id"])
+
+    async def test_operator_input_is_quoted(self):
+        self.assertEqual(to_fts5_query('indemnity OR "clause'), '"indemnity" "OR" """clause"')
+        self.assertEqual((await self.search(1, "NEAR("))["results"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
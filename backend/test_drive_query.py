@@ -10,18 +10,22 @@ if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 
 # Mocking the imports that would fail without full setup
-sys.modules['sqlalchemy.orm'] = MagicMock()
-sys.modules['google.oauth2.credentials'] = MagicMock()
-sys.modules['google.auth.transport.requests'] = MagicMock()
-sys.modules['google.auth.exceptions'] = MagicMock()
-sys.modules['googleapiclient.discovery'] = MagicMock()
-sys.modules['googleapiclient.http'] = MagicMock()
-sys.modules['models'] = MagicMock()
-sys.modules['models.google_token'] = MagicMock()
+MOCKED_MODULES = ['sqlalchemy.ext.asyncio', 'google.oauth2.credentials', 'google.auth.transport.requests', 'google.auth.exceptions',
+                  'googleapiclient.discovery', 'googleapiclient.http', 'models', 'models.google_token']
+_original_modules = {name: sys.modules.get(name) for name in MOCKED_MODULES}
+for name in MOCKED_MODULES:
+    sys.modules[name] = MagicMock()
 
 # Import the function to test from services
 from services.google_services import list_drive_files
 
+# Only services.google_services needs the mocks; test modules collected later get the real packages
+for name, module in _original_modules.items():
+    if module is None:
+        sys.modules.pop(name, None)
+    else:
+        sys.modules[name] = module
+
 class TestDriveQuery(unittest.TestCase):
     @patch('services.google_services.get_service')
     def test_query_construction(self, mock_get_service):
@@ -0,0 +1,63 @@
+import sys
+import os
+import unittest
+from datetime import datetime, timezone, timedelta
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.file_matcher import rank_files
+
+SHEET = "application/vnd.google-apps.spreadsheet"
+DOC = "application/vnd.google-apps.document"
+
+
+def f(file_id, name, mime, days_old=None):
+    record = {"id": file_id, "name": name, "mimeType": mime}
+    if days_old is not None:
+        record["modifiedTime"] = (datetime.now(timezone.utc) - timedelta(days=days_old)).isoformat()
+    return record
+
+
+class TestFileMatcher(unittest.TestCase):
+    def test_exact_name_is_best_match(self):
+        files = [f("1", "Budget 2024", SHEET), f("2", "Budget 2023", SHEET), f("3", "Holiday.mp4", "video/mp4")]
+        result = rank_files("budget 2024", files)
+        self.assertEqual(result["best_match_id"], "1")
+        self.assertNotIn("3", [m["id"] for m in result["matches"]])
+        self.assertEqual(result["matches"][0]["relevance_label"], "High")
+
+    def test_type_mismatch_is_excluded(self):
+        files = [f("1", "Resume.mp4", "video/mp4"), f("2", "Resume", DOC)]
+        result = rank_files("resume", files, user_goal="read my resume document")
+        self.assertEqual([m["id"] for m in result["matches"]], ["2"])
+        self.assertEqual(result["best_match_id"], "2")
+
+    def test_close_scores_are_ambiguous(self):
+        files = [f("1", "Q3 Sales Report", DOC), f("2", "Sales Report Q3 Final", DOC)]
+        result = rank_files("sales report", files)
+        self.assertTrue(result["ambiguous"])
+        self.assertNotIn("best_match_id", result)
+
+    def test_only_tied_candidates_go_to_the_llm(self):
+        files = [f("1", "Q3 Sales Report", DOC), f("2", "Sales Report Q3 Final", DOC), f("3", "Sales Q3", DOC)]
+        result = rank_files("sales report", files)
+        self.assertTrue(result["ambiguous"])
+        self.assertEqual(sorted(result["candidates"]), ["1", "2"])
+        self.assertIn("3", [m["id"] for m in result["matches"]])
+
+    def test_recency_breaks_near_ties(self):
+        files = [f("old", "Meeting Notes March", DOC, days_old=400), f("new", "Meeting Notes April", DOC, days_old=1)]
+        result = rank_files("meeting notes", files)
+        self.assertEqual(result["matches"][0]["id"], "new")
+
+    def test_no_relevant_files(self):
+        result = rank_files("invoice", [f("1", "Holiday photos", "image/png")])
+        self.assertEqual(result["matches"], [])
+        self.assertFalse(result["ambiguous"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import sys
+import os
+import tempfile
+import unittest
+from datetime import date
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+import controller.workflow_execution_controller as workflow_controller
+from controller.workflow_execution_controller import tool_registry, tool_catalog, workflow_handler
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from services.workflow_replay import WorkflowReplay, FIXTURE_VERSION
+from services.intent_classifier import intent_router
+from services.intent_classifier import (IntentClassifier, IntentRouter, PLANNER_LABEL, extract_arguments,
+                                        calendar_days, load_seed_examples)
+
+EXAMPLES = [
+    ("what's on my calendar tomorrow", "check_calendar_availability"),
+    ("am I free on friday", "check_calendar_availability"),
+    ("show my schedule for this week", "check_calendar_availability"),
+    ("read my last 5 emails", "read_emails"),
+    ("show my unread emails", "read_emails"),
+    ("any new emails from sam@example.com", "read_emails"),
+    ("send an email to sam@example.com saying hi", "send_email"),
+    ("email hr@example.com asking about my payslip", "send_email"),
+    ("find the budget sheet and email it to finance@example.com", PLANNER_LABEL),
+    ("read the report and summarize it in a spreadsheet", PLANNER_LABEL),
+]
+
+
+class TestIntentClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = IntentClassifier.train(EXAMPLES, epochs=60)
+
+    def test_fits_training_examples(self):
+        for query, label in EXAMPLES:
+            self.assertEqual(self.model.predict(query)[0], label, query)
+
+    def test_masked_values_do_not_matter(self):
+        # Emails and numbers are masked before hashing, so unseen values score the same
+        self.assertEqual(self.model.probabilities("read my last 12 emails"), self.model.probabilities("read my last 3 emails"))
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.json")
+            self.model.save(path)
+            loaded = IntentClassifier.load(path)
+        label, confidence = loaded.predict("read my last 5 emails")
+        self.assertEqual(label, "read_emails")
+        self.assertAlmostEqual(confidence, self.model.predict("read my last 5 emails")[1], places=3)
+
+
+class TestArgumentExtraction(unittest.TestCase):
+    def test_calendar_days(self):
+        monday = date(2026, 3, 2)
+        self.assertEqual(calendar_days("check my calendar for the next 3 days", monday), 3)
+        self.assertEqual(calendar_days("what's on my calendar tomorrow", monday), 2)
+        self.assertEqual(calendar_days("am I free on friday", monday), 5)
+        self.assertEqual(calendar_days("check my availability for two weeks", monday), 14)
+        self.assertIsNone(calendar_days("show my calendar", monday))
+        self.assertEqual(extract_arguments("check_calendar_availability", "show my calendar"), {"days": 7})
+
+    def test_read_emails(self):
+        self.assertEqual(extract_arguments("read_emails", "read my last 5 emails"), {"max_results": 5})
+        self.assertEqual(extract_arguments("read_emails", "find emails from billing@acme.com about the invoice"),
+                         {"query": "from:billing@acme.com invoice"})
+        self.assertEqual(extract_arguments("read_emails", "show three unread messages"), {"max_results": 3, "query": "is:unread"})
+
+    def test_list_drive_files(self):
+        self.assertEqual(extract_arguments("list_drive_files", "list my drive files named Budget"), {"filename": "Budget"})
+        self.assertEqual(extract_arguments("list_drive_files", "find the file report.pdf"), {"filename": "report.pdf"})
+        self.assertEqual(extract_arguments("list_drive_files", "list my pdfs"), {"mime_type": "application/pdf"})
+
+
+class TestIntentRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = IntentRouter(min_confidence=0.6, enabled=True)
+        self.router.classifier = IntentClassifier.train(EXAMPLES, epochs=60)
+
+    def test_confident_read_is_routed_with_arguments(self):
+        intent = self.router.route("read my last 5 emails", tool_registry, tool_catalog)
+        self.assertEqual((intent["tool_id"], intent["arguments"]), ("read_emails", {"max_results": 5}))
+        self.assertEqual(self.router.stats()["routed"], 1)
+
+    def test_writes_and_multi_step_requests_go_to_the_planner(self):
+        self.assertIsNone(self.router.route("send an email to bob@example.com saying hi", tool_registry, tool_catalog))
+        self.assertIsNone(self.router.route("find the budget sheet and email it to finance@example.com", tool_registry, tool_catalog))
+        counters = self.router.stats()
+        self.assertEqual((counters["not_read_only"], counters["planner_label"], counters["routed"]), (1, 1, 0))
+
+    def test_low_confidence_goes_to_the_planner(self):
+        self.router.min_confidence = 1.0
+        self.assertIsNone(self.router.route("what's on my calendar tomorrow", tool_registry, tool_catalog))
+        self.assertEqual(self.router.stats()["low_confidence"], 1)
+
+    def test_without_a_model_everything_goes_to_the_planner(self):
+        router = IntentRouter(enabled=True).load(os.path.join(tempfile.gettempdir(), "no-such-intent-model.json"))
+        self.assertIsNone(router.route("read my last 5 emails", tool_registry, tool_catalog))
+        self.assertEqual(router.stats()["no_model"], 1)
+
+    def test_seed_examples_use_known_labels(self):
+        labels = {label for _, label in load_seed_examples()}
+        self.assertIn(PLANNER_LABEL, labels)
+        self.assertTrue(labels - {PLANNER_LABEL} <= set(tool_catalog.by_id))
+
+
+class TestIntentWorkflow(AsyncSQLiteTestCase):
+    bind_session_factory = True
+
+    def setUp(self):
+        self.saved = (workflow_controller.WORKFLOW_PLANNER_MODE, intent_router.classifier, intent_router.min_confidence, intent_router.enabled)
+        workflow_controller.WORKFLOW_PLANNER_MODE = "two_call"
+        intent_router.classifier = IntentClassifier.train(EXAMPLES, epochs=60)
+        intent_router.min_confidence, intent_router.enabled = 0.6, True
+
+    def tearDown(self):
+        workflow_controller.WORKFLOW_PLANNER_MODE, intent_router.classifier, intent_router.min_confidence, intent_router.enabled = self.saved
+
+    async def test_intent_hit_runs_no_planning_stage(self):
+        emails = {"status": "success", "emails": [{"id": "m1", "from": "a@b.com", "subject": "Hi", "snippet": "Hello"}]}
+        answer = '{"paragraphs": [{"content": "One new email from a@b.com.", "math_formula": ""}]}'
+        replay = WorkflowReplay({
+            "version": FIXTURE_VERSION,
+            "messages": [{"message": "read my last 5 emails", "session_id": "intent"}],
+            # Only the answer is recorded: an extract, plan, resolve or verify call has nothing to replay
+            "llm": [{"stage": "final", "fingerprint": "", "stream": True, "content": answer, "latency_ms": 0, "ttft_ms": 0}],
+            "tools": [{"tool": "read_emails", "arguments": {"max_results": 5}, "result": emails, "latency_ms": 0}],
+        }, latency_scale=0)
+        events = await replay.run(workflow_handler)
+        self.assertEqual([e.get("status") for e in events if e.get("type") == "workflow_complete"], ["success"])
+        self.assertEqual([call["stage"] for call in replay.served], ["final"])
+        self.assertEqual(replay.stats()["tool_misses"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys
+import os
+import json
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.json_stream import IncrementalJSONParser, schema_problems
+
+ANSWER = {
+    "pqa": [{"question": "Which \"file\" was read? {x}", "answer": "Budget [2024]"}],
+    "paragraphs": [{"content": "Line one\nline two \\ done", "math_formula": ""}, {"content": "p2", "math_formula": "x^2"}],
+    "accordion": [],
+    "pop_up": [{"title": "t", "description": "d"}],
+    "end_toggle": {"heading": "next steps to learning", "content": "c", "buttons": [{"heading": "h", "content": "c"}]},
+}
+SECTIONS = ("paragraphs", "pqa", "accordion", "pop_up")
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser(item_sections=SECTIONS)
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    def test_items_are_reported_as_they_close(self):
+        for indent in (None, 2):
+            text = json.dumps(ANSWER, indent=indent)
+            for size in (1, 5, len(text)):
+                parser, events = feed_in_chunks(text, size)
+                self.assertEqual(parser.result(), ANSWER)
+                self.assertTrue(parser.finished)
+                self.assertEqual([(s, i) for s, i, _ in events],
+                                 [("pqa", 0), ("paragraphs", 0), ("paragraphs", 1), ("pop_up", 0), ("end_toggle", None)])
+                self.assertEqual(events[0][2], ANSWER["pqa"][0])
+                self.assertEqual(events[-1][2], ANSWER["end_toggle"])
+
+    def test_item_is_reported_before_the_rest_arrives(self):
+        text = json.dumps(ANSWER)
+        cut = text.index('{"content": "p2"')
+        parser = IncrementalJSONParser(item_sections=SECTIONS)
+        events = parser.feed(text[:cut])
+        self.assertEqual([(s, i) for s, i, _ in events], [("pqa", 0), ("paragraphs", 0)])
+        self.assertFalse(parser.finished)
+
+    def test_truncated_stream_fails_on_result(self):
+        text = json.dumps(ANSWER)
+        parser, _ = feed_in_chunks(text[:-10], 7)
+        with self.assertRaises(json.JSONDecodeError):
+            parser.result()
+
+
+class TestSchemaProblems(unittest.TestCase):
+    SCHEMA = {
+        "type": "object", "additionalProperties": False, "required": ["items"],
+        "properties": {"items": {"type": "array", "items": {"type": "object", "required": ["n"], "properties": {"n": {"type": "integer"}}}}},
+    }
+
+    def test_valid_and_invalid(self):
+        self.assertEqual(schema_problems({"items": [{"n": 1}]}, self.SCHEMA), [])
+        self.assertEqual(schema_problems({"items": [{"n": True}, {}], "extra": 1}, self.SCHEMA),
+                         ["$.items[0].n: expected integer, got bool", "$.items[1]: missing 'n'", "$: unexpected 'extra'"])
+
+
+if __name__ == "__main__":
+    unittest.main()
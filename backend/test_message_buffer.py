@@ -0,0 +1,107 @@
+import sys
+import os
+import asyncio
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from types import SimpleNamespace
+from sqlalchemy import select
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from models import User, ChatMessage, ChatSessionArchive, AsyncSessionLocal, async_engine
+from services.message_buffer import MessageWriteBuffer, FlushStats
+from router.chat_router import get_session_history
+
+
+def message(text):
+    return ChatMessage(session_id="b1", user_id=1, role="assistant", content=text)
+
+
+class TestMessageWriteBuffer(AsyncSQLiteTestCase):
+    tables = [User, ChatMessage, ChatSessionArchive]
+
+    async def stored(self):
+        async with self.Session() as db:
+            return (await db.execute(select(ChatMessage.content).order_by(ChatMessage.id))).scalars().all()
+
+    async def test_batches_until_flush(self):
+        flushed = []
+        buffer = MessageWriteBuffer("b1", self.Session, on_flushed=lambda batch: self._collect(flushed, batch), interval_ms=60_000)
+        for text in ("one", "two", "three"):
+            buffer.add(message(text))
+        before = await self.stored()
+        written = await buffer.flush()
+        await buffer.close()
+        after = await self.stored()
+        self.assertEqual(before, [])
+        self.assertEqual(written, 3)
+        self.assertEqual(after, ["one", "two", "three"])
+        self.assertTrue(all(m.id is not None for m in flushed))
+
+    async def _collect(self, into, batch):
+        into.extend(batch)
+
+    async def test_timer_and_batch_size_trigger_background_flushes(self):
+        timed = MessageWriteBuffer("b1", self.Session, interval_ms=20)
+        timed.add(message("timer"))
+        await asyncio.sleep(0.2)
+        self.assertEqual(await self.stored(), ["timer"])
+        full = MessageWriteBuffer("b1", self.Session, interval_ms=60_000, max_batch=2)
+        full.add(message("a"))
+        full.add(message("b"))
+        await asyncio.sleep(0.2)
+        self.assertEqual(await self.stored(), ["timer", "a", "b"])
+        self.assertEqual(full.pending, 0)
+
+    async def test_failed_flush_keeps_messages_in_order(self):
+        class BrokenSession:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def add_all(self, rows):
+                pass
+
+            async def commit(self):
+                raise ConnectionError("database unavailable")
+
+        buffer = MessageWriteBuffer("b1", BrokenSession, interval_ms=60_000)
+        buffer.add(message("first"))
+        with self.assertRaises(ConnectionError):
+            await buffer.flush()
+        buffer.add(message("second"))
+        buffer.session_factory = self.Session
+        await buffer.close()
+        self.assertEqual(await self.stored(), ["first", "second"])
+
+    async def test_history_keeps_batch_order(self):
+        # A batch commits in one transaction, so its rows share created_at and the id decides
+        AsyncSessionLocal.configure(bind=self.engine)
+        self.addCleanup(AsyncSessionLocal.configure, bind=async_engine)
+        buffer = MessageWriteBuffer("b1", self.Session, interval_ms=60_000)
+        for text in ("status", "tool result", "answer"):
+            buffer.add(message(text))
+        await buffer.close()
+        history = await get_session_history("b1", SimpleNamespace(state=SimpleNamespace(user={"id": 1})))
+        self.assertEqual(len({m["created_at"] for m in history["messages"]}), 1)
+        self.assertEqual([m["content"] for m in history["messages"]], ["status", "tool result", "answer"])
+
+    def test_stats(self):
+        stats = FlushStats()
+        for size, latency in ((1, 2.0), (3, 4.0), (40, 9.0)):
+            stats.record(size, latency)
+        report = stats.stats()
+        self.assertEqual((report["flushes"], report["messages"], report["max_batch"]), (3, 44, 40))
+        self.assertEqual(report["latency_ms_p50"], 4.0)
+        self.assertEqual(report["batch_size_histogram"]["<=1"], 1)
+        self.assertEqual(report["batch_size_histogram"]["<=4"], 1)
+        self.assertEqual(report["batch_size_histogram"][">32"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
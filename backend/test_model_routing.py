@@ -0,0 +1,92 @@
+import sys
+import os
+import copy
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.model_routing import ModelRouter, ModelRoutingError, load_model_routing, model_router
+from controller.workflow_execution_controller import llm_call
+
+
+class ScriptedCompletions:
+    """Answers each call with the next scripted content and remembers the requests."""
+
+    def __init__(self, *contents):
+        self.contents = list(contents)
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.contents.pop(0)))],
+                               usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=100))
+
+
+class TestModelRouting(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.config = load_model_routing()
+        self.saved = (model_router.routes, model_router.models, model_router.counters)
+        model_router.counters = {}
+
+    def tearDown(self):
+        model_router.routes, model_router.models, model_router.counters = self.saved
+        self.loop.close()
+
+    def test_shipped_routing_is_valid(self):
+        router = ModelRouter().load(self.config)
+        self.assertEqual(set(router.routes), {"extract", "plan", "verify", "file_match", "resolve", "final"})
+
+    def test_validation_lists_every_problem(self):
+        config = copy.deepcopy(self.config)
+        del config["stages"]["final"]
+        config["stages"]["verify"].update(max_tokens=0, escalate_to="gpt-4o-mini")
+        config["stages"]["plan"]["model"] = "gpt-5"
+        config["stages"]["summarize"] = {"model": "gpt-4o"}
+        with self.assertRaises(ModelRoutingError) as ctx:
+            ModelRouter().load(config)
+        problems = "\n".join(ctx.exception.problems)
+        self.assertIn("stage 'final': missing", problems)
+        self.assertIn("stage 'verify': max_tokens must be an integer >= 1", problems)
+        self.assertIn("stage 'verify': escalate_to must name a different model", problems)
+        self.assertIn("stage 'plan': model 'gpt-5' has no entry in models", problems)
+        self.assertIn("stage 'summarize': unknown stage", problems)
+
+    def test_stage_options_are_applied(self):
+        model_router.load(self.config)
+        completions = ScriptedCompletions('{"ok": true}')
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        self.loop.run_until_complete(llm_call(client, "verify", messages=[], response_format={"type": "json_object"}))
+        request = completions.requests[0]
+        self.assertEqual((request["model"], request["max_tokens"], request["timeout"]), ("gpt-4o-mini", 800, 20))
+        counters = model_router.stats()["verify"]
+        self.assertEqual((counters["calls"], counters["escalations"], counters["models"]), (1, 0, {"gpt-4o-mini": 1}))
+        # 1000 prompt and 100 completion tokens at $0.15 / $0.60 per 1M
+        self.assertAlmostEqual(counters["cost_usd"], 0.00021)
+
+    def test_invalid_json_escalates_once(self):
+        model_router.load(self.config)
+        completions = ScriptedCompletions('{"ok": tru', '{"ok": true}')
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        response = self.loop.run_until_complete(llm_call(client, "resolve", messages=[], response_format={"type": "json_object"}))
+        self.assertEqual(response.choices[0].message.content, '{"ok": true}')
+        self.assertEqual([r["model"] for r in completions.requests], ["gpt-4o-mini", "gpt-4o"])
+        counters = model_router.stats()["resolve"]
+        self.assertEqual((counters["calls"], counters["escalations"]), (2, 1))
+        self.assertEqual(counters["models"], {"gpt-4o-mini": 1, "gpt-4o": 1})
+
+    def test_plain_text_answers_do_not_escalate(self):
+        model_router.load(self.config)
+        completions = ScriptedCompletions("not json")
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        self.loop.run_until_complete(llm_call(client, "extract", messages=[]))
+        self.assertEqual(len(completions.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import sys
+import os
+import time
+import unittest
+from types import SimpleNamespace
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.plan_cache import PlanCache, intent_signature, make_template, instantiate_template
+from services.tool_schema import ArgumentValidator
+
+
+def email_plan(to_email, filename):
+    return [
+        {"step": 1, "tool_id": "list_drive_files", "variables": {"filename": filename}, "missing_variables": [],
+         "description": f"Find {filename}", "depends_on_step": None, "output_used_by": [2]},
+        {"step": 2, "tool_id": "send_email", "variables": {"to_email": to_email, "subject": "Summary"}, "missing_variables": [],
+         "description": f"Email the summary to {to_email}", "depends_on_step": 1, "output_used_by": []},
+    ]
+
+
+class TestIntentSignature(unittest.TestCase):
+    def test_masks_variable_parts(self):
+        self.assertEqual(intent_signature("Check my calendar for the next 3 days"), "check my calendar for the next <num> days")
+        self.assertEqual(
+            intent_signature("Email bob@example.com the summary of Q3_report.pdf"),
+            intent_signature("email alice@corp.io the summary of budget_2024.xlsx"),
+        )
+        self.assertEqual(intent_signature("meeting tomorrow at 10am"), intent_signature("meeting March 3rd at 4:30 pm"))
+
+    def test_different_intents_differ(self):
+        self.assertNotEqual(intent_signature("read my emails"), intent_signature("delete my emails"))
+
+
+class TestTemplates(unittest.TestCase):
+    def test_round_trip_with_fresh_variables(self):
+        query = "Email bob@example.com the summary of report.pdf"
+        template = make_template(query, email_plan("bob@example.com", "report.pdf"),
+                                 {"to_email": "bob@example.com", "filename": "report.pdf"})
+        self.assertEqual(template[1]["variables"]["to_email"], "{{vars.to_email}}")
+        plan = instantiate_template(template, {"to_email": "eve@x.org", "filename": "notes.docx"})
+        self.assertEqual(plan, email_plan("eve@x.org", "notes.docx"))
+
+    def test_missing_fresh_variable_becomes_missing(self):
+        template = make_template("Email bob@example.com the summary of the report", email_plan("bob@example.com", "report"),
+                                 {"to_email": "bob@example.com"})
+        plan = instantiate_template(template, {})
+        self.assertNotIn("to_email", plan[1]["variables"])
+        self.assertIn("to_email", plan[1]["missing_variables"])
+
+    def test_query_literal_not_extracted_is_uncacheable(self):
+        # The planner copied a value from the query that extraction missed: reusing it would leak data
+        self.assertIsNone(make_template("Email bob@example.com the summary", email_plan("bob@example.com", "r"), {}))
+
+    def test_derived_literal_is_uncacheable(self):
+        # "tomorrow at 10am" resolved to a date that is wrong for every later query with this signature
+        plan = [{"step": 1, "tool_id": "create_calendar_event", "missing_variables": [], "description": "Create the meeting",
+                 "variables": {"title": "Sync", "start_time": "2026-10-20T10:00:00", "end_time": "2026-10-20T11:00:00"}}]
+        self.assertIsNone(make_template("Schedule a meeting called Sync tomorrow at 10am", plan, {"title": "Sync"}))
+        template = make_template("Schedule a meeting called Sync tomorrow at 10am", plan,
+                                 {"title": "Sync", "start_time": "2026-10-20T10:00:00", "end_time": "2026-10-20T11:00:00"})
+        self.assertEqual(template[0]["variables"]["start_time"], "{{vars.start_time}}")
+
+    def test_constants_stay_literal(self):
+        plan = [{"step": 1, "tool_id": "read_emails", "variables": {"folder": "inbox", "unread": True}},
+                {"step": 2, "tool_id": "send_email", "variables": {"body": "{{steps.1.output}}", "priority": "high"}}]
+        self.assertIsNone(make_template("forward my inbox", plan, {}))
+        template = make_template("forward my inbox", plan, {}, {"send_email": {"priority": ["low", "high"]}})
+        self.assertEqual([s["variables"] for s in template], [s["variables"] for s in plan])
+
+
+class TestPlanCache(unittest.TestCase):
+    def test_hit_rate_and_round_trips_saved(self):
+        cache = PlanCache()
+        self.assertIsNone(cache.get("check my calendar for 3 days"))
+        plan = [{"step": 1, "tool_id": "check_calendar_availability", "variables": {"days": "3"}, "missing_variables": []}]
+        self.assertTrue(cache.put("check my calendar for 3 days", plan, {"days": "3"}))
+        template = cache.get("Check my calendar for 7 days")
+        self.assertEqual(instantiate_template(template, {"days": "7"})[0]["variables"], {"days": "7"})
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["round_trips_saved"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+        # Combined planner mode: the extraction on a hit costs as much as the call it replaces
+        cache.get("check my calendar for 9 days", round_trips_saved=0)
+        self.assertEqual((cache.stats()["hits"], cache.stats()["round_trips_saved"]), (2, 1))
+
+    def test_lru_and_ttl_eviction(self):
+        cache = PlanCache(max_entries=2)
+        for q in ("read my emails", "list my drive files", "create a spreadsheet"):
+            cache.put(q, [{"step": 1, "tool_id": "x", "variables": {}}], {})
+        self.assertIsNone(cache.get("read my emails"))
+        self.assertEqual(cache.stats()["evictions_lru"], 1)
+
+        cache = PlanCache(ttl=0.05)
+        cache.put("read my emails", [{"step": 1, "tool_id": "read_emails", "variables": {}}], {})
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("read my emails"))
+        self.assertEqual(cache.stats()["evictions_ttl"], 1)
+
+    def test_bind_registry_takes_enums_and_drops_templates(self):
+        registry = SimpleNamespace(tools={
+            "send_email": SimpleNamespace(validator=ArgumentValidator(
+                {"type": "object", "properties": {"priority": {"type": "string", "enum": ["low", "high"]}}})),
+            "read_emails": SimpleNamespace(validator=None),
+        })
+        cache = PlanCache()
+        cache.put("read my emails", [{"step": 1, "tool_id": "read_emails", "variables": {}}], {})
+        cache.bind_registry(registry)
+        self.assertEqual(cache.constants, {"send_email": {"priority": ["low", "high"]}})
+        self.assertIsNone(cache.get("read my emails"))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        self.assertTrue(cache.put("email my notes", [{"step": 1, "tool_id": "send_email", "variables": {"priority": "high"}}], {}))
+
+if __name__ == "__main__":
+    unittest.main()
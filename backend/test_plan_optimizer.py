@@ -0,0 +1,99 @@
+import sys
+import os
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from controller.workflow_execution_controller import tool_registry, tool_catalog, plan_dependencies
+from services.plan_optimizer import optimize_plan, step_references
+
+
+def step(n, tool, variables=None, depends_on=None, used_by=(), missing=()):
+    return {"step": n, "tool_id": tool, "variables": dict(variables or {}), "missing_variables": list(missing),
+            "description": f"step {n}", "depends_on_step": depends_on, "output_used_by": list(used_by)}
+
+
+def optimize(plan):
+    optimized, rewrites = optimize_plan(plan, tool_registry, tool_catalog)
+    return optimized, [(r["rewrite"], r["step"]) for r in rewrites]
+
+
+class TestPlanOptimizer(unittest.TestCase):
+    def test_duplicate_read_is_removed_and_references_follow(self):
+        plan = [
+            step(1, "list_drive_files", {"query": "budget"}, used_by=[2]),
+            step(2, "read_drive_file_content", {"file_id": "{{steps.1.files[0].id}}"}),
+            step(3, "list_drive_files", {"query": "budget"}),
+            step(4, "read_drive_file_content", {"file_id": "{{steps.3.files[1].id}}"}, depends_on=3),
+        ]
+        optimized, rewrites = optimize(plan)
+        self.assertEqual(rewrites, [("deduplicate", 3)])
+        self.assertEqual([s["step"] for s in optimized], [1, 2, 4])
+        self.assertEqual(optimized[2]["variables"]["file_id"], "{{steps.1.files[1].id}}")
+        self.assertEqual(optimized[2]["depends_on_step"], 1)
+        self.assertEqual(plan_dependencies(optimized)[4], {1})
+        # The input plan is left alone
+        self.assertEqual(len(plan), 4)
+
+    def test_write_in_between_keeps_the_second_read(self):
+        plan = [
+            step(1, "list_drive_files", {"query": "notes"}),
+            step(2, "upload_to_drive", {"filename": "notes.txt", "content": "x"}),
+            step(3, "list_drive_files", {"query": "notes"}),
+        ]
+        self.assertEqual(optimize(plan)[1], [])
+
+    def test_read_back_of_a_created_sheet_is_dropped(self):
+        plan = [
+            step(1, "create_spreadsheet", {"title": "Budget"}, used_by=[2]),
+            step(2, "read_spreadsheet", {"spreadsheet_id": "{{steps.1.spreadsheet_id}}"}),
+        ]
+        optimized, rewrites = optimize(plan)
+        self.assertEqual(rewrites, [("drop", 2)])
+        self.assertEqual(optimized, [{**plan[0], "output_used_by": []}])
+
+    def test_consumed_read_back_is_kept(self):
+        plan = [
+            step(1, "create_spreadsheet", {"title": "Budget"}),
+            step(2, "read_spreadsheet", {"spreadsheet_id": "{{steps.1.spreadsheet_id}}"}),
+            step(3, "send_email", {"to_email": "a@b.com", "subject": "Rows", "body": "{{steps.2.values}}"}),
+        ]
+        self.assertEqual(optimize(plan)[1], [])
+
+    def test_updates_of_the_same_target_are_merged(self):
+        plan = [
+            step(1, "update_calendar_event", {"event_id": "ev1", "title": "Sync"}),
+            step(2, "list_drive_files", {"query": "agenda"}),
+            step(3, "update_calendar_event", {"event_id": "ev1", "start_time": "2026-03-02T10:00:00"}),
+            step(4, "update_email_labels", {"message_id": "m1", "add_labels": ["A"]}),
+            step(5, "update_email_labels", {"message_id": "m1", "add_labels": ["B"], "remove_labels": ["A"]}),
+        ]
+        optimized, rewrites = optimize(plan)
+        # Labels added by one call and removed by the other: their order matters, so 4 and 5 stay apart
+        self.assertEqual(rewrites, [("merge", 1)])
+        self.assertEqual([s["step"] for s in optimized], [2, 3, 4, 5])
+        self.assertEqual(optimized[1]["description"], "step 1; step 3")
+        self.assertEqual(optimized[1]["variables"], {"event_id": "ev1", "title": "Sync", "start_time": "2026-03-02T10:00:00"})
+
+    def test_reads_are_hoisted_over_unrelated_writes_only(self):
+        plan = [
+            step(1, "send_email", {"to_email": "a@b.com", "subject": "Hi", "body": "Hello"}),
+            step(2, "check_calendar_availability", {"days": 3}),
+            step(3, "read_emails", {"query": "from:a@b.com"}),
+            step(4, "schedule_calendar_event", {"title": "Sync"}, missing=["start_time", "end_time"]),
+            step(5, "list_drive_files", {"query": "agenda"}),
+        ]
+        optimized, rewrites = optimize(plan)
+        # read_emails reads what send_email changes; list_drive_files would pass a step filled from the context
+        self.assertEqual(rewrites, [("hoist", 2)])
+        self.assertEqual([s["step"] for s in optimized], [2, 1, 3, 4, 5])
+
+    def test_step_references(self):
+        self.assertEqual(step_references({"a": "{{steps.2.files[0].id}} and {{ steps.10.name }}", "b": ["{{vars.x}}"]}), {2, 10})
+
+
+if __name__ == "__main__":
+    unittest.main()
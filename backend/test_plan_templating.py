@@ -0,0 +1,57 @@
+import sys
+import os
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.plan_templating import resolve_arguments, lookup, UnresolvedReference
+
+SCOPE = {
+    "steps": {
+        "1": {"status": "success", "files": [{"id": "f1", "name": "Budget.xlsx"}, {"id": "f2", "name": "Notes"}]},
+        "2": {"status": "success", "values": [["a", 1], ["b", 2]]},
+    },
+    "context": {"to_email": "bob@example.com"},
+}
+
+
+class TestPlanTemplating(unittest.TestCase):
+    def test_typed_lookup(self):
+        self.assertEqual(lookup("steps.1.files[0].id", SCOPE), "f1")
+        self.assertEqual(lookup("steps.1.files.1.name", SCOPE), "Notes")
+        self.assertEqual(lookup("steps.2.values", SCOPE), [["a", 1], ["b", 2]])
+        self.assertEqual(lookup("vars.to_email", SCOPE), "bob@example.com")
+        with self.assertRaises(UnresolvedReference):
+            lookup("steps.1.files[5].id", SCOPE)
+        with self.assertRaises(UnresolvedReference):
+            lookup("steps.3.file_id", SCOPE)
+
+    def test_resolve_arguments(self):
+        args, unresolved = resolve_arguments({
+            "file_id": "{{steps.1.files[0].id}}",
+            "values": "{{ steps.2.values }}",
+            "subject": "Summary of {{steps.1.files[0].name}}",
+            "to_email": "{{vars.to_email}}",
+            "days": 3,
+        }, SCOPE)
+        self.assertEqual(unresolved, [])
+        self.assertEqual(args["file_id"], "f1")
+        self.assertEqual(args["values"], [["a", 1], ["b", 2]])
+        self.assertEqual(args["subject"], "Summary of Budget.xlsx")
+        self.assertEqual(args["days"], 3)
+
+    def test_unresolved_and_prose_placeholders_need_llm(self):
+        args, unresolved = resolve_arguments({
+            "file_id": "file_id_from_step_1",
+            "spreadsheet_id": "{{steps.4.spreadsheet_id}}",
+            "title": "Report",
+        }, SCOPE)
+        self.assertEqual(sorted(unresolved), ["file_id", "spreadsheet_id"])
+        self.assertEqual(args, {"title": "Report"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import sys
+import os
+import json
+import unittest
+from types import SimpleNamespace
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+import controller.workflow_execution_controller as workflow_controller
+from controller.workflow_execution_controller import (COMBINED_PLAN_SCHEMA, _pairs_to_dict, extract_and_plan, normalize_plan_steps,
+                                                      tool_catalog, workflow_handler)
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from services.intent_classifier import intent_router
+from services.plan_cache import plan_cache
+from services.workflow_replay import WorkflowReplay, FIXTURE_VERSION
+
+COMBINED_ANSWER = {
+    "extracted_variables": [
+        {"name": "to_email", "value": "sam@example.com"},
+        {"name": "to_email", "value": "someone@else.com"},
+        {"name": "", "value": "nameless"},
+        {"name": "subject", "value": "null"},
+        {"name": " filename ", "value": "Budget 2024"},
+    ],
+    "plan": [
+        {"step": 1, "tool_id": "list_drive_files", "variables": [{"name": "query", "value": "Budget 2024"}], "missing_variables": [],
+         "description": "Find the sheet", "depends_on_step": None, "output_used_by": [2]},
+        {"step": 1, "tool_id": "send_email",
+         "variables": [{"name": "to_email", "value": "sam@example.com"}, {"name": "body", "value": "{{steps.1.files[0].name}}"},
+                       {"name": "subject", "value": ""}],
+         "missing_variables": ["subject"], "description": "Email it", "depends_on_step": 1, "output_used_by": []},
+    ],
+    "summary": "Find the budget and email it",
+}
+
+
+class ScriptedCompletions:
+    """Answers each call with the next scripted content and remembers the requests."""
+
+    def __init__(self, *contents):
+        self.contents = list(contents)
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.contents.pop(0)))],
+                               usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10))
+
+
+class TestCombinedPlanner(unittest.IsolatedAsyncioTestCase):
+    def test_pairs_to_dict(self):
+        self.assertEqual(_pairs_to_dict(COMBINED_ANSWER["extracted_variables"]), {"to_email": "sam@example.com", "filename": "Budget 2024"})
+        self.assertEqual(_pairs_to_dict(None), {})
+        self.assertEqual(_pairs_to_dict([{"name": None, "value": "x"}, {"name": "days", "value": None}]), {})
+
+    async def test_one_call_extracts_and_plans(self):
+        completions = ScriptedCompletions(json.dumps(COMBINED_ANSWER))
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        extracted, plan = await extract_and_plan(client, "email the Budget 2024 sheet to sam@example.com", tool_catalog)
+        self.assertEqual(len(completions.requests), 1)
+        self.assertIs(completions.requests[0]["response_format"], COMBINED_PLAN_SCHEMA)
+        self.assertEqual(extracted, {"to_email": "sam@example.com", "filename": "Budget 2024"})
+        self.assertEqual([s["variables"] for s in plan],
+                         [{"query": "Budget 2024"}, {"to_email": "sam@example.com", "body": "{{steps.1.files[0].name}}"}])
+        # Duplicate step numbers are renumbered in plan order before the DAG runs
+        self.assertEqual([s["step"] for s in normalize_plan_steps(plan)], [1, 2])
+
+
+class TestPlannerModes(AsyncSQLiteTestCase):
+    bind_session_factory = True
+
+    def setUp(self):
+        self.saved = (workflow_controller.WORKFLOW_PLANNER_MODE, intent_router.enabled)
+        intent_router.enabled = False
+        plan_cache.clear()
+
+    def tearDown(self):
+        workflow_controller.WORKFLOW_PLANNER_MODE, intent_router.enabled = self.saved
+
+    async def run_mode(self, mode, llm):
+        workflow_controller.WORKFLOW_PLANNER_MODE = mode
+        emails = {"status": "success", "emails": [{"id": "m1", "from": "a@b.com", "subject": "Hi", "snippet": "Hello"}]}
+        answer = '{"paragraphs": [{"content": "One new email from a@b.com.", "math_formula": ""}]}'
+        replay = WorkflowReplay({
+            "version": FIXTURE_VERSION,
+            "messages": [{"message": "read my last 5 emails", "session_id": "modes"}],
+            "llm": [*llm, {"stage": "final", "fingerprint": "", "stream": True, "content": answer, "latency_ms": 0, "ttft_ms": 0}],
+            "tools": [{"tool": "read_emails", "arguments": {"max_results": 5}, "result": emails, "latency_ms": 0}],
+        }, latency_scale=0)
+        events = await replay.run(workflow_handler)
+        self.assertEqual([e.get("status") for e in events if e.get("type") == "workflow_complete"], ["success"])
+        self.assertEqual(replay.stats()["tool_misses"], 0)
+        return [call["stage"] for call in replay.served]
+
+    async def test_combined_mode_plans_in_one_call(self):
+        plan = {"extracted_variables": [{"name": "max_results", "value": "5"}], "summary": "Read emails", "plan": [
+            {"step": 1, "tool_id": "read_emails", "variables": [{"name": "max_results", "value": "5"}], "missing_variables": [],
+             "description": "Read the last 5 emails", "depends_on_step": None, "output_used_by": []}]}
+        llm = [{"stage": "plan", "fingerprint": "", "content": json.dumps(plan), "latency_ms": 0}]
+        self.assertEqual(await self.run_mode("combined", llm), ["plan", "final"])
+
+    async def test_two_call_mode_extracts_then_plans(self):
+        plan = {"summary": "Read emails", "plan": [
+            {"step": 1, "tool_id": "read_emails", "variables": {"max_results": 5}, "missing_variables": [],
+             "description": "Read the last 5 emails", "depends_on_step": None, "output_used_by": []}]}
+        llm = [{"stage": "extract", "fingerprint": "", "content": json.dumps({"max_results": 5}), "latency_ms": 0},
+               {"stage": "plan", "fingerprint": "", "content": json.dumps(plan), "latency_ms": 0}]
+        self.assertEqual(await self.run_mode("two_call", llm), ["extract", "plan", "final"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import sys
+import unittest
+import asyncio
+import os
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.session_cache import SessionMessageCache
+
+
+def msg(i, content="x"):
+    return {"id": i, "role": "user", "content": content, "tool_name": None, "citations": None}
+
+
+class TestSessionMessageCache(unittest.TestCase):
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_miss_then_hit_with_write_through(self):
+        cache = SessionMessageCache()
+        self.assertIsNone(self.run_async(cache.get("s1")))
+        self.run_async(cache.put("s1", [msg(1)]))
+        self.run_async(cache.append("s1", msg(2)))
+        self.assertEqual([m["id"] for m in self.run_async(cache.get("s1"))], [1, 2])
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_append_does_not_create_partial_sessions(self):
+        cache = SessionMessageCache()
+        self.run_async(cache.append("s1", msg(1)))
+        self.assertIsNone(self.run_async(cache.get("s1")))
+
+    def test_tail_only_after_trim(self):
+        cache = SessionMessageCache(max_messages=3)
+        self.run_async(cache.put("s1", [msg(i) for i in range(5)]))
+        self.assertIsNone(self.run_async(cache.get("s1")))
+        self.assertEqual([m["id"] for m in self.run_async(cache.get("s1", tail=2))], [3, 4])
+
+    def test_session_longer_than_the_cap_is_served_from_its_tail(self):
+        cache = SessionMessageCache(max_messages=3)
+        # What history readers do on a miss: read the window plus one row, cache the window as a tail
+        rows = [msg(i) for i in range(4, 8)]
+        self.run_async(cache.put("s1", rows[-3:], complete=len(rows) <= 3))
+        self.run_async(cache.append("s1", msg(8)))
+        for _ in range(3):
+            self.assertEqual([m["id"] for m in self.run_async(cache.get("s1", tail=3))], [6, 7, 8])
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (3, 0))
+        # A short session read in full is complete: a tail request returns all of it
+        self.run_async(cache.put("s2", [msg(1)], complete=True))
+        self.assertEqual(self.run_async(cache.get("s2", tail=3)), [msg(1)])
+
+    def test_byte_bound_evicts_least_recently_used(self):
+        cache = SessionMessageCache(max_bytes=400)
+        self.run_async(cache.put("a", [msg(1, "a" * 100)]))
+        self.run_async(cache.put("b", [msg(2, "b" * 100)]))
+        self.run_async(cache.get("a"))
+        self.run_async(cache.put("c", [msg(3, "c" * 100)]))
+        self.assertIsNone(self.run_async(cache.get("b")))
+        self.assertIsNotNone(self.run_async(cache.get("a")))
+        self.assertEqual(cache.stats()["evictions_lru"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], 400)
+
+    def test_ttl_expiry(self):
+        cache = SessionMessageCache(ttl=0)
+        self.run_async(cache.put("s1", [msg(1)]))
+        self.assertIsNone(self.run_async(cache.get("s1")))
+        self.assertEqual(cache.stats()["evictions_ttl"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
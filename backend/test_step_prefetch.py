@@ -0,0 +1,93 @@
+import sys
+import os
+import asyncio
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.step_prefetch import StepPrefetcher, prefetch_stats
+from controller.workflow_execution_controller import prefetchable_steps
+
+
+def step(n, tool_id, depends_on=None, **variables):
+    return {"step": n, "tool_id": tool_id, "variables": variables, "missing_variables": [], "depends_on_step": depends_on, "output_used_by": []}
+
+
+class TestStepPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.calls = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    async def run_tool(self, tool_name, arguments):
+        self.calls.append((tool_name, arguments))
+        await asyncio.sleep(0.02)
+        if arguments.get("fail"):
+            return {"status": "error", "message": "quota"}
+        return {"status": "success", "tool": tool_name}
+
+    def test_same_call_is_served_from_the_prefetch(self):
+        async def scenario():
+            prefetcher = StepPrefetcher(self.run_tool, enabled=True)
+            prefetcher.start(2, "read_emails", {"max_results": 5})
+            await asyncio.sleep(0.05)
+            return await prefetcher.claim(2, "read_emails", {"max_results": 5}), await prefetcher.claim(2, "read_emails", {"max_results": 5})
+
+        used_before = prefetch_stats.counters["used"]
+        (result, saved_ms), second = self.loop.run_until_complete(scenario())
+        self.assertEqual(result, {"status": "success", "tool": "read_emails"})
+        self.assertGreaterEqual(saved_ms, 15)
+        self.assertIsNone(second)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(prefetch_stats.counters["used"], used_before + 1)
+
+    def test_changed_arguments_error_and_stale_results_are_discarded(self):
+        async def scenario():
+            prefetcher = StepPrefetcher(self.run_tool, enabled=True, max_age_sec=0.01)
+            prefetcher.start(1, "list_drive_files", {"query": "budget"})
+            prefetcher.start(2, "read_emails", {"fail": True})
+            prefetcher.start(3, "read_spreadsheet", {"spreadsheet_id": "S"})
+            changed = await prefetcher.claim(1, "list_drive_files", {"query": "budget 2024"})
+            failed = await prefetcher.claim(2, "read_emails", {"fail": True})
+            await asyncio.sleep(0.05)
+            stale = await prefetcher.claim(3, "read_spreadsheet", {"spreadsheet_id": "S"})
+            return changed, failed, stale
+
+        self.assertEqual(self.loop.run_until_complete(scenario()), (None, None, None))
+
+    def test_limit_and_discard(self):
+        async def scenario():
+            prefetcher = StepPrefetcher(self.run_tool, enabled=True, max_steps=1)
+            started = [prefetcher.start(1, "read_emails", {}), prefetcher.start(2, "list_drive_files", {})]
+            prefetcher.discard()
+            await asyncio.sleep(0)
+            return started, 1 in prefetcher
+
+        started, still_there = self.loop.run_until_complete(scenario())
+        self.assertEqual(started, [True, False])
+        self.assertFalse(still_there)
+
+
+class TestPrefetchableSteps(unittest.TestCase):
+    def test_reads_independent_of_the_answer_and_of_pending_writes(self):
+        plan = [
+            step(1, "send_email", to_email="a@b.c"),
+            step(2, "check_calendar_availability", days=3),
+            step(3, "read_emails"),
+            step(4, "list_drive_files", query="budget"),
+            step(5, "read_drive_file_content", depends_on=4, file_id="{{steps.4.files[0].id}}"),
+            step(6, "delete_drive_file", file_id="F"),
+            step(7, "read_spreadsheet", spreadsheet_id="S"),
+        ]
+        state = {"plan": plan, "completed_steps": [], "pending_tool": {"name": "send_email", "step": 1}}
+        # 3 reads the mailbox send_email writes to, 5 waits for 4, 7 comes after a Drive delete
+        self.assertEqual([s["step"] for s in prefetchable_steps(state)], [2, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import sys
+import os
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.step_verifier import verify_by_rules
+from services.plan_templating import apply_updated_variables
+
+
+class TestRuleVerifier(unittest.TestCase):
+    def test_unambiguous_success_extracts_context(self):
+        remaining = [{"step": 2, "tool_id": "send_email", "variables": {"event_link": "link_from_step_1"}, "missing_variables": [], "depends_on_step": 1}]
+        v = verify_by_rules("schedule_calendar_event", {"status": "success", "event_id": "e1", "link": "https://cal/e1"}, remaining, 1)
+        self.assertTrue(v["success"] and v["should_continue"])
+        self.assertEqual(v["context_for_next_step"], {"event_id": "e1", "event_link": "https://cal/e1"})
+        self.assertEqual(v["updated_variables"], {"event_link": "https://cal/e1"})
+
+    def test_single_drive_match_identifies_file(self):
+        files = [{"id": "f1", "name": "Budget", "mimeType": "application/vnd.google-apps.spreadsheet"}]
+        v = verify_by_rules("list_drive_files", {"status": "success", "files": files}, [])
+        self.assertEqual(v["context_for_next_step"]["spreadsheet_id"], "f1")
+        self.assertEqual(v["context_for_next_step"]["files_count"], 1)
+
+    def test_errors_and_bad_shapes_go_to_llm(self):
+        self.assertIsNone(verify_by_rules("send_email", {"error": "Gmail not connected"}, []))
+        self.assertIsNone(verify_by_rules("send_email", {"status": "success"}, []))
+        self.assertIsNone(verify_by_rules("unknown_tool", {"status": "success"}, []))
+
+    def test_empty_read_is_ambiguous_only_with_dependents(self):
+        dependent = [{"step": 2, "tool_id": "read_drive_file_content", "depends_on_step": 1}]
+        self.assertIsNone(verify_by_rules("list_drive_files", {"status": "success", "files": []}, dependent, 1))
+        self.assertIsNone(verify_by_rules("list_drive_files", {"status": "success", "files": []}, [], 1, output_used_by=[2]))
+        self.assertIsNotNone(verify_by_rules("list_drive_files", {"status": "success", "files": []}, [], 1))
+
+    def test_updates_never_replace_references_or_reach_unrelated_steps(self):
+        producer = {"step": 1, "tool_id": "list_drive_files", "output_used_by": [2]}
+        remaining = [
+            {"step": 2, "tool_id": "read_drive_file_content", "variables": {"file_id": None}},
+            {"step": 3, "tool_id": "read_drive_file_content", "variables": {"file_id": "{{steps.2.files[0].id}}"}, "depends_on_step": 1},
+            {"step": 4, "tool_id": "update_drive_file", "variables": {}, "missing_variables": ["file_id"]},
+        ]
+        v = verify_by_rules("list_drive_files", {"status": "success", "files": [{"id": "f1", "name": "Budget"}]}, remaining, 1, [2])
+        self.assertEqual(v["updated_variables"], {"file_id": "f1"})
+        apply_updated_variables(remaining, producer, v["updated_variables"])
+        self.assertEqual(remaining[0]["variables"], {"file_id": "f1"})
+        self.assertEqual(remaining[1]["variables"], {"file_id": "{{steps.2.files[0].id}}"})
+        # Step 4 waits for a file id but not from step 1
+        self.assertEqual(remaining[2]["variables"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
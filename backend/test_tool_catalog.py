@@ -0,0 +1,67 @@
+import sys
+import os
+import json
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.plan_templating import TOOL_OUTPUT_FIELDS
+from services.tool_catalog import ToolCatalog, query_terms
+
+with open(os.path.join(backend_path, "tools.json")) as f:
+    TOOLS = json.load(f)
+
+
+class TestToolCatalog(unittest.TestCase):
+    def setUp(self):
+        self.catalog = ToolCatalog(TOOLS, TOOL_OUTPUT_FIELDS, prefilter=True, top_k=6)
+
+    def test_compact_prompt_matches_planner_view(self):
+        tools = json.loads(self.catalog.full_prompt)
+        self.assertEqual(len(tools), len(TOOLS))
+        self.assertEqual(tools[0]["returns"], TOOL_OUTPUT_FIELDS[TOOLS[0]["tool_id"]])
+        self.assertNotIn("\n", self.catalog.full_prompt)
+        self.assertIs(self.catalog.get("send_email"), next(t for t in TOOLS if t["tool_id"] == "send_email"))
+        self.assertIsNone(self.catalog.get("fax_document"))
+
+    def test_selects_the_tools_a_plan_needs(self):
+        cases = {
+            "check my calendar for the next 3 days": {"check_calendar_availability"},
+            "find the contract pdf in my drive and email its contents to legal@example.com":
+                {"list_drive_files", "read_drive_file_content", "send_email"},
+            "clear range A1:D20 in the Inventory spreadsheet": {"clear_spreadsheet_values"},
+        }
+        for query, needed in cases.items():
+            selected = self.catalog.select(query)
+            self.assertTrue(needed <= set(selected), (query, selected))
+            self.assertLess(len(selected), len(TOOLS))
+            self.assertLess(len(self.catalog.prompt_for(query)), len(self.catalog.full_prompt))
+
+    def test_id_lookups_bring_their_provider(self):
+        selected = self.catalog.select("clear range A1:D20 in the Inventory spreadsheet")
+        # clear_spreadsheet_values needs a spreadsheet_id, which only a Drive listing finds
+        self.assertIn("list_drive_files", selected)
+
+    def test_unmatched_query_or_disabled_prefilter_gets_everything(self):
+        self.assertEqual(len(self.catalog.select("hello there")), len(TOOLS))
+        unfiltered = ToolCatalog(TOOLS, TOOL_OUTPUT_FIELDS, prefilter=False)
+        self.assertEqual(unfiltered.prompt_for("check my calendar"), unfiltered.full_prompt)
+
+    def test_query_terms_expand_synonyms_and_addresses(self):
+        terms = query_terms("Book a meeting with ann@example.com")
+        self.assertIn("calendar", terms)
+        self.assertIn("send", terms)
+        self.assertNotIn("ann", terms)
+
+    def test_stats(self):
+        self.catalog.prompt_for("check my calendar for the next 3 days")
+        stats = self.catalog.stats()
+        self.assertEqual((stats["prompts"], stats["filtered"], stats["tools"]), (1, 1, len(TOOLS)))
+        self.assertGreater(stats["prompt_chars_saved"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
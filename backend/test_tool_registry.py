@@ -0,0 +1,124 @@
+import sys
+import os
+import json
+import asyncio
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.tool_registry import ToolRegistry, ToolRegistryError
+
+CALLS = []
+
+
+async def slow_read(db, user_id, arguments):
+    CALLS.append(arguments)
+    await asyncio.sleep(arguments.get("sleep", 0))
+    return {"status": "success", "echo": arguments}
+
+
+async def flaky_read(db, user_id, arguments):
+    CALLS.append(arguments)
+    if len(CALLS) < 3:
+        raise ConnectionError("transient")
+    return {"status": "success"}
+
+
+async def failing_write(db, user_id, arguments):
+    CALLS.append(arguments)
+    raise ConnectionError("smtp down")
+
+
+def not_async(db, user_id, arguments):
+    return {}
+
+
+def tool(tool_id, handler, **execution):
+    return {"tool_id": tool_id, "execution": {"handler": f"test_tool_registry:{handler}", **execution}}
+
+
+class TestToolRegistryValidation(unittest.TestCase):
+    def test_shipped_tools_json_is_valid(self):
+        with open(os.path.join(backend_path, "tools.json")) as f:
+            registry = ToolRegistry().load(json.load(f))
+        self.assertIn("read_emails", registry.read_only_tools())
+        self.assertIn("send_email", registry.confirmation_tools())
+        self.assertNotIn("send_email", registry.read_only_tools())
+
+    def test_reports_every_problem(self):
+        with self.assertRaises(ToolRegistryError) as ctx:
+            ToolRegistry().load([
+                tool("a", "slow_read"),
+                tool("a", "slow_read"),
+                {"tool_id": "b"},
+                tool("c", "missing_function"),
+                tool("d", "not_async"),
+                tool("e", "slow_read", timeout_sec=0, max_concurrency=0),
+                tool("f", "failing_write", retries=1),
+                tool("g", "slow_read", read_only=True, merge_key=["id"]),
+            ])
+        problems = "\n".join(ctx.exception.problems)
+        for expected in ("'a': duplicate", "'b': missing execution.handler", "'c': cannot resolve",
+                         "'d': handler", "'e': timeout_sec", "'e': max_concurrency", "'f': retries are only allowed",
+                         "'g': merge_key is only allowed"):
+            self.assertIn(expected, problems)
+
+
+class TestToolRegistryExecution(unittest.TestCase):
+    def setUp(self):
+        CALLS.clear()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_timeout_and_metrics(self):
+        registry = ToolRegistry().load([tool("slow", "slow_read", read_only=True, timeout_sec=0.05)])
+        ok = self.loop.run_until_complete(registry.execute(None, 1, "slow", {"sleep": 0}))
+        late = self.loop.run_until_complete(registry.execute(None, 1, "slow", {"sleep": 1}))
+        self.assertEqual(ok["status"], "success")
+        self.assertEqual(late, {"status": "error", "message": "Tool 'slow' timed out after 0.05s"})
+        stats = registry.stats()["slow"]
+        self.assertEqual((stats["calls"], stats["errors"], stats["timeouts"], stats["in_flight"]), (2, 1, 1, 0))
+        self.assertEqual(sum(stats["latency_histogram"].values()), 2)
+
+    def test_concurrency_limit(self):
+        registry = ToolRegistry().load([tool("slow", "slow_read", read_only=True, max_concurrency=2)])
+        peak = []
+
+        async def scenario():
+            spec = registry.get("slow")
+
+            async def watch():
+                while any(not t.done() for t in tasks):
+                    peak.append(spec.metrics.counters["in_flight"])
+                    await asyncio.sleep(0.005)
+            tasks = [asyncio.ensure_future(registry.execute(None, 1, "slow", {"sleep": 0.05})) for _ in range(5)]
+            await asyncio.gather(watch(), *tasks)
+
+        self.loop.run_until_complete(scenario())
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(len(CALLS), 5)
+
+    def test_read_only_tools_retry_mutating_tools_do_not(self):
+        registry = ToolRegistry().load([
+            tool("flaky", "flaky_read", read_only=True, retries=2, retry_backoff_sec=0),
+            tool("write", "failing_write"),
+        ])
+        self.assertEqual(self.loop.run_until_complete(registry.execute(None, 1, "flaky", {}))["status"], "success")
+        self.assertEqual(registry.stats()["flaky"]["retries"], 2)
+        CALLS.clear()
+        result = self.loop.run_until_complete(registry.execute(None, 1, "write", {}))
+        self.assertEqual(result, {"status": "error", "message": "smtp down"})
+        self.assertEqual(len(CALLS), 1)
+
+    def test_unknown_tool(self):
+        result = self.loop.run_until_complete(ToolRegistry().execute(None, 1, "nope", {}))
+        self.assertEqual(result["message"], "Tool 'nope' not implemented")
+
+
+if __name__ == "__main__":
+    unittest.main()
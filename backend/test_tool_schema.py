@@ -0,0 +1,93 @@
+import sys
+import os
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from controller.workflow_execution_controller import tool_registry, check_arguments, get_hitl_form_schema
+from services.tool_schema import ArgumentValidator, SchemaError, compile_schema
+
+
+class TestCompiledSchema(unittest.TestCase):
+    def test_scalars_are_coerced(self):
+        validator = ArgumentValidator({"type": "object", "properties": {
+            "days": {"type": "integer", "minimum": 1}, "flag": {"type": "boolean"}, "name": {"type": "string"}}})
+        self.assertEqual(validator.validate({"days": "5", "flag": "yes", "name": 42}), ({"days": 5, "flag": True, "name": "42"}, {}))
+        self.assertEqual(validator.validate({"days": "0"})[1], {"days": "days must be >= 1"})
+        self.assertEqual(validator.validate({"days": "soon"})[1], {"days": "days must be integer"})
+
+    def test_arrays_and_objects_are_coerced(self):
+        validate = compile_schema({"type": "array", "items": {"type": "string", "format": "email"}, "minItems": 1})
+        self.assertEqual(validate("a@b.com; c@d.com", "to"), (["a@b.com", "c@d.com"], []))
+        self.assertEqual(validate("a@b.com", "to"), (["a@b.com"], []))
+        self.assertEqual(validate(["a@b.com", "nope"], "to")[1], [("to[1]", "is not an email address")])
+        rows = compile_schema({"type": "array", "items": {"type": "array"}})
+        self.assertEqual(rows('[["a", 1], ["b", 2]]', "values"), ([["a", 1], ["b", 2]], []))
+        self.assertEqual(compile_schema({"type": "object"})('{"a": 1}', "body"), ({"a": 1}, []))
+
+    def test_dates_are_normalized(self):
+        validate = compile_schema({"type": "string", "format": "date-time"})
+        self.assertEqual(validate("2026-03-02 10:00", "t")[0], "2026-03-02T10:00:00")
+        self.assertEqual(validate("March 2, 2026 3:30 PM", "t")[0], "2026-03-02T15:30:00")
+        self.assertEqual(validate("2026-03-02T10:00:00+01:00", "t")[0], "2026-03-02T10:00:00+01:00")
+        self.assertEqual(compile_schema({"type": "string", "format": "date"})("2 Mar 2026", "d")[0], "2026-03-02")
+
+    def test_sheet_ranges(self):
+        validate = compile_schema({"type": "string", "format": "a1-range"})
+        for value in ("Sheet1", "Sheet1!A1:D20", "'My Sheet'!A:Z", "A1:B2", "2:5"):
+            self.assertEqual(validate(value, "range")[1], [], value)
+        self.assertEqual(validate("A:ZZ!", "range")[1], [("range", "is not a sheet range (expected e.g. Sheet1!A1:D20)")])
+
+    def test_required_and_left_out_parameters(self):
+        validator = ArgumentValidator({"type": "object", "required": ["title"], "additionalProperties": False,
+                                       "properties": {"title": {"type": "string"}, "page": {"type": "integer"}}})
+        self.assertEqual(validator.validate({"title": "x", "page": None}), ({"title": "x"}, {}))
+        self.assertEqual(validator.validate({"title": "", "page": ""}), ({}, {"title": "title is required"}))
+        self.assertEqual(validator.validate({"title": "x", "color": "red"})[1], {"color": "color is not a parameter of this tool"})
+
+    def test_bad_schemas_fail_compilation(self):
+        for schema in ({"type": "string", "formt": "date"}, {"type": "text"}, {"type": "string", "format": "phone"},
+                       {"type": "string", "pattern": "("}):
+            with self.assertRaises(SchemaError):
+                compile_schema(schema)
+
+
+class TestToolArguments(unittest.TestCase):
+    def test_every_tool_has_a_schema(self):
+        self.assertTrue(all(spec.validator is not None for spec in tool_registry.tools.values()))
+
+    def test_registry_coerces_and_counts(self):
+        metrics = tool_registry.get("check_calendar_availability").metrics.counters
+        coerced = metrics["arguments_coerced"]
+        self.assertEqual(tool_registry.validate("check_calendar_availability", {"days": "3"}), ({"days": 3}, {}))
+        self.assertEqual(metrics["arguments_coerced"], coerced + 1)
+        self.assertEqual(tool_registry.validate("check_calendar_availability", {"days": 3}, record=False), ({"days": 3}, {}))
+        self.assertEqual(metrics["arguments_coerced"], coerced + 1)
+
+    def test_invalid_values_go_to_the_form_with_their_error(self):
+        arguments, missing, errors = check_arguments(
+            "schedule_calendar_event", {"title": "Sync", "start_time": "2026-03-02 10:00", "end_time": "whenever"}, [])
+        self.assertEqual(arguments, {"title": "Sync", "start_time": "2026-03-02T10:00:00"})
+        self.assertEqual(missing, ["end_time"])
+        schema = get_hitl_form_schema("schedule_calendar_event", missing, errors)
+        field = schema["fields"][0]
+        self.assertEqual((field["name"], field["type"], field["required"]), ("end_time", "datetime", True))
+        self.assertIn('(got "whenever")', field["error"])
+
+    def test_invalid_optional_values_are_dropped(self):
+        arguments, missing, errors = check_arguments(
+            "schedule_calendar_event",
+            {"title": "Sync", "start_time": "2026-03-02T10:00:00", "end_time": "2026-03-02T11:00:00", "attendee_email": "bob"}, [])
+        self.assertEqual((missing, errors), ([], {}))
+        self.assertNotIn("attendee_email", arguments)
+
+    def test_missing_parameters_have_no_error(self):
+        arguments, missing, errors = check_arguments("send_email", {"to_email": "a@b.com", "subject": "Hi"}, ["body"])
+        self.assertEqual((arguments, missing, errors), ({"to_email": ["a@b.com"], "subject": "Hi"}, ["body"], {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import sys
+import os
+import json
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from controller.workflow_execution_controller import (normalize_plan_steps, plan_dependencies, ready_steps, mark_step_done,
+                                                      plan_finished, run_plan_step, workflow_handler)
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from services.plan_cache import plan_cache
+from services.workflow_replay import WorkflowReplay, FIXTURE_VERSION
+
+SHEET = "application/vnd.google-apps.spreadsheet"
+
+
+def step(n, tool, depends_on=None, used_by=()):
+    return {"step": n, "tool_id": tool, "variables": {}, "depends_on_step": depends_on, "output_used_by": list(used_by)}
+
+
+class TestPlanDag(unittest.TestCase):
+    def test_independent_reads_are_ready_together(self):
+        plan = [step(1, "check_calendar_availability"), step(2, "list_drive_files"), step(3, "read_drive_file_content", depends_on=2)]
+        deps = plan_dependencies(plan)
+        self.assertEqual([s["step"] for s in ready_steps(plan, deps, set(), set())], [1, 2])
+        self.assertEqual([s["step"] for s in ready_steps(plan, deps, {2}, {1})], [3])
+
+    def test_output_used_by_adds_edges(self):
+        plan = [step(1, "read_emails", used_by=[3]), step(2, "list_drive_files"), step(3, "read_spreadsheet")]
+        self.assertEqual(plan_dependencies(plan)[3], {1})
+
+    def test_mutating_steps_are_barriers(self):
+        plan = [step(1, "read_emails"), step(2, "send_email"), step(3, "list_drive_files")]
+        deps = plan_dependencies(plan)
+        # send_email waits for step 1 even without a declared dependency, step 3 waits for send_email
+        self.assertEqual([s["step"] for s in ready_steps(plan, deps, set(), set())], [1])
+        self.assertEqual([s["step"] for s in ready_steps(plan, deps, {1}, set())], [2])
+        self.assertEqual([s["step"] for s in ready_steps(plan, deps, {1, 2}, set())], [3])
+
+    def test_completion_tracking(self):
+        state = {"plan": normalize_plan_steps([{"tool_id": "read_emails"}, {"tool_id": "send_email"}])}
+        self.assertEqual([s["step"] for s in state["plan"]], [1, 2])
+        mark_step_done(state, 2)
+        self.assertFalse(plan_finished(state))
+        mark_step_done(state, None)  # legacy pending tool without a step number: next unfinished step
+        self.assertTrue(plan_finished(state))
+        self.assertEqual(state["current_step"], 2)
+
+
+
+def listing(*names):
+    return {"status": "success", "files": [{"id": name.replace(" ", ""), "name": name, "mimeType": SHEET} for name in names]}
+
+
+def selection_fixture():
+    """Two independent Drive listings that both end in a selection prompt."""
+    plan = {"extracted_variables": [], "plan": [
+        {"step": n, "tool_id": "list_drive_files", "variables": [{"name": "query", "value": query}], "missing_variables": [],
+         "description": "list_drive_files", "depends_on_step": None, "output_used_by": []}
+        for n, query in ((1, "budget"), (2, "forecast"))]}
+    ranked = [{"matches": [{"id": name.replace(" ", ""), "name": name, "mimeType": SHEET, "relevance_score": 0.8,
+                            "relevance_label": "Medium", "reason": "Same name"} for name in names]}
+              for names in (("Budget A", "Budget B"), ("Forecast A", "Forecast B"))]
+    answer = '{"paragraphs": [{"content": "Both sheets are selected.", "math_formula": ""}]}'
+
+    def llm(stage, content, stream=False):
+        return {"stage": stage, "fingerprint": "", "stream": stream, "content": content, "latency_ms": 0, "ttft_ms": 0}
+
+    def select(file_id):
+        return {"session_id": "dag", "hitl_response": {"selected_item": {"id": file_id, "name": file_id, "mimeType": SHEET}}}
+
+    return {
+        "version": FIXTURE_VERSION,
+        "messages": [{"message": "open the budget and forecast sheets", "session_id": "dag"}, select("BudgetA"), select("ForecastA")],
+        "llm": [llm("plan", json.dumps(plan)), llm("file_match", json.dumps(ranked[0])), llm("file_match", json.dumps(ranked[1])),
+                llm("final", answer, stream=True)],
+        "tools": [{"tool": "list_drive_files", "arguments": {"query": "budget"}, "result": listing("Budget A", "Budget B"), "latency_ms": 0},
+                  {"tool": "list_drive_files", "arguments": {"query": "forecast"}, "result": listing("Forecast A", "Forecast B"), "latency_ms": 0}],
+    }
+
+
+class TestDeferredSteps(AsyncSQLiteTestCase):
+    bind_session_factory = True
+
+    def setUp(self):
+        plan_cache.clear()
+
+    async def test_listing_waits_for_an_open_prompt_before_calling_drive(self):
+        step = {"step": 2, "tool_id": "list_drive_files", "variables": {"query": "forecast"}, "missing_variables": []}
+        state = {"plan": [step], "execution_context": {}, "pending_tool": {"name": "list_drive_files", "hitl_type": "selection", "step": 1}}
+        # No socket, state manager or Drive: a deferred listing must not get that far
+        outcome = await run_plan_step(None, None, None, state, step)
+        self.assertEqual(outcome, ("deferred", None))
+        self.assertNotIn("step_outputs", state)
+
+    async def test_second_selection_resumes_without_listing_again(self):
+        replay = WorkflowReplay(selection_fixture(), latency_scale=0)
+        events = await replay.run(workflow_handler)
+        self.assertEqual(len([e for e in events if e.get("type") == "hitl_selection"]), 2)
+        self.assertEqual([e.get("status") for e in events if e.get("type") == "workflow_complete"], ["success"])
+        # One Drive call and one tie-break per step: the deferred step was not run again on resume
+        self.assertEqual([call["stage"] for call in replay.served], ["plan", "file_match", "file_match", "final"])
+        stats = replay.stats()
+        self.assertEqual((stats["tool_calls"], stats["tool_fallbacks"], stats["tool_misses"]), (2, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
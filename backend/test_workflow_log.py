@@ -0,0 +1,129 @@
+import sys
+import os
+import asyncio
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from models import WorkflowEvent, WorkflowSnapshot
+from services.workflow_log import WorkflowEventLog, apply_event, empty_state, replay
+
+PLAN = [
+    {"step": 1, "tool_id": "list_drive_files", "variables": {"query": "budget"}, "missing_variables": []},
+    {"step": 2, "tool_id": "read_drive_file_content", "variables": {"file_id": None}, "missing_variables": ["file_id"]},
+    {"step": 3, "tool_id": "send_email", "variables": {"to_email": "bob@example.com"}, "missing_variables": [], "depends_on_step": 2},
+]
+RUN = [
+    ("plan_created", {"user_goal": "email my budget to bob", "plan": PLAN, "execution_context": {"to_email": "bob@example.com"}}),
+    ("step_started", {"step": 1, "tool": "list_drive_files", "arguments": {"query": "budget"}}),
+    ("hitl_requested", {"step": 1, "tool": "list_drive_files", "execution_context": {"to_email": "bob@example.com", "query": "budget"},
+                        "pending_tool": {"name": "list_drive_files", "arguments": {"query": "budget"}, "hitl_type": "selection", "step": 1}}),
+    ("hitl_answered", {"step": 1, "tool": "list_drive_files", "outcome": "selected", "response": {"id": "F2", "name": "Budget 2024"}}),
+    ("step_started", {"step": 2, "tool": "read_drive_file_content", "arguments": {"file_id": "F2"}}),
+    ("step_completed", {"step": 2, "tool": "read_drive_file_content", "output": {"status": "success", "content": "totals"},
+                        "execution_context": {"to_email": "bob@example.com", "file_id": "F2"}, "updated_variables": {"body": "totals"}}),
+    ("hitl_requested", {"step": 3, "tool": "send_email", "execution_context": {"to_email": "bob@example.com", "file_id": "F2"},
+                        "pending_tool": {"name": "send_email", "arguments": {"to_email": "bob@example.com"}, "hitl_type": "confirmation", "step": 3}}),
+]
+
+
+def fold(events):
+    state = empty_state()
+    for event_type, payload in events:
+        apply_event(state, event_type, payload)
+    return state
+
+
+class TestWorkflowReducer(unittest.TestCase):
+    def test_fold_reaches_pending_confirmation(self):
+        state = fold(RUN)
+        self.assertEqual(state["completed_steps"], [1, 2])
+        self.assertEqual(state["current_step"], 2)
+        self.assertEqual(state["pending_tool"]["name"], "send_email")
+        self.assertEqual(state["step_outputs"]["1"]["files"][0]["id"], "F2")
+        self.assertEqual(state["plan"][2]["variables"]["body"], "totals")
+        self.assertEqual(state["execution_context"]["file_id"], "F2")
+
+    def test_selection_fills_later_file_ids(self):
+        state = fold(RUN[:4])
+        self.assertEqual(state["plan"][1]["variables"]["file_id"], "F2")
+        self.assertEqual(state["plan"][1]["missing_variables"], [])
+        self.assertIsNone(state["pending_tool"])
+
+    def test_finish_and_reset_clear_the_run(self):
+        state = fold(RUN + [("hitl_answered", {"step": 3, "outcome": "approved"}),
+                            ("step_completed", {"step": 3, "output": {"status": "success"}}),
+                            ("workflow_finished", {"status": "success"})])
+        self.assertIsNone(state["plan"])
+        self.assertIsNone(state["pending_tool"])
+        self.assertEqual(state["current_step"], 3)
+        state = fold(RUN + [("workflow_reset", {})])
+        self.assertEqual((state["plan"], state["completed_steps"]), (None, []))
+
+
+class TestWorkflowEventLog(AsyncSQLiteTestCase):
+    tables = [WorkflowEvent, WorkflowSnapshot]
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.log = WorkflowEventLog(session_factory=self.Session, snapshot_every=3, enabled=True)
+
+    async def record_run(self, session_id="s1"):
+        state = empty_state()
+        for event_type, payload in RUN:
+            apply_event(state, event_type, payload)
+            await self.log.append(session_id, event_type, payload, state)
+        return state
+
+    async def test_rebuild_from_snapshot_matches_live_state(self):
+        live = await self.record_run()
+        snapshot, snapshot_seq, events_after = await self.log.read("s1")
+        self.assertEqual(snapshot_seq, 6)
+        self.assertEqual([e["seq"] for e in events_after], [7])
+        rebuilt = await self.log.rebuild("s1")
+        self.assertEqual(rebuilt, live)
+        self.assertEqual(self.log.stats()["snapshots"], 2)
+
+    async def test_replay_yields_every_transition(self):
+        await self.record_run()
+        _, _, events = await self.log.read("s1", use_snapshot=False)
+        steps = [state["current_step"] for _, state in replay(events)]
+        self.assertEqual(steps, [0, 0, 0, 1, 1, 2, 2])
+
+    async def test_concurrent_appends_get_distinct_sequence_numbers(self):
+        seqs = await asyncio.gather(*[self.log.append("s2", "step_started", {"step": i}) for i in range(8)])
+        async with self.Session() as db:
+            stored = (await db.execute(select(WorkflowEvent.seq).where(WorkflowEvent.session_id == "s2"))).scalars().all()
+        # Nothing is dropped: appends of one session take turns instead of racing for the database lock
+        self.assertEqual(sorted(seqs), list(range(1, 9)))
+        self.assertEqual(sorted(stored), list(range(1, 9)))
+        self.assertEqual(self.log.stats()["append_errors"], 0)
+
+    async def test_locked_database_is_retried(self):
+        attempts = []
+
+        def session_factory():
+            db = self.Session()
+            if not attempts:
+                async def locked():
+                    raise OperationalError("INSERT INTO workflow_events", {}, Exception("database is locked"))
+                db.commit = locked
+            attempts.append(db)
+            return db
+
+        log = WorkflowEventLog(session_factory=session_factory, enabled=True)
+        self.assertEqual(await log.append("s3", "step_started", {"step": 1}), 1)
+        self.assertEqual((len(attempts), log.stats()["append_retries"], log.stats()["append_errors"]), (2, 1, 0))
+
+    async def test_unknown_session_rebuilds_nothing(self):
+        self.assertIsNone(await self.log.rebuild("missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import sys
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.workflow_replay import WorkflowRecorder, WorkflowReplay, ReplayError, active_recorder, active_replay
+from controller.workflow_execution_controller import llm_call, execute_google_tool
+
+PLAN_REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "plan it"}], "response_format": {"type": "json_object"}}
+FINAL_REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "answer"}], "stream": True}
+FINAL_TEXT = '{"paragraphs": [{"content": "a fairly long answer", "math_formula": ""}]}'
+
+
+class FakeCompletions:
+    async def create(self, **request):
+        await asyncio.sleep(0.01)
+        if request.get("stream"):
+            return self._stream()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='{"plan": []}'))],
+                               usage=SimpleNamespace(prompt_tokens=12, completion_tokens=4))
+
+    async def _stream(self):
+        for i in range(0, len(FINAL_TEXT), 5):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=FINAL_TEXT[i:i + 5]))])
+
+
+async def consume(stream):
+    return "".join([chunk.choices[0].delta.content async for chunk in stream])
+
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def record(self):
+        async def scenario():
+            recorder = WorkflowRecorder()
+            token = active_recorder.set(recorder)
+            try:
+                recorder.incoming({"type": "pong"})
+                recorder.incoming({"message": "plan it", "session_id": "s/1"})
+                client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+                await llm_call(client, "plan", **PLAN_REQUEST)
+                text = await consume(await llm_call(client, "final", **FINAL_REQUEST))
+                # Unknown tools come back as an error from the registry; still recorded as seen
+                await execute_google_tool(None, 1, "no_such_tool", {"q": 1})
+            finally:
+                active_recorder.reset(token)
+            return recorder, text
+
+        return self.loop.run_until_complete(scenario())
+
+    def test_recording_captures_calls(self):
+        recorder, text = self.record()
+        fixture = recorder.to_fixture()
+        self.assertEqual(text, FINAL_TEXT)
+        self.assertEqual(fixture["messages"], [{"message": "plan it", "session_id": "s/1"}])
+        plan, final = fixture["llm"]
+        self.assertEqual((plan["stage"], plan["content"], plan["usage"]), ("plan", '{"plan": []}', {"prompt_tokens": 12, "completion_tokens": 4}))
+        self.assertEqual((final["stage"], final["stream"], final["content"]), ("final", True, FINAL_TEXT))
+        self.assertGreater(final["ttft_ms"], 0)
+        self.assertEqual(fixture["tools"][0]["result"], {"status": "error", "message": "Tool 'no_such_tool' not implemented"})
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = recorder.save(directory)
+            self.assertTrue(os.path.basename(path).startswith("s_1-"))
+            with open(path) as f:
+                self.assertEqual(json.load(f)["llm"], fixture["llm"])
+            self.assertIsNone(WorkflowRecorder().save(directory))
+
+    def test_replay_answers_from_the_recording(self):
+        recorder, _ = self.record()
+        replay = WorkflowReplay(recorder.to_fixture(), latency_scale=0)
+
+        async def scenario():
+            token = active_replay.set(replay)
+            try:
+                plan = await llm_call(None, "plan", **PLAN_REQUEST)
+                text = await consume(await llm_call(None, "final", **FINAL_REQUEST))
+                tool = await execute_google_tool(None, 1, "no_such_tool", {"q": 1})
+            finally:
+                active_replay.reset(token)
+            return plan, text, tool
+
+        plan, text, tool = self.loop.run_until_complete(scenario())
+        self.assertEqual(plan.choices[0].message.content, '{"plan": []}')
+        self.assertEqual(plan.usage.prompt_tokens, 12)
+        self.assertEqual(text, FINAL_TEXT)
+        self.assertEqual(tool["message"], "Tool 'no_such_tool' not implemented")
+        self.assertEqual(sorted(replay.timings), ["execute", "final", "plan"])
+        self.assertEqual(replay.stats(), {"llm_calls": 2, "tool_calls": 1, "prompt_fallbacks": 0, "tool_fallbacks": 0,
+                                          "tool_misses": 0, "unused_llm": 0, "unused_tools": 0})
+
+    def test_changed_calls_fall_back_to_recording_order(self):
+        fixture = {"version": 1, "messages": [], "llm": [
+            {"stage": "verify", "fingerprint": "x", "content": "first", "latency_ms": 5},
+            {"stage": "verify", "fingerprint": "y", "content": "second", "latency_ms": 5},
+        ], "tools": [{"tool": "read_emails", "arguments": {"max_results": 5}, "result": {"status": "success"}, "latency_ms": 5}]}
+        replay = WorkflowReplay(fixture, llm_latency_ms=0, tool_latency_ms=0)
+
+        async def scenario():
+            first = await replay.llm("verify", PLAN_REQUEST)
+            emails = await replay.tool("read_emails", {"max_results": 10})
+            missing = await replay.tool("send_email", {})
+            await replay.llm("verify", PLAN_REQUEST)
+            with self.assertRaises(ReplayError):
+                await replay.llm("verify", PLAN_REQUEST)
+            return first, emails, missing
+
+        first, emails, missing = self.loop.run_until_complete(scenario())
+        self.assertEqual(first.choices[0].message.content, "first")
+        self.assertEqual(emails, {"status": "success"})
+        self.assertEqual(missing["status"], "error")
+        stats = replay.stats()
+        self.assertEqual((stats["prompt_fallbacks"], stats["tool_fallbacks"], stats["tool_misses"]), (2, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
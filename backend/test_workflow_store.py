@@ -0,0 +1,180 @@
+import sys
+import os
+import asyncio
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from redis.exceptions import WatchError, ConnectionError as RedisConnectionError
+from services.workflow_store import (
+    LocalStateBackend, WorkflowStateStore, WorkflowStateConflict, WORKFLOW_STATE_REDIS_PREFIX,
+)
+
+
+class FakePipeline:
+    """Just enough of redis.asyncio's transactional pipeline for WATCH/GET/MULTI/SET/EXEC."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.watched = {}
+        self.queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, key):
+        self.watched[key] = self.redis.writes.get(key, 0)
+
+    async def get(self, key):
+        return self.redis.data.get(key)
+
+    def multi(self):
+        pass
+
+    def set(self, key, value, ex=None):
+        self.queued.append((key, value, ex))
+
+    async def execute(self):
+        if self.redis.before_execute:
+            hook, self.redis.before_execute = self.redis.before_execute, None
+            await hook()
+        if any(self.redis.writes.get(k, 0) != n for k, n in self.watched.items()):
+            raise WatchError("watched key changed")
+        for key, value, ex in self.queued:
+            await self.redis.set(key, value, ex=ex)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data, self.ttls, self.writes = {}, {}, {}
+        self.before_execute = None
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise RedisConnectionError("redis is down")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.data[key], self.ttls[key] = value, ex
+        self.writes[key] = self.writes.get(key, 0) + 1
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        self._check()
+        return FakePipeline(self)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestLocalStateBackend(unittest.TestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        async def scenario():
+            store = WorkflowStateStore(local=LocalStateBackend(max_bytes=600))
+            for sid in ("a", "b", "c"):
+                await store.save(sid, {"history": ["x" * 150]})
+            await store.load("a")  # touch: "b" is now the oldest
+            await store.save("d", {"history": ["x" * 150]})
+            return [await store.load(sid) for sid in ("a", "b", "c", "d")], store.local.stats()
+
+        states, stats = run(scenario())
+        self.assertIsNone(states[1])
+        self.assertTrue(all(states[i] is not None for i in (0, 2, 3)))
+        self.assertEqual(stats["evictions_lru"], 1)
+        self.assertLessEqual(stats["bytes"], 600)
+
+    def test_ttl_expiry(self):
+        async def scenario():
+            store = WorkflowStateStore(local=LocalStateBackend(ttl=0))
+            await store.save("a", {"plan": None})
+            return await store.load("a")
+
+        self.assertIsNone(run(scenario()))
+
+    def test_stale_version_conflicts(self):
+        async def scenario():
+            store = WorkflowStateStore()
+            await store.save("s", {"current_step": 0})
+            first = await store.load("s")
+            second = await store.load("s")
+            second["current_step"] = 1
+            await store.save("s", second)
+            first["current_step"] = 2
+            with self.assertRaises(WorkflowStateConflict):
+                await store.save("s", first)
+            return await store.load("s")
+
+        state = run(scenario())
+        self.assertEqual(state["current_step"], 1)
+        self.assertEqual(state["_version"], 2)
+
+
+class TestRedisStateBackend(unittest.TestCase):
+    def test_round_trip_with_compression(self):
+        async def scenario():
+            redis = FakeRedis()
+            store = WorkflowStateStore(redis_client=redis)
+            state = {"history": [{"role": "user", "content": "summarize my budget " * 200}], "plan": {"steps": []}}
+            await store.save("s", state)
+            return redis, await store.load("s")
+
+        redis, loaded = run(scenario())
+        raw = redis.data[WORKFLOW_STATE_REDIS_PREFIX + "s"]
+        self.assertTrue(raw.startswith("1|z|"))
+        self.assertLess(len(raw), 1000)
+        self.assertEqual(loaded["_version"], 1)
+        self.assertEqual(loaded["plan"], {"steps": []})
+        self.assertIsNotNone(redis.ttls[WORKFLOW_STATE_REDIS_PREFIX + "s"])
+
+    def test_concurrent_writer_between_watch_and_exec_conflicts(self):
+        async def scenario():
+            redis = FakeRedis()
+            worker_a, worker_b = WorkflowStateStore(redis_client=redis), WorkflowStateStore(redis_client=redis)
+            await worker_a.save("s", {"current_step": 0})
+            state_a, state_b = await worker_a.load("s"), await worker_b.load("s")
+            state_b["current_step"] = 5
+
+            async def other_worker_writes():
+                await worker_b.save("s", state_b)
+
+            redis.before_execute = other_worker_writes
+            with self.assertRaises(WorkflowStateConflict):
+                await worker_a.save("s", state_a)
+            return await worker_a.load("s"), worker_a.stats()
+
+        state, stats = run(scenario())
+        self.assertEqual(state["current_step"], 5)
+        self.assertEqual(stats["redis"]["conflicts"], 1)
+
+    def test_falls_back_to_local_when_redis_is_down(self):
+        async def scenario():
+            redis = FakeRedis()
+            store = WorkflowStateStore(redis_client=redis)
+            await store.save("s", {"current_step": 0})
+            state = await store.load("s")
+            redis.down = True
+            state["current_step"] = 1
+            await store.save("s", state)
+            return await store.load("s"), store.stats()
+
+        state, stats = run(scenario())
+        self.assertEqual(state["current_step"], 1)
+        self.assertEqual(stats["redis_errors"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
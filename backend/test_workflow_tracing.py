@@ -0,0 +1,113 @@
+import sys
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from services.workflow_tracing import WorkflowTrace, SpanMetrics, active_trace, traced, trace_exporter, span_metrics
+from controller.workflow_execution_controller import llm_call, execute_google_tool
+
+
+class FakeCompletions:
+    async def create(self, **request):
+        if request.get("stream"):
+            return self._stream()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))],
+                               usage=SimpleNamespace(prompt_tokens=30, completion_tokens=7))
+
+    async def _stream(self):
+        await asyncio.sleep(0.01)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='{"a"'))], usage=None)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=': 1}'))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=50, completion_tokens=4))
+
+
+class TestWorkflowTracing(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_path = trace_exporter.path
+        trace_exporter.path = os.path.join(self.tmp.name, "traces.jsonl")
+
+    def tearDown(self):
+        trace_exporter.path = self.saved_path
+        self.loop.close()
+        self.tmp.cleanup()
+
+    def test_spans_are_sent_measured_and_exported(self):
+        events = []
+
+        async def send(event):
+            events.append(event)
+
+        async def scenario():
+            trace = WorkflowTrace("t1", send=send)
+            token = active_trace.set(trace)
+            try:
+                client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+                await llm_call(client, "plan", model="gpt-4o", messages=[])
+                async for _ in await llm_call(client, "final", model="gpt-4o", messages=[], stream=True):
+                    pass
+                await execute_google_tool(None, 1, "no_such_tool", {})
+                with self.assertRaises(KeyError):
+                    async with traced("db", "state_store.save"):
+                        raise KeyError("boom")
+            finally:
+                active_trace.reset(token)
+            await trace.finish()
+            return trace
+
+        trace = self.loop.run_until_complete(scenario())
+        spans = {(e["span"], e["name"]): e for e in events}
+        self.assertEqual(list(spans), [("llm", "plan"), ("llm", "final"), ("google", "no_such_tool"), ("db", "state_store.save"), ("workflow", "message")])
+        self.assertEqual(spans[("llm", "plan")]["attributes"], {"model": "gpt-4o", "stream": False, "prompt_tokens": 30, "completion_tokens": 7})
+        final = spans[("llm", "final")]["attributes"]
+        self.assertEqual((final["prompt_tokens"], final["completion_tokens"]), (50, 4))
+        self.assertGreaterEqual(final["ttft_ms"], 5)
+        self.assertEqual(spans[("google", "no_such_tool")]["error"], "Tool 'no_such_tool' not implemented")
+        self.assertEqual(spans[("db", "state_store.save")]["error"], "KeyError: 'boom'")
+
+        with open(trace_exporter.path) as f:
+            exported = [json.loads(line) for line in f]
+        otlp_spans = exported[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual(len(otlp_spans), 5)
+        self.assertTrue(all(s["traceId"] == trace.trace_id for s in otlp_spans))
+        root = next(s for s in otlp_spans if s["name"] == "workflow.message")
+        self.assertNotIn("parentSpanId", root)
+        self.assertTrue(all(s["parentSpanId"] == root["spanId"] for s in otlp_spans if s is not root))
+        self.assertEqual(next(s for s in otlp_spans if s["name"] == "db.state_store.save")["status"]["code"], 2)
+
+        metrics = span_metrics.render()
+        self.assertIn('workflow_llm_tokens_total{stage="plan",model="gpt-4o",type="prompt"}', metrics)
+        self.assertIn('workflow_llm_ttft_seconds_count{stage="final",model="gpt-4o"}', metrics)
+
+    def test_no_active_trace_records_nothing(self):
+        async def scenario():
+            async with traced("db", "event_log.append") as span:
+                return span
+
+        self.assertIsNone(self.loop.run_until_complete(scenario()))
+
+
+class TestSpanMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = SpanMetrics()
+        trace = SimpleNamespace()
+        for ms in (3, 40, 40, 20000):
+            metrics.observe(SimpleNamespace(kind="google", name="read_emails", error=None, duration_ms=ms, attributes={}, trace=trace))
+        text = metrics.render()
+        self.assertIn('workflow_span_duration_seconds_bucket{kind="google",name="read_emails",status="ok",le="0.005"} 1', text)
+        self.assertIn('workflow_span_duration_seconds_bucket{kind="google",name="read_emails",status="ok",le="0.05"} 3', text)
+        self.assertIn('workflow_span_duration_seconds_bucket{kind="google",name="read_emails",status="ok",le="+Inf"} 4', text)
+        self.assertIn('workflow_span_duration_seconds_count{kind="google",name="read_emails",status="ok"} 4', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
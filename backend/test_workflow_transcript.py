@@ -0,0 +1,74 @@
+import sys
+import os
+import unittest
+
+# Add the backend directory to sys.path so we can import modules from it
+backend_path = os.path.dirname(os.path.abspath(__file__))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from async_sqlite_test_case import AsyncSQLiteTestCase
+from models import User, ChatMessage, ChatSessionArchive
+from services.session_cache import session_cache
+from controller.workflow_execution_controller import WorkflowState
+
+
+class TestWorkflowTranscript(AsyncSQLiteTestCase):
+    tables = [User, ChatMessage, ChatSessionArchive]
+
+    async def seed(self):
+        async with self.Session() as db:
+            db.add_all([
+                ChatMessage(session_id="t1", user_id=1, role="user", content="summarize my budget"),
+                ChatMessage(session_id="t1", user_id=1, role="tool", tool_name="list_drive_files", content='{"files": []}'),
+            ])
+            await db.commit()
+        await session_cache.invalidate("t1")
+
+    async def asyncTearDown(self):
+        await session_cache.invalidate("t1")
+        await super().asyncTearDown()
+
+    async def test_loaded_once_then_appended(self):
+        async with self.Session() as db:
+            reads = []
+            execute = db.execute
+
+            async def counting_execute(statement, *args, **kwargs):
+                reads.append(statement)
+                return await execute(statement, *args, **kwargs)
+            db.execute = counting_execute
+
+            state_m = WorkflowState("t1", db, 1)
+            first = list(await state_m.get_full_history())
+            await state_m.save_message("tool", content='{"status": "success"}', tool_name="read_emails")
+            await state_m.save_message("assistant", "Done")
+            for _ in range(5):
+                history = list(await state_m.get_full_history())
+            await state_m.close()
+
+        self.assertEqual(first[1], {"role": "system", "content": "Output from tool 'list_drive_files': {\"files\": []}"})
+        self.assertEqual(history[:2], first)
+        self.assertEqual(history[2:], [
+            {"role": "system", "content": "Output from tool 'read_emails': {\"status\": \"success\"}"},
+            {"role": "assistant", "content": "Done"},
+        ])
+        # One history query on the cold start, none afterwards
+        self.assertEqual(len(reads), 1)
+
+    async def test_cold_load_includes_buffered_messages(self):
+        async with self.Session() as db:
+            state_m = WorkflowState("t1", db, 1)
+            await state_m.save_message("user", "and email it to bob")
+            history = list(await state_m.get_full_history())
+            before = len(await session_cache.get("t1"))
+            await state_m.close()
+            after = len(await session_cache.get("t1"))
+
+        self.assertEqual(history[-1], {"role": "user", "content": "and email it to bob"})
+        self.assertEqual(len(history), 3)
+        self.assertEqual((before, after), (2, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
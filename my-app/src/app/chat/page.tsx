@@ -61,6 +61,9 @@ export default function ChatPage() {
               clearLoading();
             }
             break;
+          case 'structured_item':
+            addLastAssistantStructuredItem(event.section, event.index, event.item);
+            break;
           case 'tool_call':
             setLastAssistantTool(event.calls[0]?.function?.name || 'tool');
             break;
@@ -77,6 +80,9 @@ export default function ChatPage() {
           case 'hitl_selection':
             setLastAssistantHITL('selection', event.schema);
             break;
+          case 'timing':
+            console.debug(`[timing] ${event.span}.${event.name} ${event.duration_ms}ms`, event.attributes);
+            break;
           case 'done':
             clearLoading();
             if (event.session_id) setCurrentSessionId(event.session_id);
@@ -180,7 +186,28 @@ export default function ChatPage() {
       const last = prev[prev.length - 1];
       if (last && last.role === 'assistant') {
         const updated = [...prev];
-        updated[updated.length - 1] = { ...last, content: last.content + chunk };
+        // The complete answer replaces the items streamed so far
+        updated[updated.length - 1] = { ...last, content: last.content + chunk, structured: undefined };
+        return updated;
+      }
+      return prev;
+    });
+  };
+
+  const addLastAssistantStructuredItem = (section: string, index: number | null, item: any) => {
+    setMessages((prev) => {
+      const last = prev[prev.length - 1];
+      if (last && last.role === 'assistant') {
+        const structured = { ...(last.structured || {}) };
+        if (index === null) {
+          structured[section] = item;
+        } else {
+          const items = [...(structured[section] || [])];
+          items[index] = item;
+          structured[section] = items;
+        }
+        const updated = [...prev];
+        updated[updated.length - 1] = { ...last, structured };
         return updated;
       }
       return prev;
@@ -15,6 +15,7 @@ interface FormField {
         pattern?: string;
         message?: string;
     };
+    error?: string;  // Server-side validation error for the value previously given
 }
 
 interface ToolInfo {
@@ -48,7 +49,9 @@ export function HITLFormInput({
     isLoading = false,
 }: HITLFormInputProps) {
     const [formData, setFormData] = useState<Record<string, string | number>>({});
-    const [errors, setErrors] = useState<Record<string, string>>({});
+    const [errors, setErrors] = useState<Record<string, string>>(() =>
+        Object.fromEntries(fields.filter((field) => field.error).map((field) => [field.name, field.error as string]))
+    );
 
     const handleChange = (name: string, value: string | number) => {
         setFormData((prev) => ({ ...prev, [name]: value }));
@@ -109,6 +109,15 @@ export function MessageBubble({
                   // Fallback to text if not valid JSON
                 }
               }
+              if (message.structured) {
+                // Structured answer still streaming: render the items received so far
+                return (
+                  <>
+                    {renderContentWithCitations(message.content)}
+                    <StructuredRenderer data={message.structured} />
+                  </>
+                );
+              }
               return renderContentWithCitations(message.content);
             })()}
           </div>
@@ -1,5 +1,8 @@
 import { Message } from '../types/chat';
 
+// Ask the backend for per-span `timing` events (model calls, Google calls, database writes)
+const WORKFLOW_TIMING = process.env.NEXT_PUBLIC_WORKFLOW_TIMING === 'true';
+
 type WorkflowEvent =
     | { type: 'content'; chunk?: string; content?: string; role?: string; finished?: boolean }
     | { type: 'tool_call'; calls: any[] }
@@ -16,6 +19,8 @@ type WorkflowEvent =
     | { type: 'plan_preview'; plan: any[]; extracted_variables: Record<string, any> }
     | { type: 'hitl_selection'; schema: any }
     | { type: 'view_pdf'; file_id: string; file_name: string; proxy_url: string }
+    | { type: 'structured_item'; section: string; index: number | null; item: any }
+    | { type: 'timing'; span: 'llm' | 'google' | 'db' | 'workflow'; name: string; duration_ms: number; attributes: Record<string, any>; error?: string }
     | { type: 'workflow_complete'; status: 'success' | 'error' | 'stopped'; session_id: string; message?: string };
 
 export interface HITLFormSchema {
@@ -34,6 +39,8 @@ export interface HITLFormSchema {
         required?: boolean;
         placeholder?: string;
         options?: { value: string; label: string }[];
+        validation?: { min?: number; max?: number; pattern?: string; message?: string };
+        error?: string;
     }>;
 }
 
@@ -227,7 +234,8 @@ export class WorkflowService {
             this.ws.send(JSON.stringify({
                 message,
                 session_id: sessionId,
-                workflow_id: workflowId
+                workflow_id: workflowId,
+                timing: WORKFLOW_TIMING
             }));
         } else {
             console.error('[WS] Cannot send message: WebSocket is not connected');
@@ -242,7 +250,8 @@ export class WorkflowService {
         if (this.ws?.readyState === WebSocket.OPEN) {
             this.ws.send(JSON.stringify({
                 hitl_response: response,
-                session_id: sessionId
+                session_id: sessionId,
+                timing: WORKFLOW_TIMING
             }));
         } else {
             console.error('[WS] Cannot send HITL response: WebSocket is not connected');
@@ -39,6 +39,8 @@ export interface Message {
   };
   hitl_status?: 'pending' | 'submitted' | 'approved' | 'rejected';
   hitl_data?: any;
+  // Sections of a structured answer received so far, while it is still streaming
+  structured?: Record<string, any>;
 }
 
 export interface ChatSession {